@@ -94,6 +94,9 @@ class embryo:
 			self.vals_slice=[]
 			self.noise=noise_dataset(self)
 			
+			#Per frame inputs of last analysis, used for incremental reanalysis
+			self.manifest=[]
+			
 			#Fitting parameters
 			self.fit_number=0
 			self.fits=[]
@@ -197,6 +200,15 @@ class embryo:
 		for i in range(shape(memusage_name)[0]):
 			print sorted_by_size[i][0], sorted_by_size[i][1]
 	
+	#Updates time vector after framerate, number of frames or post delay changed
+	def update_tvec(self):
+		
+		self.tend=self.tstart+self.framerate*(self.nframes-1)
+		self.steps_data=self.nframes
+		self.tvec_data=linspace(self.tstart,self.tend,self.nframes)
+		self.tvec_data[1:]=self.tvec_data[1:]+self.post_delay
+		self.tend=self.tend+self.post_delay
+	
 	def update_version(self):
 		
 		#Create temporarly a blank molecule file
@@ -252,13 +264,20 @@ class fit(embryo):
 				self.UB_ynaught=400.
 				self.LB_k=0.
 				self.UB_k=None
+				self.LB_extra=[]
+				self.UB_extra=[]
 				self.debug_fit=0
 				self.maxfun=1000
 				self.opt_tol=1e-15
 				self.save_track=0
+				self.track_maxlen=1000
+				self.track_every=1
 				self.Fynaught=None
 				self.model="exp"
 				self.npower=2
+				self.nstarts=1
+				self.max_time=None
+				self.max_fcalls=None
 				self.tvec_pooled=[]
 				
 				#Results
@@ -267,14 +286,26 @@ class fit(embryo):
 				self.k_opt=None
 				self.ynaught_opt=None
 				self.cnaught_opt=None
+				self.extra_opt=[]
 				self.success=None
-				self.track_parms=[]
-				self.track_fit=[]
+				self.track_parms=None
 				self.fit_av_d=[]
 				self.iterations=0
 				self.fcalls=0
+				self.cov_opt=None
+				self.nstarts_agree=None
+				self.budget_exceeded=None
 				self.halflife_min=0
 				
+				#Bootstrap confidence intervals
+				self.nboot=0
+				self.k_ci=None
+				self.cnaught_ci=None
+				self.ynaught_ci=None
+				self.extra_ci=None
+				self.halflife_s_ci=None
+				self.halflife_min_ci=None
+				
 				
 	#Print out fit
 	def print_fit(self):
@@ -290,7 +321,7 @@ class fit(embryo):
 	def print_results(self):
 		print "=============================="
 		print "Results of fit: ", self.name
-		res_parms=["k_opt","ynaught_opt","cnaught_opt","halflife_min","success","fcalls","iterations","Rsq","ssd"]
+		res_parms=["k_opt","ynaught_opt","cnaught_opt","extra_opt","halflife_min","success","fcalls","iterations","Rsq","ssd"]
 		
 		#Going through all attributes of source embryo
 		for item in vars(self):
@@ -65,6 +65,7 @@ class molecule:
 		self.F_ext=None
 		self.F_int=None
 		self.F_slice=None
+		self.corr_F_cache=corr_F_cache()
 		
 		self.bkgd_pre_slice=None
 		self.bkgd_pre_ext=None
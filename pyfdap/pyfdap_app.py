@@ -51,6 +51,7 @@ import functools
 import warnings
 import Tkinter
 import FileDialog
+import multiprocessing
 
 #PyFDP Modules
 import pyfdap_img_module as pyfdap_img
@@ -175,6 +176,9 @@ class pyfdp(QtGui.QMainWindow):
 		exportmolecule = QtGui.QAction('Export Molecule to csv-file', self)	
 		self.connect(exportmolecule, QtCore.SIGNAL('triggered()'), self.export_molecule_csv)
 		
+		exportbootstrap = QtGui.QAction('Export bootstrap CIs to csv-file', self)	
+		self.connect(exportbootstrap, QtCore.SIGNAL('triggered()'), self.export_bootstrap_csv)
+		
 		exportfit = QtGui.QAction('Export Fit to csv-file', self)	
 		self.connect(exportfit, QtCore.SIGNAL('triggered()'), self.export_fit_to_csv)
 		
@@ -225,6 +229,12 @@ class pyfdp(QtGui.QMainWindow):
 		analyzeall = QtGui.QAction('Analyze Molecule', self)
 		self.connect(analyzeall, QtCore.SIGNAL('triggered()'), self.analyze_all)
 		
+		watchdata = QtGui.QAction('Watch Data Folder of Embryo', self)
+		self.connect(watchdata, QtCore.SIGNAL('triggered()'), self.watch_dataset)
+		
+		setworkers = QtGui.QAction('Set Number of Worker Processes', self)
+		self.connect(setworkers, QtCore.SIGNAL('triggered()'), self.set_workers)
+		
 		newembryo = QtGui.QAction('New Embryo', self)
 		self.connect(newembryo, QtCore.SIGNAL('triggered()'), self.add_embryo)
 		
@@ -388,6 +398,15 @@ class pyfdp(QtGui.QMainWindow):
 		fitall = QtGui.QAction('Perform all fits in molecule', self)
 		self.connect(fitall, QtCore.SIGNAL('triggered()'), self.perform_fits_molecule)
 		
+		self.fitcachefile = QtGui.QAction('Save fit cache with molecule', self, checkable=True)
+		self.connect(self.fitcachefile, QtCore.SIGNAL('triggered()'), self.set_fit_cache_to_file)
+		
+		clearfitcache = QtGui.QAction('Clear fit cache', self)
+		self.connect(clearfitcache, QtCore.SIGNAL('triggered()'), self.clear_fit_cache)
+		
+		bootstrapfits = QtGui.QAction('Bootstrap confidence intervals', self)
+		self.connect(bootstrapfits, QtCore.SIGNAL('triggered()'), self.bootstrap_molecule)
+		
 		plotfit = QtGui.QAction('Plot fit', self)
 		self.connect(plotfit, QtCore.SIGNAL('triggered()'), self.plot_fit)
 		
@@ -486,6 +505,7 @@ class pyfdp(QtGui.QMainWindow):
 		self.edit_export_mb.addAction(exportmovie)
 		self.edit_export_mb.addAction(exportembryo)
 		self.edit_export_mb.addAction(exportmolecule)
+		self.edit_export_mb.addAction(exportbootstrap)
 		self.edit_export_mb.addAction(exportfit)
 		self.edit_export_mb.addAction(exporterror)
 		self.edit_export_mb.addAction(exportselobjtocsv)
@@ -533,6 +553,8 @@ class pyfdp(QtGui.QMainWindow):
 		self.data_analysis_mb.addAction(analyzeall)
 		self.data_analysis_mb.addAction(analyze)
 		self.data_analysis_mb.addAction(analyzebkgds)
+		self.data_analysis_mb.addAction(watchdata)
+		self.data_analysis_mb.addAction(setworkers)
 		
 		self.data_plotting_mb=self.data_mb.addMenu('&Plotting')
 		self.data_plotting_main_mb=self.data_plotting_mb.addMenu('&Main Dataset')
@@ -573,6 +595,9 @@ class pyfdp(QtGui.QMainWindow):
 		self.fit_fitting_mb.addAction(performfit)
 		self.fit_fitting_mb.addAction(fitallseries)
 		self.fit_fitting_mb.addAction(fitall)
+		self.fit_fitting_mb.addAction(bootstrapfits)
+		self.fit_fitting_mb.addAction(self.fitcachefile)
+		self.fit_fitting_mb.addAction(clearfitcache)
 		self.fit_plot_mb=self.fit_mb.addMenu('&Plotting')
 		self.fit_plot_mb.addAction(plotfit)
 		self.fit_plot_mb.addAction(plottrackfit)
@@ -683,6 +708,10 @@ class pyfdp(QtGui.QMainWindow):
 		#Load config file
 		self.init_conf()
 		
+		#Cache of fit results, so that refitting unchanged fits is instant
+		self.fit_cache=pyfdap_fit.fit_cache()
+		self.fitcachefile.setChecked(self.curr_conf.fit_cache_to_file)
+		
 		self.bin_width_halfilfe_min=10
 		
 		self.setCentralWidget(self.splitter_ver)
@@ -730,6 +759,9 @@ class pyfdp(QtGui.QMainWindow):
 		self.curr_conf=pyfdap_conf()
 		if os.path.isfile(fn):
 			self.curr_conf=self.curr_conf.load_conf(fn)
+			
+			#Update config files of older versions
+			pyfdap_misc.update_obj(pyfdap_conf(),self.curr_conf)
 		
 			self.console.setHidden(self.curr_conf.term_hidden)
 			self.prop_list.setHidden(self.curr_conf.prop_hidden)
@@ -902,8 +934,6 @@ class pyfdp(QtGui.QMainWindow):
 				masks_ext_list=[]
 				masks_int_list=[]
 				
-				fits_list=[]
-				
 				bkgd_masks_embryo_list=[]
 				bkgd_masks_ext_list=[]
 				bkgd_masks_int_list=[]
@@ -913,38 +943,24 @@ class pyfdp(QtGui.QMainWindow):
 					
 					#Dumping mask and image data into temporay lists
 					if temp_emb.masks_ext!=None:
-						masks_embryo_list.append(list(temp_emb.masks_embryo))
-						masks_ext_list.append(list(temp_emb.masks_ext))
-						masks_int_list.append(list(temp_emb.masks_int))
+						masks_embryo_list.append(temp_emb.masks_embryo)
+						masks_ext_list.append(temp_emb.masks_ext)
+						masks_int_list.append(temp_emb.masks_int)
 					
 						#Deleting all image data to reduce file size
 						temp_emb.masks_embryo=[]
 						temp_emb.masks_ext=None
 						temp_emb.masks_int=None
 						temp_emb.vals_slice=None
-					
-					#Deleting all track fit data
-					fit_list=[]
-					for fit in temp_emb.fits:
-						
-						#Dumping fit data in list
-						fit_list.append([fit.save_track,fit.track_fit,fit.track_parms])	
-						
-						#Clearing all costly fit data
-						fit.save_track=0
-						fit.track_fit=[]
-						fit.track_parms=[]
-					
-					fits_list.append(fit_list)	
 						
 				for bkgd in temp_mol.bkgds:
 					
 					#Dumping fit data in list
 					if bkgd.masks_ext!=None:
-						bkgd_masks_embryo_list.append(list(bkgd.masks_embryo))
-						bkgd_masks_ext_list.append(list(bkgd.masks_ext))
-						bkgd_masks_int_list.append(list(bkgd.masks_int))
-						bkgd_vals_slice_list.append(list(bkgd.bkgd_vals_slice))
+						bkgd_masks_embryo_list.append(bkgd.masks_embryo)
+						bkgd_masks_ext_list.append(bkgd.masks_ext)
+						bkgd_masks_int_list.append(bkgd.masks_int)
+						bkgd_vals_slice_list.append(bkgd.bkgd_vals_slice)
 					
 					#Clearing all costly background data
 					bkgd.masks_embryo=[]
@@ -977,11 +993,6 @@ class pyfdp(QtGui.QMainWindow):
 						emb.masks_embryo=masks_embryo_list[i]
 						emb.masks_ext=masks_ext_list[i]
 						emb.masks_int=masks_int_list[i]
-						
-						for j,fit in enumerate(emb.fits):
-							fit.save_track=fits_list[i][j][0]
-							fit.track_fit=fits_list[i][j][1]
-							fit.track_parms=fits_list[i][j][2]
 				
 				if len(bkgd_masks_embryo_list)>0:
 					for i,bkgd in enumerate(self.curr_mol.bkgds):
@@ -992,6 +1003,7 @@ class pyfdp(QtGui.QMainWindow):
 						
 		if fn_save!='':
 			self.append_recent(fn_save)
+			self.save_fit_cache(fn_save)
 		
 		return True
 	
@@ -1036,9 +1048,9 @@ class pyfdp(QtGui.QMainWindow):
 					#temp_emb=cpy.deepcopy(self.curr_embr)
 								
 					#Dumping mask and image data into temporay lists
-					masks_embryo=list(self.curr_embr.masks_embryo)
-					masks_ext=list(self.curr_embr.masks_ext)
-					masks_int=list(self.curr_embr.masks_int)
+					masks_embryo=self.curr_embr.masks_embryo
+					masks_ext=self.curr_embr.masks_ext
+					masks_int=self.curr_embr.masks_int
 					
 					#Deleting all image data to reduce file size
 					self.curr_embr.masks_embryo=[]
@@ -1073,6 +1085,7 @@ class pyfdp(QtGui.QMainWindow):
 	def open_molecule(self,fn_load):
 		self.lastopen=os.path.dirname(str(fn_load))
 		self.append_recent(fn_load)
+		self.load_fit_cache(fn_load)
 		
 		#Create new molecule object
 		curr_name="newmolecule_1"
@@ -2215,7 +2228,7 @@ class pyfdp(QtGui.QMainWindow):
 				
 			#Add bkgds if they exist
 			for bkgd in self.curr_mol.bkgds:	
-				if shape(bkgd.bkgd_vals_slice)[0]>0:
+				if len(bkgd.bkgd_vals_slice)>0:
 					QtGui.QTreeWidgetItem(self.curr_bkgds,[bkgd.name,'1',''])
 				else:
 					QtGui.QTreeWidgetItem(self.curr_bkgds,[bkgd.name,'0',''])
@@ -2286,8 +2299,10 @@ class pyfdp(QtGui.QMainWindow):
 		self.setDisabled(True)
 		
 		#Generate Qthread and pass analyze there
-		self.analyze_all_task=pyfdap_subwin.analyze_all_thread(molecule=self.curr_mol)
+		self.analyze_all_task=pyfdap_subwin.analyze_all_thread(molecule=self.curr_mol,workers=self.curr_conf.workers)
 		self.analyze_all_task.taskFinished.connect(self.analyze_all_finished)
+		self.analyze_all_task.taskCanceled.connect(self.analyze_all_stopped)
+		self.analyze_all_task.progress.connect(self.wait_popup.update_progress)
 		self.analyze_all_task.start()
 				
 	def analyze_all_finished(self):
@@ -2316,10 +2331,15 @@ class pyfdp(QtGui.QMainWindow):
 		return
 	
 	def analyze_all_canceled(self):
+		
+		#Analysis stops at next check of cancel token, then analyze_all_stopped is called
+		self.statusBar().showMessage("Canceling analysis ...")
+		self.analyze_all_task.cancel()
+	
+	def analyze_all_stopped(self):
 		self.statusBar().showMessage("Idle")
 		self.setEnabled(True)
 		
-		self.analyze_all_task.terminate()
 		if self.curr_conf.backup_to_file:
 			self.curr_mol=self.curr_mol.load_molecule(self.fn_backup)
 			os.remove(self.fn_backup)
@@ -2329,6 +2349,38 @@ class pyfdp(QtGui.QMainWindow):
 			
 		self.wait_popup.close()	
 			
+	#----------------------------------------------------------------------------------------------------------------------------------------
+	#Set number of worker processes used for analysis and fitting
+	
+	def set_workers(self):
+		
+		workers, ok=QtGui.QInputDialog.getInt(self, "Set number of worker processes", "workers=", self.curr_conf.workers, 1, multiprocessing.cpu_count())
+		
+		if ok:
+			self.curr_conf.workers=workers
+	
+	#----------------------------------------------------------------------------------------------------------------------------------------
+	#Fit cache
+	
+	def set_fit_cache_to_file(self):
+		
+		self.curr_conf.fit_cache_to_file=self.fitcachefile.isChecked()
+	
+	def clear_fit_cache(self):
+		
+		self.fit_cache=pyfdap_fit.fit_cache()
+	
+	def save_fit_cache(self,fn_mol):
+		
+		if self.curr_conf.fit_cache_to_file:
+			self.fit_cache.save(pyfdap_fit.get_cache_fn(str(fn_mol)))
+	
+	def load_fit_cache(self,fn_mol):
+		
+		fn_cache=pyfdap_fit.get_cache_fn(str(fn_mol))
+		if self.curr_conf.fit_cache_to_file and os.path.isfile(fn_cache):
+			self.fit_cache.load(fn_cache)
+	
 	#----------------------------------------------------------------------------------------------------------------------------------------
 	#Analyze bkgd data sets
 	
@@ -2406,6 +2458,7 @@ class pyfdp(QtGui.QMainWindow):
 		#Generate Qthread and pass analyze there
 		self.analyze_task=pyfdap_subwin.analyze_thread(embryo=self.curr_embr)
 		self.analyze_task.taskFinished.connect(self.analyze_finished)
+		self.analyze_task.taskCanceled.connect(self.analyze_stopped)
 		self.analyze_task.start()
 				
 	def analyze_finished(self):
@@ -2422,13 +2475,68 @@ class pyfdp(QtGui.QMainWindow):
 		return
 	
 	def analyze_canceled(self):
+		
+		#Analysis stops at next check of cancel token, then analyze_stopped is called
+		self.statusBar().showMessage("Canceling analysis ...")
+		self.analyze_task.cancel()
+	
+	def analyze_stopped(self):
 		self.statusBar().showMessage("Idle")
 		self.setEnabled(True)
 		
-		self.analyze_task.terminate()
 		self.curr_embr=cpy.deepcopy(self.backup_emb)
 		self.backup_emb=None
 		self.wait_popup.close()
+	
+	#----------------------------------------------------------------------------------------------------------------------------------------
+	#Watch data folder of embryo during acquisition and analyze new frames as they arrive
+	
+	def watch_dataset(self):
+		
+		if self.curr_embr_node==None:
+			QtGui.QMessageBox.critical(None, "Error","No embryo selected.",QtGui.QMessageBox.Ok | QtGui.QMessageBox.Default)
+			return
+		
+		interval, ok=QtGui.QInputDialog.getDouble(self, "Watch data folder", "polling interval (s)=", 60., 0.1, 3600., 1)
+		if not ok:
+			return
+		
+		#If a fit of this embryo is selected, refit it after every new frame
+		this_fit=None
+		if self.curr_fit!=None and self.curr_fit in self.curr_embr.fits:
+			this_fit=self.curr_fit.fit_number
+		
+		#Generate wait popup
+		self.wait_popup=pyfdap_subwin.watch_prog(None)
+		self.wait_popup.accepted.connect(self.watch_stopped)
+		self.statusBar().showMessage("Watching data folder of " + self.curr_embr.name)
+		self.setDisabled(True)
+		
+		#Generate Qthread and pass watching there
+		self.watch_task=pyfdap_subwin.watch_thread(embryo=self.curr_embr,interval=interval,this_fit=this_fit,workers=self.curr_conf.workers)
+		self.watch_task.taskFinished.connect(self.watch_finished)
+		self.watch_task.taskCanceled.connect(self.watch_finished)
+		self.watch_task.progress.connect(self.wait_popup.update_progress)
+		self.watch_task.start()
+	
+	def watch_stopped(self):
+		
+		#Watching stops at next check of cancel token, a running update is aborted and its frames are left unanalyzed
+		self.watch_task.cancel()
+		
+	def watch_finished(self):
+		
+		self.wait_popup.close()
+		self.statusBar().showMessage("Idle")
+		#Setting analyzed=1
+		if shape(self.curr_embr.slice_av_data_d)[0]>0:
+			self.curr_embr_node.setText(1,"1")
+			self.curr_pre_node.setText(1,"1")
+			self.curr_noise_node.setText(1,"1")
+		
+		self.setEnabled(True)
+			
+		return
 			
 	#----------------------------------------------------------------------------------------------------------------------------------------
 	#Plot data 
@@ -2541,7 +2649,7 @@ class pyfdp(QtGui.QMainWindow):
 				return
 			else:
 				return
-		elif shape(self.curr_embr.masks_embryo)[0]==0 and shape(self.curr_embr.slice_av_data_d)[0]>0:
+		elif len(self.curr_embr.masks_embryo)==0 and shape(self.curr_embr.slice_av_data_d)[0]>0:
 			reply = QtGui.QMessageBox.question(self, 'Message',"Image data is currently not loaded, do you want to analyze the data again?", QtGui.QMessageBox.Yes, QtGui.QMessageBox.No)
 			if reply == QtGui.QMessageBox.Yes:
 				self.analyze_dataset()
@@ -2554,7 +2662,7 @@ class pyfdp(QtGui.QMainWindow):
 		
 		self.curr_tab.imgs=[]
 		
-		for i in range(shape(self.curr_embr.vals_slice)[0]):
+		for i in range(len(self.curr_embr.vals_slice)):
 			if imgtype=="masks_embryo":
 				img=self.curr_embr.masks_embryo[i]
 			elif imgtype=="masks_ext":
@@ -2603,7 +2711,7 @@ class pyfdp(QtGui.QMainWindow):
 			return
 		
 		#Check if background is already analyzed		
-		if shape(self.curr_bkgd.bkgd_vals_slice)[0]==0 and shape(self.curr_embr.slice_av_data_d)[0]==0:
+		if len(self.curr_bkgd.bkgd_vals_slice)==0 and shape(self.curr_embr.slice_av_data_d)[0]==0:
 			
 			reply = QtGui.QMessageBox.question(self, 'Message',"This background dataset has not been analyzed yet. Do you want to analyze the background datasets now?", QtGui.QMessageBox.Yes, QtGui.QMessageBox.No)
 
@@ -2613,7 +2721,7 @@ class pyfdp(QtGui.QMainWindow):
 			else:
 				return
 			
-		elif shape(self.curr_bkgd.bkgd_vals_slice)[0]==0 and shape(self.curr_embr.slice_av_data_d)[0]>0:
+		elif len(self.curr_bkgd.bkgd_vals_slice)==0 and shape(self.curr_embr.slice_av_data_d)[0]>0:
 		
 			#Do analysis for bkgd data set
 			reply = QtGui.QMessageBox.question(self, 'Message',"This background dataset does not contain the image data anymore. Do you want to reanalyze all background datasets now?", QtGui.QMessageBox.Yes, QtGui.QMessageBox.No)
@@ -2627,7 +2735,7 @@ class pyfdp(QtGui.QMainWindow):
 		self.create_slider_plot_tab(imgtype)
 		self.img_axes=[]
 		self.curr_tab.imgs=[]
-		for i in range(shape(self.curr_bkgd.bkgd_vals_slice)[0]):
+		for i in range(len(self.curr_bkgd.bkgd_vals_slice)):
 			if imgtype=="bkgd_masks_embryo":
 				img=self.curr_bkgd.masks_embryo[i]
 			elif imgtype=="bkgd_masks_ext":
@@ -2703,6 +2811,10 @@ class pyfdp(QtGui.QMainWindow):
 			return
 		
 		if self.curr_fit.save_track==1:
+			
+			#Track only keeps parameters, compute curves
+			self.curr_track_fit=pyfdap_fit.get_track_fit(self.curr_embr,self.curr_fit)
+			
 			self.create_slider_plot_tab("track_fit")
 			
 			if shape(self.curr_embr.ignored)[0]>0:
@@ -2710,39 +2822,39 @@ class pyfdp(QtGui.QMainWindow):
 				if self.curr_fit.fit_slice==1 and self.curr_fit.fit_ext==0 and self.curr_fit.fit_int==0:
 					
 					self.ax.plot(self.curr_embr.tvec_ignored,self.curr_embr.slice_av_data_ign,'g*')
-					self.ax.plot(self.curr_embr.tvec_ignored,self.curr_fit.track_fit[-1],'g--')
+					self.ax.plot(self.curr_embr.tvec_ignored,self.curr_track_fit[-1],'g--')
 					
 				elif self.curr_fit.fit_slice==0 and self.curr_fit.fit_ext==1 and self.curr_fit.fit_int==0:
 				
 					self.ax.plot(self.curr_embr.tvec_ignored,self.curr_embr.ext_av_data_ign,'r*')
-					self.ax.plot(self.curr_embr.tvec_ignored,self.curr_fit.track_fit[-1],'r--')
+					self.ax.plot(self.curr_embr.tvec_ignored,self.curr_track_fit[-1],'r--')
 					
 				elif self.curr_fit.fit_slice==0 and self.curr_fit.fit_ext==0 and self.curr_fit.fit_int==1:
 
 					self.ax.plot(self.curr_embr.tvec_ignored,self.curr_embr.int_av_data_ign,'b*')
-					self.ax.plot(self.curr_embr.tvec_ignored,self.curr_fit.track_fit[-1],'b--')	
+					self.ax.plot(self.curr_embr.tvec_ignored,self.curr_track_fit[-1],'b--')	
 			
 			else:
 				if self.curr_fit.fit_slice==1 and self.curr_fit.fit_ext==0 and self.curr_fit.fit_int==0:
 					
 					self.ax.plot(self.curr_embr.tvec_data,self.curr_embr.slice_av_data_d,'g*')
-					self.ax.plot(self.curr_embr.tvec_data,self.curr_fit.track_fit[-1],'g--')
+					self.ax.plot(self.curr_embr.tvec_data,self.curr_track_fit[-1],'g--')
 					
 				elif self.curr_fit.fit_slice==0 and self.curr_fit.fit_ext==1 and self.curr_fit.fit_int==0:
 				
 					self.ax.plot(self.curr_embr.tvec_data,self.curr_embr.ext_av_data_d,'r*')
-					self.ax.plot(self.curr_embr.tvec_data,self.curr_fit.track_fit[-1],'r--')
+					self.ax.plot(self.curr_embr.tvec_data,self.curr_track_fit[-1],'r--')
 					
 				elif self.curr_fit.fit_slice==0 and self.curr_fit.fit_ext==0 and self.curr_fit.fit_int==1:
 
 					self.ax.plot(self.curr_embr.tvec_data,self.curr_embr.int_av_data_d,'b*')
-					self.ax.plot(self.curr_embr.tvec_data,self.curr_fit.track_fit[-1],'b--')	
+					self.ax.plot(self.curr_embr.tvec_data,self.curr_track_fit[-1],'b--')	
 		
 			self.curr_tab.lbl_track_k.setText(str(self.curr_fit.track_parms[-1][0]))
 			self.curr_tab.lbl_track_y0.setText(str(self.curr_fit.track_parms[-1][2]))
 			self.curr_tab.lbl_track_c0.setText(str(self.curr_fit.track_parms[-1][1]))
 			
-			self.curr_tab.curr_slider.setSliderPosition(shape(self.curr_fit.track_fit)[0]-1)
+			self.curr_tab.curr_slider.setSliderPosition(shape(self.curr_track_fit)[0]-1)
 			
 			self.canvas.draw()
 		
@@ -2803,7 +2915,7 @@ class pyfdp(QtGui.QMainWindow):
 		self.ax.plot(tvec_extrap,cnaught_plot,'k--',label='c0_opt+y0_opt')
 		
 		#Show halflife in plot
-		f_tau=self.curr_fit.cnaught_opt*exp(-self.curr_fit.k_opt*self.curr_fit.halflife_s)+self.curr_fit.ynaught_opt
+		f_tau=pyfdap_fit.get_model(self.curr_fit).evaluate(self.curr_fit.halflife_s,*pyfdap_fit.get_parms_opt(self.curr_fit))
 		self.ax.plot([self.curr_fit.halflife_s,self.curr_fit.halflife_s],[self.curr_fit.ynaught_opt,f_tau],'k-')
 		self.ax.plot([0,self.curr_fit.halflife_s],[f_tau,f_tau],'k-')
 		
@@ -3250,7 +3362,7 @@ class pyfdp(QtGui.QMainWindow):
 		self.vbox_slider.addLayout(self.hbox_arrows,stretch=1)
 	
 		if plottype in ["bkgd_ext","bkgd_slice","bkgd_int","bkgd_masks_embryo","bkgd_masks_ext","bkgd_masks_int"]:
-			self.curr_tab.curr_slider.setRange(0,shape(self.curr_bkgd.bkgd_vals_slice)[0]-1)
+			self.curr_tab.curr_slider.setRange(0,len(self.curr_bkgd.bkgd_vals_slice)-1)
 			self.curr_tab.curr_slider.setSingleStep(1)
 			self.connect(self.curr_tab.curr_slider, QtCore.SIGNAL('sliderReleased()'), self.update_slider_bkgd)
 			self.curr_tab.lbl_time_slider = QtGui.QLabel("img = 0", self)
@@ -3273,7 +3385,7 @@ class pyfdp(QtGui.QMainWindow):
 			self.hbox_arrows.addWidget(self.curr_tab.btn_right)
 			
 		if plottype in ["ext","slice","int","masks_embryo","masks_ext","masks_int"]:
-			self.curr_tab.curr_slider.setRange(0,shape(self.curr_embr.vals_slice)[0]-1)
+			self.curr_tab.curr_slider.setRange(0,len(self.curr_embr.vals_slice)-1)
 			self.curr_tab.curr_slider.setSingleStep(1)
 			self.connect(self.curr_tab.curr_slider, QtCore.SIGNAL('sliderReleased()'), self.update_slider_bkgd)
 			self.curr_tab.lbl_time_slider = QtGui.QLabel("img = 0", self)
@@ -3296,7 +3408,7 @@ class pyfdp(QtGui.QMainWindow):
 			self.hbox_arrows.addWidget(self.curr_tab.btn_right)
 		
 		elif plottype=="track_fit":
-			self.curr_tab.curr_slider.setRange(0,shape(self.curr_fit.track_fit)[0]-1)
+			self.curr_tab.curr_slider.setRange(0,shape(self.curr_track_fit)[0]-1)
 			self.curr_tab.curr_slider.setSingleStep(1)
 			self.connect(self.curr_tab.curr_slider, QtCore.SIGNAL('valueChanged(int)'), self.update_slider_track)
 			
@@ -3395,33 +3507,33 @@ class pyfdp(QtGui.QMainWindow):
 			if self.curr_fit.fit_slice==1 and self.curr_fit.fit_ext==0 and self.curr_fit.fit_int==0:
 						
 				self.ax.plot(self.curr_embr.tvec_ignored,self.curr_embr.slice_av_data_ign,'g-')
-				self.ax.plot(self.curr_embr.tvec_ignored,self.curr_fit.track_fit[value],'g--')
+				self.ax.plot(self.curr_embr.tvec_ignored,self.curr_track_fit[value],'g--')
 					
 			elif self.curr_fit.fit_slice==0 and self.curr_fit.fit_ext==1 and self.curr_fit.fit_int==0:
 				
 				self.ax.plot(self.curr_embr.tvec_ignored,self.curr_embr.ext_av_data_ign,'r-')
-				self.ax.plot(self.curr_embr.tvec_ignored,self.curr_fit.track_fit[value],'r--')
+				self.ax.plot(self.curr_embr.tvec_ignored,self.curr_track_fit[value],'r--')
 				
 			elif self.curr_fit.fit_slice==0 and self.curr_fit.fit_ext==0 and self.curr_fit.fit_int==1:
 				
 				self.ax.plot(self.curr_embr.tvec_ignored,self.curr_embr.int_av_data_ign,'b-')
-				self.ax.plot(self.curr_embr.tvec_ignored,self.curr_fit.track_fit[value],'b--')	
+				self.ax.plot(self.curr_embr.tvec_ignored,self.curr_track_fit[value],'b--')	
 		
 		else:
 			if self.curr_fit.fit_slice==1 and self.curr_fit.fit_ext==0 and self.curr_fit.fit_int==0:
 					
 				self.ax.plot(self.curr_embr.tvec_data,self.curr_embr.slice_av_data_d,'g-')
-				self.ax.plot(self.curr_embr.tvec_data,self.curr_fit.track_fit[value],'g--')
+				self.ax.plot(self.curr_embr.tvec_data,self.curr_track_fit[value],'g--')
 					
 			elif self.curr_fit.fit_slice==0 and self.curr_fit.fit_ext==1 and self.curr_fit.fit_int==0:
 				
 				self.ax.plot(self.curr_embr.tvec_data,self.curr_embr.ext_av_data_d,'r-')
-				self.ax.plot(self.curr_embr.tvec_data,self.curr_fit.track_fit[value],'r--')
+				self.ax.plot(self.curr_embr.tvec_data,self.curr_track_fit[value],'r--')
 				
 			elif self.curr_fit.fit_slice==0 and self.curr_fit.fit_ext==0 and self.curr_fit.fit_int==1:
 				
 				self.ax.plot(self.curr_embr.tvec_data,self.curr_embr.int_av_data_d,'b-')
-				self.ax.plot(self.curr_embr.tvec_data,self.curr_fit.track_fit[value],'b--')	
+				self.ax.plot(self.curr_embr.tvec_data,self.curr_track_fit[value],'b--')	
 		
 		self.curr_tab.lbl_track_k.setText(str(self.curr_fit.track_parms[value][0]))
 		self.curr_tab.lbl_track_y0.setText(str(self.curr_fit.track_parms[value][1]))
@@ -3434,7 +3546,7 @@ class pyfdp(QtGui.QMainWindow):
 		value=self.curr_tab.curr_slider.value()
 		
 		#Check if there is a next frame
-		if value+1>=len(self.curr_fit.track_fit):
+		if value+1>=len(self.curr_track_fit):
 			return
 		
 		#Increase value and plot
@@ -3445,33 +3557,33 @@ class pyfdp(QtGui.QMainWindow):
 			if self.curr_fit.fit_slice==1 and self.curr_fit.fit_ext==0 and self.curr_fit.fit_int==0:
 						
 				self.ax.plot(self.curr_embr.tvec_ignored,self.curr_embr.slice_av_data_ign,'g-')
-				self.ax.plot(self.curr_embr.tvec_ignored,self.curr_fit.track_fit[value],'g--')
+				self.ax.plot(self.curr_embr.tvec_ignored,self.curr_track_fit[value],'g--')
 					
 			elif self.curr_fit.fit_slice==0 and self.curr_fit.fit_ext==1 and self.curr_fit.fit_int==0:
 				
 				self.ax.plot(self.curr_embr.tvec_ignored,self.curr_embr.ext_av_data_ign,'r-')
-				self.ax.plot(self.curr_embr.tvec_ignored,self.curr_fit.track_fit[value],'r--')
+				self.ax.plot(self.curr_embr.tvec_ignored,self.curr_track_fit[value],'r--')
 				
 			elif self.curr_fit.fit_slice==0 and self.curr_fit.fit_ext==0 and self.curr_fit.fit_int==1:
 				
 				self.ax.plot(self.curr_embr.tvec_ignored,self.curr_embr.int_av_data_ign,'b-')
-				self.ax.plot(self.curr_embr.tvec_ignored,self.curr_fit.track_fit[value],'b--')	
+				self.ax.plot(self.curr_embr.tvec_ignored,self.curr_track_fit[value],'b--')	
 		
 		else:
 			if self.curr_fit.fit_slice==1 and self.curr_fit.fit_ext==0 and self.curr_fit.fit_int==0:
 					
 				self.ax.plot(self.curr_embr.tvec_data,self.curr_embr.slice_av_data_d,'g-')
-				self.ax.plot(self.curr_embr.tvec_data,self.curr_fit.track_fit[value],'g--')
+				self.ax.plot(self.curr_embr.tvec_data,self.curr_track_fit[value],'g--')
 					
 			elif self.curr_fit.fit_slice==0 and self.curr_fit.fit_ext==1 and self.curr_fit.fit_int==0:
 				
 				self.ax.plot(self.curr_embr.tvec_data,self.curr_embr.ext_av_data_d,'r-')
-				self.ax.plot(self.curr_embr.tvec_data,self.curr_fit.track_fit[value],'r--')
+				self.ax.plot(self.curr_embr.tvec_data,self.curr_track_fit[value],'r--')
 				
 			elif self.curr_fit.fit_slice==0 and self.curr_fit.fit_ext==0 and self.curr_fit.fit_int==1:
 				
 				self.ax.plot(self.curr_embr.tvec_data,self.curr_embr.int_av_data_d,'b-')
-				self.ax.plot(self.curr_embr.tvec_data,self.curr_fit.track_fit[value],'b--')	
+				self.ax.plot(self.curr_embr.tvec_data,self.curr_track_fit[value],'b--')	
 		
 		#Update values
 		self.curr_tab.lbl_track_k.setText(str(self.curr_fit.track_parms[value][0]))
@@ -3500,33 +3612,33 @@ class pyfdp(QtGui.QMainWindow):
 			if self.curr_fit.fit_slice==1 and self.curr_fit.fit_ext==0 and self.curr_fit.fit_int==0:
 						
 				self.ax.plot(self.curr_embr.tvec_ignored,self.curr_embr.slice_av_data_ign,'g-')
-				self.ax.plot(self.curr_embr.tvec_ignored,self.curr_fit.track_fit[value],'g--')
+				self.ax.plot(self.curr_embr.tvec_ignored,self.curr_track_fit[value],'g--')
 					
 			elif self.curr_fit.fit_slice==0 and self.curr_fit.fit_ext==1 and self.curr_fit.fit_int==0:
 				
 				self.ax.plot(self.curr_embr.tvec_ignored,self.curr_embr.ext_av_data_ign,'r-')
-				self.ax.plot(self.curr_embr.tvec_ignored,self.curr_fit.track_fit[value],'r--')
+				self.ax.plot(self.curr_embr.tvec_ignored,self.curr_track_fit[value],'r--')
 				
 			elif self.curr_fit.fit_slice==0 and self.curr_fit.fit_ext==0 and self.curr_fit.fit_int==1:
 				
 				self.ax.plot(self.curr_embr.tvec_ignored,self.curr_embr.int_av_data_ign,'b-')
-				self.ax.plot(self.curr_embr.tvec_ignored,self.curr_fit.track_fit[value],'b--')	
+				self.ax.plot(self.curr_embr.tvec_ignored,self.curr_track_fit[value],'b--')	
 		
 		else:
 			if self.curr_fit.fit_slice==1 and self.curr_fit.fit_ext==0 and self.curr_fit.fit_int==0:
 					
 				self.ax.plot(self.curr_embr.tvec_data,self.curr_embr.slice_av_data_d,'g-')
-				self.ax.plot(self.curr_embr.tvec_data,self.curr_fit.track_fit[value],'g--')
+				self.ax.plot(self.curr_embr.tvec_data,self.curr_track_fit[value],'g--')
 					
 			elif self.curr_fit.fit_slice==0 and self.curr_fit.fit_ext==1 and self.curr_fit.fit_int==0:
 				
 				self.ax.plot(self.curr_embr.tvec_data,self.curr_embr.ext_av_data_d,'r-')
-				self.ax.plot(self.curr_embr.tvec_data,self.curr_fit.track_fit[value],'r--')
+				self.ax.plot(self.curr_embr.tvec_data,self.curr_track_fit[value],'r--')
 				
 			elif self.curr_fit.fit_slice==0 and self.curr_fit.fit_ext==0 and self.curr_fit.fit_int==1:
 				
 				self.ax.plot(self.curr_embr.tvec_data,self.curr_embr.int_av_data_d,'b-')
-				self.ax.plot(self.curr_embr.tvec_data,self.curr_fit.track_fit[value],'b--')	
+				self.ax.plot(self.curr_embr.tvec_data,self.curr_track_fit[value],'b--')	
 		
 		#Update values
 		self.curr_tab.lbl_track_k.setText(str(self.curr_fit.track_parms[value][0]))
@@ -3555,8 +3667,9 @@ class pyfdp(QtGui.QMainWindow):
 		self.setDisabled(True)
 		
 		#Generate Qthread and pass fitting there
-		self.fitting_task=pyfdap_subwin.fitting_thread(embryo=self.curr_embr,fit=self.curr_fit,gui=self)
+		self.fitting_task=pyfdap_subwin.fitting_thread(embryo=self.curr_embr,fit=self.curr_fit,gui=self,workers=self.curr_conf.workers)
 		self.fitting_task.taskFinished.connect(self.fitting_finished)
+		self.fitting_task.taskCanceled.connect(self.fitting_stopped)
 		self.fitting_task.start()
 				
 	def fitting_finished(self):
@@ -3578,9 +3691,14 @@ class pyfdp(QtGui.QMainWindow):
 	
 	def fitting_canceled(self):
 		
+		#Fitting stops at next check of cancel token, then fitting_stopped is called. Fits finished until then keep their results.
+		self.statusBar().showMessage("Canceling fitting ...")
+		self.fitting_task.cancel()
+	
+	def fitting_stopped(self):
+		
 		self.setEnabled(True)
 		self.statusBar().showMessage("Idle")
-		self.fitting_task.terminate()
 		
 		self.wait_popup.close()
 		
@@ -3633,8 +3751,9 @@ class pyfdp(QtGui.QMainWindow):
 			self.setDisabled(True)
 			
 			#Generate Qthread and pass fitting there
-			self.fitting_task=pyfdap_subwin.fitting_all_thread(embryo=self.curr_embr,fits=fits_to_fit,gui=self)
+			self.fitting_task=pyfdap_subwin.fitting_all_thread(embryo=self.curr_embr,fits=fits_to_fit,gui=self,workers=self.curr_conf.workers)
 			self.fitting_task.taskFinished.connect(self.fitting_series_finished)
+			self.fitting_task.taskCanceled.connect(self.fitting_stopped)
 			self.fitting_task.start()
 			
 		else:
@@ -3651,8 +3770,10 @@ class pyfdp(QtGui.QMainWindow):
 		self.setDisabled(True)
 		
 		#Generate Qthread and pass fitting there
-		self.fitting_task=pyfdap_subwin.fitting_mol_thread(molecule=self.curr_mol,gui=self)
+		self.fitting_task=pyfdap_subwin.fitting_mol_thread(molecule=self.curr_mol,gui=self,workers=self.curr_conf.workers,cache=self.fit_cache)
 		self.fitting_task.taskFinished.connect(self.fitting_all_finished)
+		self.fitting_task.taskCanceled.connect(self.fitting_stopped)
+		self.fitting_task.progress.connect(self.wait_popup.update_progress)
 		self.fitting_task.start()
 	
 	def fitting_all_finished(self):
@@ -3673,6 +3794,36 @@ class pyfdp(QtGui.QMainWindow):
 		
 		return	
 	
+	def bootstrap_molecule(self):
+		
+		if self.curr_mol_node==None:
+			QtGui.QMessageBox.critical(None, "Error","No molecule selected.",QtGui.QMessageBox.Ok | QtGui.QMessageBox.Default)
+			return
+		
+		nboot, ok=QtGui.QInputDialog.getInt(self, "Set number of bootstrap resamples", "nboot=", 500, 10, 100000)
+		if not ok:
+			return
+		
+		#Generate wait popup
+		self.wait_popup=pyfdap_subwin.fitting_prog(None)
+		self.wait_popup.accepted.connect(self.fitting_canceled)
+		self.statusBar().showMessage("Bootstrapping")
+		self.setDisabled(True)
+		
+		#Generate Qthread and pass bootstrap there
+		self.fitting_task=pyfdap_subwin.bootstrap_thread(molecule=self.curr_mol,nboot=nboot,workers=self.curr_conf.workers)
+		self.fitting_task.taskFinished.connect(self.bootstrap_finished)
+		self.fitting_task.taskCanceled.connect(self.fitting_stopped)
+		self.fitting_task.start()
+	
+	def bootstrap_finished(self):
+		
+		self.wait_popup.close()
+		self.statusBar().showMessage("Idle")
+		self.setEnabled(True)
+		
+		return
+	
 	def fitting_series_finished(self):
 		
 		self.wait_popup.close()
@@ -3874,24 +4025,24 @@ class pyfdp(QtGui.QMainWindow):
 			
 			if self.curr_tab.typ in ["track_fit"]:
 				
-				for i in range(shape(self.curr_fit.track_fit)[0]):
+				for i in range(shape(self.curr_track_fit)[0]):
 					
 					self.ax.clear()
 				
 					if self.curr_fit.fit_slice==1 and self.curr_fit.fit_ext==0 and self.curr_fit.fit_int==0:
 							
 						self.ax.plot(self.curr_embr.tvec_data,self.curr_embr.slice_av_data_d,'g-')
-						self.ax.plot(self.curr_embr.tvec_data,self.curr_fit.track_fit[i],'g--')
+						self.ax.plot(self.curr_embr.tvec_data,self.curr_track_fit[i],'g--')
 							
 					elif self.curr_fit.fit_slice==0 and self.curr_fit.fit_ext==1 and self.curr_fit.fit_int==0:
 						
 						self.ax.plot(self.curr_embr.tvec_data,self.curr_embr.ext_av_data_d,'r-')
-						self.ax.plot(self.curr_embr.tvec_data,self.curr_fit.track_fit[i],'r--')
+						self.ax.plot(self.curr_embr.tvec_data,self.curr_track_fit[i],'r--')
 						
 					elif self.curr_fit.fit_slice==0 and self.curr_fit.fit_ext==0 and self.curr_fit.fit_int==1:
 						
 						self.ax.plot(self.curr_embr.tvec_data,self.curr_embr.int_av_data_d,'b-')
-						self.ax.plot(self.curr_embr.tvec_data,self.curr_fit.track_fit[i],'b--')	
+						self.ax.plot(self.curr_embr.tvec_data,self.curr_track_fit[i],'b--')	
 					
 					curr_fn_save=fn_save_temp+str(i)+'_tmp'+'.png'
 					self.fig.savefig(curr_fn_save)
@@ -3950,6 +4101,20 @@ class pyfdp(QtGui.QMainWindow):
 		
 		pyfdap_misc.write_csv_molecule(fn_save,self.curr_mol)	
 	
+	def export_bootstrap_csv(self):
+		
+		if self.curr_mol_node==None:
+			QtGui.QMessageBox.critical(None, "Error","No molecule selected.",QtGui.QMessageBox.Ok | QtGui.QMessageBox.Default)
+			return
+		
+		fn_save=QtGui.QFileDialog.getSaveFileName(self, 'Save file', self.lastopen,"*.csv","*.csv")
+		fn_save=str(fn_save)
+		if fn_save=='':
+			return
+		self.lastopen=os.path.dirname(str(fn_save))
+		
+		pyfdap_misc.write_csv_bootstrap(fn_save,self.curr_mol)
+	
 	def export_fit_to_csv(self):
 		
 		if self.curr_fit_node==None:
@@ -4413,4 +4578,6 @@ def main():
 	sys.exit(app.exec_())
 		
 if __name__ == '__main__':
+	#Needed for worker processes in frozen builds
+	multiprocessing.freeze_support()
 	main()
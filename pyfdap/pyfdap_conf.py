@@ -60,6 +60,12 @@ class pyfdap_conf:
 		self.backup_to_file=False
 		self.backup_to_mem=False
 		
+		#Number of worker processes for analysis and fitting
+		self.workers=1
+		
+		#Save fit cache next to molecule file
+		self.fit_cache_to_file=False
+		
 	
 			
 	def save_conf(self,fn_save):
@@ -32,7 +32,25 @@
 #(5) correct_ignored_vecs: Adjusts analyzed time series to time vector with ignored values
 #(6) interp_fit: Interpolates/Extrapolates fit to have the same length as embryo timevecs without ignored time points
 #(7) fdap_fitting: Selects the right optimization settings given by fit object, calls optimzation algorithm and puts results into right objects
-#(7) calc_exp_ssd: Objective function of optimzation algorithm. Returns ssd of fit-data
+#(7) fit_context: Carries data, bounds and model of a single fit. Its method calc_ssd is the objective function of the optimization algorithm
+#(8) warm_start_fit: Uses optimal parameters of last fit as initial guess
+#(9) fit_molecule: Fits all fits of a molecule, optionally in parallel on a process pool
+#(10) fit_data: Minimal stand-in for embryo that only carries what is needed for fitting
+#(11) fit_varpro: Variable projection fit of exponential model, only k is optimized numerically
+#(12) fit_least_squares: Bounded trust region least squares fit using analytic Jacobians
+#(13) fit_batch: Fits many fits at once with a vectorized Levenberg-Marquardt, stepping all fits together
+#(14) fit_brute: Vectorized brute force grid search with local polish
+#(15) fit_cache: LRU cache of fit results keyed by hash of data and fit settings, can be saved next to molecule file
+#(16) track_recorder: Bounded ring buffer of parameters evaluated by optimizer when save_track is selected
+#(17) get_track_fit: Recomputes model curves of recorded track
+#(18) bootstrap_fits: Bootstrap confidence intervals of fitted parameters, resamples are refitted in vectorized batches
+#(19) fit_multistart: Runs local optimizer from several Latin hypercube starting points and keeps the best result
+#(20) corr_F_cache: Cache of correction function F of molecule, computed for all bkgds at once and kept until bkgds change
+#(21) decay_models: Registry of decay models (exp, power, biexp, exp_production) providing vectorized model series, Jacobian, half-life and initial guess
+#(22) compile_fit_problem: Compiles fit into specialized objective function without attribute lookups or branching
+#(23) cancel_token: Cooperative cancellation of long running fits and analyses, fits can also be given time and evaluation budgets
+#(24) get_track_recorder: Returns track recorder of fit, only created when save_track is selected
+#(25) check_model_parms: Adapts x0 and bounds of extra parameters of fit to its model
 
 #=====================================================================================================================================
 #Importing necessary modules
@@ -45,6 +63,14 @@ import scipy.optimize as sopt
 from pyfdap_stats_module import *
 import matplotlib.pyplot as plt
 import time
+import multiprocessing
+import threading
+import copy as cpy
+import collections
+import hashlib
+import pickle
+import os
+import warnings
 
 #=====================================================================================================================================
 #Module Functions
@@ -120,36 +146,146 @@ def comp_corr_F(molecule,embryo):
 		except TypeError:
 			print "Could not compute F value for region ", r, "for embryo", embryo.name
 	
-	
+	return molecule
 	
 def comp_corr_F_region(molecule,embryo,region):
 	
-	min_F=[]
+	#Minima of F curves of all bkgds, computed from cache of molecule if bkgds did not change
+	min_F=get_corr_F_cache(molecule).get_min_F(molecule,region,embryo.noise.noise)
+	
+	return mean(min_F)	
+
+def corr_F(bkgd_vec,bkgd_pre,pre,noise):
+	return (asarray(bkgd_vec)-noise)/(bkgd_pre-noise)
+
+#-------------------------------------------------------------------------------------------------------------------------------------
+#Returns bkgd series of region used for F, without ignored frames if available
+
+def get_bkgd_vec(bkgd,region):
+	
+	if hasattr(bkgd,'bkgd_'+region+'_vec_ign') and shape(getattr(bkgd,'bkgd_'+region+'_vec_ign'))[0]>0:
+		return getattr(bkgd,'bkgd_'+region+'_vec_ign')
+	else:
+		return getattr(bkgd,'bkgd_'+region+'_vec')
+
+#-------------------------------------------------------------------------------------------------------------------------------------
+#Stacks bkgd series of region into 2D array, one row per bkgd with preconversion value first and NaN padding at the end. 
+#Returns array and preconversion values of all bkgds.
+
+def stack_bkgds(molecule,region):
+	
+	vecs=[get_bkgd_vec(bkgd,region) for bkgd in molecule.bkgds]
 	
-	#Loop throuh bkgds
-	for bkgd in molecule.bkgds:
+	B=empty((len(vecs),max([len(vec) for vec in vecs]+[0])+1))
+	B.fill(nan)
+	
+	for i,bkgd in enumerate(molecule.bkgds):
+		B[i,0]=getattr(bkgd.pre,'pre_'+region)
+		B[i,1:len(vecs[i])+1]=vecs[i]
+	
+	return B,B[:,0].copy()
+
+#-------------------------------------------------------------------------------------------------------------------------------------
+#Cache of correction function F of a molecule. For each region, the bkgd series are stacked (see stack_bkgds) and the 
+#minimum and maximum of each row are kept. Since F=(bkgd-noise)/(pre-noise) is monotonic in bkgd, the minimum of F of each bkgd 
+#follows from these for any noise value without touching the series again.
+#An entry is valid as long as the molecule has the same bkgds, with the same series objects of the same length and the same 
+#preconversion values, which is checked without reading the series. Analysis and import always assign new series, if a series 
+#is changed in place, clear() needs to be called. The cache is not pickled with the molecule.
+
+class corr_F_cache:
+	
+	#Creates new empty cache
+	def __init__(self):
 		
-		#Grab right bkgd vector
-		if hasattr(bkgd,'bkgd_'+region+'_vec_ign') and shape(getattr(bkgd,'bkgd_'+region+'_vec_ign'))[0]>0:
-			bkgd_vec=list(getattr(bkgd,'bkgd_'+region+'_vec_ign'))	
-		else:
-			bkgd_vec=list(getattr(bkgd,'bkgd_'+region+'_vec'))
+		self.entries={}
+	
+	def __len__(self):
 		
-		#Insert preconversion value at the start
-		bkgd_pre=getattr(bkgd.pre,'pre_'+region)	
-		bkgd_vec.insert(0,bkgd_pre)
+		return len(self.entries)
+	
+	#Returns inputs of F of region: bkgd, series, length of series and preconversion value of every bkgd
+	def get_inputs(self,molecule,region):
 		
-		#Grab preconversion value
-		pre=getattr(embryo.pre,'pre_'+region)
+		inputs=[]
+		for bkgd in molecule.bkgds:
+			vec=get_bkgd_vec(bkgd,region)
+			inputs.append((bkgd,vec,len(vec),getattr(bkgd.pre,'pre_'+region)))
 		
-		F=corr_F(bkgd_vec,bkgd_pre,pre,embryo.noise.noise)
+		return inputs
+	
+	#Returns entry [inputs,B,pre,min_B,max_B] of region, recomputed if inputs changed
+	def get_entry(self,molecule,region):
 		
-		min_F.append(min(F))
+		inputs=self.get_inputs(molecule,region)
 		
-	return mean(min_F)	
+		entry=self.entries.get(region)
+		if entry!=None and len(entry[0])==len(inputs):
+			valid=True
+			for old,new in zip(entry[0],inputs):
+				if old[0] is not new[0] or old[1] is not new[1] or old[2]!=new[2] or old[3]!=new[3]:
+					valid=False
+					break
+			if valid:
+				return entry
+		
+		B,pre=stack_bkgds(molecule,region)
+		with warnings.catch_warnings():
+			warnings.simplefilter("ignore",RuntimeWarning)
+			min_B=nanmin(B,axis=1)
+			max_B=nanmax(B,axis=1)
+		
+		entry=[inputs,B,pre,min_B,max_B]
+		self.entries[region]=entry
+		
+		return entry
+	
+	#Returns minimum of F curve of each bkgd for region and noise value
+	def get_min_F(self,molecule,region,noise):
+		
+		inputs,B,pre,min_B,max_B=self.get_entry(molecule,region)
+		
+		d=pre-noise
+		
+		#Without a sign of pre-noise, F is not monotonic, compute it
+		if (d==0).any():
+			F,min_F=self.get_F(molecule,region,noise)
+			return min_F
+		
+		return where(d>0,(min_B-noise)/d,(max_B-noise)/d)
+	
+	#Returns F curves (one row per bkgd) and minimum of each curve for region and noise value
+	def get_F(self,molecule,region,noise):
+		
+		inputs,B,pre,min_B,max_B=self.get_entry(molecule,region)
+		
+		with warnings.catch_warnings():
+			warnings.simplefilter("ignore",RuntimeWarning)
+			F=corr_F(B,pre[:,newaxis],None,noise)
+			min_F=nanmin(F,axis=1)
+		
+		return F,min_F
+	
+	def clear(self):
+		
+		self.entries.clear()
+	
+	#Entries hold references to bkgd series and are not saved with molecule
+	def __getstate__(self):
+		
+		return {"entries":{}}
+	
+	def __setstate__(self,state):
+		
+		self.__dict__.update(state)
 
-def corr_F(bkgd_vec,bkgd_pre,pre,noise):
-	return (asarray(bkgd_vec)-noise)/(bkgd_pre-noise)
+#Returns F cache of molecule, molecules of older versions get a new one
+def get_corr_F_cache(molecule):
+	
+	if getattr(molecule,"corr_F_cache",None)==None:
+		molecule.corr_F_cache=corr_F_cache()
+	
+	return molecule.corr_F_cache
 	
 
 #-------------------------------------------------------------------------------------------------------------------------------------
@@ -205,6 +341,29 @@ def opt_parms_fit(fit,molecule):
 	
 	return fit
 
+#-------------------------------------------------------------------------------------------------------------------------------------
+#Uses optimal parameters of last fit as initial guess (e.g. when refitting a growing time series). 
+#Fixed parameters are left untouched, initial guesses are kept inside bounds.
+
+def warm_start_fit(fit):
+	
+	if fit.k_opt==None:
+		return fit
+	
+	fit.x0=list(fit.x0)
+	fit.x0[0]=clip_bounds(fit.k_opt,fit.LB_k,fit.UB_k)
+	if fit.fit_cnaught==1:
+		fit.x0[1]=clip_bounds(fit.cnaught_opt,fit.LB_cnaught,fit.UB_cnaught)
+	if fit.fit_ynaught==1:
+		fit.x0[2]=clip_bounds(fit.ynaught_opt,fit.LB_ynaught,fit.UB_ynaught)
+	
+	#Extra parameters are always fitted, but only reused if they belong to the same model
+	extra=list(getattr(fit,"extra_opt",[]))
+	if len(extra)>0 and len(extra)==len(fit.x0)-3:
+		fit.x0[3:]=[clip_bounds(val,LB,UB) for val,LB,UB in zip(extra,fit.LB_extra,fit.UB_extra)]
+	
+	return fit
+
 #-------------------------------------------------------------------------------------------------------------------------------------
 #Functions to handle data series with ignored time points
 
@@ -240,7 +399,7 @@ def extrap_fit_to_end(fit,tstart,tend):
 	#tvec_extrap=concatenate((fit.embryo.tvec_data,tvec_extrap))
 	
 	if fit.k_opt!=None:
-		f_extrap=fit.cnaught_opt*exp(-fit.k_opt*tvec_extrap)+fit.ynaught_opt
+		f_extrap=get_model(fit).evaluate(tvec_extrap,*get_parms_opt(fit))
 	else:
 		print "Warning, you need to perform the fit before you can use this plot."
 		return False
@@ -251,451 +410,2154 @@ def extrap_fit_to_end(fit,tstart,tend):
 #-------------------------------------------------------------------------------------------------------------------------------------
 #Fits exponential function to data
 
-def fdap_fitting(embryo,this_fit,gui=None):
-	
-	globals()['embryo']=embryo
-	globals()['this_fit']=this_fit
-	globals()['gui']=gui
+def fdap_fitting(embryo,this_fit,gui=None,workers=1,cancel=None):
 	
 	#For good measure, check if ignored vectors are correct
 	embryo=correct_ignored_vecs(embryo)
 	
-	#Counter for function calls
-	global iterations
-	iterations=0
+	#Fit context carrying data, bounds and model, also counts function calls and checks cancel and budgets
+	ctx=fit_context(embryo,this_fit,gui=gui,cancel=cancel)
+	embryo.fits[this_fit].budget_exceeded=None
+	
+	#Fit needs exactly one region, fit is left unchanged otherwise
+	if ctx.data is None:
+		print "You have selected to fit to slice and ext. This won't work"
+		return embryo
+	
+	#Multi-start, selected optimizer is run from several initial guesses
+	if getattr(embryo.fits[this_fit],"nstarts",1)>1:
+		return fit_multistart(embryo,this_fit,ctx,workers=workers)
+	
+	#Variable projection, only k is optimized, c0 and y0 are computed in closed form
+	if embryo.fits[this_fit].opt_meth=='VarPro':
+		return fit_varpro(embryo,this_fit,ctx)
+	
+	#Vectorized grid search
+	if embryo.fits[this_fit].opt_meth=='brute':
+		return fit_brute(embryo,this_fit,ctx)
+	
+	#Trust region least squares on residual vector with analytic Jacobian
+	if embryo.fits[this_fit].opt_meth=='least_squares':
+		return fit_least_squares(embryo,this_fit,ctx)
+	
+	#Batched Levenberg-Marquardt, here with a batch of one
+	if embryo.fits[this_fit].opt_meth=='batch_lm':
+		embryo.fits[this_fit].embryo=embryo
+		fit_batch([embryo.fits[this_fit]],cancel=cancel)
+		return embryo
 	
 	#Check if constrained and if we need xtransform
 	#embryo.fits[this_fit],x0=check_constrained(embryo.fits[this_fit])
 	
+	#Objective functions, compiled once for this fit where possible, guarded if fit can be canceled or has a budget
+	calc_ssd=ctx.guard(ctx.get_objective())
+	constr_calc_ssd=ctx.guard(ctx.get_objective(constrained=True))
+	
 	#-------------------------------------------------------------------------------------------------------------------------------------
 	#Calling optimization algorithms
 	#-------------------------------------------------------------------------------------------------------------------------------------
 	
-	#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
-	#fit_cnaught==1 and fit_ynaught==1
-	#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+	#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+	#fit_cnaught==1 and fit_ynaught==1
+	#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+	
+	if embryo.fits[this_fit].fit_cnaught==1 and embryo.fits[this_fit].fit_ynaught==1:
+		
+		#Copying x0 into local variable to pass to solver
+		#if embryo.fits[this_fit].transform==0:
+		x0=list(embryo.fits[this_fit].x0)
+		
+		#Getting bounds
+		bnds = ((embryo.fits[this_fit].LB_k, embryo.fits[this_fit].UB_k), (embryo.fits[this_fit].LB_cnaught, embryo.fits[this_fit].UB_cnaught),(embryo.fits[this_fit].LB_ynaught,embryo.fits[this_fit].UB_ynaught))+ctx.get_extra_bounds()
+		
+		#Calling optimizers
+		if embryo.fits[this_fit].opt_meth=='Constrained Nelder-Mead':
+			x0=transform_x0(embryo.fits[this_fit].x0,ctx.LB,ctx.UB)
+			res=ctx.solve(sopt.fmin,constr_calc_ssd,x0,ftol=embryo.fits[this_fit].opt_tol,maxiter=embryo.fits[this_fit].maxfun,disp=bool(embryo.debug_fit),full_output=True)	
+			
+		else:
+			if embryo.fits[this_fit].opt_meth=='Anneal':
+				random.seed(555)
+				res=ctx.solve(sopt.minimize,calc_ssd, x0, method='Anneal')
+			else:
+				
+				res=ctx.solve(sopt.minimize,calc_ssd,x0,method=embryo.fits[this_fit].opt_meth,tol=embryo.fits[this_fit].opt_tol,bounds=bnds,options={'maxiter': embryo.fits[this_fit].maxfun, 'disp': bool(embryo.debug_fit)})
+				
+	#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+	#fit_cnaught==1 and fit_ynaught==0
+	#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+				
+	elif embryo.fits[this_fit].fit_cnaught==1 and embryo.fits[this_fit].fit_ynaught==0:
+		
+		#Copying x0 into local variable to pass to solver
+		#if embryo.fits[this_fit].transform==0:
+		x0=list(embryo.fits[this_fit].x0)
+		x0.pop(2)
+		
+		#Getting bounds
+		bnds = ((embryo.fits[this_fit].LB_k, embryo.fits[this_fit].UB_k), (embryo.fits[this_fit].LB_cnaught, embryo.fits[this_fit].UB_cnaught))+ctx.get_extra_bounds()
+		
+		#Calling optimizers
+		if embryo.fits[this_fit].opt_meth=='Constrained Nelder-Mead':
+			x0=transform_x0(embryo.fits[this_fit].x0,ctx.LB,ctx.UB)
+			res=ctx.solve(sopt.fmin,constr_calc_ssd,x0,ftol=embryo.fits[this_fit].opt_tol,maxiter=embryo.fits[this_fit].maxfun,disp=bool(embryo.debug_fit),full_output=True)	
+		
+		else:
+			if embryo.fits[this_fit].opt_meth=='Anneal':
+				random.seed(555)
+				res=ctx.solve(sopt.minimize,calc_ssd, x0, method='Anneal')
+			else:
+				res=ctx.solve(sopt.minimize,calc_ssd,x0,method=embryo.fits[this_fit].opt_meth,tol=embryo.fits[this_fit].opt_tol,bounds=bnds,options={'maxiter': embryo.fits[this_fit].maxfun, 'disp': bool(embryo.debug_fit)})
+			
+	#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+	#fit_cnaught==0 and fit_ynaught==1
+	#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+				
+	elif embryo.fits[this_fit].fit_cnaught==0 and embryo.fits[this_fit].fit_ynaught==1:
+		
+		#Copying x0 into local variable to pass to solver
+		#if embryo.fits[this_fit].transform==0:
+		x0=list(embryo.fits[this_fit].x0)
+		x0.pop(1)
+		
+		#Getting bounds
+		bnds = ((embryo.fits[this_fit].LB_k, embryo.fits[this_fit].UB_k), (embryo.fits[this_fit].LB_ynaught, embryo.fits[this_fit].UB_ynaught))+ctx.get_extra_bounds()
+		
+		#Calling optimizers
+		if embryo.fits[this_fit].opt_meth=='Constrained Nelder-Mead':
+			x0=transform_x0(embryo.fits[this_fit].x0,ctx.LB,ctx.UB)
+			res=ctx.solve(sopt.fmin,constr_calc_ssd,x0,ftol=embryo.fits[this_fit].opt_tol,maxiter=embryo.fits[this_fit].maxfun,disp=bool(embryo.debug_fit),full_output=True)	
+			
+		else:
+			if embryo.fits[this_fit].opt_meth=='Anneal':
+				random.seed(555)
+				res=ctx.solve(sopt.minimize,calc_ssd, x0, method='Anneal')
+			else:	
+				res=ctx.solve(sopt.minimize,calc_ssd,x0,method=embryo.fits[this_fit].opt_meth,tol=embryo.fits[this_fit].opt_tol,bounds=bnds,options={'maxiter': embryo.fits[this_fit].maxfun, 'disp': bool(embryo.debug_fit)})
+			
+	#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+	#fit_cnaught==0 and fit_ynaught==0
+	#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+	
+	elif embryo.fits[this_fit].fit_cnaught==0 and embryo.fits[this_fit].fit_ynaught==0:
+		
+		#Copying x0 into local variable to pass to solver
+		#if embryo.fits[this_fit].transform==0:
+		x0=list(embryo.fits[this_fit].x0)
+	
+		#Getting bounds
+		bnds = ((embryo.fits[this_fit].LB_k, embryo.fits[this_fit].UB_k),)+ctx.get_extra_bounds()
+		
+		#Calling optimizers
+		if embryo.fits[this_fit].opt_meth=='Constrained Nelder-Mead':
+			x0=transform_x0(embryo.fits[this_fit].x0,ctx.LB,ctx.UB)
+			res=ctx.solve(sopt.fmin,constr_calc_ssd,x0,ftol=embryo.fits[this_fit].opt_tol,maxiter=embryo.fits[this_fit].maxfun,disp=bool(embryo.debug_fit),full_output=True)	
+			
+		
+		else:
+			if embryo.fits[this_fit].opt_meth=='Anneal':
+				random.seed(555)
+				res=ctx.solve(sopt.minimize,calc_ssd, x0, method='Anneal')
+			else:
+				
+				res=ctx.solve(sopt.minimize,calc_ssd,x0,method=embryo.fits[this_fit].opt_meth,tol=embryo.fits[this_fit].opt_tol,bounds=bnds,options={'maxiter': embryo.fits[this_fit].maxfun, 'disp': bool(embryo.debug_fit)})
+	
+	#-------------------------------------------------------------------------------------------------------------------------------------
+	#Saving results in embryo object
+	#-------------------------------------------------------------------------------------------------------------------------------------	
+	
+	if embryo.fits[this_fit].opt_meth=='Constrained Nelder-Mead':
+		
+		res_new=xtransform(res[0],ctx.LB,ctx.UB)
+		
+		#Parameters not fitted are taken from x0
+		P=ctx.get_parms(res_new)
+		set_parms_opt(embryo.fits[this_fit],P)
+		
+		embryo.fits[this_fit].fit_av_d=ctx.model_series(*P)
+		embryo.fits[this_fit].ssd=res[1]
+		embryo.fits[this_fit].success=not bool(res[4])
+		embryo.fits[this_fit].iterations=res[2]
+		embryo.fits[this_fit].fcalls=res[3]
+		
+		embryo.fits[this_fit].halflife_s=ctx.model.get_halflife(P)
+		
+		embryo.fits[this_fit].halflife_min=embryo.fits[this_fit].halflife_s/60
+		
+		if embryo.fits[this_fit].fit_ext==1:
+			embryo.fits[this_fit].Rsq=fit_Rsq(embryo.ext_av_data_d,embryo.fits[this_fit].ssd)
+		elif embryo.fits[this_fit].fit_int==1:
+			embryo.fits[this_fit].Rsq=fit_Rsq(embryo.int_av_data_d,embryo.fits[this_fit].ssd)
+		else:
+			embryo.fits[this_fit].Rsq=fit_Rsq(embryo.slice_av_data_d,embryo.fits[this_fit].ssd)
+		
+	else:	
+		#Parameters not fitted are taken from x0
+		P=ctx.get_parms(res.x)
+		set_parms_opt(embryo.fits[this_fit],P)
+			
+		embryo.fits[this_fit].fit_av_d=ctx.model_series(*P)
+		embryo.fits[this_fit].ssd=res.fun
+		embryo.fits[this_fit].success=res.success
+		embryo.fits[this_fit].iterations=res.nit
+		embryo.fits[this_fit].fcalls=res.nfev
+		
+		embryo.fits[this_fit].halflife_s=ctx.model.get_halflife(P)
+		
+		embryo.fits[this_fit].halflife_min=embryo.fits[this_fit].halflife_s/60
+		
+		if embryo.fits[this_fit].fit_ext==1:
+			embryo.fits[this_fit].Rsq=fit_Rsq(embryo.ext_av_data_d,embryo.fits[this_fit].ssd)
+		elif embryo.fits[this_fit].fit_int==1:
+			embryo.fits[this_fit].Rsq=fit_Rsq(embryo.int_av_data_d,embryo.fits[this_fit].ssd)
+		else:
+			embryo.fits[this_fit].Rsq=fit_Rsq(embryo.slice_av_data_d,embryo.fits[this_fit].ssd)
+		
+	return embryo
+
+#-------------------------------------------------------------------------------------------------------------------------------------
+#Decay models. A model maps time t and its parameter vector [k,c0,y0,extra...] to a concentration series and provides its 
+#Jacobian, half-life and an initial guess. All methods broadcast, so the same code evaluates a single series, many parameter 
+#sets at once (fit_brute) or a stack of fits (batch_lm). Fit properties that set the shape of a model (shape_parms, e.g. n of 
+#the power model) are read once when the model is created and derived constants are computed there, not in every evaluation. 
+#Models that are linear in c0 and y0 (c0*basis(t,k)+y0) set linear=True, VarPro and fit_brute then only need to search k.
+#Models with more than k, c0 and y0 list the names of the additional parameters in extra_parms, together with their default 
+#initial guesses and bounds. Extra parameters are always fitted, fits keep them at the end of x0 and in LB_extra, UB_extra 
+#and extra_opt (see check_model_parms). Models are registered by name in decay_models, fit.model selects one of them.
+
+decay_models=collections.OrderedDict()
+
+def register_model(model):
+	
+	decay_models[model.name]=model
+	
+	return model
+
+#Returns model of fit, values of shape_parms are taken from fit
+def get_model(fit):
+	
+	model=decay_models[getattr(fit,"model","exp")]
+	
+	return model(*[getattr(fit,prop) for prop in model.shape_parms])
+
+class decay_model:
+	
+	#Name of model and fit properties setting its shape
+	name=None
+	shape_parms=[]
+	linear=False
+	
+	#Names of parameters besides k, c0 and y0, their default initial guesses and bounds (None is unbounded)
+	extra_parms=[]
+	extra_x0=[]
+	extra_LB=[]
+	extra_UB=[]
+	
+	#Creates model from values of shape_parms, values can also be column arrays with one row per stacked fit
+	def __init__(self,*shape):
+		pass
+	
+	#Returns copy of model with given rows of shape parameters, used for subsets of stacked fits
+	def take(self,rows):
+		
+		new=cpy.copy(self)
+		for prop,val in vars(self).items():
+			if ndim(val)>0:
+				setattr(new,prop,val[rows])
+		
+		return new
+	
+	#Model series
+	def evaluate(self,t,k,c,y,*extra):
+		raise NotImplementedError
+	
+	#Derivatives of model series with respect to k, c0, y0 and extra parameters
+	def jacobian(self,t,k,c,y,*extra):
+		raise NotImplementedError
+	
+	#Half-life in seconds
+	def halflife(self,k,c,*extra):
+		raise NotImplementedError
+	
+	#Half-life for parameter vector P=[k,c0,y0,extra...], P can also hold arrays
+	def get_halflife(self,P):
+		
+		return self.halflife(P[0],P[1],*P[3:])
+	
+	#Returns function of parameter vector giving model series at fixed times t, used by compile_fit_problem
+	def compile(self,t):
+		
+		evaluate=self.evaluate
+		
+		return lambda *P: evaluate(t,*P)
+	
+	#Initial guess of parameter vector from data series d. c0 and y0 follow from first and last data point, k is chosen such
+	#that the half-life is the time until the data first drops below y0+c0/2, extra parameters get their defaults.
+	def initial_guess(self,t,d):
+		
+		t=asarray(t,dtype=float)
+		d=asarray(d,dtype=float)
+		
+		cnaught=d[0]-d[-1]
+		ynaught=d[-1]
+		
+		below=where(d-ynaught<=cnaught/2.)[0]
+		if len(below)>0 and t[below[0]]>t[0]:
+			thalf=t[below[0]]-t[0]
+		else:
+			thalf=max(t[-1]-t[0],1.)/2.
+		
+		#Half-life is proportional to 1/k for all models
+		with errstate(all='ignore'):
+			knew=self.halflife(1.,cnaught,*self.extra_x0)/thalf
+		if not isfinite(knew) or knew<=0:
+			knew=log(2)/thalf
+		
+		return [knew,cnaught,ynaught]+list(self.extra_x0)
+
+class exp_model(decay_model):
+	
+	name="exp"
+	linear=True
+	
+	def basis(self,t,k):
+		return exp(-k*t)
+	
+	def evaluate(self,t,k,c,y):
+		return c*exp(-k*t)+y
+	
+	def jacobian(self,t,k,c,y):
+		
+		e=exp(-k*t)
+		
+		return [-c*t*e,e,ones(shape(e))]
+	
+	def halflife(self,k,c):
+		return log(2)/k
+	
+	def compile(self,t):
+		
+		nt=-asarray(t,dtype=float)
+		
+		return lambda k,c,y: c*exp(k*nt)+y
+
+register_model(exp_model)
+
+#Power decay dc/dt=-k*c**n, model is u**p+y0 with u=c0**(1-n)-k*t*(1-n) and p=1/(1-n)
+class power_model(decay_model):
+	
+	name="power"
+	shape_parms=["npower"]
+	
+	def __init__(self,npower):
+		
+		self.n=asarray(npower,dtype=float)
+		self.m=1-self.n
+		self.p=1/self.m
+		
+	def evaluate(self,t,k,c,y):
+		return (c**self.m-k*t*self.m)**self.p+y
+	
+	def jacobian(self,t,k,c,y):
+		
+		u=c**self.m-k*t*self.m
+		du=self.p*u**(self.p-1)
+		
+		return [du*(-t*self.m),du*self.m*c**(-self.n),ones(shape(u))]
+	
+	def halflife(self,k,c):
+		return ((2**(self.n-1)-1)*c**self.m)/(k*(self.n-1))
+	
+	def compile(self,t):
+		
+		t=asarray(t,dtype=float)
+		m=float(self.m)
+		p=float(self.p)
+		
+		return lambda k,c,y: (c**m-k*t*m)**p+y
+
+register_model(power_model)
+
+#Bi-exponential decay of two pools, c0*((1-frac)*exp(-k*t)+frac*exp(-kratio*k*t))+y0. frac is the fraction of c0 in the 
+#second pool, kratio=k2/k its relative decay rate. kratio>=1 makes the second pool the fast one, so that pools can't swap.
+class biexp_model(decay_model):
+	
+	name="biexp"
+	extra_parms=["kratio","frac"]
+	extra_x0=[10.,0.5]
+	extra_LB=[1.,0.]
+	extra_UB=[None,1.]
+	
+	def evaluate(self,t,k,c,y,kratio,frac):
+		return c*((1-frac)*exp(-k*t)+frac*exp(-kratio*k*t))+y
+	
+	def jacobian(self,t,k,c,y,kratio,frac):
+		
+		e1=exp(-k*t)
+		e2=exp(-kratio*k*t)
+		
+		return [-c*t*((1-frac)*e1+frac*kratio*e2),(1-frac)*e1+frac*e2,ones(shape(e1)),-c*frac*k*t*e2,c*(e2-e1)]
+	
+	#Half-life s/k solves (1-frac)*exp(-s)+frac*exp(-kratio*s)=1/2. s lies between the half-lifes of both pools 
+	#log(2)/max(1,kratio) and log(2)/min(1,kratio) and is found by bisection, which also works on arrays.
+	def halflife(self,k,c,kratio,frac):
+		
+		kratio=maximum(asarray(kratio,dtype=float),1e-12)
+		frac=asarray(frac,dtype=float)
+		
+		lo=log(2)/maximum(kratio,1.)
+		hi=log(2)/minimum(kratio,1.)
+		for i in range(60):
+			s=(lo+hi)/2.
+			above=(1-frac)*exp(-s)+frac*exp(-kratio*s)>0.5
+			lo=where(above,s,lo)
+			hi=where(above,hi,s)
+		
+		return ((lo+hi)/2.)/k
+
+register_model(biexp_model)
+
+#Exponential decay with production, dc/dt=prod-k*c. Converted protein decays from c0 towards the steady state prod/k above the 
+#background y0: c0*exp(-k*t)+prod*(1-exp(-k*t))/k+y0. prod is only identifiable if y0 is fixed or bounded (e.g. by the 
+#background), otherwise prod/k and y0 are interchangeable.
+class exp_production_model(decay_model):
+	
+	name="exp_production"
+	extra_parms=["prod"]
+	extra_x0=[0.]
+	extra_LB=[0.]
+	extra_UB=[None]
+	
+	def evaluate(self,t,k,c,y,prod):
+		return c*exp(-k*t)+prod*exp_integral(t,k)+y
+	
+	def jacobian(self,t,k,c,y,prod):
+		
+		e=exp(-k*t)
+		g=exp_integral(t,k)
+		
+		#d/dk of (1-exp(-k*t))/k is (t*exp(-k*t)-g)/k, with limit -t**2/2 for k=0
+		with errstate(all='ignore'):
+			dg=where(k==0,-t**2/2.,(t*e-g)/k)
+		
+		return [-c*t*e+prod*dg,e,ones(shape(e)),g]
+	
+	def halflife(self,k,c,prod):
+		return log(2)/k
+
+register_model(exp_production_model)
+
+#Returns (1-exp(-k*t))/k, t for k=0
+def exp_integral(t,k):
+	
+	with errstate(all='ignore'):
+		g=-expm1(-k*t)/k
+	
+	return where(k==0,t,g)
+
+#-------------------------------------------------------------------------------------------------------------------------------------
+#Adapts fit to parameters of model (class or instance). Missing extra parameters get the initial guesses and bounds of model, 
+#parameters of models selected before are dropped.
+
+def check_model_parms(fit,model):
+	
+	n=len(model.extra_parms)
+	
+	if len(fit.x0)!=3+n:
+		fit.x0=list(fit.x0)[:3]+list(model.extra_x0)
+	if len(getattr(fit,"LB_extra",[]))!=n:
+		fit.LB_extra=list(model.extra_LB)
+	if len(getattr(fit,"UB_extra",[]))!=n:
+		fit.UB_extra=list(model.extra_UB)
+	if not hasattr(fit,"extra_opt"):
+		fit.extra_opt=[]
+	
+	return fit
+
+#Returns optimal parameter vector [k,c0,y0,extra...] of fit
+def get_parms_opt(fit):
+	
+	return [fit.k_opt,fit.cnaught_opt,fit.ynaught_opt]+list(getattr(fit,"extra_opt",[]))
+
+#Writes parameter vector P into optimal parameters of fit
+def set_parms_opt(fit,P):
+	
+	fit.k_opt=P[0]
+	fit.cnaught_opt=P[1]
+	fit.ynaught_opt=P[2]
+	fit.extra_opt=list(P[3:])
+	
+	return fit
+
+#-------------------------------------------------------------------------------------------------------------------------------------
+#Cooperative cancellation. Long running fits and analyses take a cancel function, e.g. a cancel_token, and call it at safe 
+#points (every evaluation of an objective function, every iteration of batch_lm, every frame of analyze_fdap_data and while
+#waiting for process pools). Once it returns True, task_canceled is raised before results are written, so that objects are 
+#either left as they were or hold complete results.
+
+class task_canceled(Exception):
+	pass
+
+class cancel_token:
+	
+	def __init__(self):
+		
+		self.canceled=False
+	
+	#Requests cancellation, can be called from any thread
+	def cancel(self):
+		
+		self.canceled=True
+	
+	def __call__(self):
+		
+		return self.canceled
+
+def check_canceled(cancel):
+	
+	if cancel!=None and cancel():
+		raise task_canceled("Canceled")
+
+#Raised by objective functions wrapped with fit_context.guard when fit ran longer than fit.max_time seconds or evaluated its 
+#objective fit.max_fcalls times
+class budget_exceeded(Exception):
+	pass
+
+#-------------------------------------------------------------------------------------------------------------------------------------
+#Iterates over results of func applied to tasks on process pool, in order of tasks unless ordered=False. If cancel is given, 
+#it is called every cancel_poll seconds while waiting and task_canceled is raised, the caller then terminates the pool.
+#Only one task per worker process is queued at a time, with all tasks queued the pool's task handler can block on sending 
+#large tasks (e.g. embryos) and terminating the pool after cancel would hang.
+
+cancel_poll=0.1
+
+def imap_pool(pool,func,tasks,cancel=None,ordered=True):
+	
+	#Set whenever a result is ready, so that waiting does not need to poll
+	finished=threading.Event()
+	def set_finished(result):
+		finished.set()
+	
+	queued=[]
+	n=0
+	
+	for i in range(len(tasks)):
+		
+		while n<len(tasks) and len(queued)<pool._processes:
+			queued.append(pool.apply_async(func,(tasks[n],),callback=set_finished))
+			n=n+1
+		
+		#Failed tasks don't call set_finished, they are found by polling
+		while True:
+			check_canceled(cancel)
+			if ordered:
+				ready=[result for result in queued[:1] if result.ready()]
+			else:
+				ready=[result for result in queued if result.ready()]
+			if len(ready)>0:
+				break
+			finished.wait(cancel_poll)
+			finished.clear()
+		
+		queued.remove(ready[0])
+		
+		yield ready[0].get()
+
+#-------------------------------------------------------------------------------------------------------------------------------------
+#Fit context, carries everything a single fit needs (data, bounds, model) so that no module globals are needed and 
+#several fits can run at the same time in threads or processes. The objective function is a method of the context.
+
+class fit_context:
+	
+	#Creates new fit context for fit this_fit of embryo
+	def __init__(self,embryo,this_fit,gui=None,cancel=None):
+		
+		self.embryo=embryo
+		self.fit=embryo.fits[this_fit]
+		self.gui=gui
+		
+		#Counter for function calls
+		self.iterations=0
+		
+		#Cancel function and budgets, checked by objective functions wrapped with guard
+		self.cancel=cancel
+		self.max_time=getattr(self.fit,"max_time",None)
+		self.max_fcalls=getattr(self.fit,"max_fcalls",None)
+		self.t_start=time.time()
+		self.nevals=0
+		self.best=None
+		
+		#Monitor plot for debugging
+		self.fig_mon=None
+		self.ax_mon=None
+		
+		#If no model selected, take exponential decay
+		if not hasattr(self.fit,"model"):
+			self.fit.model="exp"
+		self.model=get_model(self.fit)
+		
+		#Extra parameters of model, always fitted and kept at end of solver variables
+		check_model_parms(self.fit,self.model)
+		self.nextra=len(self.model.extra_parms)
+		
+		#Track recorder is only created if needed
+		if self.fit.save_track==1:
+			get_track_recorder(self.fit)
+		
+		#Bounds
+		self.LB=[self.fit.LB_k,self.fit.LB_cnaught,self.fit.LB_ynaught]+list(self.fit.LB_extra)
+		self.UB=[self.fit.UB_k,self.fit.UB_cnaught,self.fit.UB_ynaught]+list(self.fit.UB_extra)
+		
+		#Time vector and data to fit to
+		self.ignored=shape(embryo.ignored)[0]>0
+		if self.ignored:
+			self.tvec=asarray(embryo.tvec_ignored,dtype=float)
+		else:
+			self.tvec=asarray(embryo.tvec_data,dtype=float)
+		self.data=self.get_data()
+		
+	#Returns data series selected by fit, without ignored time points. Returns None if fit selects more than one region.
+	def get_data(self):
+		
+		if self.ignored:
+			suffix="_av_data_ign"
+		else:
+			suffix="_av_data_d"
+		
+		region=get_fit_region(self.fit)
+		if region==None:
+			return None
+		
+		return getattr(self.embryo,region+suffix)
+			
+	#Returns parameter vector k, c0, y0 (and extra parameters) from solver variables, parameters not fitted are taken from x0
+	def get_parms(self,x):
+		
+		if self.fit.fit_cnaught==1 and self.fit.fit_ynaught==1:
+			P=x[0],x[1],x[2]
+		elif self.fit.fit_cnaught==1 and self.fit.fit_ynaught==0:
+			P=x[0],x[1],self.fit.x0[2]
+		elif self.fit.fit_cnaught==0 and self.fit.fit_ynaught==1:
+			P=x[0],self.fit.x0[1],x[1]
+		elif self.fit.fit_cnaught==0 and self.fit.fit_ynaught==0:
+			P=x[0],self.fit.x0[1],self.fit.x0[2]
+		
+		if self.nextra>0:
+			P=P+tuple(x[len(x)-self.nextra:])
+		
+		return P
+	
+	#Returns model series for given parameter vector
+	def model_series(self,*P):
+		
+		return self.model.evaluate(self.tvec,*P)
+	
+	#Objective function for fdap fitting
+	def calc_ssd(self,x):
+		
+		#Counting function calls
+		self.iterations=self.iterations+1
+		
+		P=self.get_parms(x)
+		
+		if self.embryo.debug_fit==1:
+			print "------------------------------------------"
+			print "knew=",P[0], "ynaught=", P[2], "cnaught=", P[1]
+		
+		#Decay model
+		self.fit.fit_av_d=self.model_series(*P)
+		
+		#Residuals and SSD
+		res=self.data-self.fit.fit_av_d
+		ssd=sum(res**2)
+		
+		if self.embryo.debug_fit==1:
+			self.plot_monitor()
+		
+		if self.fit.save_track==1:
+			self.fit.track_parms.append(P)
+			
+		return ssd
+	
+	#Returns solver variables from k, c0, y0 and extra parameters, dropping parameters that are not fitted
+	def get_x(self,knew,cnaught,ynaught,*extra):
+		
+		x=[knew]
+		if self.fit.fit_cnaught==1:
+			x.append(cnaught)
+		if self.fit.fit_ynaught==1:
+			x.append(ynaught)
+		
+		return x+list(extra)
+	
+	#Residual vector (model-data) for least squares solvers
+	def calc_residuals(self,x):
+		
+		#Counting function calls
+		self.iterations=self.iterations+1
+		
+		P=self.get_parms(x)
+		
+		self.fit.fit_av_d=self.model_series(*P)
+		
+		if self.fit.save_track==1:
+			self.fit.track_parms.append(P)
+		
+		return self.fit.fit_av_d-asarray(self.data,dtype=float)
+	
+	#Analytic Jacobian of residual vector, one column per fitted parameter
+	def calc_jacobian(self,x):
+		
+		J=self.model.jacobian(self.tvec,*self.get_parms(x))
+		
+		return array(self.get_x(*J)).T
+	
+	#Returns bounds of fitted parameters in the form least squares solvers need them
+	def get_lsq_bounds(self):
+		
+		LB=self.get_x(*self.LB)
+		UB=self.get_x(*self.UB)
+		
+		LB=[-inf if b==None else b for b in LB]
+		UB=[inf if b==None else b for b in UB]
+		
+		return LB,UB
+	
+	#Covariance of fitted parameters from Jacobian at optimum
+	def calc_covariance(self,x,ssd):
+		
+		J=self.calc_jacobian(x)
+		dof=max(shape(J)[0]-shape(J)[1],1)
+		
+		try:
+			cov=linalg.inv(dot(J.T,J))*ssd/dof
+		except linalg.LinAlgError:
+			cov=None
+		
+		return cov
+	
+	#Returns optimal c0 and y0 for given k. Since linear models (e.g. exp) are linear in c0 and y0, they follow from a bounded 
+	#linear least squares problem. For two free parameters, the optimum is either the unconstrained one or lies on one 
+	#of the edges of the bounds, so we simply check all candidates. knew can also be an array of k values, then c0 and y0
+	#are arrays too.
+	def linear_parms(self,knew):
+		
+		K=atleast_1d(asarray(knew,dtype=float))
+		E=self.model.basis(self.tvec,K[:,newaxis])
+		d=asarray(self.data,dtype=float)
+		
+		#Sums needed for normal equations
+		n=float(len(d))
+		se=E.sum(axis=1)
+		see=(E*E).sum(axis=1)
+		sed=dot(E,d)
+		sd=d.sum()
+		
+		cnaught=self.fit.x0[1]*ones(shape(K))
+		ynaught=self.fit.x0[2]*ones(shape(K))
+		
+		if self.fit.fit_cnaught==1 and self.fit.fit_ynaught==1:
+			
+			candidates=[]
+			
+			#Unconstrained optimum
+			det=n*see-se**2
+			c=(n*sed-se*sd)/where(det>0,det,1.)
+			candidates.append([c,(sd-c*se)/n,det>0])
+			
+			#Optima on edges
+			for c in [self.fit.LB_cnaught,self.fit.UB_cnaught]:
+				if c!=None:
+					candidates.append([c*ones(shape(K)),(sd-c*se)/n,ones(shape(K),dtype=bool)])
+			for y in [self.fit.LB_ynaught,self.fit.UB_ynaught]:
+				if y!=None:
+					candidates.append([(sed-y*se)/where(see>0,see,1.),y*ones(shape(K)),see>0])
+			
+			ssd_min=inf*ones(shape(K))
+			for c,y,valid in candidates:
+				c=clip_bounds(c,self.fit.LB_cnaught,self.fit.UB_cnaught)
+				y=clip_bounds(y,self.fit.LB_ynaught,self.fit.UB_ynaught)
+				ssd=((d-c[:,newaxis]*E-y[:,newaxis])**2).sum(axis=1)
+				better=valid&(ssd<ssd_min)
+				ssd_min[better]=ssd[better]
+				cnaught[better]=c[better]
+				ynaught[better]=y[better]
+		
+		elif self.fit.fit_cnaught==1:
+			c=clip_bounds((sed-ynaught*se)/where(see>0,see,1.),self.fit.LB_cnaught,self.fit.UB_cnaught)
+			cnaught=where(see>0,c,cnaught)
+		
+		elif self.fit.fit_ynaught==1:
+			ynaught=clip_bounds((sd-cnaught*se)/n,self.fit.LB_ynaught,self.fit.UB_ynaught)
+		
+		if ndim(knew)==0:
+			return cnaught[0],ynaught[0]
+		
+		return cnaught,ynaught
+	
+	#Objective function for VarPro, only depends on k
+	def varpro_ssd(self,knew):
+		
+		cnaught,ynaught=self.linear_parms(knew)
+		
+		return self.calc_ssd(self.get_x(knew,cnaught,ynaught))
+	
+	#Returns search interval for k. If k is unbounded, take k for which signal drops to 0.1% within one time step as UB.
+	def get_k_bounds(self):
+		
+		LB_k=self.fit.LB_k
+		if LB_k==None:
+			LB_k=0.
+		
+		UB_k=self.fit.UB_k
+		if UB_k==None:
+			dt=diff(self.tvec)
+			UB_k=log(1000.)/min(dt[dt>0])
+		
+		return LB_k,UB_k
+	
+	#Returns bounds of extra parameters in the form scipy.optimize.minimize needs them
+	def get_extra_bounds(self):
+		
+		return tuple(zip(self.fit.LB_extra,self.fit.UB_extra))
+	
+	#Returns grid of Ns values between bounds for each fitted parameter, fixed parameters only have their x0 value. 
+	#Missing bounds are replaced as in the fit dialog: k as in get_k_bounds, c0 up to 1.5*max(data), y0 up to max(data).
+	#Extra parameters are searched from 0 up to 10 times their initial guess (or 1) if bounds are missing.
+	def get_grid(self,Ns):
+		
+		d=asarray(self.data,dtype=float)
+		
+		LB_k,UB_k=self.get_k_bounds()
+		grid=[linspace(LB_k,UB_k,Ns)]
+		
+		for fitted,LB,UB,UB_default,x0 in [[self.fit.fit_cnaught,self.fit.LB_cnaught,self.fit.UB_cnaught,1.5*max(d),self.fit.x0[1]],[self.fit.fit_ynaught,self.fit.LB_ynaught,self.fit.UB_ynaught,max(d),self.fit.x0[2]]]:
+			if fitted==1:
+				if LB==None:
+					LB=0.
+				if UB==None:
+					UB=UB_default
+				grid.append(linspace(LB,UB,Ns))
+			else:
+				grid.append(array([x0],dtype=float))
+		
+		for LB,UB,x0 in zip(self.fit.LB_extra,self.fit.UB_extra,self.fit.x0[3:]):
+			if LB==None:
+				LB=0.
+			if UB==None:
+				UB=LB+10*max(abs(x0),1.)
+			grid.append(linspace(LB,UB,Ns))
+		
+		return grid
+	
+	#SSDs of many parameter sets at once, K, C, Y and each extra parameter in E are arrays of same length. Non-finite models 
+	#give SSD inf.
+	def grid_ssd(self,K,C,Y,*E):
+		
+		with errstate(all='ignore'):
+			F=self.model_series(K[:,newaxis],C[:,newaxis],Y[:,newaxis],*[e[:,newaxis] for e in E])
+			ssd=((asarray(self.data,dtype=float)-F)**2).sum(axis=1)
+		ssd[~isfinite(ssd)]=inf
+		
+		#Counting function calls
+		self.iterations=self.iterations+len(K)
+		
+		return ssd
+	
+	#Objective function for constrained Nelder-Mead, transforms solver variables into bounded parameters first
+	def constr_calc_ssd(self,x):
+		
+		x=xtransform(x,self.LB,self.UB)
+		
+		return self.calc_ssd(x)
+	
+	#Returns objective function for solvers, compiled by compile_fit_problem unless evaluations need to be tracked or 
+	#monitored, then calc_ssd or constr_calc_ssd
+	def get_objective(self,constrained=False):
+		
+		if self.fit.save_track==1 or self.embryo.debug_fit==1:
+			if constrained:
+				return self.constr_calc_ssd
+			return self.calc_ssd
+		
+		return compile_fit_problem(self,constrained=constrained)
+	
+	#Wraps objective function f so that cancel and budgets of fit are checked at every evaluation. The best point evaluated 
+	#so far is kept in best, score(val) gives its SSD if f does not return the SSD itself (e.g. residual vectors).
+	def guard(self,f,score=None):
+		
+		if self.cancel==None and self.max_time==None and self.max_fcalls==None:
+			return f
+		
+		def guarded_f(x):
+			
+			check_canceled(self.cancel)
+			
+			val=f(x)
+			
+			ssd=val
+			if score!=None:
+				ssd=score(val)
+			if self.best==None or ssd<self.best[2]:
+				xbest=array(x,dtype=float)
+				if xbest.ndim==0:
+					xbest=xbest[()]
+				self.best=[xbest,val,ssd]
+			
+			#Budgets are checked after evaluation, so there always is a best point
+			self.nevals=self.nevals+1
+			if self.max_fcalls!=None and self.nevals>=self.max_fcalls:
+				raise budget_exceeded("evaluation")
+			if self.max_time!=None and time.time()-self.t_start>=self.max_time:
+				raise budget_exceeded("time")
+			
+			return val
+		
+		return guarded_f
+	
+	#Calls solver(f,*args,**kwargs). If a budget of the fit is exceeded, the best point evaluated so far is returned in the 
+	#format of the solver's result and the exceeded budget is saved in fit.budget_exceeded.
+	def solve(self,solver,f,*args,**kwargs):
+		
+		fit_av_d=self.fit.fit_av_d
+		
+		try:
+			return solver(f,*args,**kwargs)
+		except budget_exceeded as e:
+			self.fit.budget_exceeded=str(e)
+		except task_canceled:
+			#Objective functions write fit_av_d, canceled fit needs to stay unchanged
+			self.fit.fit_av_d=fit_av_d
+			raise
+		
+		print "Fit", self.fit.name, "exceeded its", self.fit.budget_exceeded, "budget, keeping best parameters found so far."
+		
+		x,val,ssd=self.best
+		if solver==sopt.fmin:
+			return x,ssd,self.nevals,self.nevals,2
+		elif solver==sopt.fminbound:
+			return x,ssd,1,self.nevals
+		
+		return sopt.OptimizeResult(x=x,fun=val,success=False,status=-1,message="Budget exceeded",nit=self.nevals,njev=self.nevals,nfev=self.nevals)
+	
+	#Live plot of fit for debugging
+	def plot_monitor(self):
+		
+		#---------------
+		#Automatic update in plotting doesn't work with gui yet, since there is no plt.pause() for canvas object, need to write something in matplotlib/stackoverflow
+		#---------------
+		if self.gui!=None:
+			return
+		
+		if self.ax_mon==None:
+			self.fig_mon=plt.figure()
+			self.fig_mon.show()
+			self.ax_mon=self.fig_mon.add_subplot(111)
+		else:
+			self.ax_mon.cla()
+		
+		embryo=self.embryo
+		if self.fit.fit_ext==0 and self.fit.fit_slice==1 and self.fit.fit_int==0:
+			self.ax_mon.plot(embryo.tvec_data,embryo.slice_av_data_d,'g-')
+			self.ax_mon.plot(embryo.tvec_data,self.fit.fit_av_d,'g--')
+		elif self.fit.fit_ext==1 and self.fit.fit_slice==0 and self.fit.fit_int==0:
+			self.ax_mon.plot(embryo.tvec_data,embryo.ext_av_data_d,'r-')
+			self.ax_mon.plot(embryo.tvec_data,self.fit.fit_av_d,'r--')
+		elif self.fit.fit_ext==0 and self.fit.fit_slice==0 and self.fit.fit_int==1:
+			self.ax_mon.plot(embryo.tvec_data,embryo.int_av_data_d,'b-')
+			self.ax_mon.plot(embryo.tvec_data,self.fit.fit_av_d,'b--')
+		
+		#NOTE: plt.pause fixes the automatic live plotting problems with matplotlib v1.3, but generates a harmless MatplotlibDeprecationWarning
+		plt.draw()
+		plt.pause(0.0001)
+	
+#-------------------------------------------------------------------------------------------------------------------------------------
+#Compiles fit problem of fit context into objective function. Everything that fit_context.calc_ssd looks up or decides on 
+#each call is resolved here once: data and time vector become contiguous float arrays, the model series becomes a closure 
+#over them (see decay_model.compile), the mapping of solver variables to k, c0 and y0 and, for constrained Nelder-Mead, the 
+#bound transformation of each variable (as in xtransform) are fixed. Each evaluation is then only a few NumPy operations on 
+#local variables. Unlike calc_ssd, the objective does not count calls, save the track or write fit.fit_av_d.
+
+def compile_fit_problem(ctx,constrained=False):
+	
+	fit=ctx.fit
+	series=ctx.model.compile(ctx.tvec)
+	d=ascontiguousarray(ctx.data,dtype=float)
+	
+	#Solver variables to k, c0 and y0, parameters not fitted are taken from x0
+	cfix=fit.x0[1]
+	yfix=fit.x0[2]
+	if fit.fit_cnaught==1 and fit.fit_ynaught==1:
+		get_parms=lambda x: (x[0],x[1],x[2])
+	elif fit.fit_cnaught==1 and fit.fit_ynaught==0:
+		get_parms=lambda x: (x[0],x[1],yfix)
+	elif fit.fit_cnaught==0 and fit.fit_ynaught==1:
+		get_parms=lambda x: (x[0],cfix,x[1])
+	else:
+		get_parms=lambda x: (x[0],cfix,yfix)
+	
+	#Extra parameters are the last solver variables
+	nextra=ctx.nextra
+	if nextra>0:
+		get_kcy=get_parms
+		get_parms=lambda x: get_kcy(x)+tuple(x[len(x)-nextra:])
+	
+	if not constrained:
+		
+		def calc_ssd(x):
+			r=d-series(*get_parms(x))
+			return (r*r).sum()
+		
+		return calc_ssd
+	
+	#Bound transformation of each variable
+	transforms=[]
+	for LB,UB in zip(ctx.LB,ctx.UB):
+		transforms.append(get_xtransform(LB,UB))
+	
+	def constr_calc_ssd(x):
+		r=d-series(*get_parms([f(v) for f,v in zip(transforms,x)]))
+		return (r*r).sum()
+	
+	return constr_calc_ssd
+
+#Returns transformation of single solver variable into bounded parameter, same as xtransform for one variable
+def get_xtransform(LB,UB):
+	
+	#Upper bound only
+	if UB!=None and LB==None:
+		return lambda v: UB-v**2
+	
+	#Lower bound only
+	elif UB==None and LB!=None:
+		return lambda v: LB+v**2
+	
+	#Both bounds
+	elif UB!=None and LB!=None:
+		D=UB-LB
+		return lambda v: max([LB,min([UB,(sin(v)+1.)/2.*D+LB])])
+	
+	#No bounds
+	return lambda v: v
+
+#-------------------------------------------------------------------------------------------------------------------------------------
+#Variable projection fit of linear models (exp). Only k is optimized by a bounded 1D search, c0 and y0 are computed in closed
+#form by bounded linear least squares for each k. Writes the same results into fit as fdap_fitting does for other methods.
+
+def fit_varpro(embryo,this_fit,ctx):
+	
+	fit=embryo.fits[this_fit]
+	
+	if not ctx.model.linear:
+		print "VarPro only works with the exponential model, please select a different optimization algorithm."
+		fit.success=False
+		return embryo
+	
+	LB_k,UB_k=ctx.get_k_bounds()
+	
+	res=ctx.solve(sopt.fminbound,ctx.guard(ctx.varpro_ssd),LB_k,UB_k,xtol=fit.opt_tol,maxfun=fit.maxfun,full_output=True,disp=int(embryo.debug_fit))
+	
+	P=[res[0]]+list(ctx.linear_parms(res[0]))
+	set_parms_opt(fit,P)
+	fit.fit_av_d=ctx.model_series(*P)
+	
+	fit.ssd=res[1]
+	fit.success=res[2]==0
+	fit.iterations=res[3]
+	fit.fcalls=ctx.iterations
+	
+	fit.halflife_s=ctx.model.get_halflife(P)
+	fit.halflife_min=fit.halflife_s/60
+	
+	if fit.fit_ext==1:
+		fit.Rsq=fit_Rsq(embryo.ext_av_data_d,fit.ssd)
+	elif fit.fit_int==1:
+		fit.Rsq=fit_Rsq(embryo.int_av_data_d,fit.ssd)
+	else:
+		fit.Rsq=fit_Rsq(embryo.slice_av_data_d,fit.ssd)
+	
+	return embryo
+
+#-------------------------------------------------------------------------------------------------------------------------------------
+#Bounded trust region reflective least squares fit of residual vector with analytic Jacobian (all models). Besides the usual
+#results, the covariance of the fitted parameters (k, c0, y0 without fixed ones, extra parameters) is saved in fit.cov_opt.
+
+def fit_least_squares(embryo,this_fit,ctx):
+	
+	fit=embryo.fits[this_fit]
+	
+	LB,UB=ctx.get_lsq_bounds()
+	
+	#Initial guess needs to be inside bounds
+	x0=ctx.get_x(*fit.x0)
+	x0=[min(max(x0[i],LB[i]),UB[i]) for i in range(len(x0))]
+	
+	res=ctx.solve(sopt.least_squares,ctx.guard(ctx.calc_residuals,score=sum_squares),x0,jac=ctx.calc_jacobian,bounds=(LB,UB),method='trf',x_scale='jac',ftol=max(fit.opt_tol,finfo(float).eps),xtol=max(fit.opt_tol,finfo(float).eps),max_nfev=fit.maxfun,verbose=int(embryo.debug_fit))
+	
+	P=ctx.get_parms(res.x)
+	set_parms_opt(fit,P)
+	fit.fit_av_d=ctx.model_series(*P)
+	
+	fit.ssd=sum(res.fun**2)
+	fit.success=res.success
+	fit.iterations=res.njev
+	fit.fcalls=res.nfev
+	fit.cov_opt=ctx.calc_covariance(res.x,fit.ssd)
+	
+	fit.halflife_s=ctx.model.get_halflife(P)
+	
+	fit.halflife_min=fit.halflife_s/60
+	
+	if fit.fit_ext==1:
+		fit.Rsq=fit_Rsq(embryo.ext_av_data_d,fit.ssd)
+	elif fit.fit_int==1:
+		fit.Rsq=fit_Rsq(embryo.int_av_data_d,fit.ssd)
+	else:
+		fit.Rsq=fit_Rsq(embryo.slice_av_data_d,fit.ssd)
+	
+	return embryo
+
+#-------------------------------------------------------------------------------------------------------------------------------------
+#Batched Levenberg-Marquardt fit of many fits at once (all models). All fits are stacked into a fit_stack and fitted
+#together by batch_lm. Writes the same results into each fit as fit_least_squares does.
+
+def fit_batch(fits,cancel=None):
+	
+	if len(fits)==0:
+		return fits
+	
+	stack=fit_stack(fits)
+	
+	tracks=[get_track_recorder(fit) if fit.save_track==1 else None for fit in fits]
+	ssd,success,iterations,fcalls=batch_lm(stack,tracks=tracks,cancel=cancel)
+	
+	P=stack.P
+	valid=stack.get_valid()
+	
+	#Write results back into fits, batch_lm has no budgets
+	for i,fit in enumerate(fits):
+		
+		fit.budget_exceeded=None
+		
+		if not valid[i]:
+			fit.success=False
+			continue
+		
+		embryo=fit.embryo
+		ctx=fit_context(embryo,embryo.fits.index(fit))
+		
+		set_parms_opt(fit,P[i,:stack.nparms[i]])
+		fit.fit_av_d=ctx.model_series(*get_parms_opt(fit))
+		
+		fit.ssd=ssd[i]
+		fit.success=success[i]
+		fit.iterations=iterations[i]
+		fit.fcalls=fcalls[i]
+		fit.cov_opt=ctx.calc_covariance(ctx.get_x(*get_parms_opt(fit)),fit.ssd)
+		
+		fit.halflife_s=ctx.model.get_halflife(get_parms_opt(fit))
+		
+		fit.halflife_min=fit.halflife_s/60
+		
+		if fit.fit_ext==1:
+			fit.Rsq=fit_Rsq(embryo.ext_av_data_d,fit.ssd)
+		elif fit.fit_int==1:
+			fit.Rsq=fit_Rsq(embryo.int_av_data_d,fit.ssd)
+		else:
+			fit.Rsq=fit_Rsq(embryo.slice_av_data_d,fit.ssd)
+	
+	return fits
+
+#-------------------------------------------------------------------------------------------------------------------------------------
+#Stack of many fits for batch_lm. Data series of all fits are stacked into arrays of shape (nfits,ntimes), shorter time vectors 
+#are padded and padded or ignored time points get weight 0. W are weights of residuals, not of squared residuals. Parameter
+#vectors are padded to the longest one of all models, columns beyond the nparms parameters of a fit are fixed at 0.
+
+class fit_stack:
+	
+	#Names of all arrays of stack, first dimension is always fit
+	arrays=["T","D","W","P","LB","UB","free","nparms","mid","S","tol","maxiter"]
+	
+	#Creates new stack from fits, fits need to know their embryo
+	def __init__(self,fits):
+		
+		nfits=len(fits)
+		
+		#Stack data
+		ntimes=max([len(fit.embryo.tvec_data) for fit in fits])
+		self.T=zeros((nfits,ntimes))
+		self.D=zeros((nfits,ntimes))
+		self.W=zeros((nfits,ntimes))
+		
+		#Parameters, bounds and which parameters are fitted
+		nparms=3+max([len(model.extra_parms) for model in decay_models.values()])
+		self.P=zeros((nfits,nparms))
+		self.LB=zeros((nfits,nparms))
+		self.UB=zeros((nfits,nparms))
+		self.free=zeros((nfits,nparms))
+		self.nparms=3*ones(nfits,dtype=int)
+		
+		#Model of each fit as index into decay_models and values of its shape parameters
+		self.mid=zeros(nfits,dtype=int)
+		self.S=zeros((nfits,max([len(model.shape_parms) for model in decay_models.values()])))
+		
+		#Tolerance and maximum number of iterations of each fit
+		self.tol=zeros(nfits)
+		self.maxiter=zeros(nfits,dtype=int)
+		
+		for i,fit in enumerate(fits):
+			
+			embryo=correct_ignored_vecs(fit.embryo)
+			
+			if not hasattr(fit,"model"):
+				fit.model="exp"
+			
+			region=get_fit_region(fit)
+			if region==None:
+				print "You have selected to fit to slice and ext. This won't work"
+				continue
+			
+			n=len(embryo.tvec_data)
+			self.T[i,:n]=embryo.tvec_data
+			self.D[i,:n]=getattr(embryo,region+"_av_data_d")
+			self.W[i,:n]=1
+			self.W[i,list(embryo.ignored)]=0
+			
+			model=decay_models[fit.model]
+			check_model_parms(fit,model)
+			n=3+len(model.extra_parms)
+			self.nparms[i]=n
+			
+			for j,(lb,ub) in enumerate([[fit.LB_k,fit.UB_k],[fit.LB_cnaught,fit.UB_cnaught],[fit.LB_ynaught,fit.UB_ynaught]]+zip(fit.LB_extra,fit.UB_extra)):
+				self.LB[i,j]=-inf if lb==None else lb
+				self.UB[i,j]=inf if ub==None else ub
+			
+			self.free[i,:n]=[1,fit.fit_cnaught,fit.fit_ynaught]+[1]*(n-3)
+			self.P[i,:n]=minimum(maximum(fit.x0,self.LB[i,:n]),self.UB[i,:n])
+			
+			self.mid[i]=decay_models.keys().index(fit.model)
+			self.S[i,:len(model.shape_parms)]=[getattr(fit,prop) for prop in model.shape_parms]
+			
+			self.tol[i]=max(fit.opt_tol,1e-12)
+			self.maxiter[i]=fit.maxfun
+	
+	#Returns models of stacked fits as list of [rows,model], rows is boolean mask of fits using model and shape parameters of 
+	#model are column arrays with one row per fit in rows
+	def get_models(self):
+		
+		models=[]
+		for j,model in enumerate(decay_models.values()):
+			rows=self.mid==j
+			if rows.any():
+				models.append([rows,model(*[self.S[rows,i:i+1] for i in range(len(model.shape_parms))])])
+		
+		return models
+	
+	#Returns which fits have valid data, others are not fitted at all
+	def get_valid(self):
+		
+		return self.W.sum(axis=1)>0
+	
+	def __len__(self):
+		
+		return len(self.P)
+	
+	#Returns new stack with given rows of this stack
+	def take(self,rows):
+		
+		new=cpy.copy(self)
+		for name in self.arrays:
+			setattr(new,name,getattr(self,name)[rows])
+		
+		return new
+	
+	#Returns new stack with each fit repeated nrep times in a row
+	def repeat_fits(self,nrep):
+		
+		return self.take(repeat(arange(len(self)),nrep))
+
+#-------------------------------------------------------------------------------------------------------------------------------------
+#Vectorized Levenberg-Marquardt on fit_stack. Each iteration evaluates models, residuals and Jacobians of all active fits in one
+#go and solves all normal equations together. Parameters that are not fitted get a zero Jacobian column, bounds are 
+#enforced by clipping each step, parameters held at a bound by their gradient get a zero Jacobian column for that step. Converged fits are dropped from the active set. stack.P is updated in place, parameters
+#of each evaluation are put into tracks[i] if that is not None. Returns ssd, success, iterations and function calls of each fit.
+
+def batch_lm(stack,tracks=None,cancel=None):
+	
+	T,D,W,P,LB,UB=stack.T,stack.D,stack.W,stack.P,stack.LB,stack.UB
+	free,tol,maxiter=stack.free,stack.tol,stack.maxiter
+	models=stack.get_models()
+	
+	nfits=len(stack)
+	nparms=shape(P)[1]
+	active=stack.get_valid()
+	
+	R=batch_residuals(P,T,D,W,models)
+	ssd=(R**2).sum(axis=1)
+	
+	lam=1e-3*ones(nfits)
+	nu=2.*ones(nfits)
+	success=zeros(nfits,dtype=bool)
+	iterations=zeros(nfits,dtype=int)
+	fcalls=ones(nfits,dtype=int)
+	
+	while active.any():
+		
+		check_canceled(cancel)
+		
+		idx=where(active)[0]
+		models_idx=take_models(models,idx)
+		
+		#Normal equations of all active fits, fixed parameters get a unit diagonal and zero gradient so that they do not move
+		J=batch_jacobian(P[idx],T[idx],W[idx],models_idx)*free[idx,newaxis,:]
+		g=einsum('imk,im->ik',J,R[idx])
+		
+		#Parameters on a bound whose gradient points out of bounds are fixed for this step, clipping their step would 
+		#spoil the step of all other parameters
+		out=((P[idx]<=LB[idx])&(g>0))|((P[idx]>=UB[idx])&(g<0))
+		J=J*(~out)[:,newaxis,:]
+		g[out]=0.
+		A=einsum('imk,iml->ikl',J,J)
+		
+		diag=arange(nparms)
+		d=A[:,diag,diag]
+		d[d==0]=1.
+		A[:,diag,diag]=A[:,diag,diag]+lam[idx,newaxis]*d
+		
+		#Fits with non-finite Jacobian do not move, their damping increases until they stop
+		bad=~(isfinite(A).all(axis=(1,2))&isfinite(g).all(axis=1))
+		A[bad]=eye(nparms)
+		g[bad]=0.
+		
+		dx=-linalg.solve(A,g[:,:,newaxis])[:,:,0]
+		
+		#Step and clip to bounds
+		P_new=minimum(maximum(P[idx]+dx,LB[idx]),UB[idx])
+		R_new=batch_residuals(P_new,T[idx],D[idx],W[idx],models_idx)
+		ssd_new=(R_new**2).sum(axis=1)
+		
+		iterations[idx]=iterations[idx]+1
+		fcalls[idx]=fcalls[idx]+1
+		
+		if tracks!=None:
+			for k,i in enumerate(idx):
+				if tracks[i]!=None:
+					tracks[i].append(P_new[k,:stack.nparms[i]])
+		
+		#Accept steps that decrease SSD. Damping is updated from ratio of actual and predicted decrease (Nielsen 1999).
+		dssd=ssd[idx]-ssd_new
+		pred=(dx*(lam[idx,newaxis]*d*dx-g)).sum(axis=1)
+		rho=where(pred>0,dssd/where(pred>0,pred,1.),-1.)
+		better=(rho>0)&isfinite(ssd_new)
+		
+		step=abs(P_new-P[idx]).max(axis=1)/(abs(P[idx]).max(axis=1)+tol[idx])
+		
+		acc=idx[better]
+		P[acc]=P_new[better]
+		R[acc]=R_new[better]
+		ssd[acc]=ssd_new[better]
+		lam[acc]=lam[acc]*maximum(1/3.,1-(2*rho[better]-1)**3)
+		nu[acc]=2.
+		
+		rej=idx[~better]
+		lam[rej]=lam[rej]*nu[rej]
+		nu[rej]=nu[rej]*2.
+		
+		#Converged if accepted step barely changes SSD or parameters, or if no step decreases SSD anymore
+		conv=better&((dssd<=tol[idx]*ssd[idx])|(step<=tol[idx]))
+		conv=conv|(ssd[idx]==0)|(lam[idx]>1e16)
+		
+		success[idx[conv]]=True
+		active[idx[conv]]=False
+		active[iterations>=maxiter]=False
+	
+	return ssd,success,iterations,fcalls
+
+#-------------------------------------------------------------------------------------------------------------------------------------
+#Restricts models of stacked fits (see fit_stack.get_models) to fits idx
+
+def take_models(models,idx):
+	
+	taken=[]
+	for rows,model in models:
+		sel=rows[idx]
+		if sel.any():
+			taken.append([sel,model.take(cumsum(rows)[idx[sel]]-1)])
+	
+	return taken
+
+#-------------------------------------------------------------------------------------------------------------------------------------
+#Model series of stacked fits, P has rows [k,c0,y0,extra...]
+
+def batch_model(P,T,models):
+	
+	F=zeros(shape(T))
+	
+	for rows,model in models:
+		F[rows]=model.evaluate(T[rows],*get_stacked_parms(P[rows],model))
+	
+	return F
+
+#-------------------------------------------------------------------------------------------------------------------------------------
+#Weighted residuals (model-data) of stacked fits, time points with weight 0 do not count, even if model is not finite there
+
+def batch_residuals(P,T,D,W,models):
+	
+	F=batch_model(P,T,models)
+	
+	return where(W>0,(F-D)*W,0.)
+
+#-------------------------------------------------------------------------------------------------------------------------------------
+#Weighted analytic Jacobians of stacked fits, shape (nfits,ntimes,nparms) with columns dk, dc0, dy0 and extra parameters
+
+def batch_jacobian(P,T,W,models):
+	
+	J=zeros(shape(T)+(shape(P)[1],))
+	
+	for rows,model in models:
+		for j,col in enumerate(model.jacobian(T[rows],*get_stacked_parms(P[rows],model))):
+			J[rows,:,j]=col
+	
+	return where((W>0)[:,:,newaxis],J*W[:,:,newaxis],0.)
+
+#Returns parameters of model as column arrays from rows P of stacked fits
+def get_stacked_parms(P,model):
+	
+	return [P[:,j:j+1] for j in range(3+len(model.extra_parms))]
+
+#-------------------------------------------------------------------------------------------------------------------------------------
+#Bootstrap confidence intervals of k, c0, y0 and half-life for fits that have already been performed. Each fit gets nboot
+#resampled data series, either by resampling residuals of its optimal fit (method="residual") or by resampling time points 
+#(method="pairs", done by integer weights of time points). All resampled series of all fits are refitted together by batch_lm, 
+#starting from the optimum of each fit, and with workers>1 the rows are split over a process pool. Percentile intervals of 
+#level 1-alpha are saved in fit.k_ci, fit.cnaught_ci, fit.ynaught_ci, fit.extra_ci (one interval per extra parameter), 
+#fit.halflife_s_ci and fit.halflife_min_ci, the number of successful refits in fit.nboot.
+
+def bootstrap_fits(fits,nboot=500,method="residual",alpha=0.05,workers=1,seed=None,cancel=None):
+	
+	fits=[fit for fit in fits if fit.k_opt!=None]
+	if len(fits)==0:
+		print "No fits performed yet, nothing to bootstrap."
+		return fits
+	
+	stack=fit_stack(fits)
+	for i,fit in enumerate(fits):
+		n=stack.nparms[i]
+		stack.P[i,:n]=minimum(maximum(get_parms_opt(fit),stack.LB[i,:n]),stack.UB[i,:n])
+	
+	#Optimal model series and residuals
+	M=batch_model(stack.P,stack.T,stack.get_models())
+	
+	boot=stack.repeat_fits(nboot)
+	random_state=random.RandomState(seed)
+	
+	for i in range(len(fits)):
+		
+		rows=slice(i*nboot,(i+1)*nboot)
+		v=where(stack.W[i]>0)[0]
+		if len(v)==0:
+			continue
+		
+		if method=="residual":
+			res=stack.D[i,v]-M[i,v]
+			draws=random_state.randint(0,len(v),(nboot,len(v)))
+			boot.D[rows][:,v]=M[i,v]+res[draws]
+		elif method=="pairs":
+			counts=random_state.multinomial(len(v),ones(len(v))/len(v),size=nboot)
+			boot.W[rows][:,v]=sqrt(counts)
+	
+	#Refit, on process pool if selected
+	if workers>1:
+		chunks=[boot.take(rows) for rows in array_split(arange(len(boot)),workers)]
+		
+		pool=multiprocessing.Pool(workers)
+		try:
+			results=list(imap_pool(pool,bootstrap_task,chunks,cancel=cancel))
+			pool.close()
+		except:
+			pool.terminate()
+			raise
+		finally:
+			pool.join()
+		
+		P=concatenate([result[0] for result in results])
+		success=concatenate([result[1] for result in results])
+	else:
+		P,success=bootstrap_task(boot,cancel=cancel)
+	
+	#Percentile intervals
+	q=[100*alpha/2.,100*(1-alpha/2.)]
+	for i,fit in enumerate(fits):
+		
+		samples=P[i*nboot:(i+1)*nboot][success[i*nboot:(i+1)*nboot]]
+		fit.nboot=len(samples)
+		if fit.nboot==0:
+			continue
+		
+		halflife_s=get_model(fit).get_halflife(samples[:,:stack.nparms[i]].T)
+		
+		fit.k_ci=list(percentile(samples[:,0],q))
+		fit.cnaught_ci=list(percentile(samples[:,1],q))
+		fit.ynaught_ci=list(percentile(samples[:,2],q))
+		fit.extra_ci=[list(percentile(samples[:,j],q)) for j in range(3,stack.nparms[i])]
+		fit.halflife_s_ci=list(percentile(halflife_s,q))
+		fit.halflife_min_ci=[val/60 for val in fit.halflife_s_ci]
+	
+	return fits
+
+#-------------------------------------------------------------------------------------------------------------------------------------
+#Refits stack of resampled series, returns parameters and success of each row. Used by bootstrap_fits, also in worker processes.
+
+def bootstrap_task(stack,cancel=None):
+	
+	ssd,success,iterations,fcalls=batch_lm(stack,cancel=cancel)
+	
+	return stack.P,success
+
+#-------------------------------------------------------------------------------------------------------------------------------------
+#Bootstraps all fits of molecule, see bootstrap_fits
+
+def bootstrap_molecule(molecule,nboot=500,method="residual",alpha=0.05,workers=1,seed=None,cancel=None):
+	
+	fits=[]
+	for embryo in molecule.embryos:
+		for fit in embryo.fits:
+			fit.embryo=embryo
+			fits.append(fit)
+	
+	bootstrap_fits(fits,nboot=nboot,method=method,alpha=alpha,workers=workers,seed=seed,cancel=cancel)
+	
+	return molecule
+
+#-------------------------------------------------------------------------------------------------------------------------------------
+#Multi-start fit. The optimizer selected in fit is run from fit.nstarts initial guesses and the result with the lowest SSD is 
+#kept. The first guess is x0 of the fit, the others are Latin hypercube samples between the bounds of the fitted parameters 
+#(missing bounds as in fit_context.get_grid). Starts are light copies of fit (see copy_for_fitting) and run on a process pool 
+#when workers>1. The number of starts that reached the best SSD and k within multistart_rtol is saved in fit.nstarts_agree.
+
+multistart_rtol=1e-3
+
+def fit_multistart(embryo,this_fit,ctx,workers=1):
+	
+	fit=embryo.fits[this_fit]
+	
+	#Sampling box, fixed parameters have LB=UB=x0
+	grid=ctx.get_grid(2)
+	LB=[g[0] for g in grid]
+	UB=[g[-1] for g in grid]
+	
+	starts=[list(fit.x0)]+latin_hypercube(fit.nstarts-1,LB,UB,random.RandomState(555)).tolist()
+	
+	tasks=[]
+	for i,x0 in enumerate(starts):
+		data=copy_for_fitting(embryo,fit)
+		data.fits[0].x0=x0
+		data.fits[0].nstarts=1
+		tasks.append([i,data])
+	
+	if workers>1:
+		pool=multiprocessing.Pool(min(workers,len(tasks)))
+		try:
+			results=list(imap_pool(pool,fit_task,tasks,cancel=ctx.cancel))
+			pool.close()
+		except:
+			pool.terminate()
+			raise
+		finally:
+			pool.join()
+	else:
+		results=[fit_task(task,cancel=ctx.cancel) for task in tasks]
+	
+	results=[result for i,result in results]
+	
+	#Best start, starts without finite SSD never win
+	ssds=array([inf if result["ssd"]==None else result["ssd"] for result in results],dtype=float)
+	ssds[~isfinite(ssds)]=inf
+	best=argmin(ssds)
+	
+	merge_fit_results(embryo,fit,results[best])
+	fit.x0=starts[0]
+	fit.nstarts=len(starts)
+	fit.fcalls=sum([result["fcalls"] for result in results])
+	
+	#Starts that agree with best one
+	k=array([result["k_opt"] for result in results],dtype=float)
+	agree=(ssds<=ssds[best]*(1+multistart_rtol))&(abs(k-k[best])<=multistart_rtol*abs(k[best]))
+	fit.nstarts_agree=int(agree.sum())
+	
+	print "Multi-start:", fit.nstarts_agree, "of", fit.nstarts, "starts agree on optimum"
+	
+	return embryo
+
+#Latin hypercube sample of n points in box between LB and UB, each parameter range is split into n strata that are hit once
+def latin_hypercube(n,LB,UB,random_state):
+	
+	LB=asarray(LB,dtype=float)
+	UB=asarray(UB,dtype=float)
+	
+	strata=array([random_state.permutation(n) for j in range(len(LB))]).T.reshape(n,len(LB))
+	U=(strata+random_state.uniform(size=(n,len(LB))))/float(n)
+	
+	return LB+U*(UB-LB)
+
+#-------------------------------------------------------------------------------------------------------------------------------------
+#Brute force grid search with local polish. The grid has Ns points per fitted parameter between bounds and is evaluated in
+#chunks of broadcast model series, so that no chunk has more than grid_chunk elements. For linear models (exp), only a
+#k grid is needed since optimal c0 and y0 follow from linear least squares for each k (see linear_parms), the best k is then 
+#polished by a bounded 1D search between its neighbours. For other models (power, biexp, exp_production), the full grid is
+#searched and polished by bounded least squares as in fit_least_squares. Models with extra parameters get fewer points per
+#parameter, so that their grid is not larger than Ns**3.
+
+grid_chunk=2**20
+
+def fit_brute(embryo,this_fit,ctx,Ns=50):
+	
+	fit=embryo.fits[this_fit]
+	
+	if ctx.nextra>0:
+		Ns=max(int(round(Ns**(3./(3+ctx.nextra)))),2)
+	
+	grid=ctx.get_grid(Ns)
+	ntimes=max(len(ctx.data),1)
+	
+	if ctx.model.linear:
+		shp=(len(grid[0]),)
+	else:
+		shp=tuple([len(g) for g in grid])
+	
+	npoints=prod(shp)
+	nchunk=max(grid_chunk/ntimes,1)
+	
+	#Go through grid chunk by chunk and keep best point
+	best=None
+	ssd_best=inf
+	for start in range(0,npoints,nchunk):
+		
+		check_canceled(ctx.cancel)
+		
+		idx=unravel_index(arange(start,min(start+nchunk,npoints)),shp)
+		K=grid[0][idx[0]]
+		
+		if ctx.model.linear:
+			C,Y=ctx.linear_parms(K)
+			cols=[K,C,Y]
+		else:
+			cols=[g[j] for g,j in zip(grid,idx)]
+		
+		ssd=ctx.grid_ssd(*cols)
+		
+		i=argmin(ssd)
+		if ssd[i]<ssd_best:
+			ssd_best=ssd[i]
+			best=[[col[i] for col in cols],start+i]
+	
+	if best==None:
+		print "Brute force found no finite SSD on grid, check bounds."
+		fit.success=False
+		return embryo
+	
+	P,i=best
+	
+	#Polish
+	if ctx.model.linear:
+		i=unravel_index(i,shp)[0]
+		res=ctx.solve(sopt.fminbound,ctx.guard(ctx.varpro_ssd),grid[0][max(i-1,0)],grid[0][min(i+1,shp[0]-1)],xtol=fit.opt_tol,maxfun=fit.maxfun,full_output=True,disp=int(embryo.debug_fit))
+		
+		if res[1]<ssd_best:
+			P=[res[0]]+list(ctx.linear_parms(res[0]))
+			ssd_best=res[1]
+		
+		fit.iterations=res[3]
+	else:
+		LB,UB=ctx.get_lsq_bounds()
+		x0=ctx.get_x(*P)
+		x0=[min(max(x0[j],LB[j]),UB[j]) for j in range(len(x0))]
+		
+		res=ctx.solve(sopt.least_squares,ctx.guard(ctx.calc_residuals,score=sum_squares),x0,jac=ctx.calc_jacobian,bounds=(LB,UB),method='trf',x_scale='jac',ftol=max(fit.opt_tol,finfo(float).eps),xtol=max(fit.opt_tol,finfo(float).eps),max_nfev=fit.maxfun,verbose=int(embryo.debug_fit))
+		
+		if sum(res.fun**2)<ssd_best:
+			P=ctx.get_parms(res.x)
+			ssd_best=sum(res.fun**2)
+		
+		fit.iterations=res.njev
+	
+	set_parms_opt(fit,P)
+	fit.fit_av_d=ctx.model_series(*P)
+	
+	fit.ssd=ssd_best
+	fit.success=fit.budget_exceeded==None
+	fit.fcalls=ctx.iterations
+	
+	fit.halflife_s=ctx.model.get_halflife(P)
+	
+	fit.halflife_min=fit.halflife_s/60
+	
+	if fit.fit_ext==1:
+		fit.Rsq=fit_Rsq(embryo.ext_av_data_d,fit.ssd)
+	elif fit.fit_int==1:
+		fit.Rsq=fit_Rsq(embryo.int_av_data_d,fit.ssd)
+	else:
+		fit.Rsq=fit_Rsq(embryo.slice_av_data_d,fit.ssd)
+	
+	return embryo
+
+#-------------------------------------------------------------------------------------------------------------------------------------
+#Returns region fit is fitted to ("ext", "slice" or "int"), None if selection is invalid
+
+def get_fit_region(fit):
+	
+	if fit.fit_ext==1 and fit.fit_slice==0 and fit.fit_int==0:
+		return "ext"
+	elif fit.fit_ext==0 and fit.fit_slice==1 and fit.fit_int==0:
+		return "slice"
+	elif fit.fit_ext==0 and fit.fit_slice==0 and fit.fit_int==1:
+		return "int"
+	
+	return None
+
+#-------------------------------------------------------------------------------------------------------------------------------------
+#Returns sum of squares of residual vector r
+
+def sum_squares(r):
+	
+	return sum(r**2)
+
+#-------------------------------------------------------------------------------------------------------------------------------------
+#Returns val clipped to bounds, bounds may be None. val can also be an array.
+
+def clip_bounds(val,LB,UB):
+	
+	if LB!=None:
+		val=maximum(val,LB)
+	if UB!=None:
+		val=minimum(val,UB)
+	
+	return val
+
+#-------------------------------------------------------------------------------------------------------------------------------------
+#Fits all fits of all embryos of molecule. With workers>1, fits are spread over a process pool. Workers only get the minimal 
+#inputs of each fit (see copy_for_fitting), results are written back into the fit objects afterwards.
+#callback(done,total,name) is called whenever a fit is finished. If a fit_cache is given, fits whose data and settings did not
+#change are taken from it and all new results are put into it. If cancel() returns True, fitting stops with task_canceled,
+#fits finished until then keep their results.
+
+def fit_molecule(molecule,workers=1,callback=None,gui=None,cache=None,cancel=None):
+	
+	jobs=[]
+	batch=[]
+	keys={}
+	total=sum([len(embryo.fits) for embryo in molecule.embryos])
+	done=0
+	
+	for embryo in molecule.embryos:
+		for fit in embryo.fits:
+			
+			#Fits with same data and settings as an earlier fit are taken from cache
+			if cache!=None:
+				keys[id(fit)]=get_fit_key(embryo,fit)
+				if cache.restore_fit(keys[id(fit)],embryo,fit):
+					done=done+1
+					print "Fitted", embryo.name, fit.name, "(cached)"
+					if callback!=None:
+						callback(done,total,embryo.name+" "+fit.name)
+					continue
+			
+			#Fits with batch method are all fitted together in one batch, unless they need several starts
+			if fit.opt_meth=='batch_lm' and getattr(fit,"nstarts",1)<=1:
+				fit.embryo=embryo
+				batch.append(fit)
+			else:
+				jobs.append([embryo,fit])
+	
+	if len(batch)>0:
+		fit_batch(batch,cancel=cancel)
+		
+		for fit in batch:
+			done=done+1
+			print "Fitted", fit.embryo.name, fit.name
+			if cache!=None:
+				cache.store_fit(keys[id(fit)],fit)
+			if callback!=None:
+				callback(done,total,fit.embryo.name+" "+fit.name)
+	
+	if workers>1 and len(jobs)>1:
+		
+		tasks=[]
+		for i,job in enumerate(jobs):
+			tasks.append([i,copy_for_fitting(job[0],job[1])])
+		
+		pool=multiprocessing.Pool(min(workers,len(jobs)))
+		
+		try:
+			for i,result in imap_pool(pool,fit_task,tasks,cancel=cancel,ordered=False):
+				embryo,fit=jobs[i]
+				merge_fit_results(embryo,fit,result)
+				
+				done=done+1
+				print "Fitted", embryo.name, fit.name
+				if cache!=None:
+					cache.store_fit(keys[id(fit)],fit)
+				if callback!=None:
+					callback(done,total,embryo.name+" "+fit.name)
+			pool.close()
+		except:
+			pool.terminate()
+			raise
+		finally:
+			pool.join()
+	
+	else:
+		for embryo,fit in jobs:
+			check_canceled(cancel)
+			embryo=fdap_fitting(embryo,fit.fit_number,gui=gui,workers=workers,cancel=cancel)
+			
+			done=done+1
+			print "Fitted", embryo.name, fit.name
+			if cache!=None:
+				cache.store_fit(keys[id(fit)],fit)
+			if callback!=None:
+				callback(done,total,embryo.name+" "+fit.name)
+			
+	return molecule
+
+#-------------------------------------------------------------------------------------------------------------------------------------
+#Properties of fit that are results of fitting and are kept in fit_cache. Rsq is not cached since it also depends on ignored 
+#time points, it is recomputed from cached ssd instead.
+
+fit_result_props=["k_opt","cnaught_opt","ynaught_opt","extra_opt","ssd","success","iterations","fcalls","halflife_s","halflife_min","fit_av_d","cov_opt","nstarts_agree","budget_exceeded"]
+
+#-------------------------------------------------------------------------------------------------------------------------------------
+#Returns key of fit for fit_cache, a hash of the data series fitted to (without ignored time points), time vector and all 
+#settings that change the result. Returns None for fits that save their track, since the track is not cached.
+
+def get_fit_key(embryo,fit):
+	
+	if fit.save_track==1:
+		return None
+	
+	embryo=correct_ignored_vecs(embryo)
+	
+	if not hasattr(fit,"model"):
+		fit.model="exp"
+	check_model_parms(fit,decay_models[fit.model])
+	
+	region=get_fit_region(fit)
+	if region==None:
+		return None
+	
+	if len(embryo.ignored)>0:
+		tvec=embryo.tvec_ignored
+		data=getattr(embryo,region+"_av_data_ign")
+	else:
+		tvec=embryo.tvec_data
+		data=getattr(embryo,region+"_av_data_d")
+	
+	#Numbers are converted to float, so that e.g. 1 and 1.0 give the same key
+	nums=[fit.opt_tol,fit.LB_k,fit.UB_k,fit.LB_cnaught,fit.UB_cnaught,fit.LB_ynaught,fit.UB_ynaught]+list(fit.x0)+list(fit.LB_extra)+list(fit.UB_extra)
+	nums=nums+[getattr(fit,prop) for prop in decay_models[fit.model].shape_parms]
+	nums=[None if val==None else float(val) for val in nums]
+	
+	settings=[region,fit.model,fit.opt_meth,int(fit.maxfun),int(fit.fit_cnaught),int(fit.fit_ynaught),int(getattr(fit,"nstarts",1)),nums]
+	
+	h=hashlib.sha1()
+	h.update(asarray(tvec,dtype=float).tostring())
+	h.update(asarray(data,dtype=float).tostring())
+	h.update(repr(settings))
+	
+	return h.hexdigest()
+
+#-------------------------------------------------------------------------------------------------------------------------------------
+#Returns filename of fit cache belonging to molecule file
+
+def get_cache_fn(fn_mol):
+	
+	return os.path.splitext(fn_mol)[0]+"_fitcache.pk"
+
+#-------------------------------------------------------------------------------------------------------------------------------------
+#LRU cache of fit results. Entries are dictionaries of fit_result_props, keys come from get_fit_key. When more than maxsize 
+#entries are stored, the least recently used ones are dropped.
+
+class fit_cache:
 	
-	if embryo.fits[this_fit].fit_cnaught==1 and embryo.fits[this_fit].fit_ynaught==1:
+	#Creates new empty cache
+	def __init__(self,maxsize=1000):
 		
-		#Copying x0 into local variable to pass to solver
-		#if embryo.fits[this_fit].transform==0:
-		x0=list(embryo.fits[this_fit].x0)
+		self.maxsize=maxsize
+		self.entries=collections.OrderedDict()
 		
-		#Getting bounds
-		bnds = ((embryo.fits[this_fit].LB_k, embryo.fits[this_fit].UB_k), (embryo.fits[this_fit].LB_cnaught, embryo.fits[this_fit].UB_cnaught),(embryo.fits[this_fit].LB_ynaught,embryo.fits[this_fit].UB_ynaught))
+		#Hits and misses for statistics
+		self.hits=0
+		self.misses=0
+	
+	def __len__(self):
 		
-		#Calling optimizers
-		if embryo.fits[this_fit].opt_meth=='brute':
-			kstep=(embryo.fits[this_fit].UB_k-embryo.fits[this_fit].LB_k)/50
-			cstep=(embryo.fits[this_fit].UB_cnaught-embryo.fits[this_fit].LB_cnaught)/50
-			ystep=(embryo.fits[this_fit].UB_ynaught-embryo.fits[this_fit].LB_ynaught)/50
-			
-			ranges=(slice(embryo.fits[this_fit].LB_k,embryo.fits[this_fit].UB_k,kstep),slice(embryo.fits[this_fit].LB_cnaught,embryo.fits[this_fit].UB_cnaught,cstep),slice(embryo.fits[this_fit].LB_ynaught,embryo.fits[this_fit].UB_ynaught,ystep))
-			
-			res=sopt.brute(calc_exp_ssd, ranges, full_output=bool(embryo.debug_fit),finish=sopt.fmin)
+		return len(self.entries)
+	
+	#Returns entry of key or None, marks entry as recently used
+	def get(self,key):
 		
-		elif embryo.fits[this_fit].opt_meth=='Constrained Nelder-Mead':
-			x0=transform_x0(embryo.fits[this_fit].x0,[embryo.fits[this_fit].LB_k,embryo.fits[this_fit].LB_cnaught,embryo.fits[this_fit].LB_ynaught],[embryo.fits[this_fit].UB_k,embryo.fits[this_fit].UB_cnaught,embryo.fits[this_fit].UB_ynaught])
-			res=sopt.fmin(constr_calc_exp_ssd,x0,ftol=embryo.fits[this_fit].opt_tol,maxiter=embryo.fits[this_fit].maxfun,disp=bool(embryo.debug_fit),full_output=True)	
-			
-		else:
-			if embryo.fits[this_fit].opt_meth=='Anneal':
-				random.seed(555)
-				res=sopt.minimize(calc_exp_ssd, x0, method='Anneal')
-			else:
-				
-				res=sopt.minimize(calc_exp_ssd,x0,method=embryo.fits[this_fit].opt_meth,tol=embryo.fits[this_fit].opt_tol,bounds=bnds,options={'maxiter': embryo.fits[this_fit].maxfun, 'disp': bool(embryo.debug_fit)})
-				
-	#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
-	#fit_cnaught==1 and fit_ynaught==0
-	#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
-				
-	elif embryo.fits[this_fit].fit_cnaught==1 and embryo.fits[this_fit].fit_ynaught==0:
+		if key==None or key not in self.entries:
+			self.misses=self.misses+1
+			return None
 		
-		#Copying x0 into local variable to pass to solver
-		#if embryo.fits[this_fit].transform==0:
-		x0=list(embryo.fits[this_fit].x0)
-		x0.pop(2)
+		result=self.entries.pop(key)
+		self.entries[key]=result
+		self.hits=self.hits+1
 		
-		#Getting bounds
-		bnds = ((embryo.fits[this_fit].LB_k, embryo.fits[this_fit].UB_k), (embryo.fits[this_fit].LB_cnaught, embryo.fits[this_fit].UB_cnaught))
+		return result
+	
+	#Puts entry into cache and drops least recently used entries if cache is full
+	def put(self,key,result):
 		
-		#Calling optimizers
-		if embryo.fits[this_fit].opt_meth=='brute':
-			ranges=(slice(embryo.fits[this_fit].LB_k,embryo.fits[this_fit].UB_k,1),slice(embryo.fits[this_fit].LB_cnaught,embryo.fits[this_fit].UB_cnaught,10))	
-			res=sopt.brute(calc_exp_ssd, ranges, full_output=True,finish=sopt.fmin)
+		if key==None:
+			return
 		
-		elif embryo.fits[this_fit].opt_meth=='Constrained Nelder-Mead':
-			x0=transform_x0(embryo.fits[this_fit].x0,[embryo.fits[this_fit].LB_k,embryo.fits[this_fit].LB_cnaught,embryo.fits[this_fit].LB_ynaught],[embryo.fits[this_fit].UB_k,embryo.fits[this_fit].UB_cnaught,embryo.fits[this_fit].UB_ynaught])
-			res=sopt.fmin(constr_calc_exp_ssd,x0,ftol=embryo.fits[this_fit].opt_tol,maxiter=embryo.fits[this_fit].maxfun,disp=bool(embryo.debug_fit),full_output=True)	
+		self.entries.pop(key,None)
+		self.entries[key]=result
 		
-		else:
-			if embryo.fits[this_fit].opt_meth=='Anneal':
-				random.seed(555)
-				res=sopt.minimize(calc_exp_ssd, x0, method='Anneal')
-			else:
-				res=sopt.minimize(calc_exp_ssd,x0,method=embryo.fits[this_fit].opt_meth,tol=embryo.fits[this_fit].opt_tol,bounds=bnds,options={'maxiter': embryo.fits[this_fit].maxfun, 'disp': bool(embryo.debug_fit)})
-			
-	#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
-	#fit_cnaught==0 and fit_ynaught==1
-	#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
-				
-	elif embryo.fits[this_fit].fit_cnaught==0 and embryo.fits[this_fit].fit_ynaught==1:
+		while len(self.entries)>self.maxsize:
+			self.entries.popitem(last=False)
+	
+	#Copies results of fit into cache
+	def store_fit(self,key,fit):
 		
-		#Copying x0 into local variable to pass to solver
-		#if embryo.fits[this_fit].transform==0:
-		x0=list(embryo.fits[this_fit].x0)
-		x0.pop(1)
+		#Results of fits stopped by their budget depend on timing and are not cached
+		if getattr(fit,"budget_exceeded",None)!=None:
+			return
 		
-		#Getting bounds
-		bnds = ((embryo.fits[this_fit].LB_k, embryo.fits[this_fit].UB_k), (embryo.fits[this_fit].LB_ynaught, embryo.fits[this_fit].UB_ynaught))
+		result={}
+		for prop in fit_result_props:
+			result[prop]=cpy.deepcopy(getattr(fit,prop,None))
 		
-		#Calling optimizers
-		if embryo.fits[this_fit].opt_meth=='brute':
-			ranges=(slice(embryo.fits[this_fit].LB_k,embryo.fits[this_fit].UB_k,1),slice(embryo.fits[this_fit].LB_ynaught,embryo.fits[this_fit].UB_ynaught,1))
-			
-			res=sopt.brute(calc_exp_ssd, ranges, full_output=bool(embryo.debug_fit),finish=sopt.fmin)
+		self.put(key,result)
+	
+	#Copies cached results into fit, returns True if key was found
+	def restore_fit(self,key,embryo,fit):
 		
-		elif embryo.fits[this_fit].opt_meth=='Constrained Nelder-Mead':
-			x0=transform_x0(embryo.fits[this_fit].x0,[embryo.fits[this_fit].LB_k,embryo.fits[this_fit].LB_cnaught,embryo.fits[this_fit].LB_ynaught],[embryo.fits[this_fit].UB_k,embryo.fits[this_fit].UB_cnaught,embryo.fits[this_fit].UB_ynaught])
-			res=sopt.fmin(constr_calc_exp_ssd,x0,ftol=embryo.fits[this_fit].opt_tol,maxiter=embryo.fits[this_fit].maxfun,disp=bool(embryo.debug_fit),full_output=True)	
-			
+		result=self.get(key)
+		if result==None:
+			return False
+		
+		for prop in fit_result_props:
+			setattr(fit,prop,cpy.deepcopy(result[prop]))
+		
+		if fit.fit_ext==1:
+			fit.Rsq=fit_Rsq(embryo.ext_av_data_d,fit.ssd)
+		elif fit.fit_int==1:
+			fit.Rsq=fit_Rsq(embryo.int_av_data_d,fit.ssd)
 		else:
-			if embryo.fits[this_fit].opt_meth=='Anneal':
-				random.seed(555)
-				res=sopt.minimize(calc_exp_ssd, x0, method='Anneal')
-			else:	
-				res=sopt.minimize(calc_exp_ssd,x0,method=embryo.fits[this_fit].opt_meth,tol=embryo.fits[this_fit].opt_tol,bounds=bnds,options={'maxiter': embryo.fits[this_fit].maxfun, 'disp': bool(embryo.debug_fit)})
-			
-	#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
-	#fit_cnaught==0 and fit_ynaught==0
-	#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+			fit.Rsq=fit_Rsq(embryo.slice_av_data_d,fit.ssd)
+		
+		return True
 	
-	elif embryo.fits[this_fit].fit_cnaught==0 and embryo.fits[this_fit].fit_ynaught==0:
+	#Saves cache to file using pickle
+	def save(self,fn_save):
 		
-		#Copying x0 into local variable to pass to solver
-		#if embryo.fits[this_fit].transform==0:
-		x0=list(embryo.fits[this_fit].x0)
+		with open(fn_save, 'wb') as output:
+			pickle.dump(self.entries.items(), output, pickle.HIGHEST_PROTOCOL)
 	
-		#Getting bounds
-		bnds = ((embryo.fits[this_fit].LB_k, embryo.fits[this_fit].UB_k),)
+	#Loads entries from file, entries already in cache count as more recent ones
+	def load(self,fn_load):
 		
-		#Calling optimizers
-		if embryo.fits[this_fit].opt_meth=='brute':
-
-			ranges=(1,400)
-			res=sopt.brute(calc_exp_ssd, (ranges,), full_output=bool(embryo.debug_fit),finish=sopt.fmin)
-			
-		elif embryo.fits[this_fit].opt_meth=='Constrained Nelder-Mead':
-			x0=transform_x0(embryo.fits[this_fit].x0,[embryo.fits[this_fit].LB_k,embryo.fits[this_fit].LB_cnaught,embryo.fits[this_fit].LB_ynaught],[embryo.fits[this_fit].UB_k,embryo.fits[this_fit].UB_cnaught,embryo.fits[this_fit].UB_ynaught])
-			
-			print "bla"
-			raw_input()
-			res=sopt.fmin(constr_calc_exp_ssd,x0,ftol=embryo.fits[this_fit].opt_tol,maxiter=embryo.fits[this_fit].maxfun,disp=bool(embryo.debug_fit),full_output=True)	
-			
+		with open(fn_load, 'rb') as filehandler:
+			items=pickle.load(filehandler)
 		
-		else:
-			if embryo.fits[this_fit].opt_meth=='Anneal':
-				random.seed(555)
-				res=sopt.minimize(calc_exp_ssd, x0, method='Anneal')
-			else:
-				
-				res=sopt.minimize(calc_exp_ssd,x0,method=embryo.fits[this_fit].opt_meth,tol=embryo.fits[this_fit].opt_tol,bounds=bnds,options={'maxiter': embryo.fits[this_fit].maxfun, 'disp': bool(embryo.debug_fit)})
-	
-	#-------------------------------------------------------------------------------------------------------------------------------------
-	#Saving results in embryo object
-	#-------------------------------------------------------------------------------------------------------------------------------------	
+		entries=collections.OrderedDict(items)
+		for key,result in self.entries.items():
+			entries.pop(key,None)
+			entries[key]=result
+		self.entries=entries
+		
+		while len(self.entries)>self.maxsize:
+			self.entries.popitem(last=False)
+
+#-------------------------------------------------------------------------------------------------------------------------------------
+#Records parameters [k,c0,y0,extra...] of every every-th function evaluation into a ring buffer of maxlen entries, so that only the 
+#last maxlen recorded evaluations are kept. The buffer grows with the track up to maxlen entries and is trimmed to the kept 
+#entries when pickled. Model curves are not stored, see get_track_fit.
+
+class track_recorder:
 	
-	if embryo.fits[this_fit].opt_meth=='brute':
+	#Creates new empty recorder
+	def __init__(self,maxlen=1000,every=1):
 		
-		if embryo.fits[this_fit].fit_cnaught==1 and embryo.fits[this_fit].fit_ynaught==1:
-			
-			embryo.fits[this_fit].k_opt=res[0]
-			embryo.fits[this_fit].cnaught_opt=res[1]
-			embryo.fits[this_fit].ynaught_opt=res[2]
-			
-		elif embryo.fits[this_fit].fit_cnaught==1 and embryo.fits[this_fit].fit_ynaught==0:
-			embryo.fits[this_fit].k_opt=res[0]
-			embryo.fits[this_fit].cnaught_opt=res[1]
-			embryo.fits[this_fit].ynaught_opt=embryo.fits[this_fit].x0[2]
-			
-		elif embryo.fits[this_fit].fit_cnaught==0 and embryo.fits[this_fit].fit_ynaught==1:
-			embryo.fits[this_fit].k_opt=res[0]
-			embryo.fits[this_fit].cnaught_opt=embryo.fits[this_fit].x0[1]
-			embryo.fits[this_fit].ynaught_opt=res[1]
-			
-		elif embryo.fits[this_fit].fit_cnaught==0 and embryo.fits[this_fit].fit_ynaught==0:
-			embryo.fits[this_fit].k_opt=res[0]
-			embryo.fits[this_fit].cnaught_opt=embryo.fits[this_fit].x0[1]
-			embryo.fits[this_fit].ynaught_opt=embryo.fits[this_fit].x0[2]
-			
-		embryo.fits[this_fit].ssd=res[1]
-		embryo.fits[this_fit].success=True
-		embryo.fits[this_fit].halflife_s=log(2)/embryo.fits[this_fit].k_opt
-		embryo.fits[this_fit].halflife_min=embryo.fits[this_fit].halflife_s/60
-		embryo.fits[this_fit].iterations=iterations
-		#In bruteforce iterations = fcalls???
-		embryo.fits[this_fit].fcalls=iterations
+		self.maxlen=max(int(maxlen),1)
+		self.every=max(int(every),1)
+		self.parms=zeros((0,3))
 		
-		if embryo.fits[this_fit].fit_ext==1:
-			embryo.fits[this_fit].Rsq=fit_Rsq(embryo.ext_av_data_d,embryo.fits[this_fit].ssd)
-		elif embryo.fits[this_fit].fit_int==1:
-			embryo.fits[this_fit].Rsq=fit_Rsq(embryo.int_av_data_d,embryo.fits[this_fit].ssd)
-		else:
-			embryo.fits[this_fit].Rsq=fit_Rsq(embryo.slice_av_data_d,embryo.fits[this_fit].ssd)
+		#Number of evaluations seen and number of parameter sets recorded
+		self.nevals=0
+		self.nrecorded=0
+	
+	def __len__(self):
 		
-	elif embryo.fits[this_fit].opt_meth=='Constrained Nelder-Mead':
+		return min(self.nrecorded,self.maxlen)
+	
+	#Returns i-th kept parameter set, oldest first
+	def __getitem__(self,i):
 		
-		res_new=xtransform(res[0],[embryo.fits[this_fit].LB_k,embryo.fits[this_fit].LB_cnaught,embryo.fits[this_fit].LB_ynaught],[embryo.fits[this_fit].UB_k,embryo.fits[this_fit].UB_cnaught,embryo.fits[this_fit].UB_ynaught])
+		n=len(self)
+		if i<0:
+			i=i+n
+		if i<0 or i>=n:
+			raise IndexError("track index out of range")
 		
-		if embryo.fits[this_fit].fit_cnaught==1 and embryo.fits[this_fit].fit_ynaught==1:
-			embryo.fits[this_fit].k_opt=res_new[0]
-			embryo.fits[this_fit].cnaught_opt=res_new[1]
-			embryo.fits[this_fit].ynaught_opt=res_new[2]
-			
-		elif embryo.fits[this_fit].fit_cnaught==1 and embryo.fits[this_fit].fit_ynaught==0:
-			embryo.fits[this_fit].k_opt=res_new[0]
-			embryo.fits[this_fit].cnaught_opt=res_new[1]
-			embryo.fits[this_fit].ynaught_opt=embryo.fits[this_fit].x0[2]
-			
-		elif embryo.fits[this_fit].fit_cnaught==0 and embryo.fits[this_fit].fit_ynaught==1:
-			embryo.fits[this_fit].k_opt=res_new[0]
-			embryo.fits[this_fit].cnaught_opt=embryo.fits[this_fit].x0[1]
-			embryo.fits[this_fit].ynaught_opt=res_new[1]
-			
-		elif embryo.fits[this_fit].fit_cnaught==0 and embryo.fits[this_fit].fit_ynaught==0:
-			embryo.fits[this_fit].k_opt=res_new[0]
-			embryo.fits[this_fit].cnaught_opt=embryo.fits[this_fit].x0[1]
-			embryo.fits[this_fit].ynaught_opt=embryo.fits[this_fit].x0[2]	
+		return self.parms[(self.nrecorded-n+i)%self.maxlen]
+	
+	#Records parameter set of evaluation
+	def append(self,parms):
 		
-		embryo.fits[this_fit].ssd=res[1]
-		embryo.fits[this_fit].success=not bool(res[4])
-		embryo.fits[this_fit].iterations=res[2]
-		embryo.fits[this_fit].fcalls=res[3]
+		self.nevals=self.nevals+1
+		if (self.nevals-1)%self.every!=0:
+			return
 		
-		if embryo.fits[this_fit].model=="exp":
-			embryo.fits[this_fit].halflife_s=log(2)/embryo.fits[this_fit].k_opt
-		elif embryo.fits[this_fit].model=="power":
-			embryo.fits[this_fit].halflife_s=((2**(embryo.fits[this_fit].npower-1)-1)*embryo.fits[this_fit].cnaught_opt**(1-embryo.fits[this_fit].npower))/(embryo.fits[this_fit].k_opt*(embryo.fits[this_fit].npower-1))
+		#Width of buffer is set by first parameter set, models with extra parameters have more than 3
+		if self.nrecorded==0 and shape(self.parms)[1]!=len(parms):
+			self.parms=zeros((0,len(parms)))
 		
-		embryo.fits[this_fit].halflife_min=embryo.fits[this_fit].halflife_s/60
+		#Grow buffer until it holds maxlen entries, until then entries are stored in order
+		if self.nrecorded<self.maxlen and self.nrecorded>=shape(self.parms)[0]:
+			n=min(max(2*shape(self.parms)[0],16),self.maxlen)
+			self.parms=concatenate([self.parms,zeros((n-shape(self.parms)[0],shape(self.parms)[1]))])
 		
-		if embryo.fits[this_fit].fit_ext==1:
-			embryo.fits[this_fit].Rsq=fit_Rsq(embryo.ext_av_data_d,embryo.fits[this_fit].ssd)
-		elif embryo.fits[this_fit].fit_int==1:
-			embryo.fits[this_fit].Rsq=fit_Rsq(embryo.int_av_data_d,embryo.fits[this_fit].ssd)
-		else:
-			embryo.fits[this_fit].Rsq=fit_Rsq(embryo.slice_av_data_d,embryo.fits[this_fit].ssd)
+		self.parms[self.nrecorded%self.maxlen]=parms
+		self.nrecorded=self.nrecorded+1
+	
+	#Returns all kept parameter sets as array, oldest first
+	def get_parms(self):
 		
-	else:	
-		if embryo.fits[this_fit].fit_cnaught==1 and embryo.fits[this_fit].fit_ynaught==1:
-			embryo.fits[this_fit].k_opt=res.x[0]
-			embryo.fits[this_fit].cnaught_opt=res.x[1]
-			embryo.fits[this_fit].ynaught_opt=res.x[2]
-			
-		elif embryo.fits[this_fit].fit_cnaught==1 and embryo.fits[this_fit].fit_ynaught==0:
-			embryo.fits[this_fit].k_opt=res.x[0]
-			embryo.fits[this_fit].cnaught_opt=res.x[1]
-			embryo.fits[this_fit].ynaught_opt=embryo.fits[this_fit].x0[2]
-			
-		elif embryo.fits[this_fit].fit_cnaught==0 and embryo.fits[this_fit].fit_ynaught==1:
-			embryo.fits[this_fit].k_opt=res.x[0]
-			embryo.fits[this_fit].cnaught_opt=embryo.fits[this_fit].x0[1]
-			embryo.fits[this_fit].ynaught_opt=res.x[1]
-			
-		elif embryo.fits[this_fit].fit_cnaught==0 and embryo.fits[this_fit].fit_ynaught==0:
-			embryo.fits[this_fit].k_opt=res.x[0]
-			embryo.fits[this_fit].cnaught_opt=embryo.fits[this_fit].x0[1]
-			embryo.fits[this_fit].ynaught_opt=embryo.fits[this_fit].x0[2]
-			
-		embryo.fits[this_fit].ssd=res.fun
-		embryo.fits[this_fit].success=res.success
-		embryo.fits[this_fit].iterations=res.nit
-		embryo.fits[this_fit].fcalls=res.nfev
+		n=len(self)
 		
-		if embryo.fits[this_fit].model=="exp":
-			embryo.fits[this_fit].halflife_s=log(2)/embryo.fits[this_fit].k_opt
-		elif embryo.fits[this_fit].model=="power":
-			embryo.fits[this_fit].halflife_s=((2**(embryo.fits[this_fit].npower-1)-1)*embryo.fits[this_fit].cnaught_opt**(1-embryo.fits[this_fit].npower))/(embryo.fits[this_fit].k_opt*(embryo.fits[this_fit].npower-1))
+		return self.parms[(arange(n)+self.nrecorded-n)%self.maxlen]
+	
+	def clear(self):
 		
-		embryo.fits[this_fit].halflife_min=embryo.fits[this_fit].halflife_s/60
+		self.nevals=0
+		self.nrecorded=0
+		self.parms=zeros((0,3))
+	
+	#Only kept entries are pickled, oldest first
+	def __getstate__(self):
 		
-		if embryo.fits[this_fit].fit_ext==1:
-			embryo.fits[this_fit].Rsq=fit_Rsq(embryo.ext_av_data_d,embryo.fits[this_fit].ssd)
-		elif embryo.fits[this_fit].fit_int==1:
-			embryo.fits[this_fit].Rsq=fit_Rsq(embryo.int_av_data_d,embryo.fits[this_fit].ssd)
-		else:
-			embryo.fits[this_fit].Rsq=fit_Rsq(embryo.slice_av_data_d,embryo.fits[this_fit].ssd)
+		state=dict(self.__dict__)
+		state["parms"]=self.get_parms()
+		state["nrecorded"]=len(self)
 		
-	return embryo
+		return state
+	
+	def __setstate__(self,state):
+		
+		self.__dict__.update(state)
 
 #-------------------------------------------------------------------------------------------------------------------------------------
-#Objective function for fdap fitting
+#Returns track recorder of fit. Recorder is created on first use and recreated if track_maxlen or track_every of fit changed, 
+#keeping the last recorded parameters. Tracks of older versions (lists of parameters) are converted.
 
-def calc_exp_ssd(x):	
+def get_track_recorder(fit):
 	
-	#Counting function calls
-	global iterations
-	iterations=iterations+1
+	track=fit.track_parms
+	maxlen=getattr(fit,"track_maxlen",1000)
+	every=getattr(fit,"track_every",1)
 	
-	#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
-	#Checking input
-	#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
-	
-	#Check if any variable is negative
-	if iterations==0:
-		for entry in x:
-			if entry<0:
-				#If initial guess is out of bounds, just do nothing
-				print "Check your initial guess, some entry is negative"
-				raw_input("Press Enter to continue")
-			
-	if embryo.fits[this_fit].fit_cnaught==1 and embryo.fits[this_fit].fit_ynaught==1:
-		
-		knew=x[0]
-		cnaught=x[1]
-		ynaught=x[2]
-		
-	elif embryo.fits[this_fit].fit_cnaught==1 and embryo.fits[this_fit].fit_ynaught==0:
+	if isinstance(track,track_recorder) and track.maxlen==maxlen and track.every==every:
+		return track
 	
-		knew=x[0]
-		cnaught=x[1]
-		ynaught=embryo.fits[this_fit].x0[2]
-			
-	elif embryo.fits[this_fit].fit_cnaught==0 and embryo.fits[this_fit].fit_ynaught==1:
-		
-		knew=x[0]
-		ynaught=x[1]
-		cnaught=embryo.fits[this_fit].x0[1]
-		
-	elif embryo.fits[this_fit].fit_cnaught==0 and embryo.fits[this_fit].fit_ynaught==0:
+	new=track_recorder(maxlen=maxlen,every=every)
+	if isinstance(track,track_recorder):
+		track=track.get_parms()
+	if track is not None:
+		for parms in track:
+			new.append(parms)
 	
-		knew=x[0]
-		ynaught=embryo.fits[this_fit].x0[2]
-		cnaught=embryo.fits[this_fit].x0[1]
+	fit.track_parms=new
 	
-	if embryo.debug_fit==1:
-		
-		print "------------------------------------------"
-		print "knew=",knew, "ynaught=", ynaught, "cnaught=", cnaught
+	return new
+
+#-------------------------------------------------------------------------------------------------------------------------------------
+#Returns model curves of all kept track parameters of fit, one row per parameter set. Curves are computed on the same time 
+#vector as fit_av_d.
+
+def get_track_fit(embryo,fit):
 	
-	#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
-	#Exponential/Power decay
-	#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+	embryo=correct_ignored_vecs(embryo)
+	ctx=fit_context(embryo,embryo.fits.index(fit))
 	
-	#If no model selected, take exponential decay
-		if hasattr(embryo.fits[this_fit],"model"):
-			pass
-		else:
-			embryo.fits[this_fit].model="exp"
-		
-	if shape(embryo.ignored)[0]>0:
-			
-		if embryo.fits[this_fit].model=="exp":
-			embryo.fits[this_fit].fit_av_d=cnaught*exp(-knew*embryo.tvec_ignored)+ynaught
-		elif embryo.fits[this_fit].model=="power":
-			#embryo.fits[this_fit].fit_av_d=((knew*embryo.tvec_ignored+cnaught**((1-embryo.fits[this_fit].npower)/embryo.fits[this_fit].npower))*(embryo.fits[this_fit].npower-1))**(1/(1-embryo.fits[this_fit].npower))+ynaught
-			embryo.fits[this_fit].fit_av_d=(cnaught**(1-embryo.fits[this_fit].npower)-knew*embryo.tvec_ignored*(1-embryo.fits[this_fit].npower))**(1/(1-embryo.fits[this_fit].npower))+ynaught
-	else:
-		if embryo.fits[this_fit].model=="exp":
-			embryo.fits[this_fit].fit_av_d=cnaught*exp(-knew*embryo.tvec_data)+ynaught
-		elif embryo.fits[this_fit].model=="power":
-			#embryo.fits[this_fit].fit_av_d=((knew*embryo.tvec_data+cnaught**((1-embryo.fits[this_fit].npower)/embryo.fits[this_fit].npower))*(embryo.fits[this_fit].npower-1))**(1/(1-embryo.fits[this_fit].npower))+ynaught
-			embryo.fits[this_fit].fit_av_d=(cnaught**(1-embryo.fits[this_fit].npower)-knew*embryo.tvec_data*(1-embryo.fits[this_fit].npower))**(1/(1-embryo.fits[this_fit].npower))+ynaught
-			
-	#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
-	#Compute ssd
-	#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
-	
-	#Residuals
-	if shape(embryo.ignored)[0]==0:
-		if embryo.fits[this_fit].fit_ext==1 and embryo.fits[this_fit].fit_slice==0 and embryo.fits[this_fit].fit_int==0:
-			res=embryo.ext_av_data_d-embryo.fits[this_fit].fit_av_d
-		elif embryo.fits[this_fit].fit_ext==0 and embryo.fits[this_fit].fit_slice==1 and embryo.fits[this_fit].fit_int==0:
-			res=embryo.slice_av_data_d-embryo.fits[this_fit].fit_av_d
-		elif embryo.fits[this_fit].fit_ext==0 and embryo.fits[this_fit].fit_slice==0 and embryo.fits[this_fit].fit_int==1:
-			res=embryo.int_av_data_d-embryo.fits[this_fit].fit_av_d
-		else:	
-			print "You have selected to fit to slice and ext. This won't work"
-			raw_input("Wait")
+	n=3+ctx.nextra
+	if isinstance(fit.track_parms,track_recorder):
+		P=fit.track_parms.get_parms()
+	elif fit.track_parms is None:
+		P=zeros((0,n))
 	else:
-		if embryo.fits[this_fit].fit_ext==1 and embryo.fits[this_fit].fit_slice==0 and embryo.fits[this_fit].fit_int==0:
-			res=embryo.ext_av_data_ign-embryo.fits[this_fit].fit_av_d
-		elif embryo.fits[this_fit].fit_ext==0 and embryo.fits[this_fit].fit_slice==1 and embryo.fits[this_fit].fit_int==0:
-			res=embryo.slice_av_data_ign-embryo.fits[this_fit].fit_av_d
-		elif embryo.fits[this_fit].fit_ext==0 and embryo.fits[this_fit].fit_slice==0 and embryo.fits[this_fit].fit_int==1:
-			res=embryo.int_av_data_ign-embryo.fits[this_fit].fit_av_d
-		else:	
-			print "You have selected to fit to slice and ext. This won't work"
-			raw_input("Wait")
-	#SSD
-	ssd=sum(res**2)
+		P=asarray(fit.track_parms,dtype=float).reshape(-1,n)
+	if len(P)==0:
+		P=zeros((0,n))
 	
-	if embryo.debug_fit==1:
-		
-		if iterations==1:
-			if gui==None:
-			
-				global fig_mon
-				fig_mon=plt.figure()
-				fig_mon.show()
-				global ax_mon
-				
-				ax_mon=fig_mon.add_subplot(111)
-			else:
-				pass
-		else:
-			if gui==None:
-				ax_mon.cla()
+	return ctx.model_series(*[P[:,j:j+1] for j in range(n)])
+
+#-------------------------------------------------------------------------------------------------------------------------------------
+#Minimal stand-in for embryo that only carries what fdap_fitting needs: time vector, data series and ignored time points.
+#Used to send fits to worker processes without images and masks.
+
+class fit_data:
+	
+	#Creates new fit data object from embryo
+	def __init__(self,embryo):
 		
-		if gui==None:
-			
-			if embryo.fits[this_fit].fit_ext==0 and embryo.fits[this_fit].fit_slice==1 and embryo.fits[this_fit].fit_int==0:
-				
-				ax_mon.plot(embryo.tvec_data,embryo.slice_av_data_d,'g-')
-				ax_mon.plot(embryo.tvec_data,embryo.fits[this_fit].fit_av_d,'g--')
-				
-			elif embryo.fits[this_fit].fit_ext==1 and embryo.fits[this_fit].fit_slice==0 and embryo.fits[this_fit].fit_int==0:
-				
-				ax_mon.plot(embryo.tvec_data,embryo.ext_av_data_d,'r-')
-				ax_mon.plot(embryo.tvec_data,embryo.fits[this_fit].fit_av_d,'r--')
-			
-			elif embryo.fits[this_fit].fit_ext==0 and embryo.fits[this_fit].fit_slice==0 and embryo.fits[this_fit].fit_int==1:
-			
-				ax_mon.plot(embryo.tvec_data,embryo.int_av_data_d,'b-')
-				ax_mon.plot(embryo.tvec_data,embryo.fits[this_fit].fit_av_d,'b--')
-				
-			plt.draw()
-			plt.pause(0.0001)
-			
-			#---------------
-			#NOTE: this command fixes the automatic live plotting problems with matplotlib v1.3, however generates the error: 
-			#/usr/local/lib/python2.7/dist-packages/matplotlib/backend_bases.py:2407: MatplotlibDeprecationWarning: Using default event loop until function specific to this GUI is implemented
-			#warnings.warn(str, mplDeprecation)
-			#This is not a problem, however annoying
-			#---------------
-			
-		else:
-			#---------------
-			#Automatic update in plotting doesn't work with gui yet, since there is no plt.pause() for canvas object, need to write something in matplotlib/stackoverflow
-			#---------------
-			pass
-			#gui.canvas.draw()
+		self.name=embryo.name
+		self.tvec_data=embryo.tvec_data
+		self.ignored=list(getattr(embryo,"ignored",[]))
+		self.ext_av_data_d=embryo.ext_av_data_d
+		self.int_av_data_d=embryo.int_av_data_d
+		self.slice_av_data_d=embryo.slice_av_data_d
 		
-	if embryo.fits[this_fit].save_track==1:
-		embryo.fits[this_fit].track_parms.append([knew,cnaught,ynaught])
-		embryo.fits[this_fit].track_fit.append(embryo.fits[this_fit].fit_av_d)
+		#No monitor plots in worker processes
+		self.debug_fit=0
 		
-	return ssd
+		self.fits=[]
+
+#-------------------------------------------------------------------------------------------------------------------------------------
+#Makes light copy of fit (bounds, x0, model, options) attached to a fit_data object
 
-def constr_calc_exp_ssd(x):
+def copy_for_fitting(embryo,fit):
 	
-	x=xtransform(x,[embryo.fits[this_fit].LB_k,embryo.fits[this_fit].LB_cnaught,embryo.fits[this_fit].LB_ynaught],[embryo.fits[this_fit].UB_k,embryo.fits[this_fit].UB_cnaught,embryo.fits[this_fit].UB_ynaught])
+	data=fit_data(embryo)
 	
-	ssd=calc_exp_ssd(x)
+	new=cpy.copy(fit)
+	new.embryo=data
+	new.x0=list(fit.x0)
+	new.track_parms=cpy.deepcopy(fit.track_parms)
 	
-	return ssd
+	data.fits.append(new)
+	
+	return data
+
+#-------------------------------------------------------------------------------------------------------------------------------------
+#Fits single light fit in worker process and returns all properties of fit. task is [i,fit_data].
+
+def fit_task(task,cancel=None):
+	
+	i,data=task
+	
+	data=fdap_fitting(data,0,cancel=cancel)
+	
+	result=dict(vars(data.fits[0]))
+	result.pop("embryo")
+	
+	return i,result
+
+#-------------------------------------------------------------------------------------------------------------------------------------
+#Writes fit results returned by worker back into fit object
+
+def merge_fit_results(embryo,fit,result):
+	
+	for prop,val in result.items():
+		setattr(fit,prop,val)
 	
+	#Also update ignored vectors of embryo as fdap_fitting would
+	embryo=correct_ignored_vecs(embryo)
+	
+	return fit
+
 def xtransform(x,LB,UB):
 	
 	#Determine number of parameters to be fitted
@@ -806,9 +2668,6 @@ def check_constrained(fit):
 
 def fit_binned_mol(mol,pinned,plot=False,fit_cnaught=True):
 	
-	#Make molecule global so we can do stuff with it
-	globals()['mol']=mol
-	
 	#Grab first fit as reference
 	fit=mol.sel_fits[0]
 	
@@ -844,17 +2703,22 @@ def fit_binned_mol(mol,pinned,plot=False,fit_cnaught=True):
 		plt.draw()
 		raw_input()
 	
-	#Define x0 and other paramters
-	mol.x0=[fit.k_opt,mol.data_av[0]-mol.data_av[-1],mol.data_av[-1]]
+	#Define x0 and other paramters, k from first fit if available
+	model=get_model(fit)
+	mol.x0=model.initial_guess(mol.tvec_avg,mol.data_av)
+	if fit.k_opt!=None:
+		mol.x0[0]=fit.k_opt
 	mol.LB_k=0
 	mol.UB_k=None
 	mol.LB_ynaught=0
 	mol.UB_ynaught=None
 	mol.LB_cnaught=0
 	mol.UB_cnaught=None
+	mol.LB_extra=list(model.extra_LB)
+	mol.UB_extra=list(model.extra_UB)
 	
 	#Transform x0
-	mol.x0=transform_x0(mol.x0,[mol.LB_k,mol.LB_cnaught,mol.LB_ynaught],[mol.UB_k,mol.UB_cnaught,mol.UB_ynaught])
+	mol.x0=transform_x0(mol.x0,[mol.LB_k,mol.LB_cnaught,mol.LB_ynaught]+mol.LB_extra,[mol.UB_k,mol.UB_cnaught,mol.UB_ynaught]+mol.UB_extra)
 	
 	#Throw out x0 for cnaught
 	x0=list(mol.x0)
@@ -862,10 +2726,11 @@ def fit_binned_mol(mol,pinned,plot=False,fit_cnaught=True):
 		x0.pop(1)
 		
 	#Pass to optimization algorithm 
-	res=sopt.fmin(fit_simple_obj,x0,full_output=True)	
+	res=sopt.fmin(fit_simple_obj,x0,args=(mol,model),full_output=True)	
 	
 	#Put results into molecule to be passed back
-	res_new=xtransform(res[0],[mol.LB_k,mol.LB_cnaught,mol.LB_ynaught],[mol.UB_k,mol.UB_cnaught,mol.UB_ynaught])
+	LB,UB=get_simple_bounds(mol,len(res[0]))
+	res_new=xtransform(res[0],LB,UB)
 	
 	if fit_cnaught:
 		mol.k_opt_refit=res_new[0]
@@ -874,6 +2739,7 @@ def fit_binned_mol(mol,pinned,plot=False,fit_cnaught=True):
 	else:	
 		mol.k_opt_refit=res_new[0]
 		mol.ynaught_opt_refit=res_new[1]
+	mol.extra_opt_refit=list(res_new[len(res_new)-len(mol.LB_extra):])
 				
 	mol.ssd_refit=res[1]
 	mol.success_refit=not bool(res[4])
@@ -893,30 +2759,30 @@ def fit_binned_mol(mol,pinned,plot=False,fit_cnaught=True):
 	
 	return mol
 	
-def fit_simple_obj(x):
+def fit_simple_obj(x,mol,model):
 	
 	#Grab first embryo and fit as reference
 	emb=mol.sel_fits[0].embryo
 	fit=mol.sel_fits[0]
 	
 	#Transform for constrained NM
-	x=xtransform(x,[mol.LB_k,mol.LB_cnaught,mol.LB_ynaught],[mol.UB_k,mol.UB_cnaught,mol.UB_ynaught])
+	LB,UB=get_simple_bounds(mol,len(x))
+	x=xtransform(x,LB,UB)
 	
-	#Fitting all three parameters here, could add options though	
-	if len(x)==2:
+	#Fitting all three parameters here, could add options though. Extra parameters are at the end.
+	nextra=len(model.extra_parms)
+	extra=list(x[len(x)-nextra:])
+	if len(x)-nextra==2:
 		knew=x[0]
 		cnaught=mol.x0[1]
 		ynaught=x[1]
-	elif len(x)==3:
+	elif len(x)-nextra==3:
 		knew=x[0]
 		cnaught=x[1]
 		ynaught=x[2]
 	
 	#Generate model series
-	if fit.model=="exp":
-		mol.fit_av=cnaught*exp(-knew*mol.tvec_avg)+ynaught
-	elif fit.model=="power":
-		mol.fit_av=(cnaught**(1-fit.npower)-knew*mol.tvec_avg*(1-fit.npower))**(1/(1-fit.npower))+ynaught
+	mol.fit_av=model.evaluate(mol.tvec_avg,knew,cnaught,ynaught,*extra)
 	
 	#Compute residuals
 	res=mol.data_av-mol.fit_av
@@ -927,6 +2793,17 @@ def fit_simple_obj(x):
 	
 	return ssd
 
+#Returns bounds of n solver variables of fit_simple_obj, c0 is dropped if it is not fitted
+def get_simple_bounds(mol,n):
+	
+	LB=[mol.LB_k,mol.LB_cnaught,mol.LB_ynaught]+list(mol.LB_extra)
+	UB=[mol.UB_k,mol.UB_cnaught,mol.UB_ynaught]+list(mol.UB_extra)
+	if n<len(LB):
+		LB.pop(1)
+		UB.pop(1)
+	
+	return LB,UB
+
 def get_common_tvec(mol):
 	
 	#Empty lists
@@ -966,76 +2843,81 @@ def bin_tvec_data(mol,pinned,region,plot=False):
 	#Get hist and mapping
 	h,mappings=simple_hist(tvec_bin_edges,tvecs,plot=plot)
 	
-	#Make empty vectors filled with lists
-	tvec_bin=list(zeros([len(tvec_bin_edges)-1]))
-	r_bin=list(zeros(shape(tvec_bin)))
-	
-	#Fill in empty lists
-	for i in range(len(r_bin)):
-		r_bin[i]=[]
-		tvec_bin[i]=[]
-	
-	#Go through each selected fit, grab data vectors, and assign data to bin vector according to mapping from simple_hist
+	#Go through each selected fit and grab data vectors, pinned series are computed once per fit
+	tvals=[]
+	rvals=[]
 	for i,fit in enumerate(mol.sel_fits):
-
-		m=mappings[i]				
+		
 		emb=fit.embryo
 		if len(emb.ignored)>0:
-			for j in range(len(getattr(emb,region+'_av_data_ign'))):
-			
-				if pinned:
-					r_bin[m[j]].append(pin_dataseries(getattr(emb,region+'_av_data_ign'),fit.ynaught_opt,fit.cnaught_opt)[j])
-				else:
-					r_bin[m[j]].append(getattr(emb,region+'_av_data_ign')[j])
-				
-				tvec_bin[m[j]].append(emb.tvec_ignored[j])
-				
+			data=getattr(emb,region+'_av_data_ign')
 		else:
-			for j in range(len(getattr(emb,region+'_av_data_d'))):
-				
-				if pinned:
-					
-					r_bin[m[j]].append(pin_dataseries(getattr(emb,region+'_av_data_d'),fit.ynaught_opt,fit.cnaught_opt)[j])
-					
-				else:
-					r_bin[m[j]].append(getattr(emb,region+'_av_data_d')[j])
-				
-				tvec_bin[m[j]].append(emb.tvec_data[j])
-										
+			data=getattr(emb,region+'_av_data_d')
+		
+		if pinned:
+			data=pin_dataseries(data,fit.ynaught_opt,fit.cnaught_opt)
+		
+		tvals.append(asarray(tvecs[i],dtype=float))
+		rvals.append(asarray(data,dtype=float))
+	
+	#Assign data to bins according to mapping from simple_hist
+	nbins=len(tvec_bin_edges)-1
+	m=concatenate(mappings)
+	tvec_bin=pad_bins(m,concatenate(tvals),nbins)
+	r_bin=pad_bins(m,concatenate(rvals),nbins)
+	
 	return tvec_bin,r_bin
 
+#Puts values into padded 2D array with one row per bin, unused entries are NaN. Values keep their order within each bin, 
+#values with bin index -1 are dropped.
+def pad_bins(m,vals,nbins):
+	
+	valid=m>=0
+	m=m[valid]
+	vals=vals[valid]
+	
+	order=argsort(m,kind='mergesort')
+	m=m[order]
+	vals=vals[order]
+	
+	#Position of each value inside its bin
+	counts=bincount(m,minlength=nbins)
+	starts=cumsum(counts)-counts
+	pos=arange(len(m))-starts[m]
+	
+	padded=empty((nbins,max(counts.max() if nbins>0 else 0,1)))
+	padded.fill(nan)
+	padded[m,pos]=vals
+	
+	return padded
+
 def pin_dataseries(datavec,ynaught,cnaught):
 	pinned=(asarray(datavec)-ynaught)/cnaught
 	return pinned
 				
 def simple_hist(bins_edges,datavecs,plot=False):
 	
+	bins_edges=asarray(bins_edges,dtype=float)
+	nbins=len(bins_edges)-1
+	
 	#Empty vector for histogram
-	h=zeros([len(bins_edges)-1])
+	h=zeros([nbins])
 	
 	mappings=[]
 	
-	#Loop through all datavectors
+	#Loop through all datavectors, bin i holds bins_edges[i]<=d<bins_edges[i+1]
 	for data in datavecs:
 		
-		m=[]
-		#Loop through datavector
-		for d in data:
-			found=False
-			#Loop through bin edges
-			for i in range(len(bins_edges)-1):
-				
-				#Check if data point is in this bin
-				if bins_edges[i]<=d and d<bins_edges[i+1]:
-				
-					m.append(i)
-					h[i]=h[i]+1
-					found=True
-					break
-				
-			if not found:	
-				print "not found", d	, bins_edges,m,i
-				raw_input()
+		data=asarray(data,dtype=float)
+		m=searchsorted(bins_edges,data,side='right')-1
+		
+		#Data points outside of all bins are not mapped
+		outside=(m<0)|(m>=nbins)
+		if outside.any():
+			print "not found", data[outside], bins_edges
+			m[outside]=-1
+		
+		h=h+bincount(m[m>=0],minlength=nbins)
 					
 		#Put in mappings list
 		mappings.append(m)
@@ -1053,38 +2935,23 @@ def simple_hist(bins_edges,datavecs,plot=False):
 
 def edge_to_bin_vec(edge_vec):
 	
-	bin_vec=[]
+	edge_vec=asarray(edge_vec,dtype=float)
 	
-	for i in range(len(edge_vec)-1):
-		bin_vec.append((edge_vec[i]+edge_vec[i+1])/2)
-		
-	return bin_vec	
+	return (edge_vec[:-1]+edge_vec[1:])/2
 
+#Mean and standard deviation of each bin of padded array from bin_tvec_data, NaN entries are ignored
 def mean_bin(vec):
-
-	mvec=[]
-	for v in vec:
-		
-		mvec.append(nanmean(v))
 	
-	mvec=asarray(mvec)
+	with warnings.catch_warnings():
+		warnings.simplefilter("ignore",RuntimeWarning)
+		mvec=nanmean(asarray(vec,dtype=float),axis=1)
 	
 	return mvec
-	
 
 def std_bin(vec):
 	
-	mvec=[]
-	for v in vec:
-		mvec.append(nanstd(v))
-	
-	mvec=asarray(mvec)
+	with warnings.catch_warnings():
+		warnings.simplefilter("ignore",RuntimeWarning)
+		mvec=nanstd(asarray(vec,dtype=float),axis=1)
 	
 	return mvec
-							
-		
-		
-		
-		
-			
-
@@ -34,6 +34,24 @@
 #7) get_embryo_mask: Computes mask of embryo defined by its radius and center
 #8) get_noise: Computes noise values via different methods defined in noise subobject
 #9) oval_to_circle: Computes center and radius of circle from oval data returned by imageJ
+#10) make_embryo_mask: Builds embryo mask on a broadcasted grid
+#11) clear_embryo_mask_cache: Empties LRU cache of embryo masks
+#12) otsu_imagej_stack: Vectorized Otsu algorithm for a whole stack of images
+#13) frame_source: Decodes each image file only once per analysis
+#14) analyze_frame: Computes region averages of a single data image
+#15) map_pool: Maps function over tasks using a process pool
+#16) analyze_molecule: Analyzes all embryos and bkgds of molecule, optionally in parallel
+#17) analyze_bkgd: Analyzes single bkgd object
+#18) get_label_img: Encodes region membership of pixels in integer label image
+#19) region_stats: Computes sums and pixel counts of all regions in one pass
+#20) frame_store: Compact storage of masked images
+#21) mask_store: Bit-packed storage of masks
+#22) pack_masks: Packs list of masks into mask_store
+#23) get_manifest: Per frame inputs of embryo analysis, used for incremental reanalysis
+#24) get_changed_frames: Returns frames whose inputs changed since last analysis
+#25) splice_frame_results: Merges results of reanalyzed frames with unchanged ones
+#26) watch_fdap_data: Streaming analysis of data folder during acquisition
+#27) get_ready_frames: Returns number of completely written frames in data/mask folder
 
 #=====================================================================================================================================
 #Importing necessary modules
@@ -59,7 +77,186 @@ import sys
 #Image processing
 import matplotlib.image as mpimg
 
+#Fitting
+import pyfdap_fit_module as pyfdap_fit
 
+#Caching
+from collections import OrderedDict
+
+#Parallel processing
+import multiprocessing
+import copy as cpy
+
+#=====================================================================================================================================
+#Module Variables
+#=====================================================================================================================================
+
+#LRU cache of embryo masks, keyed by (radius,center,res,fill). Frames with the same circle share one read-only mask.
+embryo_mask_cache=OrderedDict()
+embryo_mask_cache_size=32
+
+#Labels of regions in label images
+label_out=0
+label_ext=1
+label_int=2
+
+
+#=====================================================================================================================================
+#Frame source
+#=====================================================================================================================================
+
+#-------------------------------------------------------------------------------------------------------------------------------------
+#Decodes each image file only once and hands out the decoded array to every consumer (masks, region averages, noise).
+#Note: Returned arrays are read-only, consumers need to copy (e.g. via astype) before manipulating them.
+
+class frame_source:
+	
+	#Creates new frame source
+	def __init__(self):
+		
+		self.frames={}
+		self.decoded=0
+		self.requested=0
+	
+	#Returns decoded image of file fn
+	def load(self,fn):
+		
+		key=os.path.abspath(fn)
+		self.requested=self.requested+1
+		
+		if key not in self.frames:
+			img=mpimg.imread(fn)
+			img.flags.writeable=False
+			self.frames[key]=img
+			self.decoded=self.decoded+1
+			
+		return self.frames[key]
+	
+	#Returns decoded image of file fn if already decoded, otherwise None
+	def cached(self,fn):
+		
+		return self.frames.get(os.path.abspath(fn))
+	
+	#Frees all decoded images
+	def clear(self):
+		
+		self.frames={}
+		
+#=====================================================================================================================================
+#Frame store
+#=====================================================================================================================================
+
+#-------------------------------------------------------------------------------------------------------------------------------------
+#Compact storage of masked images (e.g. embryo.vals_slice). Keeps images in their native encoding (e.g. uint16) together with 
+#their embryo mask (packed, see mask_store). The masked float image is only reconstructed when accessed. 
+#Behaves like a list of masked images, so viewers can keep indexing it.
+
+class frame_store:
+	
+	#Creates new frame store
+	def __init__(self):
+		
+		self.imgs=[]
+		self.masks=mask_store()
+	
+	#Adds image and its mask
+	def append(self,img,mask):
+		
+		self.imgs.append(img)
+		self.masks.append(mask)
+	
+	#Returns masked image i
+	def __getitem__(self,i):
+		
+		return self.imgs[i]*self.masks[i]
+	
+	def __len__(self):
+		
+		return len(self.imgs)
+	
+	def __iter__(self):
+		
+		for i in range(len(self)):
+			yield self[i]
+	
+	#Returns memory used by images and masks
+	def nbytes(self):
+		
+		return sum([img.nbytes for img in self.imgs])+self.masks.nbytes()
+
+#-------------------------------------------------------------------------------------------------------------------------------------
+#Compact storage of a series of masks (e.g. embryo.masks_ext). Binary masks are stored bit-packed (np.packbits), 
+#masks with other values (e.g. embryo masks with fill value) are stored as they are. Consecutive identical masks
+#are only stored once. Masks are unpacked to float arrays when accessed, so it behaves like a list of masks.
+
+class mask_store:
+	
+	#Creates new mask store
+	def __init__(self):
+		
+		self.masks=[]
+		self.shapes=[]
+		self.packed=[]
+		self.idx=[]
+	
+	#Adds mask
+	def append(self,mask):
+		
+		mask=asarray(mask)
+		packed=is_binary_mask(mask)
+		if packed:
+			item=packbits(mask.ravel()>0)
+		else:
+			item=mask
+		
+		#Reuse previous mask if it is identical
+		if len(self.masks)>0:
+			j=len(self.masks)-1
+			if self.packed[j]==packed and self.shapes[j]==mask.shape:
+				if item is self.masks[j] or array_equal(item,self.masks[j]):
+					self.idx.append(j)
+					return
+		
+		self.masks.append(item)
+		self.shapes.append(mask.shape)
+		self.packed.append(packed)
+		self.idx.append(len(self.masks)-1)
+	
+	#Returns unpacked mask i
+	def __getitem__(self,i):
+		
+		j=self.idx[i]
+		if self.packed[j]:
+			n=int(prod(self.shapes[j]))
+			return unpackbits(self.masks[j])[:n].reshape(self.shapes[j]).astype('float')
+		else:
+			return self.masks[j]
+	
+	def __len__(self):
+		
+		return len(self.idx)
+	
+	def __iter__(self):
+		
+		for i in range(len(self)):
+			yield self[i]
+	
+	#Returns memory used by stored masks
+	def nbytes(self):
+		
+		return sum([mask.nbytes for mask in self.masks])
+
+#-------------------------------------------------------------------------------------------------------------------------------------
+#Packs list of masks into mask_store
+
+def pack_masks(masks):
+	
+	store=mask_store()
+	for mask in masks:
+		store.append(mask)
+	
+	return store
+		
 #=====================================================================================================================================
 #Module Functions
 #=====================================================================================================================================
@@ -67,10 +264,15 @@ import matplotlib.image as mpimg
 #-------------------------------------------------------------------------------------------------------------------------------------
 #Load and analyze FDAP data set
 
-def analyze_fdap_data(embryo):
+def analyze_fdap_data(embryo,workers=1,incremental=True,nframes=None,cancel=None):
 	
-	#Get sorted file list
+	#Frame source so that every image is only decoded once during analysis
+	frames=frame_source()
+	
+	#Get sorted file list, if nframes is given only analyze first nframes files (e.g. when files are still being written)
 	fn_data_files=get_sorted_folder_list(embryo.fn_datafolder,embryo.data_ft)
+	if nframes!=None:
+		fn_data_files=fn_data_files[:nframes]
 	
 	#If folder string ends without /, add /
 	if embryo.fn_datafolder[-1]=="/":
@@ -78,71 +280,453 @@ def analyze_fdap_data(embryo):
 	else:
 		embryo.fn_datafolder=embryo.fn_datafolder+"/"
 	
-	#Creating embryo mask
-	embryo.masks_embryo=[]
+	#Creating embryo mask, results are only written into embryo at the end so that a canceled analysis leaves embryo unchanged
+	masks_embryo=[]
 	for i in range(shape(fn_data_files)[0]):
 		mask_embryo=get_embryo_mask(embryo.radiuses_embr_px[i],embryo.centers_embr_px[i],embryo.data_res_px,0,fill=embryo.fill_mask)
-		embryo.masks_embryo.append(mask_embryo)
+		masks_embryo.append(mask_embryo)
 		
+	#Compare inputs of all frames with manifest of last analysis and only redo frames that changed
+	manifest=get_manifest(embryo,fn_data_files)
+	if incremental:
+		redo=get_changed_frames(embryo,manifest)
+	else:
+		redo=range(shape(fn_data_files)[0])
+	
 	#Creating masks for exterior and interior of cells
-	masks_ext,masks_int=get_ext_mask(embryo.fn_maskfolder,embryo.data_ft,embryo.thresh_meth,embryo.masks_embryo,embryo.thresh_masked,embryo.threshs,0)
+	pyfdap_fit.check_canceled(cancel)
+	masks_ext,masks_int=get_ext_mask(embryo.fn_maskfolder,embryo.data_ft,embryo.thresh_meth,masks_embryo,embryo.thresh_masked,embryo.threshs,0,frames=frames,indices=redo)
 	
-	print len(embryo.masks_embryo), len(masks_ext), len(fn_data_files)
+	print len(masks_embryo), len(masks_ext), len(fn_data_files)
 	
 	print "analyzed masks"
 	
-	#Some empty result vectors
-	ext_av=[]
-	int_av=[]
-	slice_av=[]
-	embryo.vals_slice=[]
+	#Tasks for all data images. If an image was already decoded (e.g. as mask image), pass the decoded image along.
+	tasks=[]
+	for j,i in enumerate(redo):
+		fn_load=embryo.fn_datafolder+fn_data_files[i]
+		tasks.append([fn_load,frames.cached(fn_load),embryo.data_enc,masks_embryo[i],masks_ext[j],masks_int[j]])
 	
-	#Looping trough all data images
-	for i in range(shape(fn_data_files)[0]):
+	#Looping trough all data images, either serial or spread over process pool
+	if workers>1 and len(tasks)>1:
+		results=map_pool(analyze_frame,tasks,workers,cancel=cancel)
+	else:
+		results=[]
+		for task in tasks:
+			pyfdap_fit.check_canceled(cancel)
+			#Make sure we only decode image once
+			if task[1] is None:
+				task[1]=frames.load(task[0])
+			results.append(analyze_frame(task))
 	
-		#Load current data img
-		fn_load=embryo.fn_datafolder+fn_data_files[i]
-		data_img = mpimg.imread(fn_load).astype(embryo.data_enc)
-		data_vals=data_img.real
-		data_vals=data_vals.astype('float')
-		
-		#Multiplying with embryo mask and substracting bkgd
-		data_vals_slice=data_vals*embryo.masks_embryo[i]
-		embryo.vals_slice.append(data_vals_slice)	
-		
-		#Multiplying with embryo mask and exterior/interior and subtracting bkgd
-		data_vals_ext=data_vals*mask_embryo*masks_ext[i]
-		data_vals_int=data_vals*mask_embryo*masks_int[i]
-		
-		#Computing average concentrations for all 3 regions
-		slice_av.append(float(sum(data_vals_slice))/float(sum(mask_embryo)))
-		ext_av.append(float(sum(data_vals_ext))/float(sum(mask_embryo*masks_ext[i])))
-		int_av.append(float(sum(data_vals_int))/float(sum(mask_embryo*masks_int[i])))
-		
-		print "analyzed", fn_data_files[i]
+	print "analyzed", len(redo), "of", len(fn_data_files), "frames"
+	
+	#Splice new results into results of unchanged frames
+	vals_slice,masks_ext,masks_int,slice_av,ext_av,int_av=splice_frame_results(embryo,redo,results,masks_embryo,masks_ext,masks_int)
+	
+	#Last check of cancel, from here on results are written into embryo
+	pyfdap_fit.check_canceled(cancel)
 	
 	#Getting pre image
 	embryo.pre=get_pre(embryo.pre,0)
 	
 	print "analyzed pre"
 	
-	#Getting noise level
-	embryo.noise=get_noise(embryo.noise,0)
+	#Getting noise level, needs new images and unpacked embryo masks
+	embryo.masks_embryo=masks_embryo
+	embryo.vals_slice=vals_slice
+	embryo.noise=get_noise(embryo.noise,0,frames=frames)
 	
 	print "analyzed noise"
 	
-	#Mapping results back to embryo object
+	#Free decoded images
+	frames.clear()
+	
+	#Mapping results back to embryo object, masks are kept packed. Only native images are kept, masked images are reconstructed 
+	#on demand
+	embryo.masks_embryo=pack_masks(embryo.masks_embryo)
 	embryo.masks_ext=masks_ext
 	embryo.masks_int=masks_int
 
 	embryo.slice_av_data_d=slice_av
 	embryo.int_av_data_d=int_av
 	embryo.ext_av_data_d=ext_av
+	embryo.manifest=manifest
 	
 	print "Done with analysis of embryo:", embryo.name
 	
 	return embryo
 
+#-------------------------------------------------------------------------------------------------------------------------------------
+#Returns manifest of embryo, i.e. for every frame everything its analysis result depends on:
+#data and mask file (path, size, mtime), embryo mask parameters and threshholding options.
+
+def get_manifest(embryo,fn_data_files):
+	
+	fn_maskfolder=embryo.fn_maskfolder
+	if fn_maskfolder[-1]!="/":
+		fn_maskfolder=fn_maskfolder+"/"
+	
+	fn_mask_files=get_sorted_folder_list(embryo.fn_maskfolder,embryo.data_ft)
+	
+	manifest=[]
+	for i in range(shape(fn_data_files)[0]):
+		
+		entry=[get_file_signature(embryo.fn_datafolder+fn_data_files[i])]
+		if i<len(fn_mask_files):
+			entry.append(get_file_signature(fn_maskfolder+fn_mask_files[i]))
+		else:
+			entry.append(None)
+		
+		entry.append(embryo_mask_key(embryo.radiuses_embr_px[i],embryo.centers_embr_px[i],embryo.data_res_px,embryo.fill_mask))
+		entry.append((embryo.data_enc,embryo.thresh_meth,bool(embryo.thresh_masked)))
+		if embryo.thresh_meth=="Manual":
+			entry.append(embryo.threshs[i])
+		
+		manifest.append(tuple(entry))
+		
+	return manifest
+	
+def get_file_signature(fn):
+	
+	return (os.path.abspath(fn),os.path.getsize(fn),os.path.getmtime(fn))
+
+#-------------------------------------------------------------------------------------------------------------------------------------
+#Returns indices of frames whose manifest entry differs from the manifest of the last analysis.
+#If results of last analysis are incomplete (e.g. image data was stripped), all frames are returned.
+
+def get_changed_frames(embryo,manifest):
+	
+	old=getattr(embryo,"manifest",[])
+	nold=len(old)
+	
+	complete=isinstance(embryo.vals_slice,frame_store) and embryo.masks_ext is not None and embryo.masks_int is not None
+	if complete:
+		for vec in [embryo.vals_slice,embryo.masks_ext,embryo.masks_int,embryo.slice_av_data_d,embryo.ext_av_data_d,embryo.int_av_data_d]:
+			complete=complete and len(vec)==nold
+	
+	if not complete:
+		return range(len(manifest))
+	
+	return [i for i in range(len(manifest)) if i>=nold or old[i]!=manifest[i]]
+
+#-------------------------------------------------------------------------------------------------------------------------------------
+#Merges results of reanalyzed frames (given in order of redo) with results of unchanged frames still stored in embryo.
+#Returns new frame store, packed ext/int masks and averages of all frames.
+
+def splice_frame_results(embryo,redo,results,masks_embryo,masks_ext_new,masks_int_new):
+	
+	new=dict(zip(redo,range(len(redo))))
+	
+	vals_slice=frame_store()
+	masks_ext=mask_store()
+	masks_int=mask_store()
+	slice_av=[]
+	ext_av=[]
+	int_av=[]
+	
+	for i in range(len(masks_embryo)):
+		
+		if i in new:
+			j=new[i]
+			data_img,curr_slice_av,curr_ext_av,curr_int_av=results[j]
+			mask_ext=masks_ext_new[j]
+			mask_int=masks_int_new[j]
+		else:
+			data_img=embryo.vals_slice.imgs[i]
+			curr_slice_av=embryo.slice_av_data_d[i]
+			curr_ext_av=embryo.ext_av_data_d[i]
+			curr_int_av=embryo.int_av_data_d[i]
+			mask_ext=embryo.masks_ext[i]
+			mask_int=embryo.masks_int[i]
+		
+		vals_slice.append(data_img,masks_embryo[i])
+		masks_ext.append(mask_ext)
+		masks_int.append(mask_int)
+		slice_av.append(curr_slice_av)
+		ext_av.append(curr_ext_av)
+		int_av.append(curr_int_av)
+	
+	return vals_slice,masks_ext,masks_int,slice_av,ext_av,int_av
+
+#-------------------------------------------------------------------------------------------------------------------------------------
+#Streaming analysis of data folder during acquisition. Polls data and mask folder of embryo every interval seconds, analyzes 
+#new frames as soon as they are completely written and extends the time series. New frames inherit embryo circle (and manual
+#threshhold) of the last frame. If this_fit is given, the fit is redone after each update, warm started from its last optimum.
+#callback(embryo,nframes) is called after each update. Watching ends when stop() returns True or, if timeout is given, 
+#when no new frame arrived for timeout seconds. If cancel is given, watching is aborted as soon as cancel() returns True, 
+#also during analysis and fitting, by raising task_canceled. Results of finished updates are kept.
+
+def watch_fdap_data(embryo,interval=10.,this_fit=None,callback=None,stop=None,timeout=None,workers=1,cancel=None):
+	
+	if len(embryo.centers_embr_px)==0 or len(embryo.radiuses_embr_px)==0:
+		print "ERROR: Embryo circle of first frame needs to be defined before watching data folder."
+		return embryo
+	
+	sizes={}
+	last_update=time.time()
+	
+	while stop==None or not stop():
+		
+		pyfdap_fit.check_canceled(cancel)
+		
+		nready=get_ready_frames(embryo,sizes,interval)
+		
+		if nready>len(getattr(embryo,"manifest",[])):
+			
+			#Remember old number of frames so that extension can be undone if analysis is canceled
+			nold=[len(embryo.centers_embr_px),len(embryo.radiuses_embr_px),len(embryo.threshs),embryo.nframes]
+			
+			#Extend embryo to new number of frames
+			while len(embryo.centers_embr_px)<nready:
+				embryo.centers_embr_px.append(list(embryo.centers_embr_px[-1]))
+				embryo.radiuses_embr_px.append(embryo.radiuses_embr_px[-1])
+			if embryo.thresh_meth=="Manual":
+				while len(embryo.threshs)<nready:
+					embryo.threshs.append(embryo.threshs[-1])
+			embryo.nframes=nready
+			embryo.update_tvec()
+			
+			#Only new frames are analyzed
+			try:
+				embryo=analyze_fdap_data(embryo,workers=workers,nframes=nready,cancel=cancel)
+			except pyfdap_fit.task_canceled:
+				del embryo.centers_embr_px[nold[0]:]
+				del embryo.radiuses_embr_px[nold[1]:]
+				del embryo.threshs[nold[2]:]
+				embryo.nframes=nold[3]
+				embryo.update_tvec()
+				raise
+			
+			#Refit with warm start
+			if this_fit!=None:
+				embryo.fits[this_fit]=pyfdap_fit.warm_start_fit(embryo.fits[this_fit])
+				embryo=pyfdap_fit.fdap_fitting(embryo,this_fit,cancel=cancel)
+				
+			if callback!=None:
+				callback(embryo,nready)
+			
+			last_update=time.time()
+			
+		elif timeout!=None and time.time()-last_update>timeout:
+			break
+		
+		#Sleep in small steps so we can react to stop quickly
+		t=time.time()
+		while time.time()-t<interval and (stop==None or not stop()) and (cancel==None or not cancel()):
+			time.sleep(min(0.1,interval))
+		
+	return embryo
+
+#-------------------------------------------------------------------------------------------------------------------------------------
+#Returns number of leading frames of which both data and mask file are completely written. A file counts as complete if its
+#size did not change since the last poll (sizes keeps track of them) or it was last modified more than settle seconds ago.
+
+def get_ready_frames(embryo,sizes,settle):
+	
+	fn_datafolder=embryo.fn_datafolder
+	if fn_datafolder[-1]!="/":
+		fn_datafolder=fn_datafolder+"/"
+	fn_maskfolder=embryo.fn_maskfolder
+	if fn_maskfolder[-1]!="/":
+		fn_maskfolder=fn_maskfolder+"/"
+	
+	fn_data_files=get_sorted_folder_list(embryo.fn_datafolder,embryo.data_ft)
+	fn_mask_files=get_sorted_folder_list(embryo.fn_maskfolder,embryo.data_ft)
+	
+	nready=0
+	for i in range(min(len(fn_data_files),len(fn_mask_files))):
+		
+		complete=True
+		for fn in [fn_datafolder+fn_data_files[i],fn_maskfolder+fn_mask_files[i]]:
+			size=os.path.getsize(fn)
+			unchanged=sizes.get(fn)==size
+			sizes[fn]=size
+			complete=complete and size>0 and (unchanged or time.time()-os.path.getmtime(fn)>settle)
+		
+		if not complete:
+			break
+		nready=nready+1
+		
+	return nready
+
+#-------------------------------------------------------------------------------------------------------------------------------------
+#Analyzes single data image. task is [fn_load,data_img,data_enc,mask_embryo,mask_ext,mask_int], where mask_embryo is the 
+#embryo mask of this frame. 
+#If data_img is None, image is loaded from fn_load. Needs to be module level function so it can be passed to a process pool.
+#Returns image in its native encoding and the averages over all 3 regions.
+
+def analyze_frame(task):
+	
+	fn_load,data_img,data_enc,mask_embryo,mask_ext,mask_int=task
+	
+	#Load current data img
+	if data_img is None:
+		data_img=mpimg.imread(fn_load)
+	data_img=data_img.astype(data_enc)
+	data_vals=data_img.real
+	
+	#Computing average concentrations for all 3 regions
+	labels=get_label_img(mask_embryo,mask_ext,mask_int)
+	slice_av,ext_av,int_av=region_averages(data_vals,labels,mask_embryo)
+	
+	return data_vals,slice_av,ext_av,int_av
+
+#-------------------------------------------------------------------------------------------------------------------------------------
+#Maps func over tasks using a pool of workers processes. Results are returned in the order of tasks.
+#If callback is given, callback(i,result) is called as soon as task i is done. If cancel is given, pool is terminated as soon as 
+#cancel() returns True (see pyfdap_fit.imap_pool).
+
+def map_pool(func,tasks,workers,callback=None,cancel=None):
+	
+	results=[None]*len(tasks)
+	
+	pool=multiprocessing.Pool(min(workers,len(tasks)))
+	
+	try:
+		for i,result in pyfdap_fit.imap_pool(pool,indexed_call,[(func,i,task) for i,task in enumerate(tasks)],cancel=cancel,ordered=False):
+			results[i]=result
+			if callback!=None:
+				callback(i,result)
+		pool.close()
+	except:
+		pool.terminate()
+		raise
+	finally:
+		pool.join()
+	
+	return results
+
+def indexed_call(args):
+	func,i,task=args
+	return i,func(task)
+
+#-------------------------------------------------------------------------------------------------------------------------------------
+#Analyzes all embryos and bkgds of a molecule. With workers>1, embryos and bkgds are analyzed concurrently on a process pool and 
+#results are merged back into the molecule. callback(done,total,name) is called whenever a dataset is finished. If cancel() 
+#returns True, analysis stops with pyfdap_fit.task_canceled, datasets analyzed until then keep their results.
+
+def analyze_molecule(molecule,workers=1,callback=None,cancel=None):
+	
+	objs=list(molecule.embryos)+list(molecule.bkgds)
+	
+	if workers>1 and len(objs)>1:
+		
+		#Only send what is needed for analysis to the workers
+		tasks=[]
+		for obj in objs:
+			tasks.append(copy_for_analysis(obj))
+		
+		done=[0]
+		def merge(i,result):
+			merge_analysis_results(objs[i],result)
+			done[0]=done[0]+1
+			if callback!=None:
+				callback(done[0],len(objs),objs[i].name)
+		
+		map_pool(analyze_dataset_task,tasks,workers,callback=merge,cancel=cancel)
+		
+	else:
+		for i,obj in enumerate(objs):
+			pyfdap_fit.check_canceled(cancel)
+			if is_bkgd(obj):
+				analyze_bkgd(obj,0)
+			else:
+				analyze_fdap_data(obj,cancel=cancel)
+			if callback!=None:
+				callback(i+1,len(objs),obj.name)
+	
+	#Averaging over all bkgds
+	if len(molecule.bkgds)>0:
+		molecule.bkgd_slice,molecule.bkgd_ext,molecule.bkgd_int,molecule.bkgd_pre_slice,molecule.bkgd_pre_ext,molecule.bkgd_pre_int=average_bkgds(molecule.bkgds)
+	
+	return molecule
+
+#-------------------------------------------------------------------------------------------------------------------------------------
+#Properties that are results of analysis and need to be passed back from worker processes
+
+embryo_result_props=["fn_datafolder","manifest","masks_embryo","masks_ext","masks_int","vals_slice","slice_av_data_d","ext_av_data_d","int_av_data_d"]
+bkgd_result_props=["fn_bkgdfolder","masks_embryo","masks_ext","masks_int","bkgd_vals_slice","bkgd_slice_av","bkgd_ext_av","bkgd_int_av","bkgd_slice_vec","bkgd_ext_vec","bkgd_int_vec"]
+pre_result_props=["fn_datafolder","masks_embryo","masks_ext","masks_int","pre_slice","pre_ext","pre_int"]
+noise_result_props=["noise"]
+
+#Properties that are overwritten by analysis anyway and don't need to be sent to worker processes
+analysis_heavy_props=["masks_embryo","masks_ext","masks_int","vals_slice","bkgd_vals_slice"]
+
+#Results of last analysis that incremental reanalysis of embryos needs (see get_changed_frames), these are sent along
+incremental_props=["masks_ext","masks_int","vals_slice"]
+
+def is_bkgd(obj):
+	return hasattr(obj,"fn_bkgdfolder")
+
+#-------------------------------------------------------------------------------------------------------------------------------------
+#Makes light copy of embryo/bkgd object for analysis in worker process, without fits, old masks, images and link to molecule.
+#Embryos keep the packed results of their last analysis, so that workers only reanalyze changed frames.
+
+def copy_for_analysis(obj):
+	
+	new=cpy.copy(obj)
+	
+	for prop in analysis_heavy_props:
+		if hasattr(new,prop) and (is_bkgd(obj) or prop not in incremental_props):
+			setattr(new,prop,[])
+	
+	if is_bkgd(obj):
+		new.molecule=None
+		new.pre=cpy.copy(obj.pre)
+		new.pre.bkgd=new
+	else:
+		new.fits=[]
+		new.pre=cpy.copy(obj.pre)
+		new.pre.embryo=new
+		new.noise=cpy.copy(obj.noise)
+		new.noise.embryo=new
+	
+	for prop in analysis_heavy_props:
+		if hasattr(new.pre,prop):
+			setattr(new.pre,prop,[])
+		
+	return new
+
+#-------------------------------------------------------------------------------------------------------------------------------------
+#Analyzes embryo/bkgd object in worker process and returns analysis results
+
+def analyze_dataset_task(obj):
+	
+	if is_bkgd(obj):
+		obj=analyze_bkgd(obj,0)
+		result={"obj":get_props(obj,bkgd_result_props)}
+	else:
+		obj=analyze_fdap_data(obj)
+		result={"obj":get_props(obj,embryo_result_props),"noise":get_props(obj.noise,noise_result_props)}
+	
+	result["pre"]=get_props(obj.pre,pre_result_props)
+	
+	return result
+
+def get_props(obj,props):
+	
+	vals={}
+	for prop in props:
+		vals[prop]=getattr(obj,prop)
+	
+	return vals
+
+#-------------------------------------------------------------------------------------------------------------------------------------
+#Writes analysis results returned by worker back into embryo/bkgd object
+
+def merge_analysis_results(obj,result):
+	
+	for prop,val in result["obj"].items():
+		setattr(obj,prop,val)
+	for prop,val in result["pre"].items():
+		setattr(obj.pre,prop,val)
+	if "noise" in result:
+		for prop,val in result["noise"].items():
+			setattr(obj.noise,prop,val)
+	
+	return obj
+
 #-------------------------------------------------------------------------------------------------------------------------------------
 #Load and analyze FDAP background data set
 
@@ -190,8 +774,13 @@ def mean_ignore_none(vec):
 #-------------------------------------------------------------------------------------------------------------------------------------
 #Take folder where masks are stored and use Otsu algorithm to find contours
 		
-def get_ext_mask(fn_maskfolder,data_ft,thresh_meth,masks_embryo,thresh_masked,threshs,debug_opt):
+def get_ext_mask(fn_maskfolder,data_ft,thresh_meth,masks_embryo,thresh_masked,threshs,debug_opt,frames=None,indices=None):
 	print "in ext mask"
+	
+	#If no frame source is given, use one just for this function
+	if frames==None:
+		frames=frame_source()
+	
 	#Get sorted file list
 	fn_mask_files=get_sorted_folder_list(fn_maskfolder,data_ft)
 	
@@ -205,68 +794,63 @@ def get_ext_mask(fn_maskfolder,data_ft,thresh_meth,masks_embryo,thresh_masked,th
 	masks_ext=[]
 	masks_int=[]
 	
-	#Loop through all mask files and get masks
-	for i in range(shape(fn_mask_files)[0]):
+	#If no indices are given, compute masks for all mask images
+	if indices==None:
+		indices=range(shape(fn_mask_files)[0])
+	
+	#Load all mask images first
+	mask_imgs=[]
+	for i in indices:
 		
 		#Compose filename
 		fn_load=fn_maskfolder+fn_mask_files[i]
 	
+		#Load current image file as grayscale image
+		mask_img = frames.load(fn_load).astype("uint16")
+		
+		#If thresh_masked is selected, apply masking before threshholding
+		if thresh_masked:
+			mask_img=mask_img*masks_embryo[i]
+		
+		mask_imgs.append(mask_img)
+	
+	#Otsu threshholding of whole stack in one go
+	if thresh_meth=="Otsu" and len(mask_imgs)>0:
+		opt_threshs,otsu_masks=otsu_imagej_stack(mask_imgs,1,0)
+	
+	#Loop through all mask images and get masks
+	for j,i in enumerate(indices):
+		
+		mask_img=mask_imgs[j]
+		
 		#Some debugging plots
 		if debug_opt==1:
 			
-			data_img = mpimg.imread(fn_load).astype('float')
-			mask_img=data_img.real
-			mask_img=mask_img.astype('float')
-			
 			#Plot image
 			fig=plt.figure()
 			fig.show()
 			ax=fig.add_subplot(131)
-			con=ax.contourf(mask_img)
+			con=ax.contourf(mask_img.astype('float'))
 			plt.colorbar(con)
 			plt.title("Original image")
 			plt.draw()
 		
-		#Load current image file as grayscale image
-		mask_img = mpimg.imread(fn_load).astype("uint16")
-		
-		#If thresh_masked is selected, apply masking before threshholding
-		if thresh_masked:
-			mask_img=mask_img*masks_embryo[i]
-		
 		#Threshholding
 		if thresh_meth=="Otsu":
-			opt_thresh2,mask2=otsu_imagej(mask_img,1,0,0)
+			mask=otsu_masks[j]
 		elif thresh_meth=="Adaptive":
 			#NOTE: still developmental
-			mask2=adaptive_thresh(mask_img,5)
+			mask=adaptive_thresh(mask_img,5)
 		elif thresh_meth=="Manual":
 			#NOTE: still developmental
-			mask2=fixed_thresh(mask_img,threshs[i])
-		
-		if debug_opt==1:
-			print "curr_img=", fn_load
-			print "opt_thresh cv2", opt_thresh
-			print "opt_thresh imagej", opt_thresh2
-			print "opt_thresh own", opt_thresh3
-			
-			fig=plt.figure()
-			fig.show()
-			ax=fig.add_subplot(131)
-			ax.contourf(mask)
-			ax=fig.add_subplot(132)
-			ax.contourf(mask2)
-			ax=fig.add_subplot(133)
-			ax.contourf(mask-mask2)
-			
-			plt.draw()
-		
-			raw_input()
-		
-		mask=mask2
+			mask=fixed_thresh(mask_img,threshs[i])
 		
 		#Some debugging plots
 		if debug_opt==1:
+			if thresh_meth=="Otsu":
+				print "curr_img=", fn_maskfolder+fn_mask_files[i]
+				print "opt_thresh imagej", opt_threshs[j]
+			
 			#Plot found contours
 			ax=fig.add_subplot(132)
 			con=ax.contourf(mask)
@@ -281,7 +865,7 @@ def get_ext_mask(fn_maskfolder,data_ft,thresh_meth,masks_embryo,thresh_masked,th
 		#Some debugging plots
 		if debug_opt==1:
 			ax=fig.add_subplot(133)
-			con=ax.contourf(mask)
+			con=ax.contourf(mask_ext)
 			plt.colorbar(con)
 			plt.title("Inverted Mask")
 			plt.draw()
@@ -319,15 +903,9 @@ def otsu_imagej(img,maxval,minval,debug_opt):
 	#Initialize values
 	#L = img.max()
 	L = 256
-	S = 0 
-	N = 0
-	
-	#Make bin vector (histogram autobinning does not work if there are nans in img)
-	bins=linspace(nanmin(img),nanmax(img),L+1)
 	
 	#Compute histogram
-	data,bin_edges=histogram(img,bins)
-	bin_width=diff(bin_edges)[0]
+	data,bin_edges=otsu_hist(img,L)
 	
 	#Debugging plot for histogram
 	if debug_opt==1:
@@ -336,64 +914,15 @@ def otsu_imagej(img,maxval,minval,debug_opt):
 		fig.show()
 		ax=fig.add_subplot(121)
 		ax.bar(bin_vec,data)
-		ax.plot(bin_vec,other_data,'g')
 		#ax.plot(bin_vec,data,'r')
 		
 		plt.draw()
-		
-	for k in range(L):
-		#Total histogram intensity
-		S = S+ k * data[k]
-		#Total number of data points
-		N = N + data[k]		
-	
-
-	#Temporary variables
-	Sk = 0
-	BCV = 0
-	BCVmax=0
-	kStar = 0
 	
-	#The entry for zero intensity
-	N1 = data[0] 
-	
-	#Look at each possible threshold value,
-	#calculate the between-class variance, and decide if it's a max
-	for k in range (1,L-1): 
-		#No need to check endpoints k = 0 or k = L-1
-		Sk = Sk + k * data[k]
-		N1 = N1 + data[k]
-
-		#The float casting here is to avoid compiler warning about loss of precision and
-		#will prevent overflow in the case of large saturated images
-		denom = float(float(N1) * (float(N) - float(N1))) 
-
-		if denom != 0:
-			#Float here is to avoid loss of precision when dividing
-			num = float(( float(N1) / float(N) ) * S) - Sk 
-			BCV = float((num * num)) / float(denom)
-		
-		else:
-			BCV = 0
-
-		if BCV >= BCVmax: 
-			#Assign the best threshold found so far
-			BCVmax = BCV
-			kStar = k
-	
-	kStar=bin_edges[0]+kStar*bin_width
+	#Find optimal threshold 
+	kStar=otsu_kstar(data,bin_edges)
 	
 	#Now manipulate the image
-	bin_img=zeros(shape(img))
-	for i in range(shape(img)[0]):
-		for j in range(shape(img)[1]):
-			if isnan(img[i,j]):
-				bin_img[i,j]=minval
-			else:
-				if img[i,j]<=kStar:
-					bin_img[i,j]=minval
-				else:				
-					bin_img[i,j]=maxval
+	bin_img=otsu_binarize(img,kStar,maxval,minval)
 	
 	if debug_opt==1:
 		print "Optimal threshold = ", kStar
@@ -406,6 +935,86 @@ def otsu_imagej(img,maxval,minval,debug_opt):
 		raw_input()
 			
 	return kStar,bin_img
+
+#-------------------------------------------------------------------------------------------------------------------------------------
+#Otsu algorithm of imagej for a whole stack of images. Returns list of thresholds and stack of binary images.
+
+def otsu_imagej_stack(imgs,maxval,minval,L=256):
+	
+	imgs=asarray(imgs)
+	
+	#Histograms need their own bins per image
+	hists=[]
+	edges=[]
+	for img in imgs:
+		data,bin_edges=otsu_hist(img,L)
+		hists.append(data)
+		edges.append(bin_edges)
+	
+	#Thresholds of all images at once
+	kStars=otsu_kstar(asarray(hists),asarray(edges))
+	
+	#Binarize whole stack at once
+	bin_imgs=otsu_binarize(imgs,kStars.reshape((-1,)+(1,)*(imgs.ndim-1)),maxval,minval)
+	
+	return list(kStars),bin_imgs
+
+#-------------------------------------------------------------------------------------------------------------------------------------
+#Histogram used by Otsu algorithm
+
+def otsu_hist(img,L):
+	
+	#Make bin vector (histogram autobinning does not work if there are nans in img)
+	bins=linspace(nanmin(img),nanmax(img),L+1)
+	
+	#Compute histogram
+	data,bin_edges=histogram(img,bins)
+	
+	return data,bin_edges
+
+#-------------------------------------------------------------------------------------------------------------------------------------
+#Computes optimal threshold from histogram(s) by maximizing between-class variance.
+#data and bin_edges can either be single histograms or one histogram per row.
+
+def otsu_kstar(data,bin_edges):
+	
+	data=asarray(data,dtype=float)
+	bin_edges=asarray(bin_edges,dtype=float)
+	L=data.shape[-1]
+	k=arange(L)
+	
+	#Total histogram intensity and total number of data points
+	S=sum(k*data,axis=-1)[...,newaxis]
+	N=sum(data,axis=-1)[...,newaxis]
+	
+	#Cumulative intensity and number of data points for all possible thresholds.
+	#No need to check endpoints k = 0 or k = L-1
+	Sk=cumsum(k*data,axis=-1)[...,1:L-1]
+	N1=cumsum(data,axis=-1)[...,1:L-1]
+	
+	#Between-class variance
+	denom=N1*(N-N1)
+	num=(N1/N)*S-Sk
+	with errstate(divide='ignore',invalid='ignore'):
+		BCV=where(denom!=0,(num*num)/denom,0.)
+	
+	#ImageJ takes the last maximum if there are ties
+	kStar=(L-2)-argmax(BCV[...,::-1],axis=-1)
+	
+	bin_width=bin_edges[...,1]-bin_edges[...,0]
+	kStar=bin_edges[...,0]+kStar*bin_width
+	
+	return kStar
+
+#-------------------------------------------------------------------------------------------------------------------------------------
+#Binarizes image(s) with threshold kStar. nan pixels are set to minval.
+
+def otsu_binarize(img,kStar,maxval,minval):
+	
+	with errstate(invalid='ignore'):
+		bin_img=where(img>kStar,float(maxval),float(minval))
+	
+	return bin_img
 	
 #-------------------------------------------------------------------------------------------------------------------------------------
 #Takes folder where background images are stored and computes background concentration
@@ -413,118 +1022,133 @@ def otsu_imagej(img,maxval,minval,debug_opt):
 def get_bkgd(bkgds,debug_opt):
 	
 	#Note: Multiple bkgd objects can be given in bkgds_val
-	bkgds_val_slice_temp=[]
-	bkgds_val_ext_temp=[]
-	bkgds_val_int_temp=[]
+	for j in range(shape(bkgds)[0]):
+		bkgds[j]=analyze_bkgd(bkgds[j],debug_opt)
 	
-	bkgds_pre_ext=[]
-	bkgds_pre_int=[]
-	bkgds_pre_slice=[]
+	bkgd_slice,bkgd_ext,bkgd_int, bkgd_pre_slice,bkgd_pre_ext,bkgd_pre_int=average_bkgds(bkgds)
 	
+	return bkgd_slice,bkgd_ext,bkgd_int, bkgd_pre_slice,bkgd_pre_ext,bkgd_pre_int, bkgds
+
+#-------------------------------------------------------------------------------------------------------------------------------------
+#Analyzes a single bkgd object
+
+def analyze_bkgd(curr_bkgd,debug_opt):
 	
-		
+	#Frame source for this bkgd, bkgd and mask folder are often the same
+	frames=frame_source()
 	
-	for j in range(shape(bkgds)[0]):
-		
-		#Get current bkgd folder
-		curr_bkgd=bkgds[j]
-		print "Analyzing", curr_bkgd.name
-		#Get sorted file list
-		fn_bkgd_files=get_sorted_folder_list(curr_bkgd.fn_bkgdfolder,curr_bkgd.data_ft)
-		
-		#If folder string ends without /, add /
-		if curr_bkgd.fn_bkgdfolder[-1]=="/":
-			pass
-		else:
-			curr_bkgd.fn_bkgdfolder=curr_bkgd.fn_bkgdfolder+"/"
+	print "Analyzing", curr_bkgd.name
+	#Get sorted file list
+	fn_bkgd_files=get_sorted_folder_list(curr_bkgd.fn_bkgdfolder,curr_bkgd.data_ft)
+	
+	#If folder string ends without /, add /
+	if curr_bkgd.fn_bkgdfolder[-1]=="/":
+		pass
+	else:
+		curr_bkgd.fn_bkgdfolder=curr_bkgd.fn_bkgdfolder+"/"
+	
+	#Some empty vectors to keep track of bkgd intensity in each time step
+	bkgds_val_slice=[]
+	bkgds_val_ext=[]
+	bkgds_val_int=[]
+	
+	#Get embryo mask
+	curr_bkgd.masks_embryo=[]
+	for i in range(shape(fn_bkgd_files)[0]):
+		mask_embryo=get_embryo_mask(curr_bkgd.radiuses_embr_px[i],curr_bkgd.centers_embr_px[i],curr_bkgd.res_px,0)
+		curr_bkgd.masks_embryo.append(mask_embryo)
+	
+	#Create Masks using Otsu algorithm
+	masks_ext,masks_int=get_ext_mask(curr_bkgd.fn_maskfolder,curr_bkgd.data_ft,curr_bkgd.thresh_meth,curr_bkgd.masks_embryo,curr_bkgd.thresh_masked,curr_bkgd.threshs,0,frames=frames)
+	
+	#Save packed masks to bkgd object
+	curr_bkgd.masks_ext=pack_masks(masks_ext)
+	curr_bkgd.masks_int=pack_masks(masks_int)
+	
+	#Create empty frame store to save image values to current bkgd
+	curr_bkgd.bkgd_vals_slice=frame_store()
+	
+	#Loop through all bkgd images and compute bkgd concentration
+	for i in range(shape(fn_bkgd_files)[0]):
 		
-		#Some empty vectors to keep track of bkgd intensity in each time step
-		bkgds_val_slice=[]
-		bkgds_val_ext=[]
-		bkgds_val_int=[]
+		#Load current image file as color image
+		fn_load=curr_bkgd.fn_bkgdfolder+fn_bkgd_files[i]
 		
-		#Get embryo mask
-		curr_bkgd.masks_embryo=[]
-		for i in range(shape(fn_bkgd_files)[0]):
-			mask_embryo=get_embryo_mask(curr_bkgd.radiuses_embr_px[i],curr_bkgd.centers_embr_px[i],curr_bkgd.res_px,0)
-			curr_bkgd.masks_embryo.append(mask_embryo)
+		bkgd_img = frames.load(fn_load).astype(curr_bkgd.data_enc)
+		bkgd_vals=bkgd_img.real
 		
-		#Create Masks using Otsu algorithm
-		masks_ext,masks_int=get_ext_mask(curr_bkgd.fn_maskfolder,curr_bkgd.data_ft,curr_bkgd.thresh_meth,curr_bkgd.masks_embryo,curr_bkgd.thresh_masked,curr_bkgd.threshs,0)
+		mask_embryo=curr_bkgd.masks_embryo[i]
 		
-		#Save masks to bkgd object
-		curr_bkgd.masks_ext=masks_ext
-		curr_bkgd.masks_int=masks_int
+		if debug_opt==1:
 		
-		#Create empty vector to save image values to current bkgd
-		curr_bkgd.bkgd_vals_slice=[]
+			fig=plt.figure()
+			fig.show()
+			ax=fig.add_subplot(131)
+			ax.contourf(bkgd_vals)
+			ax=fig.add_subplot(132)
+			ax.contourf(mask_embryo)
+			ax=fig.add_subplot(133)
+			ax.contourf(bkgd_vals*mask_embryo)
+			plt.draw()
+			raw_input()
+			
+		curr_bkgd.bkgd_vals_slice.append(bkgd_vals,mask_embryo)
 		
-		#Create empty vector to save embryo masks to current bkgd
-		curr_bkgd.masks_embryo=[]
+		#Computing background in slice
+		labels=get_label_img(mask_embryo,masks_ext[i],masks_int[i])
+		bkgd_slice,bkgd_ext,bkgd_int=region_averages(bkgd_vals,labels,mask_embryo)
 		
-		#Loop through all bkgd images and compute bkgd concentration
-		for i in range(shape(fn_bkgd_files)[0]):
-			
-			#Load current image file as color image
-			fn_load=curr_bkgd.fn_bkgdfolder+fn_bkgd_files[i]
-			
-			bkgd_img = mpimg.imread(fn_load).astype(curr_bkgd.data_enc)
-			bkgd_vals=bkgd_img.real
-			bkgd_vals=bkgd_vals.astype('float')
-			
-			#Multiplying with embryo mask
-			bkgd_vals_slice=mask_embryo*bkgd_vals
-			bkgd_vals_ext=mask_embryo*masks_ext[i]*bkgd_vals
-			bkgd_vals_int=mask_embryo*masks_int[i]*bkgd_vals
-			
-			if debug_opt==1:
-			
-				fig=plt.figure()
-				fig.show()
-				ax=fig.add_subplot(131)
-				ax.contourf(bkgd_vals)
-				ax=fig.add_subplot(132)
-				ax.contourf(mask_embryo)
-				ax=fig.add_subplot(133)
-				ax.contourf(bkgd_vals_slice)
-				plt.draw()
-				raw_input()
-				
-			curr_bkgd.bkgd_vals_slice.append(bkgd_vals_slice)
-			
-			#Computing background in slice
-			bkgd_slice=sum(bkgd_vals_slice)/sum(mask_embryo)
-			bkgd_ext=sum(bkgd_vals_ext)/sum(mask_embryo*masks_ext[i])
-			bkgd_int=sum(bkgd_vals_int)/sum(mask_embryo*masks_int[i])
-			
-			#Appending new bkgd	
-			bkgds_val_slice.append(bkgd_slice)
-			bkgds_val_ext.append(bkgd_ext)
-			bkgds_val_int.append(bkgd_int)
-			
-			print "Analyzed ", fn_bkgd_files[i]
-			
-		#Averaging over all bkgds_val
-		bkgds_val_slice_temp.append(float(sum(bkgds_val_slice))/float(shape(bkgds_val_slice)[0]))
-		bkgds_val_ext_temp.append(float(sum(bkgds_val_ext))/float(shape(bkgds_val_ext)[0]))
-		bkgds_val_int_temp.append(float(sum(bkgds_val_int))/float(shape(bkgds_val_int)[0]))
+		#Appending new bkgd	
+		bkgds_val_slice.append(bkgd_slice)
+		bkgds_val_ext.append(bkgd_ext)
+		bkgds_val_int.append(bkgd_int)
 		
-		curr_bkgd.bkgd_slice_av=bkgds_val_slice_temp[j]
-		curr_bkgd.bkgd_ext_av=bkgds_val_ext_temp[j]
-		curr_bkgd.bkgd_int_av=bkgds_val_int_temp[j]
+		print "Analyzed ", fn_bkgd_files[i]
 		
-		curr_bkgd.bkgd_slice_vec=bkgds_val_slice
-		curr_bkgd.bkgd_ext_vec=bkgds_val_ext
-		curr_bkgd.bkgd_int_vec=bkgds_val_int
+	#Free decoded images
+	frames.clear()
+	
+	#Keep embryo masks packed
+	curr_bkgd.masks_embryo=pack_masks(curr_bkgd.masks_embryo)
+	
+	#Averaging over all bkgds_val
+	curr_bkgd.bkgd_slice_av=float(sum(bkgds_val_slice))/float(shape(bkgds_val_slice)[0])
+	curr_bkgd.bkgd_ext_av=float(sum(bkgds_val_ext))/float(shape(bkgds_val_ext)[0])
+	curr_bkgd.bkgd_int_av=float(sum(bkgds_val_int))/float(shape(bkgds_val_int)[0])
+	
+	curr_bkgd.bkgd_slice_vec=bkgds_val_slice
+	curr_bkgd.bkgd_ext_vec=bkgds_val_ext
+	curr_bkgd.bkgd_int_vec=bkgds_val_int
+	
+	#Getting pre image
+	curr_bkgd.pre=get_pre(curr_bkgd.pre,0)
+	
+	print "Analyzed background dataset:", curr_bkgd.name
+	
+	return curr_bkgd
+
+#-------------------------------------------------------------------------------------------------------------------------------------
+#Averages bkgd values over all analyzed bkgd objects
+
+def average_bkgds(bkgds):
+	
+	bkgds_val_slice_temp=[]
+	bkgds_val_ext_temp=[]
+	bkgds_val_int_temp=[]
+	
+	bkgds_pre_ext=[]
+	bkgds_pre_int=[]
+	bkgds_pre_slice=[]
+	
+	for curr_bkgd in bkgds:
 		
-		#Getting pre image
-		curr_bkgd.pre=get_pre(curr_bkgd.pre,0)
+		bkgds_val_slice_temp.append(curr_bkgd.bkgd_slice_av)
+		bkgds_val_ext_temp.append(curr_bkgd.bkgd_ext_av)
+		bkgds_val_int_temp.append(curr_bkgd.bkgd_int_av)
 		
 		bkgds_pre_slice.append(curr_bkgd.pre.pre_slice)
 		bkgds_pre_ext.append(curr_bkgd.pre.pre_ext)
 		bkgds_pre_int.append(curr_bkgd.pre.pre_int)
-		
-		print "Analyzed background dataset:", curr_bkgd.name
 	
 	#Averaging over all bkgds_val_temp
 	bkgd_slice=float(sum(bkgds_val_slice_temp))/float(shape(bkgds_val_slice_temp)[0])
@@ -536,7 +1160,7 @@ def get_bkgd(bkgds,debug_opt):
 	bkgd_pre_ext=float(sum(bkgds_pre_ext))/float(shape(bkgds_pre_ext)[0])
 	bkgd_pre_int=float(sum(bkgds_pre_int))/float(shape(bkgds_pre_int)[0])
 	
-	return bkgd_slice,bkgd_ext,bkgd_int, bkgd_pre_slice,bkgd_pre_ext,bkgd_pre_int, bkgds
+	return bkgd_slice,bkgd_ext,bkgd_int, bkgd_pre_slice,bkgd_pre_ext,bkgd_pre_int
 
 #-------------------------------------------------------------------------------------------------------------------------------------
 #Takes folder where pre images are stored and computes background concentration of pre images
@@ -558,6 +1182,9 @@ def get_pre(pre,debug_opt):
 	pres_ext=[]
 	pres_int=[]
 	
+	#Frame source for pre, pre and mask folder are often the same
+	frames=frame_source()
+	
 	#Creating pre mask
 	pre.masks_embryo=[]
 	mask_embryo=get_embryo_mask(pre.radius_embr_px,pre.center_embr_px,pre.res_px,0)
@@ -565,12 +1192,13 @@ def get_pre(pre,debug_opt):
 	
 	#Get extracellular/intracellular mask
 	if hasattr(pre,'bkgd'):
-		masks_ext,masks_int=get_ext_mask(pre.fn_maskfolder,pre.data_ft,pre.bkgd.thresh_meth,pre.masks_embryo,pre.bkgd.thresh_masked,pre.bkgd.threshs,0)
+		masks_ext,masks_int=get_ext_mask(pre.fn_maskfolder,pre.data_ft,pre.bkgd.thresh_meth,pre.masks_embryo,pre.bkgd.thresh_masked,pre.bkgd.threshs,0,frames=frames)
 	else:
-		masks_ext,masks_int=get_ext_mask(pre.fn_maskfolder,pre.data_ft,pre.embryo.thresh_meth,pre.masks_embryo,pre.embryo.thresh_masked,pre.embryo.threshs,0)
+		masks_ext,masks_int=get_ext_mask(pre.fn_maskfolder,pre.data_ft,pre.embryo.thresh_meth,pre.masks_embryo,pre.embryo.thresh_masked,pre.embryo.threshs,0,frames=frames)
 	
-	pre.masks_ext=masks_ext
-	pre.masks_int=masks_int
+	pre.masks_embryo=pack_masks(pre.masks_embryo)
+	pre.masks_ext=pack_masks(masks_ext)
+	pre.masks_int=pack_masks(masks_int)
 	
 	
 	#Check if folder is empty
@@ -588,19 +1216,16 @@ def get_pre(pre,debug_opt):
 		fn_load=pre.fn_datafolder+fn_pre_files[i]
 		
 	
-		pre_img = mpimg.imread(fn_load).astype(pre.data_enc)
+		pre_img = frames.load(fn_load).astype(pre.data_enc)
 		pre_vals=pre_img.real
-		pre_vals=pre_vals
-		
-		#Multiplying with pre mask
-		pre_vals_slice=mask_embryo*pre_vals
-		pre_vals_ext=mask_embryo*masks_ext[i]*pre_vals
-		pre_vals_int=mask_embryo*masks_int[i]*pre_vals
 		
 		#Computing background in slice
-		pres_slice.append(float(sum(pre_vals_slice))/float(sum(mask_embryo)))
-		pres_ext.append(float(sum(pre_vals_ext))/float(sum(mask_embryo*masks_ext[i])))
-		pres_int.append(float(sum(pre_vals_int))/float(sum(mask_embryo*masks_int[i])))
+		labels=get_label_img(mask_embryo,masks_ext[i],masks_int[i])
+		pre_slice,pre_ext,pre_int=region_averages(pre_vals,labels,mask_embryo)
+		
+		pres_slice.append(pre_slice)
+		pres_ext.append(pre_ext)
+		pres_int.append(pre_int)
 	
 	#Averaging over all pre
 	pre_slice=float(sum(pres_slice))/float(shape(pres_slice)[0])
@@ -613,27 +1238,88 @@ def get_pre(pre,debug_opt):
 	
 	return pre
 		
+#-------------------------------------------------------------------------------------------------------------------------------------
+#Encodes region membership of every pixel in one small integer image: 
+#label_out outside of embryo, label_ext/label_int in the extracellular/intracellular part of the embryo.
+
+def get_label_img(mask_embryo,mask_ext,mask_int):
+	
+	labels=zeros(shape(mask_embryo),dtype=uint8)
+	labels[asarray(mask_ext)>0]=label_ext
+	labels[asarray(mask_int)>0]=label_int
+	labels[asarray(mask_embryo)==0]=label_out
+	
+	return labels
+
+#-------------------------------------------------------------------------------------------------------------------------------------
+#Computes sums and pixel counts of all regions in a label image in a single pass. 
+#If weights are given (e.g. embryo mask with fill value), pixels are weighted accordingly.
+
+def region_stats(data,labels,weights=None,data_weighted=None):
+	
+	labels=labels.ravel()
+	nlabels=max(label_ext,label_int)+1
+	
+	if weights is None:
+		sums=bincount(labels,weights=asarray(data,dtype=float).ravel(),minlength=nlabels)
+		counts=bincount(labels,minlength=nlabels).astype(float)
+	else:
+		if data_weighted is None:
+			data_weighted=data*weights
+		sums=bincount(labels,weights=asarray(data_weighted,dtype=float).ravel(),minlength=nlabels)
+		counts=bincount(labels,weights=asarray(weights,dtype=float).ravel(),minlength=nlabels)
+	
+	return sums,counts
+
+#-------------------------------------------------------------------------------------------------------------------------------------
+#Returns average over slice, extracellular and intracellular region, weighted by embryo mask.
+
+def region_averages(data,labels,mask_embryo,data_weighted=None):
+	
+	#Only need to weight if embryo mask is filled with something else than 0 outside
+	if is_binary_mask(mask_embryo):
+		sums,counts=region_stats(data,labels)
+	else:
+		sums,counts=region_stats(data,labels,weights=mask_embryo,data_weighted=data_weighted)
+	
+	#Slice is union of extracellular and intracellular region
+	slice_sum=sums[label_ext]+sums[label_int]
+	slice_count=counts[label_ext]+counts[label_int]
+	
+	slice_av=float(slice_sum)/float(slice_count)
+	ext_av=float(sums[label_ext])/float(counts[label_ext])
+	int_av=float(sums[label_int])/float(counts[label_int])
+	
+	return slice_av,ext_av,int_av
+
+def is_binary_mask(mask):
+	return ((mask==0)|(mask==1)).all()
+
 #-------------------------------------------------------------------------------------------------------------------------------------
 #Takes radius and resolution and returns mask of embryo
 		
 def get_embryo_mask(radius,center,res,debug_opt,fill=0):
 	
-	
-	
 	#Converting res to int if not already
 	res=int(res)
 	
-	mask_embryo=zeros((res,res))
+	#Look up mask in cache, otherwise build it and remember it
+	key=embryo_mask_key(radius,center,res,fill)
 	
-	#Going through res*res and see what's within embryo boundaries
-	for i in range(res):
-		for j in range(res):
-			if sqrt((i-center[0])**2 + (j-center[1])**2) < radius:
-				mask_embryo[i,j]=1
-			else:
-				mask_embryo[i,j]=fill
-				
-	mask_embryo=mask_embryo.T
+	if key in embryo_mask_cache:
+		mask_embryo=embryo_mask_cache.pop(key)
+	else:
+		mask_embryo=make_embryo_mask(radius,center,res,fill=fill)
+		
+		#Cached masks are shared between frames, so make sure nobody writes into them
+		mask_embryo.flags.writeable=False
+		
+		#Throw out least recently used mask if cache is full
+		if len(embryo_mask_cache)>=embryo_mask_cache_size:
+			embryo_mask_cache.popitem(last=False)
+	
+	#(Re)insert mask as most recently used
+	embryo_mask_cache[key]=mask_embryo
 	
 	#Debugging plot of embryo mask
 	if debug_opt==1:
@@ -648,10 +1334,49 @@ def get_embryo_mask(radius,center,res,debug_opt,fill=0):
 	
 	return mask_embryo
 
+#-------------------------------------------------------------------------------------------------------------------------------------
+#Builds embryo mask on a broadcasted grid. Pixel (x,y) is inside the embryo if its distance to center is smaller than radius.
+#Note: x is compared to center[0] and y to center[1], mask is indexed as mask[y,x].
+
+def make_embryo_mask(radius,center,res,fill=0):
+	
+	res=int(res)
+	
+	#Row (y) and column (x) coordinates as broadcastable vectors
+	y,x=ogrid[0:res,0:res]
+	
+	inside=sqrt((x-center[0])**2+(y-center[1])**2)<radius
+	
+	mask_embryo=where(inside,1.,float(fill))
+	
+	return mask_embryo
+
+#-------------------------------------------------------------------------------------------------------------------------------------
+#Cache key for embryo masks
+
+def embryo_mask_key(radius,center,res,fill):
+	#Note: nan!=nan, so use string for nan fill
+	if isnan(fill):
+		fill="nan"
+	else:
+		fill=float(fill)
+	
+	return (float(radius),float(center[0]),float(center[1]),int(res),fill)
+
+#-------------------------------------------------------------------------------------------------------------------------------------
+#Empty embryo mask cache
+
+def clear_embryo_mask_cache():
+	embryo_mask_cache.clear()
+
 #-------------------------------------------------------------------------------------------------------------------------------------
 #Generate noise img dataset
 
-def get_noise(noise,debug_opt):
+def get_noise(noise,debug_opt,frames=None):
+	
+	#If no frame source is given, use one just for this function
+	if frames==None:
+		frames=frame_source()
 	
 	if noise.mode=="seperate":
 	
@@ -662,7 +1387,7 @@ def get_noise(noise,debug_opt):
 		for i in range(shape(fn_noise_files)[0]):
 			
 			fn_load=noise.fn_datafolder+fn_noise_files[i]
-			noise_vals = mpimg.imread(fn_load).astype(noise.data_enc)
+			noise_vals = frames.load(fn_load).astype(noise.data_enc)
 			
 			curr_mean=mean(noise_vals)
 			mean_sum=mean_sum+curr_mean
@@ -678,14 +1403,24 @@ def get_noise(noise,debug_opt):
 		
 		fn_data_files=get_sorted_folder_list(noise.embryo.fn_datafolder,noise.embryo.data_ft)
 		
+		#Use images kept by analysis if available, otherwise load them
+		stored=isinstance(noise.embryo.vals_slice,frame_store) and len(noise.embryo.vals_slice)>0
+		if stored:
+			nframes=len(noise.embryo.vals_slice)
+		else:
+			nframes=shape(fn_data_files)[0]
+		
 		out_av=[]
 		
 		#Looping trough all data images
-		for i in range(shape(fn_data_files)[0]):
+		for i in range(nframes):
 		
 			#Load current data img
-			fn_load=noise.embryo.fn_datafolder+fn_data_files[i]
-			data_img = mpimg.imread(fn_load).astype(noise.embryo.data_enc)
+			if stored:
+				data_img = noise.embryo.vals_slice.imgs[i]
+			else:
+				fn_load=noise.embryo.fn_datafolder+fn_data_files[i]
+				data_img = frames.load(fn_load).astype(noise.embryo.data_enc)
 			data_vals=data_img.real
 			data_vals=data_vals.astype('float')
 			
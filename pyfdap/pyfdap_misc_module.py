@@ -41,6 +41,7 @@
 #13) write_csv_molecule: Write molecule object properties into csv file
 #14) write_csv_timeseries: Write a list of time series into csv file
 #15) adjust_folderpaths: Adjust folder paths in object if root folder is different
+#16) write_csv_bootstrap: Write bootstrap confidence intervals of all fits of molecule into csv file
 
 
 #=====================================================================================================================================
@@ -348,6 +349,29 @@ def write_csv_timeseries(fn_save,ts_list,ts_names):
 		wfile.writerow(ts_list[i])
 		
 	print "Done writing ", ts_names, "into", fn_save		
+
+def write_csv_bootstrap(fn_save,molecule):
+	
+	wfile=csv.writer(open(fn_save,'wb'), delimiter=';')
+	
+	wfile.writerow(["embryo","fit","model","k","k_lower","k_upper","halflife_min","halflife_min_lower","halflife_min_upper",
+		"halflife_s","halflife_s_lower","halflife_s_upper","c0","c0_lower","c0_upper","y0","y0_lower","y0_upper","nboot"])
+	
+	for embryo in molecule.embryos:
+		for fit in embryo.fits:
+			
+			#Fits without bootstrap (or from older molecule files) get empty bounds
+			row=[embryo.name,fit.name,fit.model]
+			for val,prop in [[fit.k_opt,"k_ci"],[fit.halflife_min,"halflife_min_ci"],[fit.halflife_s,"halflife_s_ci"],[fit.cnaught_opt,"cnaught_ci"],[fit.ynaught_opt,"ynaught_ci"]]:
+				ci=getattr(fit,prop,None)
+				if ci==None:
+					row=row+[val,"",""]
+				else:
+					row=row+[val,ci[0],ci[1]]
+			row.append(getattr(fit,"nboot",0))
+			wfile.writerow(row)
+	
+	print "Done writing bootstrap intervals of", molecule.name, "into", fn_save	
 		
 def print_mem_usage(obj):
 		
@@ -43,8 +43,9 @@
 #16) fitting_thread: QThread for fitting of single fit
 #17) fitting_all_thread: QThread for Fitting all three data series
 #18) fitting_mol_thread: QThread for fitting of complete molecule
-#19) select_fits: Dialog to select fits out of list of fits
-#20) select_ignored_frames: Dialog to select frames to be ignored for fitting
+#19) bootstrap_thread: QThread for bootstrap confidence intervals of complete molecule
+#20) select_fits: Dialog to select fits out of list of fits
+#21) select_ignored_frames: Dialog to select frames to be ignored for fitting
 
 #=====================================================================================================================================
 #Importing necessary modules
@@ -2323,7 +2324,12 @@ class fit_dialog(QtGui.QDialog):
 		self.lbl_opt_meth = QtGui.QLabel("opt_meth:", self)
 		self.lbl_opt_tol = QtGui.QLabel("opt_tol", self)
 		self.lbl_maxfun = QtGui.QLabel("maxfun:", self)
+		self.lbl_nstarts = QtGui.QLabel("nstarts:", self)
+		self.lbl_max_time = QtGui.QLabel("max_time (s):", self)
+		self.lbl_max_fcalls = QtGui.QLabel("max_fcalls:", self)
 		self.lbl_save_track = QtGui.QLabel("save_track:", self)
+		self.lbl_track_maxlen = QtGui.QLabel("track_maxlen:", self)
+		self.lbl_track_every = QtGui.QLabel("track_every:", self)
 		self.lbl_debug_fit = QtGui.QLabel("debug_fit:", self)
 		
 		self.lbl_x0_k = QtGui.QLabel("x0_k:", self)
@@ -2359,6 +2365,9 @@ class fit_dialog(QtGui.QDialog):
 		self.combo_meth.addItem("brute")
 		self.combo_meth.addItem("BFGS")
 		self.combo_meth.addItem("CG")
+		self.combo_meth.addItem("VarPro")
+		self.combo_meth.addItem("least_squares")
+		self.combo_meth.addItem("batch_lm")
 		self.combo_meth.activated[str].connect(self.sel_meth)   
 		
 		self.combo_x0_c0 = QtGui.QComboBox(self)
@@ -2388,8 +2397,9 @@ class fit_dialog(QtGui.QDialog):
 		self.combo_LB_y0.activated[str].connect(self.sel_LB_y0) 
 		
 		self.combo_model = QtGui.QComboBox(self)
-		self.combo_model.addItem("exp")
-		self.combo_model.addItem("power")
+		for model in pyfdap_fit.decay_models.keys():
+			self.combo_model.addItem(model)
+		self.combo_model.setCurrentIndex(max(self.combo_model.findText(self.fit.model),0))
 		self.combo_model.activated[str].connect(self.sel_model) 
 		
 		#-------------------------------------------------------------------------------------------------------------------
@@ -2476,6 +2486,15 @@ class fit_dialog(QtGui.QDialog):
 		self.qle_name = QtGui.QLineEdit(self.fit.name)
 		self.qle_opt_tol = QtGui.QLineEdit(str(self.fit.opt_tol))
 		self.qle_maxfun = QtGui.QLineEdit(str(self.fit.maxfun))
+		self.qle_nstarts = QtGui.QLineEdit(str(getattr(self.fit,"nstarts",1)))
+		self.qle_max_time = QtGui.QLineEdit("")
+		if getattr(self.fit,"max_time",None)!=None:
+			self.qle_max_time.setText(str(self.fit.max_time))
+		self.qle_max_fcalls = QtGui.QLineEdit("")
+		if getattr(self.fit,"max_fcalls",None)!=None:
+			self.qle_max_fcalls.setText(str(self.fit.max_fcalls))
+		self.qle_track_maxlen = QtGui.QLineEdit(str(getattr(self.fit,"track_maxlen",1000)))
+		self.qle_track_every = QtGui.QLineEdit(str(getattr(self.fit,"track_every",1)))
 		
 		self.qle_x0_k = QtGui.QLineEdit(str(self.fit.x0[0]))
 		self.qle_x0_c0 = QtGui.QLineEdit(str(self.fit.x0[1]))
@@ -2529,10 +2548,20 @@ class fit_dialog(QtGui.QDialog):
 		
 		self.int_valid=QtGui.QIntValidator()
 		self.qle_npower.setValidator(self.int_valid)
+		self.qle_nstarts.setValidator(QtGui.QIntValidator(1,10000,self))
+		self.qle_max_time.setValidator(QtGui.QDoubleValidator(0.,1e9,3,self))
+		self.qle_max_fcalls.setValidator(QtGui.QIntValidator(1,1000000000,self))
+		self.qle_track_maxlen.setValidator(QtGui.QIntValidator(1,1000000000,self))
+		self.qle_track_every.setValidator(QtGui.QIntValidator(1,1000000000,self))
 		
 		self.qle_name.textChanged[str].connect(self.set_name)
 		self.qle_opt_tol.textChanged[str].connect(self.set_opt_tol)
 		self.qle_maxfun.textChanged[str].connect(self.set_maxfun)
+		self.qle_nstarts.textChanged[str].connect(self.set_nstarts)
+		self.qle_max_time.textChanged[str].connect(self.set_max_time)
+		self.qle_max_fcalls.textChanged[str].connect(self.set_max_fcalls)
+		self.qle_track_maxlen.textChanged[str].connect(self.set_track_maxlen)
+		self.qle_track_every.textChanged[str].connect(self.set_track_every)
 		
 		self.qle_x0_k.textChanged[str].connect(self.set_x0_k)
 		self.qle_x0_c0.textChanged[str].connect(self.set_x0_c0)
@@ -2569,6 +2598,11 @@ class fit_dialog(QtGui.QDialog):
 		grid.addWidget(self.lbl_maxfun,4,1)
 		grid.addWidget(self.lbl_debug_fit,5,1)
 		grid.addWidget(self.lbl_save_track,6,1)
+		grid.addWidget(self.lbl_nstarts,7,1)
+		grid.addWidget(self.lbl_max_time,8,1)
+		grid.addWidget(self.lbl_max_fcalls,9,1)
+		grid.addWidget(self.lbl_track_maxlen,10,1)
+		grid.addWidget(self.lbl_track_every,11,1)
 		
 		grid.addWidget(self.qle_name,1,2)
 		grid.addWidget(self.combo_meth,2,2)
@@ -2576,6 +2610,11 @@ class fit_dialog(QtGui.QDialog):
 		grid.addWidget(self.qle_maxfun,4,2)
 		grid.addWidget(self.cb_debug_fit,5,2)
 		grid.addWidget(self.cb_save_track,6,2)
+		grid.addWidget(self.qle_nstarts,7,2)
+		grid.addWidget(self.qle_max_time,8,2)
+		grid.addWidget(self.qle_max_fcalls,9,2)
+		grid.addWidget(self.qle_track_maxlen,10,2)
+		grid.addWidget(self.qle_track_every,11,2)
 		
 		grid.addWidget(self.lbl_model,1,3)
 		grid.addWidget(self.lbl_npower,2,3)
@@ -2638,7 +2677,7 @@ class fit_dialog(QtGui.QDialog):
 		grid.setColumnStretch(0,1)
 		grid.setColumnStretch(12,1)
 	
-		grid.setRowStretch(9,1)
+		grid.setRowStretch(12,1)
 		
 		self.setLayout(grid)    
 		self.setWindowTitle('Edit Fit')    
@@ -2653,6 +2692,30 @@ class fit_dialog(QtGui.QDialog):
 		
 	def set_maxfun(self,text):
 		self.fit.maxfun=int(str(text))
+	
+	def set_nstarts(self,text):
+		if str(text)!="":
+			self.fit.nstarts=max(int(str(text)),1)
+	
+	def set_max_time(self,text):
+		if str(text)=="":
+			self.fit.max_time=None
+		else:
+			self.fit.max_time=float(str(text))
+	
+	def set_max_fcalls(self,text):
+		if str(text)=="":
+			self.fit.max_fcalls=None
+		else:
+			self.fit.max_fcalls=int(str(text))
+	
+	def set_track_maxlen(self,text):
+		if str(text)!="":
+			self.fit.track_maxlen=max(int(str(text)),1)
+	
+	def set_track_every(self,text):
+		if str(text)!="":
+			self.fit.track_every=max(int(str(text)),1)
 		
 	def set_x0_k(self,text):
 		self.fit.x0[0]=float(str(text))
@@ -2687,6 +2750,7 @@ class fit_dialog(QtGui.QDialog):
 		
 	def sel_model(self,text):
 		self.fit.model=str(text)
+		pyfdap_fit.check_model_parms(self.fit,pyfdap_fit.decay_models[self.fit.model])
 		self.power_vis()
 			
 	def set_npower(self,text):
@@ -2702,7 +2766,7 @@ class fit_dialog(QtGui.QDialog):
 		self.cb_bound_LB_y0.setCheckState(QtCore.Qt.Checked)
 	
 	def power_vis(self):
-		if self.fit.model=="power":
+		if "npower" in pyfdap_fit.decay_models[self.fit.model].shape_parms:
 			self.qle_npower.setVisible(True)
 			self.lbl_npower.setVisible(True)
 		else: 	
@@ -2715,7 +2779,7 @@ class fit_dialog(QtGui.QDialog):
 	
 	def update_bounds_after_meth(self,text):
 	
-		if text not in ["Constrained Nelder-Mead","TNC","L-BFGS-B","SLSQP","brute"]:
+		if text not in ["Constrained Nelder-Mead","TNC","L-BFGS-B","SLSQP","brute","VarPro","least_squares","batch_lm"]:
 			
 			self.temp_LB_k=self.fit.LB_k
 			self.temp_UB_k=self.fit.UB_k
@@ -2975,6 +3039,9 @@ class fit_dialog(QtGui.QDialog):
 		
 	def check_save_track(self, value):
 		self.fit.save_track=int(value/2)	
+		#Drop track when not saving it anymore
+		if self.fit.save_track==0:
+			self.fit.track_parms=None
 	
 	def check_bound_LB_k(self,value):
 		
@@ -3087,7 +3154,12 @@ class mult_fit_dialog(QtGui.QDialog):
 		self.lbl_opt_meth = QtGui.QLabel("opt_meth:", self)
 		self.lbl_opt_tol = QtGui.QLabel("opt_tol", self)
 		self.lbl_maxfun = QtGui.QLabel("maxfun:", self)
+		self.lbl_nstarts = QtGui.QLabel("nstarts:", self)
+		self.lbl_max_time = QtGui.QLabel("max_time (s):", self)
+		self.lbl_max_fcalls = QtGui.QLabel("max_fcalls:", self)
 		self.lbl_save_track = QtGui.QLabel("save_track:", self)
+		self.lbl_track_maxlen = QtGui.QLabel("track_maxlen:", self)
+		self.lbl_track_every = QtGui.QLabel("track_every:", self)
 		self.lbl_debug_fit = QtGui.QLabel("debug_fit:", self)
 		
 		self.lbl_x0_k = QtGui.QLabel("x0_k:", self)
@@ -3120,6 +3192,9 @@ class mult_fit_dialog(QtGui.QDialog):
 		self.combo_meth.addItem("COBYLA")
 		self.combo_meth.addItem("BFGS")
 		self.combo_meth.addItem("CG")
+		self.combo_meth.addItem("VarPro")
+		self.combo_meth.addItem("least_squares")
+		self.combo_meth.addItem("batch_lm")
 		self.combo_meth.activated[str].connect(self.sel_meth)   
 		
 		self.combo_x0_c0 = QtGui.QComboBox(self)
@@ -3231,6 +3306,20 @@ class mult_fit_dialog(QtGui.QDialog):
 		
 		self.qle_opt_tol = QtGui.QLineEdit(str(self.sel_fits[0].opt_tol))
 		self.qle_maxfun = QtGui.QLineEdit(str(self.sel_fits[0].maxfun))
+		self.qle_nstarts = QtGui.QLineEdit(str(getattr(self.sel_fits[0],"nstarts",1)))
+		self.qle_nstarts.setValidator(QtGui.QIntValidator(1,10000,self))
+		self.qle_max_time = QtGui.QLineEdit("")
+		if getattr(self.sel_fits[0],"max_time",None)!=None:
+			self.qle_max_time.setText(str(self.sel_fits[0].max_time))
+		self.qle_max_time.setValidator(QtGui.QDoubleValidator(0.,1e9,3,self))
+		self.qle_max_fcalls = QtGui.QLineEdit("")
+		if getattr(self.sel_fits[0],"max_fcalls",None)!=None:
+			self.qle_max_fcalls.setText(str(self.sel_fits[0].max_fcalls))
+		self.qle_max_fcalls.setValidator(QtGui.QIntValidator(1,1000000000,self))
+		self.qle_track_maxlen = QtGui.QLineEdit(str(getattr(self.sel_fits[0],"track_maxlen",1000)))
+		self.qle_track_maxlen.setValidator(QtGui.QIntValidator(1,1000000000,self))
+		self.qle_track_every = QtGui.QLineEdit(str(getattr(self.sel_fits[0],"track_every",1)))
+		self.qle_track_every.setValidator(QtGui.QIntValidator(1,1000000000,self))
 		
 		self.qle_x0_k = QtGui.QLineEdit("")
 		self.qle_x0_c0 = QtGui.QLineEdit("")
@@ -3282,6 +3371,11 @@ class mult_fit_dialog(QtGui.QDialog):
 		
 		self.qle_opt_tol.textChanged[str].connect(self.set_opt_tol)
 		self.qle_maxfun.textChanged[str].connect(self.set_maxfun)
+		self.qle_nstarts.textChanged[str].connect(self.set_nstarts)
+		self.qle_max_time.textChanged[str].connect(self.set_max_time)
+		self.qle_max_fcalls.textChanged[str].connect(self.set_max_fcalls)
+		self.qle_track_maxlen.textChanged[str].connect(self.set_track_maxlen)
+		self.qle_track_every.textChanged[str].connect(self.set_track_every)
 		
 		self.qle_x0_k.textChanged[str].connect(self.set_x0_k)
 		self.qle_x0_c0.textChanged[str].connect(self.set_x0_c0)
@@ -3313,12 +3407,22 @@ class mult_fit_dialog(QtGui.QDialog):
 		grid.addWidget(self.lbl_maxfun,4,1)
 		grid.addWidget(self.lbl_debug_fit,5,1)
 		grid.addWidget(self.lbl_save_track,6,1)
+		grid.addWidget(self.lbl_nstarts,7,1)
+		grid.addWidget(self.lbl_max_time,8,1)
+		grid.addWidget(self.lbl_max_fcalls,9,1)
+		grid.addWidget(self.lbl_track_maxlen,10,1)
+		grid.addWidget(self.lbl_track_every,11,1)
 		
 		grid.addWidget(self.combo_meth,2,2)
 		grid.addWidget(self.qle_opt_tol,3,2)
 		grid.addWidget(self.qle_maxfun,4,2)
 		grid.addWidget(self.cb_debug_fit,5,2)
 		grid.addWidget(self.cb_save_track,6,2)
+		grid.addWidget(self.qle_nstarts,7,2)
+		grid.addWidget(self.qle_max_time,8,2)
+		grid.addWidget(self.qle_max_fcalls,9,2)
+		grid.addWidget(self.qle_track_maxlen,10,2)
+		grid.addWidget(self.qle_track_every,11,2)
 		
 		grid.addWidget(self.lbl_x0_k,1,3)
 		grid.addWidget(self.lbl_x0_c0,2,3)
@@ -3375,7 +3479,7 @@ class mult_fit_dialog(QtGui.QDialog):
 		grid.setColumnStretch(0,1)
 		grid.setColumnStretch(12,1)
 	
-		grid.setRowStretch(9,1)
+		grid.setRowStretch(12,1)
 		
 		self.setLayout(grid)    
 		self.setWindowTitle('Edit multiple Fits')    
@@ -3388,6 +3492,35 @@ class mult_fit_dialog(QtGui.QDialog):
 	def set_maxfun(self,text):
 		for fit in self.sel_fits:
 			fit.maxfun=int(str(text))
+	
+	def set_nstarts(self,text):
+		if str(text)!="":
+			for fit in self.sel_fits:
+				fit.nstarts=max(int(str(text)),1)
+	
+	def set_max_time(self,text):
+		for fit in self.sel_fits:
+			if str(text)=="":
+				fit.max_time=None
+			else:
+				fit.max_time=float(str(text))
+	
+	def set_max_fcalls(self,text):
+		for fit in self.sel_fits:
+			if str(text)=="":
+				fit.max_fcalls=None
+			else:
+				fit.max_fcalls=int(str(text))
+	
+	def set_track_maxlen(self,text):
+		if str(text)!="":
+			for fit in self.sel_fits:
+				fit.track_maxlen=max(int(str(text)),1)
+	
+	def set_track_every(self,text):
+		if str(text)!="":
+			for fit in self.sel_fits:
+				fit.track_every=max(int(str(text)),1)
 		
 	def set_x0_k(self,text):
 		for fit in self.sel_fits:
@@ -3596,6 +3729,9 @@ class mult_fit_dialog(QtGui.QDialog):
 	def check_save_track(self, value):
 		for fit in self.sel_fits:
 			fit.save_track=int(value/2)	
+			#Drop track when not saving it anymore
+			if fit.save_track==0:
+				fit.track_parms=None
 	
 	def check_bound_LB_k(self,value):
 		
@@ -3719,15 +3855,26 @@ class analyze_all_prog(QtGui.QDialog):
 		self.show()	
 	
 	def cancel_analysis(self):
-	
+		
+		#Task stops at its next check of the cancel token
+		self.lbl_name.setText("Canceling ...")
+		self.btn_cancel.setDisabled(True)
 		self.accepted.emit()
 	
+	def update_progress(self,done,total,name):
+		
+		self.lbl_name.setText("Analyzing complete molecule ... finished "+name+" ("+str(done)+"/"+str(total)+")")
+	
 class analyze_all_thread(QtCore.QThread):
 	taskFinished = QtCore.pyqtSignal()
+	taskCanceled = QtCore.pyqtSignal()
+	progress = QtCore.pyqtSignal(int,int,str)
     
-	def __init__(self, molecule=None, parent=None):
+	def __init__(self, molecule=None, workers=1, parent=None):
 		QtCore.QThread.__init__(self)
 		self.molecule=molecule
+		self.workers=workers
+		self.cancel_token=pyfdap_fit.cancel_token()
 		
 	def __del__(self):
 		self.wait()
@@ -3738,13 +3885,21 @@ class analyze_all_thread(QtCore.QThread):
 			self.terminate()
 			self.taskFinished.emit() 	
 		else:
-			for embryo in self.molecule.embryos:
-				embryo=pyfdap_img.analyze_fdap_data(embryo)
-			
-			if len(self.molecule.bkgds)>0:
-				self.molecule=pyfdap_img.analyze_fdap_bkgds(self.molecule)
+			try:
+				self.molecule=pyfdap_img.analyze_molecule(self.molecule,workers=self.workers,callback=self.report_progress,cancel=self.cancel_token)
+			except pyfdap_fit.task_canceled:
+				self.taskCanceled.emit()
+				return
 				
 			self.taskFinished.emit()
+	
+	def cancel(self):
+		
+		self.cancel_token.cancel()
+	
+	def report_progress(self,done,total,name):
+		
+		self.progress.emit(done,total,name)
 
 #===================================================================================================================================
 #Dialog for anaylze progress
@@ -3766,15 +3921,20 @@ class analyze_prog(QtGui.QDialog):
 		self.show()	
 	
 	def cancel_analysis(self):
-	
+		
+		#Task stops at its next check of the cancel token
+		self.lbl_name.setText("Canceling ...")
+		self.btn_cancel.setDisabled(True)
 		self.accepted.emit()
 		
 class analyze_thread(QtCore.QThread):
 	taskFinished = QtCore.pyqtSignal()
+	taskCanceled = QtCore.pyqtSignal()
     
 	def __init__(self, embryo=None, parent=None):
 		QtCore.QThread.__init__(self)
 		self.embryo=embryo
+		self.cancel_token=pyfdap_fit.cancel_token()
 		
 	def __del__(self):
 		self.wait()
@@ -3785,9 +3945,87 @@ class analyze_thread(QtCore.QThread):
 			self.terminate()
 			self.taskFinished.emit() 	
 		else:
-			self.embryo=pyfdap_img.analyze_fdap_data(self.embryo)
+			try:
+				self.embryo=pyfdap_img.analyze_fdap_data(self.embryo,cancel=self.cancel_token)
+			except pyfdap_fit.task_canceled:
+				self.taskCanceled.emit()
+				return
 			self.taskFinished.emit()
+	
+	def cancel(self):
+		
+		self.cancel_token.cancel()
 			
+#===================================================================================================================================
+#Dialog for watching data folder
+#===================================================================================================================================
+
+class watch_prog(QtGui.QDialog):
+	
+	def __init__(self,parent):
+		super(watch_prog,self).__init__(parent)
+		self.lbl_name = QtGui.QLabel("Watching data folder ...", self)
+		self.btn_cancel=QtGui.QPushButton('Stop watching')
+		self.btn_cancel.connect(self.btn_cancel, QtCore.SIGNAL('clicked()'), self.cancel_watching)	
+		
+		self.vbox = QtGui.QVBoxLayout()
+		self.vbox.addWidget(self.lbl_name)
+		self.vbox.addWidget(self.btn_cancel)
+		
+		self.setLayout(self.vbox)
+		self.show()	
+	
+	def cancel_watching(self):
+		
+		self.lbl_name.setText("Stopping ...")
+		self.accepted.emit()
+	
+	def update_progress(self,nframes,halflife):
+		
+		txt="Watching data folder ... analyzed "+str(nframes)+" frames"
+		if halflife>=0:
+			txt=txt+", preliminary half-life: "+str(round(halflife,2))+" min"
+		self.lbl_name.setText(txt)
+	
+class watch_thread(QtCore.QThread):
+	taskFinished = QtCore.pyqtSignal()
+	taskCanceled = QtCore.pyqtSignal()
+	progress = QtCore.pyqtSignal(int,float)
+    
+	def __init__(self, embryo=None, interval=60., this_fit=None, workers=1, parent=None):
+		QtCore.QThread.__init__(self)
+		self.embryo=embryo
+		self.interval=interval
+		self.this_fit=this_fit
+		self.workers=workers
+		self.cancel_token=pyfdap_fit.cancel_token()
+		
+	def __del__(self):
+		self.wait()
+    
+	def run(self):
+		
+		if self.embryo==None:
+			self.taskFinished.emit() 	
+		else:
+			try:
+				self.embryo=pyfdap_img.watch_fdap_data(self.embryo,interval=self.interval,this_fit=self.this_fit,callback=self.report_progress,workers=self.workers,cancel=self.cancel_token)
+			except pyfdap_fit.task_canceled:
+				self.taskCanceled.emit()
+				return
+			self.taskFinished.emit()
+	
+	def cancel(self):
+		
+		self.cancel_token.cancel()
+	
+	def report_progress(self,embryo,nframes):
+		
+		halflife=-1.
+		if self.this_fit!=None and embryo.fits[self.this_fit].halflife_min!=None:
+			halflife=embryo.fits[self.this_fit].halflife_min
+		self.progress.emit(nframes,halflife)
+	
 #===================================================================================================================================
 #Dialog for bkgd analyze
 #===================================================================================================================================
@@ -3850,17 +4088,27 @@ class fitting_prog(QtGui.QDialog):
 		self.show()	
 	
 	def cancel_fitting(self):
-	
+		
+		#Task stops at its next check of the cancel token
+		self.lbl_name.setText("Canceling ...")
+		self.btn_cancel.setDisabled(True)
 		self.accepted.emit()
+	
+	def update_progress(self,done,total,name):
+		
+		self.lbl_name.setText("Fitting in progress... finished "+name+" ("+str(done)+"/"+str(total)+")")
 
 class fitting_thread(QtCore.QThread):
 	taskFinished = QtCore.pyqtSignal()
+	taskCanceled = QtCore.pyqtSignal()
     
-	def __init__(self, embryo=None, fit=None, gui=None, parent=None):
+	def __init__(self, embryo=None, fit=None, gui=None, workers=1, parent=None):
 		QtCore.QThread.__init__(self)
 		self.embryo=embryo
 		self.fit=fit
 		self.gui=gui
+		self.workers=workers
+		self.cancel_token=pyfdap_fit.cancel_token()
 		
 	def __del__(self):
 		self.wait()
@@ -3871,17 +4119,28 @@ class fitting_thread(QtCore.QThread):
 			self.terminate()
 			self.taskFinished.emit() 	
 		else:
-			self.embryo=pyfdap_fit.fdap_fitting(self.embryo,self.fit.fit_number,gui=self.gui)
+			try:
+				self.embryo=pyfdap_fit.fdap_fitting(self.embryo,self.fit.fit_number,gui=self.gui,workers=self.workers,cancel=self.cancel_token)
+			except pyfdap_fit.task_canceled:
+				self.taskCanceled.emit()
+				return
 			self.taskFinished.emit()
+	
+	def cancel(self):
+		
+		self.cancel_token.cancel()
 
 class fitting_all_thread(QtCore.QThread):
 	taskFinished = QtCore.pyqtSignal()
+	taskCanceled = QtCore.pyqtSignal()
     
-	def __init__(self, embryo=None, fits=None, gui=None, parent=None):
+	def __init__(self, embryo=None, fits=None, gui=None, workers=1, parent=None):
 		QtCore.QThread.__init__(self)
 		self.embryo=embryo
 		self.fits=fits
 		self.gui=gui
+		self.workers=workers
+		self.cancel_token=pyfdap_fit.cancel_token()
 		
 	def __del__(self):
 		self.wait()
@@ -3892,18 +4151,31 @@ class fitting_all_thread(QtCore.QThread):
 			self.terminate()
 			self.taskFinished.emit() 	
 		else:
-			for fit in self.fits:
-				self.embryo=pyfdap_fit.fdap_fitting(self.embryo,fit.fit_number,gui=self.gui)
-				print "Fitted", fit.name
+			try:
+				for fit in self.fits:
+					self.embryo=pyfdap_fit.fdap_fitting(self.embryo,fit.fit_number,gui=self.gui,workers=self.workers,cancel=self.cancel_token)
+					print "Fitted", fit.name
+			except pyfdap_fit.task_canceled:
+				self.taskCanceled.emit()
+				return
 			self.taskFinished.emit()
+	
+	def cancel(self):
+		
+		self.cancel_token.cancel()
 			
 class fitting_mol_thread(QtCore.QThread):
 	taskFinished = QtCore.pyqtSignal()
+	taskCanceled = QtCore.pyqtSignal()
+	progress = QtCore.pyqtSignal(int,int,str)
     
-	def __init__(self, molecule=None, gui=None, parent=None):
+	def __init__(self, molecule=None, gui=None, workers=1, cache=None, parent=None):
 		QtCore.QThread.__init__(self)
 		self.molecule=molecule
 		self.gui=gui
+		self.workers=workers
+		self.cache=cache
+		self.cancel_token=pyfdap_fit.cancel_token()
 		
 	def __del__(self):
 		self.wait()
@@ -3914,13 +4186,54 @@ class fitting_mol_thread(QtCore.QThread):
 			self.terminate()
 			self.taskFinished.emit() 	
 		else:
-			for embryo in self.molecule.embryos:
-				print "Fitting all fits of embryo", embryo.name
-				for fit in embryo.fits:
-					self.embryo=pyfdap_fit.fdap_fitting(embryo,fit.fit_number,gui=self.gui)	
-					print "Fitted", fit.name
+			try:
+				self.molecule=pyfdap_fit.fit_molecule(self.molecule,workers=self.workers,callback=self.report_progress,gui=self.gui,cache=self.cache,cancel=self.cancel_token)
+			except pyfdap_fit.task_canceled:
+				self.taskCanceled.emit()
+				return
 			
 			self.taskFinished.emit()			
+	
+	def cancel(self):
+		
+		self.cancel_token.cancel()
+	
+	def report_progress(self,done,total,name):
+		
+		self.progress.emit(done,total,name)
+
+class bootstrap_thread(QtCore.QThread):
+	taskFinished = QtCore.pyqtSignal()
+	taskCanceled = QtCore.pyqtSignal()
+    
+	def __init__(self, molecule=None, nboot=500, workers=1, parent=None):
+		QtCore.QThread.__init__(self)
+		self.molecule=molecule
+		self.nboot=nboot
+		self.workers=workers
+		self.cancel_token=pyfdap_fit.cancel_token()
+		
+	def __del__(self):
+		self.wait()
+    
+	def run(self):
+		
+		if self.molecule==None:
+			self.terminate()
+			self.taskFinished.emit() 	
+		else:
+			try:
+				self.molecule=pyfdap_fit.bootstrap_molecule(self.molecule,nboot=self.nboot,workers=self.workers,cancel=self.cancel_token)
+			except pyfdap_fit.task_canceled:
+				self.taskCanceled.emit()
+				return
+			
+			self.taskFinished.emit()			
+	
+	def cancel(self):
+		
+		self.cancel_token.cancel()
+
 
 #===================================================================================================================================
 #Dialog for selecting fits for averaging molecule
@@ -0,0 +1,352 @@
+#=====================================================================================================================================
+#Copyright
+#=====================================================================================================================================
+
+#Copyright (C) 2014 Alexander Blaessle, Patrick Mueller, and the Friedrich Miescher Laboratory of the Max Planck Society
+#This software is distributed under the terms of the GNU General Public License.
+
+#This file is part of PyFDAP.
+
+#PyFDAP is free software: you can redistribute it and/or modify
+#it under the terms of the GNU General Public License as published by
+#the Free Software Foundation, either version 3 of the License, or
+#(at your option) any later version.
+
+#This program is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#GNU General Public License for more details.
+
+#You should have received a copy of the GNU General Public License
+#along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+#=====================================================================================================================================
+#Module Description
+#=====================================================================================================================================
+
+#Reference implementations of PyFDAP 1.1 for the regression tests. These are the loop based versions that were replaced by
+#vectorized ones, copied with debugging plots and global state removed. Only used by tests, do not optimize.
+#(1) get_embryo_mask: Pixel by pixel embryo mask
+#(2) otsu_imagej: Loop version of ImageJ's Otsu algorithm
+#(3) region_averages: Averages over slice, extracellular and intracellular region from masks
+#(4) comp_corr_F_region: Correction function F of one embryo and region, bkgd by bkgd
+#(5) bin_tvec_data: Time binning of molecule refits with nested loops
+#(6) fit_constrained_nm: Constrained Nelder-Mead fit of exponential model as done by fdap_fitting
+
+#=====================================================================================================================================
+#Importing necessary modules
+#=====================================================================================================================================
+
+from numpy import *
+import scipy.optimize as sopt
+
+#=====================================================================================================================================
+#Module Functions
+#=====================================================================================================================================
+
+#-------------------------------------------------------------------------------------------------------------------------------------
+#Embryo mask
+
+def get_embryo_mask(radius,center,res,fill=0):
+	
+	#Converting res to int if not already
+	res=int(res)
+	
+	mask_embryo=zeros((res,res))
+	
+	#Going through res*res and see what's within embryo boundaries
+	for i in range(res):
+		for j in range(res):
+			if sqrt((i-center[0])**2 + (j-center[1])**2) < radius:
+				mask_embryo[i,j]=1
+			else:
+				mask_embryo[i,j]=fill
+	
+	mask_embryo=mask_embryo.T
+	
+	return mask_embryo
+
+#-------------------------------------------------------------------------------------------------------------------------------------
+#Otsu thresholding
+
+def otsu_imagej(img,maxval,minval):
+	
+	#Initialize values
+	L = 256
+	S = 0
+	N = 0
+	
+	#Make bin vector (histogram autobinning does not work if there are nans in img)
+	bins=linspace(nanmin(img),nanmax(img),L+1)
+	
+	#Compute histogram
+	data,bin_edges=histogram(img,bins)
+	bin_width=diff(bin_edges)[0]
+	
+	for k in range(L):
+		#Total histogram intensity
+		S = S+ k * data[k]
+		#Total number of data points
+		N = N + data[k]
+	
+	#Temporary variables
+	Sk = 0
+	BCV = 0
+	BCVmax=0
+	kStar = 0
+	
+	#The entry for zero intensity
+	N1 = data[0]
+	
+	#Look at each possible threshold value,
+	#calculate the between-class variance, and decide if it's a max
+	for k in range (1,L-1):
+		#No need to check endpoints k = 0 or k = L-1
+		Sk = Sk + k * data[k]
+		N1 = N1 + data[k]
+		
+		denom = float(float(N1) * (float(N) - float(N1)))
+		
+		if denom != 0:
+			num = float(( float(N1) / float(N) ) * S) - Sk
+			BCV = float((num * num)) / float(denom)
+		else:
+			BCV = 0
+		
+		if BCV >= BCVmax:
+			#Assign the best threshold found so far
+			BCVmax = BCV
+			kStar = k
+	
+	kStar=bin_edges[0]+kStar*bin_width
+	
+	#Now manipulate the image
+	bin_img=zeros(shape(img))
+	for i in range(shape(img)[0]):
+		for j in range(shape(img)[1]):
+			if isnan(img[i,j]):
+				bin_img[i,j]=minval
+			else:
+				if img[i,j]<=kStar:
+					bin_img[i,j]=minval
+				else:
+					bin_img[i,j]=maxval
+	
+	return kStar,bin_img
+
+#-------------------------------------------------------------------------------------------------------------------------------------
+#Region averages of one frame, each frame uses its own embryo mask
+
+def region_averages(data_vals,mask_embryo,mask_ext,mask_int):
+	
+	data_vals=asarray(data_vals,dtype=float)
+	
+	#Multiplying with embryo mask and exterior/interior
+	data_vals_slice=data_vals*mask_embryo
+	data_vals_ext=data_vals*mask_embryo*mask_ext
+	data_vals_int=data_vals*mask_embryo*mask_int
+	
+	#Computing average concentrations for all 3 regions
+	slice_av=float(sum(data_vals_slice))/float(sum(mask_embryo))
+	ext_av=float(sum(data_vals_ext))/float(sum(mask_embryo*mask_ext))
+	int_av=float(sum(data_vals_int))/float(sum(mask_embryo*mask_int))
+	
+	return slice_av,ext_av,int_av
+
+#-------------------------------------------------------------------------------------------------------------------------------------
+#Correction function F
+
+def comp_corr_F_region(molecule,embryo,region):
+	
+	min_F=[]
+	
+	#Loop throuh bkgds
+	for bkgd in molecule.bkgds:
+		
+		#Grab right bkgd vector
+		if hasattr(bkgd,'bkgd_'+region+'_vec_ign') and shape(getattr(bkgd,'bkgd_'+region+'_vec_ign'))[0]>0:
+			bkgd_vec=list(getattr(bkgd,'bkgd_'+region+'_vec_ign'))
+		else:
+			bkgd_vec=list(getattr(bkgd,'bkgd_'+region+'_vec'))
+		
+		#Insert preconversion value at the start
+		bkgd_pre=getattr(bkgd.pre,'pre_'+region)
+		bkgd_vec.insert(0,bkgd_pre)
+		
+		F=corr_F(bkgd_vec,bkgd_pre,embryo.noise.noise)
+		
+		min_F.append(min(F))
+	
+	return mean(min_F)
+
+def corr_F(bkgd_vec,bkgd_pre,noise):
+	return (asarray(bkgd_vec)-noise)/(bkgd_pre-noise)
+
+#-------------------------------------------------------------------------------------------------------------------------------------
+#Time binning of molecule refits
+
+def get_common_tvec(mol):
+	
+	maxs=[]
+	mins=[]
+	tvecs=[]
+	
+	#Find out range of all tvecs and save everything in lists
+	for fit in mol.sel_fits:
+		
+		emb=fit.embryo
+		maxs.append(max(emb.tvec_data))
+		mins.append(min(emb.tvec_data))
+		dt=emb.tvec_data[-1]-emb.tvec_data[-2]
+		
+		if len(emb.ignored)>0:
+			tvecs.append(emb.tvec_ignored)
+		else:
+			tvecs.append(emb.tvec_data)
+	
+	tmin=min(mins)
+	tmax=max(maxs)
+	
+	#Generating bin vector (adding small percentage of dt to make sure that bounds get into bins too)
+	tvec_bin_edges=arange(tmin-0.00001*dt,tmax+1.00001*dt,dt)
+	
+	return tvec_bin_edges, tvecs
+
+def bin_tvec_data(mol,pinned,region):
+	
+	#Get common tvec
+	tvec_bin_edges,tvecs=get_common_tvec(mol)
+	
+	#Get hist and mapping
+	h,mappings=simple_hist(tvec_bin_edges,tvecs)
+	
+	#Make empty vectors filled with lists
+	tvec_bin=[[] for i in range(len(tvec_bin_edges)-1)]
+	r_bin=[[] for i in range(len(tvec_bin_edges)-1)]
+	
+	#Go through each selected fit, grab data vectors, and assign data to bin vector according to mapping from simple_hist
+	for i,fit in enumerate(mol.sel_fits):
+		
+		m=mappings[i]
+		emb=fit.embryo
+		if len(emb.ignored)>0:
+			data=getattr(emb,region+'_av_data_ign')
+			tvec=emb.tvec_ignored
+		else:
+			data=getattr(emb,region+'_av_data_d')
+			tvec=emb.tvec_data
+		
+		for j in range(len(data)):
+			if pinned:
+				r_bin[m[j]].append(pin_dataseries(data,fit.ynaught_opt,fit.cnaught_opt)[j])
+			else:
+				r_bin[m[j]].append(data[j])
+			
+			tvec_bin[m[j]].append(tvec[j])
+	
+	return tvec_bin,r_bin
+
+def pin_dataseries(datavec,ynaught,cnaught):
+	return (asarray(datavec)-ynaught)/cnaught
+
+def simple_hist(bins_edges,datavecs):
+	
+	#Empty vector for histogram
+	h=zeros([len(bins_edges)-1])
+	
+	mappings=[]
+	
+	#Loop through all datavectors
+	for data in datavecs:
+		
+		m=[]
+		for d in data:
+			
+			#Loop through bin edges
+			for i in range(len(bins_edges)-1):
+				
+				#Check if data point is in this bin
+				if bins_edges[i]<=d and d<bins_edges[i+1]:
+					m.append(i)
+					h[i]=h[i]+1
+					break
+		
+		mappings.append(m)
+	
+	return h, mappings
+
+#-------------------------------------------------------------------------------------------------------------------------------------
+#Constrained Nelder-Mead fit of c0*exp(-k*t)+y0, all three parameters fitted. Returns k, c0, y0 and SSD.
+
+def fit_constrained_nm(tvec,data,x0,LB,UB,opt_tol,maxfun):
+	
+	tvec=asarray(tvec,dtype=float)
+	data=asarray(data,dtype=float)
+	
+	def constr_calc_exp_ssd(x):
+		knew,cnaught,ynaught=xtransform(x,LB,UB)
+		return sum((data-(cnaught*exp(-knew*tvec)+ynaught))**2)
+	
+	res=sopt.fmin(constr_calc_exp_ssd,transform_x0(x0,LB,UB),ftol=opt_tol,maxiter=maxfun,disp=False,full_output=True)
+	
+	knew,cnaught,ynaught=xtransform(res[0],LB,UB)
+	
+	return knew,cnaught,ynaught,res[1]
+
+def xtransform(x,LB,UB):
+	
+	xtrans=zeros(shape(x))
+	
+	for i in range(len(x)):
+		
+		#Upper bound only
+		if UB[i]!=None and LB[i]==None:
+			xtrans[i]=UB[i]-x[i]**2
+		
+		#Lower bound only
+		elif UB[i]==None and LB[i]!=None:
+			xtrans[i]=LB[i]+x[i]**2
+		
+		#Both bounds
+		elif UB[i]!=None and LB[i]!=None:
+			xtrans[i]=(sin(x[i])+1.)/2.*(UB[i]-LB[i])+LB[i]
+			xtrans[i]=max([LB[i],min([UB[i],xtrans[i]])])
+		
+		#No bounds
+		else:
+			xtrans[i]=x[i]
+	
+	return xtrans
+
+def transform_x0(x0,LB,UB):
+	
+	x0u=list(x0)
+	
+	for i in range(len(x0)):
+		
+		#Upper bound only
+		if UB[i]!=None and LB[i]==None:
+			if UB[i]<=x0[i]:
+				x0u[i]=0
+			else:
+				x0u[i]=sqrt(UB[i]-x0[i])
+		
+		#Lower bound only
+		elif UB[i]==None and LB[i]!=None:
+			if LB[i]>=x0[i]:
+				x0u[i]=0
+			else:
+				x0u[i]=sqrt(x0[i]-LB[i])
+		
+		#Both bounds
+		elif UB[i]!=None and LB[i]!=None:
+			if UB[i]<=x0[i]:
+				x0u[i]=pi/2
+			elif LB[i]>=x0[i]:
+				x0u[i]=-pi/2
+			else:
+				x0u[i]=2*(x0[i]-LB[i])/(UB[i]-LB[i])-1
+				#shift by 2*pi to avoid problems at zero in fminsearch otherwise, the initial simplex is vanishingly small
+				x0u[i]=2*pi+arcsin(max([-1,min(1,x0u[i])]))
+	
+	return x0u
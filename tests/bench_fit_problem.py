@@ -0,0 +1,77 @@
+###Script to compare speed of objective functions of fit_context with compiled fit problems of compile_fit_problem
+###Run from the repository root with: python tests/bench_fit_problem.py [number of evaluations]
+
+#Importing modules
+import os
+import sys
+import time
+
+sys.path.insert(0,os.path.join(os.path.dirname(os.path.abspath(__file__)),os.pardir,"pyfdap"))
+
+#pyfdap_img_module needs to be imported before pyfdap_fit_module
+import pyfdap_img_module
+from embryo import *
+import pyfdap_fit_module
+
+#Number of evaluations per objective function
+if len(sys.argv)>1:
+	nevals=int(sys.argv[1])
+else:
+	nevals=20000
+
+#Create dummy embryo with synthetic data
+emb=embryo('bench','fdap')
+emb.tvec_data=linspace(0,600*29,30)
+emb.ext_av_data_d=list(120*exp(-1e-4*emb.tvec_data)+40+random.RandomState(0).randn(30))
+emb.ignored=[]
+
+#Times n evaluations of function f at x, returns microseconds per evaluation and last value
+def time_objective(f,x,n):
+	
+	t0=time.time()
+	for i in range(n):
+		val=f(x)
+	
+	return (time.time()-t0)/n*1e6,val
+
+print "Evaluations per objective function: ", nevals
+
+#Loop through models
+for model in sorted(pyfdap_fit_module.decay_models.keys()):
+	
+	#Add fit
+	emb.add_fit(len(emb.fits),model,'default')
+	fit=emb.fits[-1]
+	fit.fit_ext=1
+	fit.fit_int=0
+	fit.fit_slice=0
+	fit.model=model
+	fit.x0=[1e-4,100.,30.]
+	fit.LB_k=0
+	fit.UB_k=1e-2
+	fit.LB_cnaught=0
+	fit.UB_cnaught=500
+	fit.LB_ynaught=0
+	fit.UB_ynaught=200
+	pyfdap_fit_module.check_model_parms(fit,pyfdap_fit_module.decay_models[model])
+	
+	ctx=pyfdap_fit_module.fit_context(emb,len(emb.fits)-1)
+	
+	#Unconstrained and constrained objective
+	for constrained in [False,True]:
+		
+		if constrained:
+			old=ctx.constr_calc_ssd
+			x=pyfdap_fit_module.transform_x0(list(fit.x0),ctx.LB,ctx.UB)
+		else:
+			old=ctx.calc_ssd
+			x=ctx.get_x(*fit.x0)
+		new=pyfdap_fit_module.compile_fit_problem(ctx,constrained=constrained)
+		
+		t_old,val_old=time_objective(old,x,nevals)
+		t_new,val_new=time_objective(new,x,nevals)
+		
+		print "Model: ", model, " constrained: ", constrained
+		print "	fit_context:         ", round(t_old,2), " us/eval, ssd=", val_old
+		print "	compile_fit_problem: ", round(t_new,2), " us/eval, ssd=", val_new
+		print "	speedup:             ", round(t_old/t_new,2), " equal: ", val_old==val_new
@@ -0,0 +1,136 @@
+#=====================================================================================================================================
+#Copyright
+#=====================================================================================================================================
+
+#Copyright (C) 2014 Alexander Blaessle, Patrick Mueller, and the Friedrich Miescher Laboratory of the Max Planck Society
+#This software is distributed under the terms of the GNU General Public License.
+
+#This file is part of PyFDAP.
+
+#PyFDAP is free software: you can redistribute it and/or modify
+#it under the terms of the GNU General Public License as published by
+#the Free Software Foundation, either version 3 of the License, or
+#(at your option) any later version.
+
+#This program is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#GNU General Public License for more details.
+
+#You should have received a copy of the GNU General Public License
+#along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+#=====================================================================================================================================
+#Module Description
+#=====================================================================================================================================
+
+#Checks shared by the tests of the optimizers of fdap_fitting. Only used by tests.
+
+#=====================================================================================================================================
+#Importing necessary modules
+#=====================================================================================================================================
+
+import os
+import sys
+
+sys.path.insert(0,os.path.join(os.path.dirname(os.path.abspath(__file__)),os.pardir,"pyfdap"))
+
+from numpy import *
+from numpy.testing import assert_allclose
+
+#pyfdap_img_module needs to be imported before pyfdap_fit_module
+import pyfdap_img_module
+import pyfdap_fit_module
+
+import baseline_reference
+from synthetic_data import make_embryo,make_model_embryo
+
+#=====================================================================================================================================
+#Module Functions
+#=====================================================================================================================================
+
+#Optimum of constrained Nelder-Mead as in PyFDAP 1.1, restarted from its result until it does not improve anymore
+def get_reference_optimum(emb):
+	
+	fit=emb.fits[0]
+	x0=fit.x0
+	LB=[fit.LB_k,fit.LB_cnaught,fit.LB_ynaught]
+	UB=[fit.UB_k,fit.UB_cnaught,fit.UB_ynaught]
+	
+	ssd=inf
+	while True:
+		knew,cnaught,ynaught,ssd_new=baseline_reference.fit_constrained_nm(emb.tvec_ignored,emb.ext_av_data_ign,x0,LB,UB,1e-15,10000)
+		x0=[knew,cnaught,ynaught]
+		if ssd_new>=ssd*(1-1e-12):
+			break
+		ssd=ssd_new
+	
+	return x0,ssd
+
+#Optimum of constrained Nelder-Mead of fdap_fitting, for any model and fixed parameters, restarted from its result until it 
+#does not improve anymore
+def get_nm_optimum(emb):
+	
+	fit=emb.fits[0]
+	fit.opt_meth='Constrained Nelder-Mead'
+	fit.opt_tol=1e-15
+	fit.maxfun=10000
+	
+	P,ssd=None,inf
+	while True:
+		pyfdap_fit_module.fdap_fitting(emb,0)
+		if fit.ssd>=ssd*(1-1e-12):
+			break
+		P,ssd=pyfdap_fit_module.get_parms_opt(fit),fit.ssd
+		fit.x0=P
+	
+	return P,ssd
+
+#Mixin for unittest.TestCase: fits of synthetic embryos with optimizer opt_meth have to find the reference optimum
+class same_optimum_checks:
+	
+	def check_same_optimum(self,opt_meth):
+		
+		for i in range(3):
+			
+			x_ref,ssd_ref=get_reference_optimum(make_embryo(i))
+			
+			emb=make_embryo(i)
+			fit=emb.fits[0]
+			fit.opt_meth=opt_meth
+			pyfdap_fit_module.fdap_fitting(emb,0)
+			
+			msg=str([i,opt_meth])
+			self.assertTrue(fit.ssd<=ssd_ref*(1+1e-6),msg=msg)
+			assert_allclose([fit.k_opt,fit.cnaught_opt,fit.ynaught_opt],x_ref,rtol=1e-3,err_msg=msg)
+			assert_allclose(fit.fit_av_d,fit.cnaught_opt*exp(-fit.k_opt*emb.tvec_ignored)+fit.ynaught_opt,err_msg=msg)
+	
+	#Fits with model, shape parameters and fixed c0 or y0 have to find the optimum of constrained Nelder-Mead (get_nm_optimum)
+	def check_nm_optimum(self,opt_meth,model,fit_cnaught=1,fit_ynaught=1,**shape):
+		
+		for i in range(3):
+			
+			embryos=[]
+			for j in range(2):
+				emb=make_model_embryo(i,model,**shape)
+				emb.fits[0].fit_cnaught=fit_cnaught
+				emb.fits[0].fit_ynaught=fit_ynaught
+				embryos.append(emb)
+			
+			P_ref,ssd_ref=get_nm_optimum(embryos[0])
+			
+			emb=embryos[1]
+			fit=emb.fits[0]
+			fit.opt_meth=opt_meth
+			pyfdap_fit_module.fdap_fitting(emb,0)
+			
+			msg=str([i,opt_meth,model,shape,fit_cnaught,fit_ynaught])
+			self.assertTrue(fit.ssd<=ssd_ref*(1+1e-6),msg=msg)
+			assert_allclose(pyfdap_fit_module.get_parms_opt(fit),P_ref,rtol=1e-5,atol=1e-6,err_msg=msg)
+			
+			#Parameters that are not fitted keep x0
+			if fit_cnaught==0:
+				self.assertEqual(fit.cnaught_opt,fit.x0[1],msg=msg)
+			if fit_ynaught==0:
+				self.assertEqual(fit.ynaught_opt,fit.x0[2],msg=msg)
@@ -0,0 +1,215 @@
+#=====================================================================================================================================
+#Copyright
+#=====================================================================================================================================
+
+#Copyright (C) 2014 Alexander Blaessle, Patrick Mueller, and the Friedrich Miescher Laboratory of the Max Planck Society
+#This software is distributed under the terms of the GNU General Public License.
+
+#This file is part of PyFDAP.
+
+#PyFDAP is free software: you can redistribute it and/or modify
+#it under the terms of the GNU General Public License as published by
+#the Free Software Foundation, either version 3 of the License, or
+#(at your option) any later version.
+
+#This program is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#GNU General Public License for more details.
+
+#You should have received a copy of the GNU General Public License
+#along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+#=====================================================================================================================================
+#Module Description
+#=====================================================================================================================================
+
+#Synthetic images and datasets shared by the tests. Datasets on disk are written as 16 bit tif images, which needs PIL.
+#Only used by tests.
+
+#=====================================================================================================================================
+#Importing necessary modules
+#=====================================================================================================================================
+
+import os
+import sys
+
+sys.path.insert(0,os.path.join(os.path.dirname(os.path.abspath(__file__)),os.pardir,"pyfdap"))
+
+from numpy import *
+
+try:
+	from PIL import Image
+except ImportError:
+	Image=None
+
+#pyfdap_img_module needs to be imported before pyfdap_fit_module and molecule
+import pyfdap_img_module
+import pyfdap_fit_module
+from molecule import *
+from embryo import *
+
+#=====================================================================================================================================
+#Module Functions
+#=====================================================================================================================================
+
+#Synthetic frame: bright blobs on a noisy background, integer valued like 8/16 bit images
+def make_img(res,seed):
+	
+	random_state=random.RandomState(seed)
+	y,x=ogrid[0:res,0:res]
+	
+	img=50+20*random_state.rand(res,res)
+	for i in range(5):
+		cx,cy,r=random_state.uniform(0,res,2).tolist()+[random_state.uniform(2,res/6.)]
+		img=img+150*(((x-cx)**2+(y-cy)**2)<r**2)
+	
+	return floor(img)
+
+#Embryo with synthetic exponential decays in all regions, every third embryo has an ignored time point
+def make_embryo(i,ntimes=30,dt=600.):
+	
+	random_state=random.RandomState(i)
+	
+	emb=embryo('e%d'%i,'fdap')
+	emb.tvec_data=arange(ntimes)*dt
+	for region,c,y in [["ext",120.,40.],["int",80.,20.],["slice",100.,30.]]:
+		setattr(emb,region+"_av_data_d",list(c*exp(-(i+1)*1e-4*emb.tvec_data)+y+random_state.randn(ntimes)))
+	
+	if i%3==1:
+		emb.ignored=[2]
+	else:
+		emb.ignored=[]
+	pyfdap_fit_module.correct_ignored_vecs(emb)
+	
+	emb.add_fit(0,'fit','default')
+	fit=emb.fits[0]
+	fit.embryo=emb
+	fit.x0=[1e-4,100.,30.]
+	fit.LB_k=0
+	fit.UB_k=1e-2
+	fit.LB_cnaught=0
+	fit.UB_cnaught=500
+	fit.LB_ynaught=0
+	fit.UB_ynaught=200
+	
+	return emb
+
+#Embryo fitted with model, with data of make_embryo or, if biexp_data, a decay of two pools. Values of the shape parameters
+#of the model (e.g. npower) are given as keyword arguments.
+def make_model_embryo(i,model,biexp_data=False,ntimes=30,**shape):
+	
+	emb=make_embryo(i,ntimes=ntimes)
+	
+	if biexp_data:
+		t=emb.tvec_data
+		emb.ext_av_data_d=list(120*(0.6*exp(-1e-4*t)+0.4*exp(-8e-4*t))+40+random.RandomState(i).randn(ntimes))
+		pyfdap_fit_module.correct_ignored_vecs(emb)
+	
+	fit=emb.fits[0]
+	fit.model=model
+	for prop,val in shape.items():
+		setattr(fit,prop,val)
+	pyfdap_fit_module.check_model_parms(fit,pyfdap_fit_module.decay_models[model])
+	
+	return emb
+
+#Stand-in for bkgd, pre and noise objects, only carries attributes
+class record:
+	
+	def __init__(self,**kwargs):
+		
+		self.__dict__.update(kwargs)
+
+#Writes images as 16 bit tif files img_000.tif, img_001.tif, ... into folder fn_folder, which is created if needed
+def write_frames(fn_folder,imgs):
+	
+	if not os.path.exists(fn_folder):
+		os.makedirs(fn_folder)
+	
+	for i,img in enumerate(imgs):
+		Image.fromarray(asarray(img).astype('uint16')).save(os.path.join(fn_folder,"img_%03d.tif"%i))
+
+#Writes data, mask and pre images of one dataset into fn_folder. Data images decay exponentially with rate k, so that fits
+#have something to find. An existing dataset is not written again, so that several objects can share the same files.
+#Returns data, mask and pre folder.
+def write_dataset(fn_folder,nframes,res,seed,k=1e-4,dt=600.):
+	
+	fn_data=os.path.join(fn_folder,"data")
+	fn_mask=os.path.join(fn_folder,"mask")
+	fn_pre=os.path.join(fn_folder,"pre")
+	
+	if os.path.exists(fn_folder):
+		return fn_data,fn_mask,fn_pre
+	
+	#Bright cell in the center, so that every embryo has an intracellular region
+	y,x=ogrid[0:res,0:res]
+	cell=150*(((x-res/2.)**2+(y-res/2.)**2)<(res/8.)**2)
+	
+	imgs=[make_img(res,seed+i)+cell for i in range(nframes+1)]
+	
+	write_frames(fn_data,[floor(imgs[i]*exp(-k*dt*i)) for i in range(nframes)])
+	write_frames(fn_mask,imgs[:nframes])
+	write_frames(fn_pre,imgs[nframes:])
+	
+	return fn_data,fn_mask,fn_pre
+
+#Embryo on synthetic dataset in fn_folder, with one fit of the extracellular region. The embryo circle moves a bit from
+#frame to frame.
+def make_disk_embryo(fn_folder,name,nframes=5,res=64,seed=0):
+	
+	fn_data,fn_mask,fn_pre=write_dataset(fn_folder,nframes,res,seed)
+	
+	emb=embryo(name,'fdap')
+	emb.fn_datafolder=fn_data
+	emb.fn_maskfolder=fn_mask
+	emb.data_res_px=res
+	emb.nframes=nframes
+	emb.update_tvec()
+	emb.centers_embr_px=[[res/2.+i,res/2.-i] for i in range(nframes)]
+	emb.radiuses_embr_px=[res/3.]*nframes
+	
+	emb.pre.fn_datafolder=fn_pre
+	emb.pre.fn_maskfolder=fn_pre
+	emb.pre.res_px=res
+	emb.pre.center_embr_px=[res/2.,res/2.]
+	emb.pre.radius_embr_px=res/3.
+	
+	emb.noise.mode="outside"
+	
+	emb.add_fit(0,'fit','default')
+	fit=emb.fits[0]
+	fit.x0=[1e-4,100.,30.]
+	fit.UB_k=1e-2
+	fit.UB_cnaught=500.
+	
+	return emb
+
+#Molecule with nembryos embryos and nbkgds bkgds on synthetic datasets in subfolders of fn_folder
+def make_disk_molecule(fn_folder,nembryos=3,nbkgds=2,nframes=5,res=64):
+	
+	mol=molecule('mol')
+	
+	for i in range(nembryos):
+		mol.add_embryo(make_disk_embryo(os.path.join(fn_folder,"embryo%d"%i),"embryo%d"%i,nframes=nframes,res=res,seed=10*i))
+	
+	for i in range(nbkgds):
+		
+		fn_data,fn_mask,fn_pre=write_dataset(os.path.join(fn_folder,"bkgd%d"%i),nframes,res,100+10*i,k=0)
+		
+		mol.add_bkgd(i,"bkgd%d"%i,"default")
+		bkgd=mol.bkgds[-1]
+		bkgd.fn_bkgdfolder=fn_data
+		bkgd.fn_maskfolder=fn_mask
+		bkgd.res_px=res
+		bkgd.centers_embr_px=[[res/2.,res/2.]]*nframes
+		bkgd.radiuses_embr_px=[res/3.]*nframes
+		
+		bkgd.pre.fn_datafolder=fn_pre
+		bkgd.pre.fn_maskfolder=fn_pre
+		bkgd.pre.res_px=res
+		bkgd.pre.center_embr_px=[res/2.,res/2.]
+		bkgd.pre.radius_embr_px=res/3.
+	
+	return mol
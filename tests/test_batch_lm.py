@@ -0,0 +1,119 @@
+#=====================================================================================================================================
+#Copyright
+#=====================================================================================================================================
+
+#Copyright (C) 2014 Alexander Blaessle, Patrick Mueller, and the Friedrich Miescher Laboratory of the Max Planck Society
+#This software is distributed under the terms of the GNU General Public License.
+
+#This file is part of PyFDAP.
+
+#PyFDAP is free software: you can redistribute it and/or modify
+#it under the terms of the GNU General Public License as published by
+#the Free Software Foundation, either version 3 of the License, or
+#(at your option) any later version.
+
+#This program is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#GNU General Public License for more details.
+
+#You should have received a copy of the GNU General Public License
+#along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+#=====================================================================================================================================
+#Module Description
+#=====================================================================================================================================
+
+#Tests of the batched vectorized Levenberg-Marquardt optimizer: fits of synthetic embryos have to find the optimum of the 
+#constrained Nelder-Mead of PyFDAP 1.1 (baseline_reference), biexp fits must not get stuck at bounds of their extra 
+#parameters, and fit_batch of several stacked fits with different time vectors, ignored frames and models has to give the 
+#same results as fitting each alone. Run from the repository root with:
+#python -m unittest discover tests
+
+#=====================================================================================================================================
+#Importing necessary modules
+#=====================================================================================================================================
+
+import unittest
+
+from numpy import *
+from numpy.testing import assert_allclose
+
+import fit_checks
+import pyfdap_fit_module
+from synthetic_data import make_model_embryo
+
+#=====================================================================================================================================
+#Tests
+#=====================================================================================================================================
+
+class test_batch_lm(unittest.TestCase,fit_checks.same_optimum_checks):
+	
+	def test_same_optimum(self):
+		
+		self.check_same_optimum('batch_lm')
+	
+	#Parameters held at a bound (e.g. kratio=1) must not stop the other parameters
+	def test_biexp(self):
+		
+		for biexp_data in [False,True]:
+			for i in range(3):
+				
+				ssds={}
+				for opt_meth in ['least_squares','batch_lm']:
+					emb=make_model_embryo(i,'biexp',biexp_data=biexp_data)
+					fit=emb.fits[0]
+					fit.opt_meth=opt_meth
+					pyfdap_fit_module.fdap_fitting(emb,0)
+					ssds[opt_meth]=fit.ssd
+				
+				msg=str([biexp_data,i])
+				self.assertTrue(fit.success,msg=msg)
+				self.assertTrue(ssds['batch_lm']<=ssds['least_squares']*(1+1e-6),msg=msg)
+	
+	#Embryos with different numbers of time points, ignored frames and models, fitted in one stack and alone
+	def make_embryos(self):
+		
+		embryos=[]
+		for i in range(5):
+			if i==3:
+				emb=make_model_embryo(i,'power',ntimes=20+4*i,npower=2)
+			elif i==4:
+				emb=make_model_embryo(i,'biexp',biexp_data=True,ntimes=20+4*i)
+			else:
+				emb=make_model_embryo(i,'exp',ntimes=20+4*i)
+			
+			if i==2:
+				emb.ignored=[0,5,6]
+				pyfdap_fit_module.correct_ignored_vecs(emb)
+			
+			emb.fits[0].opt_meth='batch_lm'
+			embryos.append(emb)
+		
+		return embryos
+	
+	def test_fit_batch(self):
+		
+		embryos=self.make_embryos()
+		pyfdap_fit_module.fit_batch([emb.fits[0] for emb in embryos])
+		
+		for i,emb_alone in enumerate(self.make_embryos()):
+			
+			pyfdap_fit_module.fdap_fitting(emb_alone,0)
+			
+			fit=embryos[i].fits[0]
+			fit_alone=emb_alone.fits[0]
+			
+			msg=str(i)
+			self.assertTrue(fit.success,msg=msg)
+			assert_allclose(pyfdap_fit_module.get_parms_opt(fit),pyfdap_fit_module.get_parms_opt(fit_alone),rtol=1e-8,err_msg=msg)
+			assert_allclose(fit.ssd,fit_alone.ssd,rtol=1e-8,err_msg=msg)
+			
+			#Padded and ignored time points do not count
+			emb=embryos[i]
+			self.assertEqual(len(fit.fit_av_d),len(emb.tvec_data)-len(emb.ignored),msg=msg)
+			assert_allclose(fit.ssd,sum((fit.fit_av_d-asarray(emb.ext_av_data_ign))**2),rtol=1e-10,err_msg=msg)
+
+if __name__ == '__main__':
+	unittest.main()
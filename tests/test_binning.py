@@ -0,0 +1,86 @@
+#=====================================================================================================================================
+#Copyright
+#=====================================================================================================================================
+
+#Copyright (C) 2014 Alexander Blaessle, Patrick Mueller, and the Friedrich Miescher Laboratory of the Max Planck Society
+#This software is distributed under the terms of the GNU General Public License.
+
+#This file is part of PyFDAP.
+
+#PyFDAP is free software: you can redistribute it and/or modify
+#it under the terms of the GNU General Public License as published by
+#the Free Software Foundation, either version 3 of the License, or
+#(at your option) any later version.
+
+#This program is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#GNU General Public License for more details.
+
+#You should have received a copy of the GNU General Public License
+#along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+#=====================================================================================================================================
+#Module Description
+#=====================================================================================================================================
+
+#Regression tests of the vectorized time binning of molecule refits against the loop based reference implementation in
+#baseline_reference, pinned and unpinned, for embryos of different lengths. Run from the repository root with:
+#python -m unittest discover tests
+
+#=====================================================================================================================================
+#Importing necessary modules
+#=====================================================================================================================================
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0,os.path.join(os.path.dirname(os.path.abspath(__file__)),os.pardir,"pyfdap"))
+
+from numpy import *
+from numpy.testing import assert_array_equal,assert_allclose
+
+#pyfdap_img_module needs to be imported before pyfdap_fit_module
+import pyfdap_img_module
+import pyfdap_fit_module
+
+import baseline_reference
+from synthetic_data import make_embryo,record
+
+#=====================================================================================================================================
+#Tests
+#=====================================================================================================================================
+
+class test_binning(unittest.TestCase):
+	
+	#Molecule with embryos of different lengths, one of them with an ignored time point
+	def setUp(self):
+		
+		self.mol=record(sel_fits=[])
+		for i,ntimes in enumerate([30,25,28]):
+			emb=make_embryo(i,ntimes=ntimes)
+			fit=emb.fits[0]
+			fit.cnaught_opt=100.+i
+			fit.ynaught_opt=30.-i
+			self.mol.sel_fits.append(fit)
+	
+	def test_equal_bins(self):
+		
+		for pinned in [False,True]:
+			for region in ["ext","int","slice"]:
+				
+				tvec_ref,r_ref=baseline_reference.bin_tvec_data(self.mol,pinned,region)
+				tvec_bin,r_bin=pyfdap_fit_module.bin_tvec_data(self.mol,pinned,region)
+				
+				self.assertEqual(len(tvec_bin),len(tvec_ref))
+				for j in range(len(tvec_ref)):
+					assert_array_equal(tvec_bin[j][~isnan(tvec_bin[j])],tvec_ref[j])
+					assert_array_equal(r_bin[j][~isnan(r_bin[j])],r_ref[j])
+				
+				assert_allclose(pyfdap_fit_module.mean_bin(r_bin),[mean(r) for r in r_ref],rtol=1e-12)
+				assert_allclose(pyfdap_fit_module.std_bin(r_bin),[std(r) for r in r_ref],rtol=1e-12)
+
+if __name__ == '__main__':
+	unittest.main()
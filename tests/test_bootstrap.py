@@ -0,0 +1,205 @@
+#=====================================================================================================================================
+#Copyright
+#=====================================================================================================================================
+
+#Copyright (C) 2014 Alexander Blaessle, Patrick Mueller, and the Friedrich Miescher Laboratory of the Max Planck Society
+#This software is distributed under the terms of the GNU General Public License.
+
+#This file is part of PyFDAP.
+
+#PyFDAP is free software: you can redistribute it and/or modify
+#it under the terms of the GNU General Public License as published by
+#the Free Software Foundation, either version 3 of the License, or
+#(at your option) any later version.
+
+#This program is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#GNU General Public License for more details.
+
+#You should have received a copy of the GNU General Public License
+#along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+#=====================================================================================================================================
+#Module Description
+#=====================================================================================================================================
+
+#Tests of bootstrap confidence intervals (bootstrap_fits, bootstrap_molecule) and their CSV export (write_csv_bootstrap): 
+#intervals are reproducible with a seed, do not depend on the number of workers, have zero width for fixed parameters, and 
+#are written into the CSV file as computed. Run from the repository root with:
+#python -m unittest discover tests
+
+#=====================================================================================================================================
+#Importing necessary modules
+#=====================================================================================================================================
+
+import os
+import sys
+import csv
+import shutil
+import tempfile
+import unittest
+import multiprocessing
+
+sys.path.insert(0,os.path.join(os.path.dirname(os.path.abspath(__file__)),os.pardir,"pyfdap"))
+
+from numpy import *
+from numpy.testing import assert_allclose
+
+#pyfdap_img_module needs to be imported before pyfdap_fit_module
+import pyfdap_img_module
+import pyfdap_fit_module
+import pyfdap_misc_module
+
+from synthetic_data import make_embryo,record
+
+#=====================================================================================================================================
+#Tests
+#=====================================================================================================================================
+
+ci_props=["k_ci","cnaught_ci","ynaught_ci","extra_ci","halflife_s_ci","halflife_min_ci"]
+
+class test_bootstrap(unittest.TestCase):
+	
+	nboot=100
+	
+	#Fitted embryos, the last one with fixed y0
+	def make_fits(self):
+		
+		fits=[]
+		for i in range(3):
+			
+			emb=make_embryo(i)
+			fit=emb.fits[0]
+			fit.opt_meth='least_squares'
+			if i==2:
+				fit.fit_ynaught=0
+			
+			pyfdap_fit_module.fdap_fitting(emb,0)
+			fits.append(fit)
+		
+		return fits
+	
+	def bootstrap(self,**kwargs):
+		
+		fits=self.make_fits()
+		pyfdap_fit_module.bootstrap_fits(fits,nboot=self.nboot,**kwargs)
+		
+		return fits
+	
+	def get_cis(self,fits):
+		
+		return [[getattr(fit,prop) for prop in ci_props] for fit in fits]
+	
+	def test_seed(self):
+		
+		fits=self.bootstrap(seed=1)
+		
+		self.assertEqual(self.get_cis(fits),self.get_cis(self.bootstrap(seed=1)))
+		self.assertNotEqual(self.get_cis(fits),self.get_cis(self.bootstrap(seed=2)))
+		
+		for fit in fits:
+			self.assertEqual(fit.nboot,self.nboot)
+			self.assertTrue(fit.k_ci[0]<fit.k_opt<fit.k_ci[1])
+			self.assertTrue(fit.halflife_s_ci[0]<fit.halflife_s<fit.halflife_s_ci[1])
+			assert_allclose(fit.halflife_min_ci,array(fit.halflife_s_ci)/60)
+	
+	#Resampled series are drawn before they are split over workers
+	def test_workers(self):
+		
+		fits=self.bootstrap(seed=1)
+		fits_pool=self.bootstrap(seed=1,workers=2)
+		
+		for fit,fit_pool in zip(fits,fits_pool):
+			for prop in ci_props:
+				assert_allclose(getattr(fit_pool,prop),getattr(fit,prop),rtol=1e-10,err_msg=prop)
+		
+		self.assertEqual(multiprocessing.active_children(),[])
+	
+	def test_fixed(self):
+		
+		fit=self.bootstrap(seed=1)[2]
+		
+		self.assertEqual(fit.ynaught_ci,[fit.x0[2]]*2)
+		self.assertTrue(fit.cnaught_ci[1]>fit.cnaught_ci[0])
+	
+	def test_pairs(self):
+		
+		fits=self.bootstrap(seed=1,method="pairs")
+		fits_residual=self.bootstrap(seed=1)
+		
+		for fit,fit_residual in zip(fits,fits_residual):
+			self.assertEqual(fit.nboot,self.nboot)
+			self.assertTrue(fit.k_ci[0]<fit.k_opt<fit.k_ci[1])
+			self.assertNotEqual(fit.k_ci,fit_residual.k_ci)
+		
+		self.assertEqual(fits[2].ynaught_ci,[fits[2].x0[2]]*2)
+	
+	#Fits that are not performed yet are skipped
+	def test_molecule(self):
+		
+		fits=self.make_fits()
+		mol=record(name="mol",embryos=[fit.embryo for fit in fits]+[make_embryo(3)])
+		
+		pyfdap_fit_module.bootstrap_molecule(mol,nboot=self.nboot,seed=1)
+		
+		self.assertEqual(self.get_cis([emb.fits[0] for emb in mol.embryos[:3]]),self.get_cis(self.bootstrap(seed=1)))
+		self.assertEqual([mol.embryos[3].fits[0].k_ci,mol.embryos[3].fits[0].nboot],[None,0])
+
+class test_write_csv_bootstrap(unittest.TestCase):
+	
+	def setUp(self):
+		
+		self.fn_folder=tempfile.mkdtemp()
+	
+	def tearDown(self):
+		
+		shutil.rmtree(self.fn_folder)
+	
+	def test_csv(self):
+		
+		embryos=[]
+		for i in range(3):
+			emb=make_embryo(i)
+			emb.fits[0].opt_meth='least_squares'
+			pyfdap_fit_module.fdap_fitting(emb,0)
+			embryos.append(emb)
+		
+		mol=record(name="mol",embryos=embryos)
+		pyfdap_fit_module.bootstrap_molecule(mol,nboot=50,seed=1,method="pairs")
+		
+		#Fit without bootstrap
+		emb=embryos[2]
+		emb.add_fit(1,'unbooted','default')
+		fit=emb.fits[1]
+		fit.model="exp"
+		fit.embryo=emb
+		fit.x0=[1e-4,100.,30.]
+		fit.opt_meth='least_squares'
+		pyfdap_fit_module.fdap_fitting(emb,1)
+		
+		fn_save=os.path.join(self.fn_folder,"bootstrap.csv")
+		pyfdap_misc_module.write_csv_bootstrap(fn_save,mol)
+		
+		rows=list(csv.reader(open(fn_save,'rb'),delimiter=';'))
+		self.assertEqual(rows[0],["embryo","fit","model","k","k_lower","k_upper","halflife_min","halflife_min_lower","halflife_min_upper",
+			"halflife_s","halflife_s_lower","halflife_s_upper","c0","c0_lower","c0_upper","y0","y0_lower","y0_upper","nboot"])
+		self.assertEqual(len(rows),5)
+		
+		for row,emb,fit in zip(rows[1:],[embryos[0],embryos[1],embryos[2],embryos[2]],[emb.fits[0] for emb in embryos]+[fit]):
+			
+			self.assertEqual(row[:3],[emb.name,fit.name,"exp"])
+			vals=[fit.k_opt,fit.halflife_min,fit.halflife_s,fit.cnaught_opt,fit.ynaught_opt]
+			assert_allclose([float(val) for val in row[3:18:3]],vals,rtol=1e-12)
+			
+			if fit.name=='unbooted':
+				self.assertEqual(row[4:18:3]+row[5:18:3],[""]*10)
+				self.assertEqual(row[18],"0")
+			else:
+				cis=[fit.k_ci,fit.halflife_min_ci,fit.halflife_s_ci,fit.cnaught_ci,fit.ynaught_ci]
+				assert_allclose([[float(row[j]),float(row[j+1])] for j in range(4,18,3)],cis,rtol=1e-12)
+				self.assertEqual(row[18],"50")
+
+if __name__ == '__main__':
+	unittest.main()
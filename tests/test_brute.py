@@ -0,0 +1,108 @@
+#=====================================================================================================================================
+#Copyright
+#=====================================================================================================================================
+
+#Copyright (C) 2014 Alexander Blaessle, Patrick Mueller, and the Friedrich Miescher Laboratory of the Max Planck Society
+#This software is distributed under the terms of the GNU General Public License.
+
+#This file is part of PyFDAP.
+
+#PyFDAP is free software: you can redistribute it and/or modify
+#it under the terms of the GNU General Public License as published by
+#the Free Software Foundation, either version 3 of the License, or
+#(at your option) any later version.
+
+#This program is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#GNU General Public License for more details.
+
+#You should have received a copy of the GNU General Public License
+#along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+#=====================================================================================================================================
+#Module Description
+#=====================================================================================================================================
+
+#Tests of the chunked vectorized grid search of the brute force optimizer: fits of synthetic embryos have to find the 
+#optimum of the constrained Nelder-Mead of PyFDAP 1.1 (baseline_reference), and small grid chunks have to cover the whole 
+#grid in chunks of at most grid_chunk elements with the same result. Run from the repository root with:
+#python -m unittest discover tests
+
+#=====================================================================================================================================
+#Importing necessary modules
+#=====================================================================================================================================
+
+import unittest
+
+from numpy import *
+from numpy.testing import assert_allclose
+
+import fit_checks
+import pyfdap_fit_module
+from synthetic_data import make_model_embryo
+
+#=====================================================================================================================================
+#Tests
+#=====================================================================================================================================
+
+class test_brute(unittest.TestCase,fit_checks.same_optimum_checks):
+	
+	#Spy on grid_ssd, records number of grid points of each chunk
+	def setUp(self):
+		
+		self.grid_chunk=pyfdap_fit_module.grid_chunk
+		self.grid_ssd=pyfdap_fit_module.fit_context.grid_ssd
+		
+		self.chunks=[]
+		grid_ssd=self.grid_ssd
+		def spy(ctx,K,*args):
+			self.chunks.append(len(K))
+			return grid_ssd(ctx,K,*args)
+		pyfdap_fit_module.fit_context.grid_ssd=spy
+	
+	def tearDown(self):
+		
+		pyfdap_fit_module.grid_chunk=self.grid_chunk
+		pyfdap_fit_module.fit_context.grid_ssd=self.grid_ssd
+	
+	def test_same_optimum(self):
+		
+		self.check_same_optimum('brute')
+	
+	#Returns optimal parameters, SSD and chunk sizes of brute force fit
+	def fit_brute(self,model,**shape):
+		
+		emb=make_model_embryo(0,model,**shape)
+		fit=emb.fits[0]
+		fit.opt_meth='brute'
+		
+		self.chunks=[]
+		pyfdap_fit_module.fdap_fitting(emb,0)
+		
+		return pyfdap_fit_module.get_parms_opt(fit),fit.ssd,self.chunks
+	
+	#Linear model only searches k grid, power model the full grid of k, c0 and y0
+	def test_grid_chunk(self):
+		
+		ntimes=30
+		
+		for model,shape,npoints,nchunk in [['exp',{},50,7],['power',{'npower':2},50**3,997]]:
+			
+			P_ref,ssd_ref,chunks_ref=self.fit_brute(model,**shape)
+			
+			pyfdap_fit_module.grid_chunk=nchunk*ntimes
+			P,ssd,chunks=self.fit_brute(model,**shape)
+			pyfdap_fit_module.grid_chunk=self.grid_chunk
+			
+			msg=model
+			self.assertEqual(sum(chunks_ref),npoints,msg=msg)
+			self.assertEqual(sum(chunks),npoints,msg=msg)
+			self.assertEqual(max(chunks),nchunk,msg=msg)
+			self.assertEqual(len(chunks),int(ceil(npoints/float(nchunk))),msg=msg)
+			assert_allclose(P,P_ref,rtol=1e-12,err_msg=msg)
+			assert_allclose(ssd,ssd_ref,rtol=1e-12,err_msg=msg)
+
+if __name__ == '__main__':
+	unittest.main()
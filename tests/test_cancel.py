@@ -0,0 +1,293 @@
+#=====================================================================================================================================
+#Copyright
+#=====================================================================================================================================
+
+#Copyright (C) 2014 Alexander Blaessle, Patrick Mueller, and the Friedrich Miescher Laboratory of the Max Planck Society
+#This software is distributed under the terms of the GNU General Public License.
+
+#This file is part of PyFDAP.
+
+#PyFDAP is free software: you can redistribute it and/or modify
+#it under the terms of the GNU General Public License as published by
+#the Free Software Foundation, either version 3 of the License, or
+#(at your option) any later version.
+
+#This program is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#GNU General Public License for more details.
+
+#You should have received a copy of the GNU General Public License
+#along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+#=====================================================================================================================================
+#Module Description
+#=====================================================================================================================================
+
+#Tests of cooperative cancellation and budgets: fits stopped by max_fcalls or max_time keep the best parameters evaluated,
+#canceled fits, molecule fits and molecule analyses raise task_canceled, keep results finished until then, leave unfinished
+#objects unchanged and stop their process pool. Run from the repository root with:
+#python -m unittest discover tests
+
+#=====================================================================================================================================
+#Importing necessary modules
+#=====================================================================================================================================
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+import threading
+import unittest
+import multiprocessing
+
+sys.path.insert(0,os.path.join(os.path.dirname(os.path.abspath(__file__)),os.pardir,"pyfdap"))
+
+from numpy import *
+from numpy.testing import assert_allclose
+
+#pyfdap_img_module needs to be imported before pyfdap_fit_module
+import pyfdap_img_module
+import pyfdap_fit_module
+
+import synthetic_data
+from synthetic_data import make_embryo,record
+
+#=====================================================================================================================================
+#Tests
+#=====================================================================================================================================
+
+#Task for process pool that takes long
+def sleep_task(t):
+	
+	time.sleep(t)
+	return t
+
+#Cancel function that returns True from its n-th call on
+class cancel_after:
+	
+	def __init__(self,n):
+		
+		self.n=n
+		self.calls=0
+	
+	def __call__(self):
+		
+		self.calls=self.calls+1
+		return self.calls>=self.n
+
+class test_budget(unittest.TestCase):
+	
+	#Fit with budget saves its track, so that all evaluated parameters are known
+	def fit_with_budget(self,opt_meth,**budget):
+		
+		emb=make_embryo(1)
+		fit=emb.fits[0]
+		fit.opt_meth=opt_meth
+		fit.save_track=1
+		for prop,val in budget.items():
+			setattr(fit,prop,val)
+		
+		pyfdap_fit_module.fdap_fitting(emb,0)
+		
+		return emb,fit
+	
+	def test_max_fcalls(self):
+		
+		for opt_meth in ['Constrained Nelder-Mead','least_squares','VarPro']:
+			
+			emb,fit=self.fit_with_budget(opt_meth,max_fcalls=15)
+			
+			msg=opt_meth
+			self.assertEqual(fit.budget_exceeded,"evaluation",msg=msg)
+			self.assertFalse(fit.success,msg=msg)
+			
+			#Best of all evaluated parameters is kept
+			P=fit.track_parms.get_parms()
+			ssds=sum((pyfdap_fit_module.get_track_fit(emb,fit)-emb.ext_av_data_ign)**2,axis=1)
+			self.assertTrue(len(P)>=15,msg=msg)
+			assert_allclose(fit.ssd,min(ssds),rtol=1e-12,err_msg=msg)
+			assert_allclose([fit.k_opt,fit.cnaught_opt,fit.ynaught_opt],P[argmin(ssds)],rtol=1e-12,err_msg=msg)
+			assert_allclose(fit.fit_av_d,fit.cnaught_opt*exp(-fit.k_opt*emb.tvec_ignored)+fit.ynaught_opt,rtol=1e-12,err_msg=msg)
+			
+			#Without budget the fit gets further
+			emb_ref,fit_ref=self.fit_with_budget(opt_meth)
+			self.assertEqual(fit_ref.budget_exceeded,None,msg=msg)
+			self.assertTrue(fit_ref.ssd<fit.ssd,msg=msg)
+	
+	def test_max_time(self):
+		
+		emb,fit=self.fit_with_budget('Constrained Nelder-Mead',max_time=0.)
+		
+		self.assertEqual(fit.budget_exceeded,"time")
+		self.assertEqual(len(fit.track_parms),1)
+		assert_allclose([fit.k_opt,fit.cnaught_opt,fit.ynaught_opt],fit.track_parms[0],rtol=1e-12)
+	
+	#budget_exceeded of an earlier fit is reset
+	def test_reset(self):
+		
+		emb,fit=self.fit_with_budget('Constrained Nelder-Mead',max_fcalls=15)
+		fit.max_fcalls=None
+		pyfdap_fit_module.fdap_fitting(emb,0)
+		
+		self.assertEqual(fit.budget_exceeded,None)
+
+class test_cancel_fit(unittest.TestCase):
+	
+	def setUp(self):
+		
+		self.mol=record(embryos=[make_embryo(i) for i in range(4)])
+	
+	def get_results(self):
+		
+		return [emb.fits[0].k_opt for emb in self.mol.embryos]
+	
+	def test_token(self):
+		
+		token=pyfdap_fit_module.cancel_token()
+		self.assertFalse(token())
+		
+		token.cancel()
+		self.assertTrue(token())
+		self.assertRaises(pyfdap_fit_module.task_canceled,pyfdap_fit_module.check_canceled,token)
+		
+		pyfdap_fit_module.check_canceled(None)
+	
+	#Fit canceled during optimization leaves fit unchanged
+	def test_fdap_fitting(self):
+		
+		for opt_meth in ['Constrained Nelder-Mead','least_squares','VarPro','brute','batch_lm']:
+			
+			emb=make_embryo(0)
+			fit=emb.fits[0]
+			fit.opt_meth=opt_meth
+			
+			self.assertRaises(pyfdap_fit_module.task_canceled,pyfdap_fit_module.fdap_fitting,emb,0,cancel=cancel_after(3))
+			self.assertEqual([fit.k_opt,fit.ssd,fit.fit_av_d],[None,None,[]],msg=opt_meth)
+	
+	def test_canceled_before(self):
+		
+		for workers in [1,2]:
+			
+			token=pyfdap_fit_module.cancel_token()
+			token.cancel()
+			
+			self.assertRaises(pyfdap_fit_module.task_canceled,pyfdap_fit_module.fit_molecule,self.mol,workers=workers,cancel=token)
+			self.assertEqual(self.get_results(),[None]*4)
+			self.assertEqual(multiprocessing.active_children(),[])
+	
+	#Canceled after first fit is done, first fit keeps its results, pool is stopped
+	def test_canceled_during(self):
+		
+		for workers in [1,2]:
+			
+			self.setUp()
+			
+			token=pyfdap_fit_module.cancel_token()
+			done=[]
+			def callback(n,total,name):
+				done.append(name)
+				token.cancel()
+			
+			self.assertRaises(pyfdap_fit_module.task_canceled,pyfdap_fit_module.fit_molecule,self.mol,workers=workers,callback=callback,cancel=token)
+			
+			results=self.get_results()
+			self.assertEqual(len(done),1)
+			self.assertEqual(len([k for k in results if k!=None]),1)
+			self.assertEqual(multiprocessing.active_children(),[])
+
+@unittest.skipIf(synthetic_data.Image==None,"needs PIL to write tif images")
+class test_cancel_analysis(unittest.TestCase):
+	
+	def setUp(self):
+		
+		self.fn_folder=tempfile.mkdtemp()
+		self.mol=synthetic_data.make_disk_molecule(self.fn_folder)
+	
+	def tearDown(self):
+		
+		shutil.rmtree(self.fn_folder)
+	
+	def get_analyzed(self):
+		
+		analyzed=[]
+		for emb in self.mol.embryos:
+			analyzed.append(len(emb.ext_av_data_d)>0)
+		for bkgd in self.mol.bkgds:
+			analyzed.append(bkgd.bkgd_ext_vec!=None)
+		
+		return analyzed
+	
+	def test_canceled_before(self):
+		
+		for workers in [1,2]:
+			
+			token=pyfdap_fit_module.cancel_token()
+			token.cancel()
+			
+			self.assertRaises(pyfdap_fit_module.task_canceled,pyfdap_img_module.analyze_molecule,self.mol,workers=workers,cancel=token)
+			self.assertEqual(self.get_analyzed(),[False]*5)
+			self.assertEqual(self.mol.embryos[0].manifest,[])
+			self.assertEqual(multiprocessing.active_children(),[])
+	
+	def test_canceled_during(self):
+		
+		for workers in [1,2]:
+			
+			self.mol=synthetic_data.make_disk_molecule(self.fn_folder)
+			
+			token=pyfdap_fit_module.cancel_token()
+			done=[]
+			def callback(n,total,name):
+				done.append(name)
+				token.cancel()
+			
+			self.assertRaises(pyfdap_fit_module.task_canceled,pyfdap_img_module.analyze_molecule,self.mol,workers=workers,callback=callback,cancel=token)
+			
+			self.assertEqual(len(done),1)
+			self.assertEqual(sum(self.get_analyzed()),1)
+			self.assertEqual(multiprocessing.active_children(),[])
+	
+	#Embryo canceled during analysis is unchanged
+	def test_analyze_fdap_data(self):
+		
+		emb=self.mol.embryos[0]
+		
+		self.assertRaises(pyfdap_fit_module.task_canceled,pyfdap_img_module.analyze_fdap_data,emb,cancel=cancel_after(3))
+		self.assertEqual([emb.ext_av_data_d,emb.manifest,emb.vals_slice,emb.noise.noise,emb.pre.pre_ext],[[],[],[],None,None])
+
+class test_imap_pool(unittest.TestCase):
+	
+	#Cancel is polled while waiting for results of a pool
+	def test_poll(self):
+		
+		token=pyfdap_fit_module.cancel_token()
+		threading.Timer(0.3,token.cancel).start()
+		
+		pool=multiprocessing.Pool(2)
+		t=time.time()
+		try:
+			results=pyfdap_fit_module.imap_pool(pool,sleep_task,[0.,30.,30.],cancel=token)
+			self.assertEqual(results.next(),0.)
+			self.assertRaises(pyfdap_fit_module.task_canceled,results.next)
+		finally:
+			pool.terminate()
+			pool.join()
+		
+		self.assertTrue(time.time()-t<10)
+	
+	def test_results(self):
+		
+		pool=multiprocessing.Pool(2)
+		try:
+			results=list(pyfdap_fit_module.imap_pool(pool,sleep_task,[0.2,0.,0.1],cancel=pyfdap_fit_module.cancel_token()))
+		finally:
+			pool.terminate()
+			pool.join()
+		
+		self.assertEqual(results,[0.2,0.,0.1])
+
+if __name__ == '__main__':
+	unittest.main()
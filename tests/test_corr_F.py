@@ -0,0 +1,181 @@
+#=====================================================================================================================================
+#Copyright
+#=====================================================================================================================================
+
+#Copyright (C) 2014 Alexander Blaessle, Patrick Mueller, and the Friedrich Miescher Laboratory of the Max Planck Society
+#This software is distributed under the terms of the GNU General Public License.
+
+#This file is part of PyFDAP.
+
+#PyFDAP is free software: you can redistribute it and/or modify
+#it under the terms of the GNU General Public License as published by
+#the Free Software Foundation, either version 3 of the License, or
+#(at your option) any later version.
+
+#This program is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#GNU General Public License for more details.
+
+#You should have received a copy of the GNU General Public License
+#along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+#=====================================================================================================================================
+#Module Description
+#=====================================================================================================================================
+
+#Regression tests of the cached correction function F against the loop based reference implementation in baseline_reference.
+#F has to follow changes of bkgds and noise, hits must not restack the bkgd series and the cache is not saved with the
+#molecule. Run from the repository root with:
+#python -m unittest discover tests
+
+#=====================================================================================================================================
+#Importing necessary modules
+#=====================================================================================================================================
+
+import os
+import sys
+import pickle
+import unittest
+
+sys.path.insert(0,os.path.join(os.path.dirname(os.path.abspath(__file__)),os.pardir,"pyfdap"))
+
+from numpy import *
+
+#pyfdap_img_module needs to be imported before pyfdap_fit_module
+import pyfdap_img_module
+import pyfdap_fit_module
+from embryo import *
+from molecule import *
+
+import baseline_reference
+from synthetic_data import record
+
+#=====================================================================================================================================
+#Tests
+#=====================================================================================================================================
+
+class test_corr_F(unittest.TestCase):
+	
+	#Molecule with bkgds of different lengths, one with ignored frames, and embryos with different noise, the last one with 
+	#noise above all preconversion values
+	def setUp(self):
+		
+		random_state=random.RandomState(0)
+		
+		self.mol=molecule('mol')
+		for i,nframes in enumerate([20,25,22]):
+			bkgd=record(pre=record())
+			for region,level in [["ext",30.],["int",20.],["slice",25.]]:
+				setattr(bkgd.pre,"pre_"+region,level+random_state.rand())
+				setattr(bkgd,"bkgd_"+region+"_vec",list(level+5*random_state.rand(nframes)))
+			if i==1:
+				bkgd.bkgd_ext_vec_ign=bkgd.bkgd_ext_vec[:-3]
+			self.mol.bkgds.append(bkgd)
+		
+		for i,noise in enumerate([5.,7.5,50.]):
+			emb=embryo('e%d'%i,'fdap')
+			emb.noise=record(noise=noise)
+			emb.pre=record(pre_ext=50.,pre_int=40.,pre_slice=45.)
+			self.mol.embryos.append(emb)
+		
+		#Count how often bkgds are stacked
+		self.nstacked=[0]
+		self.stack_bkgds=pyfdap_fit_module.stack_bkgds
+		def stack_bkgds(molecule,region):
+			self.nstacked[0]=self.nstacked[0]+1
+			return self.stack_bkgds(molecule,region)
+		pyfdap_fit_module.stack_bkgds=stack_bkgds
+	
+	def tearDown(self):
+		
+		pyfdap_fit_module.stack_bkgds=self.stack_bkgds
+	
+	def check_F(self):
+		
+		for emb in self.mol.embryos:
+			for region in ["ext","int","slice"]:
+				self.assertEqual(pyfdap_fit_module.comp_corr_F_region(self.mol,emb,region),baseline_reference.comp_corr_F_region(self.mol,emb,region))
+	
+	#F has to follow changes of bkgds and noise, not return stale cache entries
+	def test_equal_F(self):
+		
+		self.check_F()
+		self.check_F()
+		
+		#Analysis and import assign new series
+		vec=list(self.mol.bkgds[0].bkgd_int_vec)
+		vec[3]=1.
+		self.mol.bkgds[0].bkgd_int_vec=vec
+		self.check_F()
+		
+		self.mol.bkgds[1].bkgd_ext_vec_ign=self.mol.bkgds[1].bkgd_ext_vec[2:]
+		self.mol.bkgds[2].pre.pre_slice=40.
+		self.mol.embryos[0].noise.noise=2.
+		self.check_F()
+		
+		self.mol.bkgds[2].bkgd_slice_vec.append(1.)
+		self.check_F()
+		
+		self.mol.bkgds.pop(1)
+		self.check_F()
+		
+		self.mol.bkgds.insert(0,self.mol.bkgds[1])
+		self.check_F()
+	
+	#Series of bkgds are only stacked when they changed, not for every embryo or noise value
+	def test_hit(self):
+		
+		self.check_F()
+		self.assertEqual(self.nstacked[0],3)
+		
+		self.mol.embryos[0].noise.noise=2.
+		self.check_F()
+		self.assertEqual(self.nstacked[0],3)
+		
+		self.mol.bkgds[0].bkgd_int_vec=list(self.mol.bkgds[0].bkgd_int_vec)
+		self.check_F()
+		self.assertEqual(self.nstacked[0],4)
+		
+		self.assertEqual(len(self.mol.corr_F_cache),3)
+	
+	#Series changed in place need the cache to be cleared
+	def test_clear(self):
+		
+		self.check_F()
+		
+		self.mol.bkgds[0].bkgd_int_vec[3]=1.
+		self.mol.corr_F_cache.clear()
+		self.check_F()
+	
+	def test_F_curves(self):
+		
+		for emb in self.mol.embryos:
+			for region in ["ext","int","slice"]:
+				noise=emb.noise.noise
+				F,min_F=self.mol.corr_F_cache.get_F(self.mol,region,noise)
+				
+				for i,bkgd in enumerate(self.mol.bkgds):
+					vec=[getattr(bkgd.pre,"pre_"+region)]+list(pyfdap_fit_module.get_bkgd_vec(bkgd,region))
+					self.assertEqual(list(F[i,:len(vec)]),list(baseline_reference.corr_F(vec,vec[0],noise)))
+					self.assertTrue(isnan(F[i,len(vec):]).all())
+				
+				self.assertEqual(list(min_F),list(self.mol.corr_F_cache.get_min_F(self.mol,region,noise)))
+	
+	#Cache is not saved with molecule, F of loaded molecule is the same
+	def test_pickle(self):
+		
+		self.check_F()
+		ref=[pyfdap_fit_module.comp_corr_F_region(self.mol,emb,"ext") for emb in self.mol.embryos]
+		
+		data=pickle.dumps(self.mol,pickle.HIGHEST_PROTOCOL)
+		loaded=pickle.loads(data)
+		
+		self.mol.corr_F_cache.clear()
+		self.assertEqual(data,pickle.dumps(self.mol,pickle.HIGHEST_PROTOCOL))
+		self.assertEqual(len(loaded.corr_F_cache),0)
+		self.assertEqual([pyfdap_fit_module.comp_corr_F_region(loaded,emb,"ext") for emb in loaded.embryos],ref)
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,268 @@
+#=====================================================================================================================================
+#Copyright
+#=====================================================================================================================================
+
+#Copyright (C) 2014 Alexander Blaessle, Patrick Mueller, and the Friedrich Miescher Laboratory of the Max Planck Society
+#This software is distributed under the terms of the GNU General Public License.
+
+#This file is part of PyFDAP.
+
+#PyFDAP is free software: you can redistribute it and/or modify
+#it under the terms of the GNU General Public License as published by
+#the Free Software Foundation, either version 3 of the License, or
+#(at your option) any later version.
+
+#This program is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#GNU General Public License for more details.
+
+#You should have received a copy of the GNU General Public License
+#along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+#=====================================================================================================================================
+#Module Description
+#=====================================================================================================================================
+
+#Tests of the fit result cache: keys of get_fit_key have to change with everything the result depends on and only with that,
+#fit_molecule has to take unchanged fits from the cache, the cache drops least recently used entries and survives saving and
+#loading next to the molecule file. Run from the repository root with:
+#python -m unittest discover tests
+
+#=====================================================================================================================================
+#Importing necessary modules
+#=====================================================================================================================================
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0,os.path.join(os.path.dirname(os.path.abspath(__file__)),os.pardir,"pyfdap"))
+
+from numpy import *
+from numpy.testing import assert_array_equal
+
+#pyfdap_img_module needs to be imported before pyfdap_fit_module
+import pyfdap_img_module
+import pyfdap_fit_module
+
+from synthetic_data import make_embryo,record
+
+#=====================================================================================================================================
+#Tests
+#=====================================================================================================================================
+
+class test_fit_key(unittest.TestCase):
+	
+	#Embryo with an ignored time point
+	def setUp(self):
+		
+		self.emb=make_embryo(1)
+		self.fit=self.emb.fits[0]
+		self.key=pyfdap_fit_module.get_fit_key(self.emb,self.fit)
+	
+	def get_key(self):
+		
+		return pyfdap_fit_module.get_fit_key(self.emb,self.fit)
+	
+	#Each change has to give a new key, undoing it has to give the old key back
+	def check_changes_key(self,obj,prop,val):
+		
+		old=getattr(obj,prop)
+		
+		setattr(obj,prop,val)
+		self.assertNotEqual(self.get_key(),self.key,msg=prop)
+		
+		setattr(obj,prop,old)
+		self.assertEqual(self.get_key(),self.key,msg=prop)
+	
+	def test_same_key(self):
+		
+		self.assertTrue(self.key!=None)
+		self.assertEqual(self.get_key(),self.key)
+		self.assertEqual(pyfdap_fit_module.get_fit_key(make_embryo(1),make_embryo(1).fits[0]),self.key)
+	
+	def test_data(self):
+		
+		data=list(self.emb.ext_av_data_d)
+		data[5]=data[5]+1e-9
+		self.check_changes_key(self.emb,"ext_av_data_d",data)
+		
+		#Data of ignored frame doesn't matter
+		data=list(self.emb.ext_av_data_d)
+		data[2]=data[2]+1.
+		self.emb.ext_av_data_d=data
+		self.assertEqual(self.get_key(),self.key)
+		
+		#Data of other regions only matters when fitted
+		self.emb.int_av_data_d=list(array(self.emb.int_av_data_d)+1.)
+		self.assertEqual(self.get_key(),self.key)
+		self.fit.fit_ext=0
+		self.fit.fit_int=1
+		self.assertNotEqual(self.get_key(),self.key)
+	
+	def test_ignored(self):
+		
+		self.check_changes_key(self.emb,"ignored",[3])
+		self.check_changes_key(self.emb,"ignored",[])
+	
+	def test_tvec(self):
+		
+		self.check_changes_key(self.emb,"tvec_data",self.emb.tvec_data*1.01)
+	
+	def test_settings(self):
+		
+		for prop,val in [["model","power"],["opt_meth","VarPro"],["opt_tol",1e-10],["maxfun",500],["fit_cnaught",0],["fit_ynaught",0],["nstarts",4],
+			["LB_k",1e-6],["UB_k",1.],["LB_cnaught",1.],["UB_cnaught",None],["LB_ynaught",1.],["UB_ynaught",100.],["x0",[2e-4,100.,30.]]]:
+			self.check_changes_key(self.fit,prop,val)
+	
+	#Shape parameters of models count, e.g. exponent of power model
+	def test_model_parms(self):
+		
+		self.fit.model="power"
+		self.key=self.get_key()
+		self.check_changes_key(self.fit,"npower",3)
+	
+	#Same numbers given as int or float give the same key
+	def test_number_types(self):
+		
+		self.fit.x0=[1e-4,100,30]
+		self.fit.UB_ynaught=200
+		self.assertEqual(self.get_key(),self.key)
+	
+	#Fits saving their track can't be cached
+	def test_track(self):
+		
+		self.fit.save_track=1
+		self.assertEqual(self.get_key(),None)
+
+class test_fit_cache(unittest.TestCase):
+	
+	def setUp(self):
+		
+		self.fn_folder=tempfile.mkdtemp()
+		self.mol=record(embryos=[make_embryo(i) for i in range(3)])
+		
+	def tearDown(self):
+		
+		shutil.rmtree(self.fn_folder)
+	
+	def get_results(self,mol):
+		
+		results=[]
+		for emb in mol.embryos:
+			fit=emb.fits[0]
+			results.append([fit.k_opt,fit.cnaught_opt,fit.ynaught_opt,fit.ssd,fit.Rsq,fit.fcalls,list(fit.fit_av_d)])
+		
+		return results
+	
+	def test_hit(self):
+		
+		cache=pyfdap_fit_module.fit_cache()
+		pyfdap_fit_module.fit_molecule(self.mol,cache=cache)
+		self.assertEqual([cache.hits,cache.misses,len(cache)],[0,3,3])
+		
+		mol=record(embryos=[make_embryo(i) for i in range(3)])
+		
+		#Cached fits are not fitted again
+		fdap_fitting=pyfdap_fit_module.fdap_fitting
+		pyfdap_fit_module.fdap_fitting=None
+		try:
+			pyfdap_fit_module.fit_molecule(mol,cache=cache)
+		finally:
+			pyfdap_fit_module.fdap_fitting=fdap_fitting
+		
+		self.assertEqual([cache.hits,cache.misses,len(cache)],[3,3,3])
+		self.assertEqual(self.get_results(mol),self.get_results(self.mol))
+		
+		#Cached results are copies
+		mol.embryos[0].fits[0].fit_av_d[0]=-1.
+		self.assertNotEqual(self.get_results(mol),self.get_results(self.mol))
+		pyfdap_fit_module.fit_molecule(mol,cache=cache)
+		self.assertEqual(self.get_results(mol),self.get_results(self.mol))
+	
+	#Changed fit is fitted again, others are taken from cache
+	def test_miss(self):
+		
+		cache=pyfdap_fit_module.fit_cache()
+		pyfdap_fit_module.fit_molecule(self.mol,cache=cache)
+		
+		self.mol.embryos[1].fits[0].x0=[2e-4,100.,30.]
+		pyfdap_fit_module.fit_molecule(self.mol,cache=cache)
+		
+		self.assertEqual([cache.hits,cache.misses,len(cache)],[2,4,4])
+	
+	def test_eviction(self):
+		
+		cache=pyfdap_fit_module.fit_cache(maxsize=2)
+		
+		cache.put("a",{"ssd":1.})
+		cache.put("b",{"ssd":2.})
+		
+		#Using a makes b the least recently used entry
+		self.assertEqual(cache.get("a"),{"ssd":1.})
+		cache.put("c",{"ssd":3.})
+		
+		self.assertEqual(list(cache.entries.keys()),["a","c"])
+		self.assertEqual(cache.get("b"),None)
+		
+		#Putting an existing key replaces it and doesn't evict anything
+		cache.put("a",{"ssd":4.})
+		self.assertEqual(list(cache.entries.keys()),["c","a"])
+		self.assertEqual(cache.get("a"),{"ssd":4.})
+		
+		cache.put(None,{"ssd":5.})
+		self.assertEqual(len(cache),2)
+	
+	#Fits stopped by their budget are not cached
+	def test_budget_not_cached(self):
+		
+		cache=pyfdap_fit_module.fit_cache()
+		fit=self.mol.embryos[0].fits[0]
+		fit.budget_exceeded="max_fcalls"
+		
+		cache.store_fit("a",fit)
+		self.assertEqual(len(cache),0)
+	
+	def test_save_load(self):
+		
+		fn_mol=os.path.join(self.fn_folder,"mol.pk")
+		fn_cache=pyfdap_fit_module.get_cache_fn(fn_mol)
+		self.assertEqual(fn_cache,os.path.join(self.fn_folder,"mol_fitcache.pk"))
+		
+		cache=pyfdap_fit_module.fit_cache()
+		pyfdap_fit_module.fit_molecule(self.mol,cache=cache)
+		cache.save(fn_cache)
+		
+		loaded=pyfdap_fit_module.fit_cache()
+		loaded.load(fn_cache)
+		self.assertEqual(list(loaded.entries.keys()),list(cache.entries.keys()))
+		
+		mol=record(embryos=[make_embryo(i) for i in range(3)])
+		pyfdap_fit_module.fit_molecule(mol,cache=loaded)
+		self.assertEqual(loaded.hits,3)
+		self.assertEqual(self.get_results(mol),self.get_results(self.mol))
+		for emb,emb_ref in zip(mol.embryos,self.mol.embryos):
+			assert_array_equal(emb.fits[0].cov_opt,emb_ref.fits[0].cov_opt)
+	
+	#Entries already in cache count as more recent than loaded ones, so loaded ones are dropped first
+	def test_load_merge(self):
+		
+		fn_cache=os.path.join(self.fn_folder,"cache.pk")
+		
+		cache=pyfdap_fit_module.fit_cache()
+		cache.put("a",{"ssd":1.})
+		cache.put("b",{"ssd":2.})
+		cache.save(fn_cache)
+		
+		loaded=pyfdap_fit_module.fit_cache(maxsize=2)
+		loaded.put("c",{"ssd":3.})
+		loaded.load(fn_cache)
+		
+		self.assertEqual(list(loaded.entries.keys()),["b","c"])
+
+if __name__ == '__main__':
+	unittest.main()
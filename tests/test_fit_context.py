@@ -0,0 +1,92 @@
+#=====================================================================================================================================
+#Copyright
+#=====================================================================================================================================
+
+#Copyright (C) 2014 Alexander Blaessle, Patrick Mueller, and the Friedrich Miescher Laboratory of the Max Planck Society
+#This software is distributed under the terms of the GNU General Public License.
+
+#This file is part of PyFDAP.
+
+#PyFDAP is free software: you can redistribute it and/or modify
+#it under the terms of the GNU General Public License as published by
+#the Free Software Foundation, either version 3 of the License, or
+#(at your option) any later version.
+
+#This program is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#GNU General Public License for more details.
+
+#You should have received a copy of the GNU General Public License
+#along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+#=====================================================================================================================================
+#Module Description
+#=====================================================================================================================================
+
+#Checks that fdap_fitting never reads from the terminal, so that fits can run in threads and pool workers without stdin. 
+#Run from the repository root with:
+#python -m unittest discover tests
+
+#=====================================================================================================================================
+#Importing necessary modules
+#=====================================================================================================================================
+
+import os
+import sys
+import unittest
+import StringIO
+
+sys.path.insert(0,os.path.join(os.path.dirname(os.path.abspath(__file__)),os.pardir,"pyfdap"))
+
+#pyfdap_img_module needs to be imported before pyfdap_fit_module
+import pyfdap_img_module
+import pyfdap_fit_module
+
+from synthetic_data import make_embryo
+
+#=====================================================================================================================================
+#Tests
+#=====================================================================================================================================
+
+class test_no_stdin(unittest.TestCase):
+	
+	#Reading from stdin raises EOFError as in pool workers
+	def setUp(self):
+		
+		self.stdin=sys.stdin
+		sys.stdin=StringIO.StringIO("")
+	
+	def tearDown(self):
+		
+		sys.stdin=self.stdin
+	
+	#Fit selecting more than one region is skipped and left unchanged
+	def test_several_regions(self):
+		
+		for opt_meth in ['Constrained Nelder-Mead','L-BFGS-B','least_squares','VarPro','brute']:
+			
+			emb=make_embryo(0)
+			fit=emb.fits[0]
+			fit.opt_meth=opt_meth
+			fit.fit_slice=1
+			
+			pyfdap_fit_module.fdap_fitting(emb,0)
+			self.assertEqual([fit.k_opt,fit.ssd,fit.fit_av_d],[None,None,[]],msg=opt_meth)
+	
+	#Only k is fitted, c0 and y0 are taken from x0
+	def test_fixed_cnaught_ynaught(self):
+		
+		emb=make_embryo(0)
+		fit=emb.fits[0]
+		fit.opt_meth='Constrained Nelder-Mead'
+		fit.fit_cnaught=0
+		fit.fit_ynaught=0
+		
+		pyfdap_fit_module.fdap_fitting(emb,0)
+		self.assertEqual([fit.cnaught_opt,fit.ynaught_opt],fit.x0[1:])
+		self.assertTrue(fit.LB_k<=fit.k_opt<=fit.UB_k)
+
+if __name__ == '__main__':
+	unittest.main()
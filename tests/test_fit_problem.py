@@ -0,0 +1,107 @@
+#=====================================================================================================================================
+#Copyright
+#=====================================================================================================================================
+
+#Copyright (C) 2014 Alexander Blaessle, Patrick Mueller, and the Friedrich Miescher Laboratory of the Max Planck Society
+#This software is distributed under the terms of the GNU General Public License.
+
+#This file is part of PyFDAP.
+
+#PyFDAP is free software: you can redistribute it and/or modify
+#it under the terms of the GNU General Public License as published by
+#the Free Software Foundation, either version 3 of the License, or
+#(at your option) any later version.
+
+#This program is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#GNU General Public License for more details.
+
+#You should have received a copy of the GNU General Public License
+#along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+#=====================================================================================================================================
+#Module Description
+#=====================================================================================================================================
+
+#Checks that objective functions compiled by compile_fit_problem give the same SSD as the instrumented objective functions
+#of fit_context (calc_ssd and constr_calc_ssd), for every registered decay model, with and without constraints and for all
+#combinations of fitted c0 and y0. Run from the repository root with:
+#python -m unittest discover tests
+
+#=====================================================================================================================================
+#Importing necessary modules
+#=====================================================================================================================================
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0,os.path.join(os.path.dirname(os.path.abspath(__file__)),os.pardir,"pyfdap"))
+
+#pyfdap_img_module needs to be imported before pyfdap_fit_module
+import pyfdap_img_module
+import pyfdap_fit_module
+from embryo import *
+
+#=====================================================================================================================================
+#Tests
+#=====================================================================================================================================
+
+class test_compile_fit_problem(unittest.TestCase):
+	
+	#Embryo with synthetic data and one fit per model
+	def setUp(self):
+		
+		self.emb=embryo('test','fdap')
+		self.emb.tvec_data=linspace(0,600*29,30)
+		self.emb.ext_av_data_d=list(120*exp(-1e-4*self.emb.tvec_data)+40+random.RandomState(0).randn(30))
+		self.emb.ignored=[]
+		
+		for i,model in enumerate(pyfdap_fit_module.decay_models.keys()):
+			self.emb.add_fit(i,model,'default')
+			fit=self.emb.fits[-1]
+			fit.model=model
+			fit.x0=[1e-4,100.,30.]
+			fit.LB_k=0
+			fit.UB_k=1e-2
+			fit.LB_cnaught=0
+			fit.UB_cnaught=500
+			fit.LB_ynaught=0
+			fit.UB_ynaught=200
+			pyfdap_fit_module.check_model_parms(fit,pyfdap_fit_module.decay_models[model])
+	
+	#Solver variables as fdap_fitting passes them, with x0 of parameters that are not fitted dropped
+	def get_x(self,ctx,constrained):
+		
+		if constrained:
+			return pyfdap_fit_module.transform_x0(list(ctx.fit.x0),ctx.LB,ctx.UB)
+		
+		return ctx.get_x(*ctx.fit.x0)
+	
+	def test_equal_ssd(self):
+		
+		for this_fit,fit in enumerate(self.emb.fits):
+			for fit_cnaught in [0,1]:
+				for fit_ynaught in [0,1]:
+					for constrained in [False,True]:
+						
+						fit.fit_cnaught=fit_cnaught
+						fit.fit_ynaught=fit_ynaught
+						ctx=pyfdap_fit_module.fit_context(self.emb,this_fit)
+						
+						if constrained:
+							old=ctx.constr_calc_ssd
+						else:
+							old=ctx.calc_ssd
+						new=pyfdap_fit_module.compile_fit_problem(ctx,constrained=constrained)
+						
+						x=self.get_x(ctx,constrained)
+						
+						#Also check a point away from x0
+						for scale in [1.,1.1]:
+							xs=[v*scale for v in x]
+							self.assertEqual(old(xs),new(xs),msg=str([fit.model,fit_cnaught,fit_ynaught,constrained,scale]))
+
+if __name__ == '__main__':
+	unittest.main()
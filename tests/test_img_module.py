@@ -0,0 +1,71 @@
+#=====================================================================================================================================
+#Copyright
+#=====================================================================================================================================
+
+#Copyright (C) 2014 Alexander Blaessle, Patrick Mueller, and the Friedrich Miescher Laboratory of the Max Planck Society
+#This software is distributed under the terms of the GNU General Public License.
+
+#This file is part of PyFDAP.
+
+#PyFDAP is free software: you can redistribute it and/or modify
+#it under the terms of the GNU General Public License as published by
+#the Free Software Foundation, either version 3 of the License, or
+#(at your option) any later version.
+
+#This program is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#GNU General Public License for more details.
+
+#You should have received a copy of the GNU General Public License
+#along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+#=====================================================================================================================================
+#Module Description
+#=====================================================================================================================================
+
+#Regression tests of the vectorized embryo mask generation against the loop based reference implementation in
+#baseline_reference, including the cache of embryo masks. Run from the repository root with:
+#python -m unittest discover tests
+
+#=====================================================================================================================================
+#Importing necessary modules
+#=====================================================================================================================================
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0,os.path.join(os.path.dirname(os.path.abspath(__file__)),os.pardir,"pyfdap"))
+
+from numpy import *
+from numpy.testing import assert_array_equal
+import pyfdap_img_module
+
+import baseline_reference
+
+#=====================================================================================================================================
+#Tests
+#=====================================================================================================================================
+
+class test_embryo_mask(unittest.TestCase):
+	
+	def test_equal_masks(self):
+		
+		for radius,center,fill in [[20,[32,32],0],[17.5,[20.3,40.7],0],[40,[10,50],nan],[5,[0,0],0]]:
+			
+			ref=baseline_reference.get_embryo_mask(radius,center,64,fill=fill)
+			new=pyfdap_img_module.get_embryo_mask(radius,center,64,0,fill=fill)
+			
+			assert_array_equal(new,ref)
+	
+	#Cached masks are shared and must not be changed by callers
+	def test_cached_mask_read_only(self):
+		
+		mask=pyfdap_img_module.get_embryo_mask(20,[32,32],64,0)
+		
+		self.assertTrue(mask is pyfdap_img_module.get_embryo_mask(20,[32,32],64,0))
+		self.assertFalse(mask.flags.writeable)
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,138 @@
+#=====================================================================================================================================
+#Copyright
+#=====================================================================================================================================
+
+#Copyright (C) 2014 Alexander Blaessle, Patrick Mueller, and the Friedrich Miescher Laboratory of the Max Planck Society
+#This software is distributed under the terms of the GNU General Public License.
+
+#This file is part of PyFDAP.
+
+#PyFDAP is free software: you can redistribute it and/or modify
+#it under the terms of the GNU General Public License as published by
+#the Free Software Foundation, either version 3 of the License, or
+#(at your option) any later version.
+
+#This program is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#GNU General Public License for more details.
+
+#You should have received a copy of the GNU General Public License
+#along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+#=====================================================================================================================================
+#Module Description
+#=====================================================================================================================================
+
+#Tests of incremental reanalysis: after a data file or the embryo circle of a frame changes, or new frames arrive, only
+#these frames are analyzed again (get_manifest, get_changed_frames) and the spliced results (splice_frame_results) equal a
+#full reanalysis. Uses synthetic datasets written to a temporary folder. Run from the repository root with:
+#python -m unittest discover tests
+
+#=====================================================================================================================================
+#Importing necessary modules
+#=====================================================================================================================================
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0,os.path.join(os.path.dirname(os.path.abspath(__file__)),os.pardir,"pyfdap"))
+
+from numpy import *
+from numpy.testing import assert_array_equal
+
+import pyfdap_img_module
+from pyfdap_misc_module import get_sorted_folder_list
+
+import synthetic_data
+
+#=====================================================================================================================================
+#Tests
+#=====================================================================================================================================
+
+@unittest.skipIf(synthetic_data.Image==None,"needs PIL to write tif images")
+class test_incremental(unittest.TestCase):
+	
+	def setUp(self):
+		
+		self.fn_folder=tempfile.mkdtemp()
+		self.fn_dataset=os.path.join(self.fn_folder,"embryo")
+		self.emb=synthetic_data.make_disk_embryo(self.fn_dataset,'e')
+		pyfdap_img_module.analyze_fdap_data(self.emb)
+		
+		#Record which data files analyze_frame is called on
+		self.analyzed=[]
+		self.analyze_frame=pyfdap_img_module.analyze_frame
+		def analyze_frame(task):
+			self.analyzed.append(os.path.basename(task[0]))
+			return self.analyze_frame(task)
+		pyfdap_img_module.analyze_frame=analyze_frame
+		
+	def tearDown(self):
+		
+		pyfdap_img_module.analyze_frame=self.analyze_frame
+		shutil.rmtree(self.fn_folder)
+	
+	def get_changed_frames(self):
+		
+		fn_data_files=get_sorted_folder_list(self.emb.fn_datafolder,self.emb.data_ft)
+		
+		return pyfdap_img_module.get_changed_frames(self.emb,pyfdap_img_module.get_manifest(self.emb,fn_data_files))
+	
+	#Reanalyzes embryo and checks that only frames redo were analyzed and results equal a full analysis
+	def check_reanalysis(self,redo):
+		
+		self.assertEqual(self.get_changed_frames(),redo)
+		
+		pyfdap_img_module.analyze_fdap_data(self.emb)
+		self.assertEqual(self.analyzed,["img_%03d.tif"%i for i in redo])
+		self.assertEqual(self.get_changed_frames(),[])
+		
+		ref=synthetic_data.make_disk_embryo(self.fn_dataset,'ref')
+		ref.centers_embr_px=self.emb.centers_embr_px
+		ref.nframes=self.emb.nframes
+		pyfdap_img_module.analyze_fdap_data(ref,incremental=False)
+		
+		self.assertEqual(self.emb.manifest,ref.manifest)
+		for prop in ["slice_av_data_d","ext_av_data_d","int_av_data_d"]:
+			self.assertEqual(getattr(self.emb,prop),getattr(ref,prop))
+		for prop in ["vals_slice","masks_embryo","masks_ext","masks_int"]:
+			self.assertEqual(len(getattr(self.emb,prop)),len(getattr(ref,prop)))
+			for i in range(len(getattr(ref,prop))):
+				assert_array_equal(getattr(self.emb,prop)[i],getattr(ref,prop)[i])
+		self.assertEqual(self.emb.noise.noise,ref.noise.noise)
+	
+	def test_unchanged(self):
+		
+		self.check_reanalysis([])
+	
+	#New data file in place of frame 2, with a newer modification time
+	def test_changed_file(self):
+		
+		fn_data=os.path.join(self.emb.fn_datafolder,"img_002.tif")
+		t=os.path.getmtime(fn_data)
+		synthetic_data.Image.fromarray(synthetic_data.make_img(64,99).astype('uint16')).save(fn_data)
+		os.utime(fn_data,(t+10,t+10))
+		
+		self.check_reanalysis([2])
+	
+	def test_changed_circle(self):
+		
+		self.emb.centers_embr_px[-1]=[28.,36.]
+		
+		self.check_reanalysis([4])
+	
+	#Frames that were not there at the last analysis, as when watching a data folder
+	def test_new_frames(self):
+		
+		pyfdap_img_module.analyze_fdap_data(self.emb,incremental=False,nframes=3)
+		self.analyzed=[]
+		
+		self.check_reanalysis([3,4])
+
+if __name__ == '__main__':
+	unittest.main()
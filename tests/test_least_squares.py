@@ -0,0 +1,63 @@
+#=====================================================================================================================================
+#Copyright
+#=====================================================================================================================================
+
+#Copyright (C) 2014 Alexander Blaessle, Patrick Mueller, and the Friedrich Miescher Laboratory of the Max Planck Society
+#This software is distributed under the terms of the GNU General Public License.
+
+#This file is part of PyFDAP.
+
+#PyFDAP is free software: you can redistribute it and/or modify
+#it under the terms of the GNU General Public License as published by
+#the Free Software Foundation, either version 3 of the License, or
+#(at your option) any later version.
+
+#This program is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#GNU General Public License for more details.
+
+#You should have received a copy of the GNU General Public License
+#along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+#=====================================================================================================================================
+#Module Description
+#=====================================================================================================================================
+
+#Regression tests of the least squares optimizer with analytic Jacobians: fits of synthetic embryos have to find the
+#optimum of the constrained Nelder-Mead of PyFDAP 1.1 (baseline_reference), also for the power model and with c0 or y0 
+#fixed (optimum of constrained Nelder-Mead of fdap_fitting). Run from the repository root with:
+#python -m unittest discover tests
+
+#=====================================================================================================================================
+#Importing necessary modules
+#=====================================================================================================================================
+
+import unittest
+
+import fit_checks
+
+#=====================================================================================================================================
+#Tests
+#=====================================================================================================================================
+
+class test_least_squares(unittest.TestCase,fit_checks.same_optimum_checks):
+	
+	def test_same_optimum(self):
+		
+		self.check_same_optimum('least_squares')
+	
+	def test_power(self):
+		
+		for npower in [2,3]:
+			self.check_nm_optimum('least_squares','power',npower=npower)
+	
+	def test_fixed(self):
+		
+		for model,shape in [['exp',{}],['power',{'npower':2}]]:
+			self.check_nm_optimum('least_squares',model,fit_cnaught=0,**shape)
+			self.check_nm_optimum('least_squares',model,fit_ynaught=0,**shape)
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,215 @@
+#=====================================================================================================================================
+#Copyright
+#=====================================================================================================================================
+
+#Copyright (C) 2014 Alexander Blaessle, Patrick Mueller, and the Friedrich Miescher Laboratory of the Max Planck Society
+#This software is distributed under the terms of the GNU General Public License.
+
+#This file is part of PyFDAP.
+
+#PyFDAP is free software: you can redistribute it and/or modify
+#it under the terms of the GNU General Public License as published by
+#the Free Software Foundation, either version 3 of the License, or
+#(at your option) any later version.
+
+#This program is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#GNU General Public License for more details.
+
+#You should have received a copy of the GNU General Public License
+#along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+#=====================================================================================================================================
+#Module Description
+#=====================================================================================================================================
+
+#Tests of the decay models (decay_models) and of adapting fits to them (check_model_parms): analytic Jacobians agree with 
+#finite differences, half-lifes are the times the models need to decay halfway, and switching the model of a fit resizes 
+#x0, LB_extra and UB_extra. Run from the repository root with:
+#python -m unittest discover tests
+
+#=====================================================================================================================================
+#Importing necessary modules
+#=====================================================================================================================================
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0,os.path.join(os.path.dirname(os.path.abspath(__file__)),os.pardir,"pyfdap"))
+
+from numpy import *
+from numpy.testing import assert_allclose
+
+#pyfdap_img_module needs to be imported before pyfdap_fit_module
+import pyfdap_img_module
+import pyfdap_fit_module
+
+from synthetic_data import make_embryo
+
+#=====================================================================================================================================
+#Tests
+#=====================================================================================================================================
+
+#Models with values of their shape parameters and parameter vectors [k,c0,y0,extra...] to check them at
+model_cases=[
+	["exp",[],[[1e-4,100.,30.],[2e-3,5.,0.]]],
+	["power",[2],[[1e-6,100.,30.],[5e-5,20.,3.]]],
+	["power",[3],[[1e-8,100.,30.],[1e-7,40.,0.]]],
+	["biexp",[],[[1e-4,100.,30.,10.,0.5],[1e-4,100.,30.,1.,0.2],[5e-4,50.,10.,0.3,0.9]]],
+	["exp_production",[],[[1e-4,100.,30.,1e-3],[3e-4,20.,0.,0.05],[0.,100.,30.,1e-3]]]]
+
+class test_models(unittest.TestCase):
+	
+	t=linspace(0,20000,41)
+	
+	#Central finite differences of model series, relative step for each parameter. Parameters that are 0 get a step relative 
+	#to a typical value, 1e-4 for k and 1 for all others.
+	def get_fd_jacobian(self,model,P,h=1e-6):
+		
+		cols=[]
+		for j in range(len(P)):
+			if P[j]!=0:
+				dp=h*abs(P[j])
+			else:
+				dp=h*[1e-4,1.][j>0]
+			Pp=list(P)
+			Pm=list(P)
+			Pp[j]=P[j]+dp
+			Pm[j]=P[j]-dp
+			cols.append((model.evaluate(self.t,*Pp)-model.evaluate(self.t,*Pm))/(2*dp))
+		
+		return cols
+	
+	def test_jacobian(self):
+		
+		for name,shape_vals,Ps in model_cases:
+			
+			model=pyfdap_fit_module.decay_models[name](*shape_vals)
+			
+			for P in Ps:
+				
+				msg=str([name,shape_vals,P])
+				J=model.jacobian(self.t,*P)
+				J_fd=self.get_fd_jacobian(model,P)
+				
+				self.assertEqual(len(J),3+len(model.extra_parms),msg=msg)
+				for j in range(len(J)):
+					scale=max(abs(J_fd[j]).max(),1.)
+					assert_allclose(J[j]*ones(shape(self.t)),J_fd[j],rtol=1e-5,atol=1e-6*scale,err_msg=msg+" column "+str(j))
+	
+	#Stacked parameters (column arrays, as in batch_lm) give the same Jacobians as each parameter set alone
+	def test_jacobian_stacked(self):
+		
+		for name,shape_vals,Ps in model_cases:
+			
+			model=pyfdap_fit_module.decay_models[name](*shape_vals)
+			P=array(Ps,dtype=float)
+			
+			J=model.jacobian(self.t[newaxis,:],*[P[:,j:j+1] for j in range(shape(P)[1])])
+			for i in range(len(Ps)):
+				for j in range(len(J)):
+					assert_allclose((J[j]*ones((len(Ps),len(self.t))))[i],model.jacobian(self.t,*Ps[i])[j]*ones(shape(self.t)),rtol=1e-12,err_msg=name)
+	
+	#Without background, model decays to half of c0 after one half-life. With production, the distance to the steady state 
+	#prod/k halves.
+	def test_halflife(self):
+		
+		for name,shape_vals,Ps in model_cases:
+			
+			model=pyfdap_fit_module.decay_models[name](*shape_vals)
+			
+			for P in Ps:
+				
+				msg=str([name,shape_vals,P])
+				k,c,y=P[:3]
+				if k==0:
+					continue
+				
+				thalf=model.get_halflife(P)
+				self.assertTrue(thalf>0,msg=msg)
+				
+				c_half=model.evaluate(thalf,*P)-y
+				if name=="exp_production":
+					steady=P[3]/k
+					assert_allclose(c_half-steady,(c-steady)/2.,rtol=1e-10,err_msg=msg)
+				else:
+					assert_allclose(c_half,c/2.,rtol=1e-10,err_msg=msg)
+	
+	def test_halflife_special_cases(self):
+		
+		biexp=pyfdap_fit_module.biexp_model()
+		
+		#Biexp with one pool is exponential
+		for kratio,frac in [[1.,0.3],[5.,0.],[0.2,1.]]:
+			assert_allclose(biexp.halflife(1e-4,100.,kratio,frac)*kratio**frac,log(2)/1e-4,rtol=1e-12)
+		
+		#Arrays of parameters, as in bootstrap_fits
+		kratio=array([1.,5.,0.2])
+		frac=array([0.5,0.5,0.5])
+		assert_allclose(biexp.halflife(1e-4,100.,kratio,frac),[biexp.halflife(1e-4,100.,kratio[i],frac[i]) for i in range(3)],rtol=1e-12)
+		
+		assert_allclose(pyfdap_fit_module.exp_production_model().halflife(1e-4,100.,1e-3),log(2)/1e-4,rtol=1e-12)
+
+class test_check_model_parms(unittest.TestCase):
+	
+	def set_model(self,fit,name):
+		
+		fit.model=name
+		pyfdap_fit_module.check_model_parms(fit,pyfdap_fit_module.decay_models[name])
+	
+	def test_switch(self):
+		
+		fit=make_embryo(0).fits[0]
+		x0=list(fit.x0)
+		
+		for name in ["exp","biexp","exp_production","biexp","exp","exp_production","power"]:
+			
+			self.set_model(fit,name)
+			model=pyfdap_fit_module.decay_models[name]
+			
+			self.assertEqual(fit.x0,x0+model.extra_x0,msg=name)
+			self.assertEqual(fit.LB_extra,model.extra_LB,msg=name)
+			self.assertEqual(fit.UB_extra,model.extra_UB,msg=name)
+			self.assertEqual(fit.extra_opt,[],msg=name)
+			
+			#Defaults of models are not changed through fit
+			self.assertFalse(fit.x0 is model.extra_x0 or fit.LB_extra is model.extra_LB or fit.UB_extra is model.extra_UB)
+	
+	#Extra parameters set for current model are kept
+	def test_keep(self):
+		
+		fit=make_embryo(0).fits[0]
+		
+		self.set_model(fit,"biexp")
+		fit.x0[3:]=[20.,0.1]
+		fit.LB_extra=[2.,0.05]
+		fit.UB_extra=[50.,0.5]
+		
+		self.set_model(fit,"biexp")
+		self.assertEqual([fit.x0[3:],fit.LB_extra,fit.UB_extra],[[20.,0.1],[2.,0.05],[50.,0.5]])
+		
+		#Switching away and back restores defaults
+		self.set_model(fit,"exp")
+		self.set_model(fit,"biexp")
+		self.assertEqual([fit.x0[3:],fit.LB_extra,fit.UB_extra],[[10.,0.5],[1.,0.],[None,1.]])
+	
+	#Switched fit can be fitted and gets one optimal value per extra parameter
+	def test_fit(self):
+		
+		emb=make_embryo(0)
+		fit=emb.fits[0]
+		fit.opt_meth='least_squares'
+		
+		for name in ["biexp","exp_production","exp"]:
+			
+			self.set_model(fit,name)
+			pyfdap_fit_module.fdap_fitting(emb,0)
+			
+			self.assertEqual(len(fit.extra_opt),len(pyfdap_fit_module.decay_models[name].extra_parms),msg=name)
+			self.assertTrue(isfinite(fit.ssd),msg=name)
+
+if __name__ == '__main__':
+	unittest.main()
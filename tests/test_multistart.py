@@ -0,0 +1,134 @@
+#=====================================================================================================================================
+#Copyright
+#=====================================================================================================================================
+
+#Copyright (C) 2014 Alexander Blaessle, Patrick Mueller, and the Friedrich Miescher Laboratory of the Max Planck Society
+#This software is distributed under the terms of the GNU General Public License.
+
+#This file is part of PyFDAP.
+
+#PyFDAP is free software: you can redistribute it and/or modify
+#it under the terms of the GNU General Public License as published by
+#the Free Software Foundation, either version 3 of the License, or
+#(at your option) any later version.
+
+#This program is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#GNU General Public License for more details.
+
+#You should have received a copy of the GNU General Public License
+#along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+#=====================================================================================================================================
+#Module Description
+#=====================================================================================================================================
+
+#Tests of multi-start fits (fit_multistart) and their Latin hypercube starts (latin_hypercube): starts are stratified and 
+#within bounds, multi-start fits are at least as good as a single start from a bad initial guess and count the starts that 
+#agree on the optimum. Run from the repository root with:
+#python -m unittest discover tests
+
+#=====================================================================================================================================
+#Importing necessary modules
+#=====================================================================================================================================
+
+import os
+import sys
+import unittest
+import multiprocessing
+
+sys.path.insert(0,os.path.join(os.path.dirname(os.path.abspath(__file__)),os.pardir,"pyfdap"))
+
+from numpy import *
+from numpy.testing import assert_allclose
+
+#pyfdap_img_module needs to be imported before pyfdap_fit_module
+import pyfdap_img_module
+import pyfdap_fit_module
+
+from synthetic_data import make_model_embryo
+
+#=====================================================================================================================================
+#Tests
+#=====================================================================================================================================
+
+class test_latin_hypercube(unittest.TestCase):
+	
+	#Last parameter is fixed, as in fit_multistart
+	def test_strata(self):
+		
+		LB=[0.,-50.,1e-4,5.]
+		UB=[1.,100.,1e-2,5.]
+		
+		for n in [1,2,7,20]:
+			
+			X=pyfdap_fit_module.latin_hypercube(n,LB,UB,random.RandomState(n))
+			
+			self.assertEqual(shape(X),(n,len(LB)))
+			self.assertTrue((X>=LB).all() and (X<=UB).all())
+			self.assertTrue((X[:,3]==5.).all())
+			
+			#Each stratum of each free parameter is hit once
+			for j in range(3):
+				strata=floor((X[:,j]-LB[j])/(UB[j]-LB[j])*n).astype(int)
+				self.assertEqual(sorted(strata),range(n),msg=str([n,j]))
+			
+			assert_allclose(X,pyfdap_fit_module.latin_hypercube(n,LB,UB,random.RandomState(n)))
+
+class test_multistart(unittest.TestCase):
+	
+	#Fit starting far away from optimum, at k close to its upper bound
+	def fit(self,i,model,opt_meth,nstarts,workers=1):
+		
+		emb=make_model_embryo(i,model)
+		fit=emb.fits[0]
+		fit.opt_meth=opt_meth
+		fit.x0[:3]=[9e-3,1.,190.]
+		fit.nstarts=nstarts
+		
+		pyfdap_fit_module.fdap_fitting(emb,0,workers=workers)
+		
+		return fit
+	
+	def test_better(self):
+		
+		for model,opt_meth in [['exp','Constrained Nelder-Mead'],['exp','L-BFGS-B'],['biexp','least_squares']]:
+			for i in range(3):
+				
+				fit_single=self.fit(i,model,opt_meth,1)
+				fit=self.fit(i,model,opt_meth,8)
+				
+				msg=str([model,opt_meth,i])
+				self.assertTrue(fit.ssd<=fit_single.ssd*(1+1e-9),msg=msg)
+				self.assertEqual(fit.nstarts,8,msg=msg)
+				self.assertEqual(fit.x0[:3],[9e-3,1.,190.],msg=msg)
+				assert_allclose(fit.fit_av_d,pyfdap_fit_module.fit_context(fit.embryo,0).model_series(*pyfdap_fit_module.get_parms_opt(fit)),err_msg=msg)
+				
+				#Single least squares start gets stuck with biexp
+				if model=='biexp':
+					self.assertTrue(fit.ssd<0.01*fit_single.ssd,msg=msg)
+	
+	def test_nstarts_agree(self):
+		
+		#Exponential model has a single optimum that all starts find
+		fit=self.fit(0,'exp','Constrained Nelder-Mead',8)
+		self.assertEqual(fit.nstarts_agree,8)
+		
+		#Biexp starts end up in different places
+		fit=self.fit(0,'biexp','least_squares',8)
+		self.assertTrue(1<=fit.nstarts_agree<8)
+	
+	def test_workers(self):
+		
+		fit=self.fit(1,'biexp','least_squares',8)
+		fit_pool=self.fit(1,'biexp','least_squares',8,workers=2)
+		
+		for prop in ["k_opt","cnaught_opt","ynaught_opt","extra_opt","ssd","nstarts_agree","fcalls"]:
+			assert_allclose(getattr(fit_pool,prop),getattr(fit,prop),rtol=1e-12,err_msg=prop)
+		
+		self.assertEqual(multiprocessing.active_children(),[])
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,85 @@
+#=====================================================================================================================================
+#Copyright
+#=====================================================================================================================================
+
+#Copyright (C) 2014 Alexander Blaessle, Patrick Mueller, and the Friedrich Miescher Laboratory of the Max Planck Society
+#This software is distributed under the terms of the GNU General Public License.
+
+#This file is part of PyFDAP.
+
+#PyFDAP is free software: you can redistribute it and/or modify
+#it under the terms of the GNU General Public License as published by
+#the Free Software Foundation, either version 3 of the License, or
+#(at your option) any later version.
+
+#This program is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#GNU General Public License for more details.
+
+#You should have received a copy of the GNU General Public License
+#along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+#=====================================================================================================================================
+#Module Description
+#=====================================================================================================================================
+
+#Regression tests of the cumulative histogram Otsu thresholding against the loop based reference implementation in
+#baseline_reference, on single synthetic images and stacks, with nan pixels outside of the embryo. Run from the repository
+#root with:
+#python -m unittest discover tests
+
+#=====================================================================================================================================
+#Importing necessary modules
+#=====================================================================================================================================
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0,os.path.join(os.path.dirname(os.path.abspath(__file__)),os.pardir,"pyfdap"))
+
+from numpy import *
+from numpy.testing import assert_array_equal
+import pyfdap_img_module
+
+import baseline_reference
+from synthetic_data import make_img
+
+#=====================================================================================================================================
+#Tests
+#=====================================================================================================================================
+
+class test_otsu(unittest.TestCase):
+	
+	def setUp(self):
+		
+		self.imgs=[make_img(64,seed) for seed in range(4)]
+		
+		#Image masked with nan outside of embryo, as with thresh_masked
+		self.imgs.append(self.imgs[0]*baseline_reference.get_embryo_mask(25,[30,34],64,fill=nan))
+	
+	def test_single(self):
+		
+		for img in self.imgs:
+			
+			kStar_ref,bin_ref=baseline_reference.otsu_imagej(img,1,0)
+			kStar_new,bin_new=pyfdap_img_module.otsu_imagej(img,1,0,0)
+			
+			self.assertEqual(kStar_new,kStar_ref)
+			assert_array_equal(bin_new,bin_ref)
+	
+	def test_stack(self):
+		
+		kStars,bin_imgs=pyfdap_img_module.otsu_imagej_stack(self.imgs,1,0)
+		
+		for i,img in enumerate(self.imgs):
+			
+			kStar_ref,bin_ref=baseline_reference.otsu_imagej(img,1,0)
+			
+			self.assertEqual(kStars[i],kStar_ref)
+			assert_array_equal(bin_imgs[i],bin_ref)
+
+if __name__ == '__main__':
+	unittest.main()
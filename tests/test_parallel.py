@@ -0,0 +1,154 @@
+#=====================================================================================================================================
+#Copyright
+#=====================================================================================================================================
+
+#Copyright (C) 2014 Alexander Blaessle, Patrick Mueller, and the Friedrich Miescher Laboratory of the Max Planck Society
+#This software is distributed under the terms of the GNU General Public License.
+
+#This file is part of PyFDAP.
+
+#PyFDAP is free software: you can redistribute it and/or modify
+#it under the terms of the GNU General Public License as published by
+#the Free Software Foundation, either version 3 of the License, or
+#(at your option) any later version.
+
+#This program is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#GNU General Public License for more details.
+
+#You should have received a copy of the GNU General Public License
+#along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+#=====================================================================================================================================
+#Module Description
+#=====================================================================================================================================
+
+#Checks that analyze_molecule and fit_molecule give the same results with a process pool (workers>1) as serially, and that
+#results computed in worker processes end up in the original embryo, bkgd and fit objects of the molecule. Uses synthetic
+#datasets written to a temporary folder. Run from the repository root with:
+#python -m unittest discover tests
+
+#=====================================================================================================================================
+#Importing necessary modules
+#=====================================================================================================================================
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0,os.path.join(os.path.dirname(os.path.abspath(__file__)),os.pardir,"pyfdap"))
+
+from numpy import *
+from numpy.testing import assert_array_equal
+
+import pyfdap_img_module
+import pyfdap_fit_module
+
+import synthetic_data
+
+#=====================================================================================================================================
+#Tests
+#=====================================================================================================================================
+
+#Analysis results compared between serial and parallel runs
+embryo_props=["slice_av_data_d","ext_av_data_d","int_av_data_d"]
+embryo_stores=["vals_slice","masks_embryo","masks_ext","masks_int"]
+bkgd_props=["bkgd_slice_av","bkgd_ext_av","bkgd_int_av","bkgd_slice_vec","bkgd_ext_vec","bkgd_int_vec"]
+bkgd_stores=["bkgd_vals_slice","masks_embryo","masks_ext","masks_int"]
+pre_props=["pre_slice","pre_ext","pre_int"]
+mol_props=["bkgd_slice","bkgd_ext","bkgd_int","bkgd_pre_slice","bkgd_pre_ext","bkgd_pre_int"]
+fit_props=["k_opt","cnaught_opt","ynaught_opt","ssd","Rsq","success","iterations","fcalls","fit_av_d"]
+
+@unittest.skipIf(synthetic_data.Image==None,"needs PIL to write tif images")
+class test_parallel(unittest.TestCase):
+	
+	def setUp(self):
+		
+		self.fn_folder=tempfile.mkdtemp()
+		
+	def tearDown(self):
+		
+		shutil.rmtree(self.fn_folder)
+	
+	def assert_equal_stores(self,store,ref):
+		
+		self.assertEqual(len(store),len(ref))
+		for i in range(len(ref)):
+			assert_array_equal(store[i],ref[i])
+	
+	def test_analyze_molecule(self):
+		
+		ref=synthetic_data.make_disk_molecule(self.fn_folder)
+		pyfdap_img_module.analyze_molecule(ref,workers=1)
+		
+		mol=synthetic_data.make_disk_molecule(self.fn_folder)
+		objs=list(mol.embryos)+list(mol.bkgds)
+		
+		done=[]
+		pyfdap_img_module.analyze_molecule(mol,workers=2,callback=lambda i,n,name: done.append(name))
+		
+		self.assertEqual(sorted(done),sorted([obj.name for obj in objs]))
+		
+		#Results are merged into the objects of the molecule, not into copies
+		self.assertEqual(list(mol.embryos)+list(mol.bkgds),objs)
+		
+		for emb,emb_ref in zip(mol.embryos,ref.embryos):
+			for prop in embryo_props:
+				assert_array_equal(getattr(emb,prop),getattr(emb_ref,prop),err_msg=prop)
+			for prop in embryo_stores:
+				self.assert_equal_stores(getattr(emb,prop),getattr(emb_ref,prop))
+			for prop in pre_props:
+				self.assertEqual(getattr(emb.pre,prop),getattr(emb_ref.pre,prop))
+			self.assertEqual(emb.noise.noise,emb_ref.noise.noise)
+			self.assertEqual(emb.manifest,emb_ref.manifest)
+			
+			#Subobjects still point to their embryo
+			self.assertTrue(emb.pre.embryo is emb)
+			self.assertTrue(emb.noise.embryo is emb)
+		
+		for bkgd,bkgd_ref in zip(mol.bkgds,ref.bkgds):
+			for prop in bkgd_props:
+				assert_array_equal(getattr(bkgd,prop),getattr(bkgd_ref,prop),err_msg=prop)
+			for prop in bkgd_stores:
+				self.assert_equal_stores(getattr(bkgd,prop),getattr(bkgd_ref,prop))
+			for prop in pre_props:
+				self.assertEqual(getattr(bkgd.pre,prop),getattr(bkgd_ref.pre,prop))
+			self.assertTrue(bkgd.molecule is mol)
+		
+		for prop in mol_props:
+			self.assertEqual(getattr(mol,prop),getattr(ref,prop))
+	
+	def test_fit_molecule(self):
+		
+		#One embryo with an ignored time point
+		ref=synthetic_data.make_disk_molecule(self.fn_folder,nbkgds=0)
+		pyfdap_img_module.analyze_molecule(ref,workers=1)
+		ref.embryos[1].ignored=[2]
+		pyfdap_fit_module.fit_molecule(ref,workers=1)
+		
+		mol=synthetic_data.make_disk_molecule(self.fn_folder,nbkgds=0)
+		pyfdap_img_module.analyze_molecule(mol,workers=1)
+		mol.embryos[1].ignored=[2]
+		
+		fits=[emb.fits[0] for emb in mol.embryos]
+		pyfdap_fit_module.fit_molecule(mol,workers=2)
+		
+		for emb,emb_ref,fit in zip(mol.embryos,ref.embryos,fits):
+			
+			#Results are merged into the fit objects of the embryo, which still belong to it
+			self.assertTrue(emb.fits[0] is fit)
+			self.assertTrue(fit.embryo is emb)
+			
+			for prop in fit_props:
+				assert_array_equal(getattr(fit,prop),getattr(emb_ref.fits[0],prop),err_msg=prop)
+			
+			#Ignored vectors are updated as fdap_fitting does
+			assert_array_equal(emb.tvec_ignored,emb_ref.tvec_ignored)
+			assert_array_equal(emb.ext_av_data_ign,emb_ref.ext_av_data_ign)
+
+if __name__ == '__main__':
+	unittest.main()
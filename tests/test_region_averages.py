@@ -0,0 +1,112 @@
+#=====================================================================================================================================
+#Copyright
+#=====================================================================================================================================
+
+#Copyright (C) 2014 Alexander Blaessle, Patrick Mueller, and the Friedrich Miescher Laboratory of the Max Planck Society
+#This software is distributed under the terms of the GNU General Public License.
+
+#This file is part of PyFDAP.
+
+#PyFDAP is free software: you can redistribute it and/or modify
+#it under the terms of the GNU General Public License as published by
+#the Free Software Foundation, either version 3 of the License, or
+#(at your option) any later version.
+
+#This program is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#GNU General Public License for more details.
+
+#You should have received a copy of the GNU General Public License
+#along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+#=====================================================================================================================================
+#Module Description
+#=====================================================================================================================================
+
+#Regression tests of the label image region averages against the masked multiplications of the reference implementation in
+#baseline_reference, on synthetic images with per-frame embryo masks. Run from the repository root with:
+#python -m unittest discover tests
+
+#=====================================================================================================================================
+#Importing necessary modules
+#=====================================================================================================================================
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0,os.path.join(os.path.dirname(os.path.abspath(__file__)),os.pardir,"pyfdap"))
+
+from numpy import *
+from numpy.testing import assert_allclose
+import pyfdap_img_module
+
+import baseline_reference
+from synthetic_data import make_img
+
+#=====================================================================================================================================
+#Tests
+#=====================================================================================================================================
+
+#Embryo circles of the frames
+circles=[[20,[32,32]],[24,[30,35]],[15.5,[40.2,28.9]]]
+
+class test_region_averages(unittest.TestCase):
+	
+	#Averages of frame i with embryo mask filled with fill outside, ext/int masks come from thresholding the frame
+	def get_averages(self,i,fill):
+		
+		radius,center=circles[i]
+		
+		data=make_img(64,i)
+		mask_embryo=baseline_reference.get_embryo_mask(radius,center,64,fill=fill)
+		kStar,mask_ext=baseline_reference.otsu_imagej(data,1,0)
+		mask_int=1-mask_ext
+		
+		ref=baseline_reference.region_averages(data,mask_embryo,mask_ext,mask_int)
+		
+		labels=pyfdap_img_module.get_label_img(mask_embryo,mask_ext,mask_int)
+		new=pyfdap_img_module.region_averages(data,labels,mask_embryo)
+		
+		return new,ref
+	
+	#Binary embryo masks and masks with a fill value outside, which are weighted
+	def test_equal_averages(self):
+		
+		for i in range(len(circles)):
+			for fill in [0,0.5]:
+				
+				new,ref=self.get_averages(i,fill)
+				
+				self.assertTrue(isfinite(ref).all())
+				assert_allclose(new,ref,rtol=1e-12)
+	
+	#With nan outside of embryo, the reference averages are nan, so must be the new ones
+	def test_nan_fill(self):
+		
+		for i in range(len(circles)):
+			
+			new,ref=self.get_averages(i,nan)
+			
+			self.assertTrue(isnan(ref).all())
+			self.assertTrue(isnan(new).all())
+	
+	#Whole frame analysis as done by analyze_fdap_data for every frame
+	def test_analyze_frame(self):
+		
+		data=make_img(64,7)
+		mask_embryo=pyfdap_img_module.get_embryo_mask(22,[31,33],64,0)
+		kStar,mask_ext=baseline_reference.otsu_imagej(data,1,0)
+		mask_int=1-mask_ext
+		
+		data_vals,slice_av,ext_av,int_av=pyfdap_img_module.analyze_frame([None,data,'uint16',mask_embryo,mask_ext,mask_int])
+		
+		ref=baseline_reference.region_averages(data.astype('uint16'),mask_embryo,mask_ext,mask_int)
+		
+		self.assertTrue(isfinite(ref).all())
+		assert_allclose([slice_av,ext_av,int_av],ref,rtol=1e-12)
+
+if __name__ == '__main__':
+	unittest.main()
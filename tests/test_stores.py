@@ -0,0 +1,158 @@
+#=====================================================================================================================================
+#Copyright
+#=====================================================================================================================================
+
+#Copyright (C) 2014 Alexander Blaessle, Patrick Mueller, and the Friedrich Miescher Laboratory of the Max Planck Society
+#This software is distributed under the terms of the GNU General Public License.
+
+#This file is part of PyFDAP.
+
+#PyFDAP is free software: you can redistribute it and/or modify
+#it under the terms of the GNU General Public License as published by
+#the Free Software Foundation, either version 3 of the License, or
+#(at your option) any later version.
+
+#This program is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#GNU General Public License for more details.
+
+#You should have received a copy of the GNU General Public License
+#along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+#=====================================================================================================================================
+#Module Description
+#=====================================================================================================================================
+
+#Round trip tests of the compact storage of analysis results: frame_store (embryo.vals_slice) and bit-packed mask_store
+#(embryo.masks_embryo, masks_ext and masks_int). Stored images and masks have to
+#come back unchanged when indexed, iterated and after pickling, as done when saving a molecule. Run from the repository root with:
+#python -m unittest discover tests
+
+#=====================================================================================================================================
+#Importing necessary modules
+#=====================================================================================================================================
+
+import os
+import sys
+import pickle
+import unittest
+
+sys.path.insert(0,os.path.join(os.path.dirname(os.path.abspath(__file__)),os.pardir,"pyfdap"))
+
+from numpy import *
+from numpy.testing import assert_array_equal
+import pyfdap_img_module
+from embryo import *
+
+from synthetic_data import make_img
+
+#=====================================================================================================================================
+#Tests
+#=====================================================================================================================================
+
+#Pickles and unpickles obj the same way molecules are saved and loaded
+def pickle_round_trip(obj):
+	
+	return pickle.loads(pickle.dumps(obj,pickle.HIGHEST_PROTOCOL))
+
+class test_frame_store(unittest.TestCase):
+	
+	#Native uint16 images with embryo masks that are shared between frames, move and are filled with nan outside
+	def setUp(self):
+		
+		self.imgs=[make_img(64,i).astype('uint16') for i in range(6)]
+		self.masks=[]
+		for i,(center,fill) in enumerate([[[32,32],0],[[32,32],0],[[30,35],0],[[30,35],nan],[[30,35],nan],[[32,32],0]]):
+			self.masks.append(pyfdap_img_module.get_embryo_mask(20,center,64,0,fill=fill))
+		
+		self.store=pyfdap_img_module.frame_store()
+		for img,mask in zip(self.imgs,self.masks):
+			self.store.append(img,mask)
+	
+	def check_store(self,store):
+		
+		self.assertEqual(len(store),len(self.imgs))
+		
+		for i in range(len(self.imgs)):
+			assert_array_equal(store[i],self.imgs[i]*self.masks[i])
+			assert_array_equal(store.imgs[i],self.imgs[i])
+			self.assertEqual(store.imgs[i].dtype,dtype('uint16'))
+		
+		for frame,img,mask in zip(store,self.imgs,self.masks):
+			assert_array_equal(frame,img*mask)
+		
+		assert_array_equal(store[-1],store[len(self.imgs)-1])
+	
+	def test_round_trip(self):
+		
+		self.check_store(self.store)
+		self.check_store(pickle_round_trip(self.store))
+	
+	#Images are kept in native encoding, identical consecutive masks only once
+	def test_compact(self):
+		
+		float_bytes=sum([(img*mask).nbytes for img,mask in zip(self.imgs,self.masks)])
+		
+		self.assertTrue(self.store.nbytes()<float_bytes/2)
+		self.assertEqual(len(pickle_round_trip(self.store).masks.masks),4)
+
+class test_mask_store(unittest.TestCase):
+	
+	#Binary masks of odd size, so that packed bits need padding, and embryo masks filled with nan that can't be packed
+	def setUp(self):
+		
+		self.masks=[]
+		for i in range(4):
+			kStar,mask=pyfdap_img_module.otsu_imagej(make_img(63,i)[:,:61],1,0,0)
+			self.masks.append(mask)
+		self.masks.insert(2,self.masks[1].copy())
+		self.masks.append(pyfdap_img_module.get_embryo_mask(20,[30,30],63,0,fill=nan))
+		self.masks.append(pyfdap_img_module.get_embryo_mask(20,[30,30],63,0,fill=nan))
+		self.masks.append(1-self.masks[0])
+		
+		self.store=pyfdap_img_module.pack_masks(self.masks)
+	
+	def check_store(self,store):
+		
+		self.assertEqual(len(store),len(self.masks))
+		
+		for i,mask in enumerate(self.masks):
+			assert_array_equal(store[i],mask)
+			self.assertEqual(store[i].shape,mask.shape)
+		
+		for stored,mask in zip(store,self.masks):
+			assert_array_equal(stored,mask)
+	
+	def test_round_trip(self):
+		
+		self.check_store(self.store)
+		self.check_store(pickle_round_trip(self.store))
+	
+	#Binary masks are packed to bits, nan filled ones are kept as they are, consecutive identical masks only stored once
+	def test_packed(self):
+		
+		self.assertEqual(self.store.packed,[True,True,True,True,False,True])
+		self.assertEqual(self.store.idx,[0,1,1,2,3,4,4,5])
+		self.assertEqual(self.store.masks[0].nbytes,int(ceil(63*61/8.)))
+	
+	#Masks of an analyzed embryo survive pickling together with the embryo
+	def test_embryo_round_trip(self):
+		
+		emb=embryo('e','fdap')
+		emb.masks_ext=self.store
+		emb.masks_int=pyfdap_img_module.pack_masks([1-mask for mask in self.masks[:4]])
+		emb.vals_slice=pyfdap_img_module.frame_store()
+		for i in range(4):
+			emb.vals_slice.append(make_img(63,i)[:,:61].astype('uint16'),self.masks[i])
+		
+		loaded=pickle_round_trip(emb)
+		
+		self.check_store(loaded.masks_ext)
+		for i in range(4):
+			assert_array_equal(loaded.masks_int[i],1-self.masks[i])
+			assert_array_equal(loaded.vals_slice[i],emb.vals_slice[i])
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,241 @@
+#=====================================================================================================================================
+#Copyright
+#=====================================================================================================================================
+
+#Copyright (C) 2014 Alexander Blaessle, Patrick Mueller, and the Friedrich Miescher Laboratory of the Max Planck Society
+#This software is distributed under the terms of the GNU General Public License.
+
+#This file is part of PyFDAP.
+
+#PyFDAP is free software: you can redistribute it and/or modify
+#it under the terms of the GNU General Public License as published by
+#the Free Software Foundation, either version 3 of the License, or
+#(at your option) any later version.
+
+#This program is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#GNU General Public License for more details.
+
+#You should have received a copy of the GNU General Public License
+#along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+#=====================================================================================================================================
+#Module Description
+#=====================================================================================================================================
+
+#Tests of the ring buffer that records optimizer tracks (track_recorder): order after wraparound, subsampling, pickling and
+#conversion of tracks of older versions. Model curves recomputed by get_track_fit have to equal the curves fdap_fitting
+#evaluated, which older versions stored in fit.track_fit. Run from the repository root with:
+#python -m unittest discover tests
+
+#=====================================================================================================================================
+#Importing necessary modules
+#=====================================================================================================================================
+
+import os
+import sys
+import pickle
+import unittest
+
+sys.path.insert(0,os.path.join(os.path.dirname(os.path.abspath(__file__)),os.pardir,"pyfdap"))
+
+from numpy import *
+from numpy.testing import assert_array_equal,assert_allclose
+
+#pyfdap_img_module needs to be imported before pyfdap_fit_module
+import pyfdap_img_module
+import pyfdap_fit_module
+
+from synthetic_data import make_embryo
+
+#=====================================================================================================================================
+#Tests
+#=====================================================================================================================================
+
+#Recorder with parameter sets [i,10*i,100*i] of evaluations i=0..n-1 appended
+def make_recorder(n,maxlen=1000,every=1):
+	
+	track=pyfdap_fit_module.track_recorder(maxlen=maxlen,every=every)
+	for i in range(n):
+		track.append([i,10*i,100*i])
+	
+	return track
+
+#Expected parameter sets of evaluations idx
+def get_parms(idx):
+	
+	return array([[i,10*i,100*i] for i in idx],dtype=float)
+
+class test_track_recorder(unittest.TestCase):
+	
+	def check_track(self,track,idx):
+		
+		P=get_parms(idx)
+		
+		self.assertEqual(len(track),len(idx))
+		assert_array_equal(track.get_parms(),P.reshape(-1,3))
+		for i in range(len(idx)):
+			assert_array_equal(track[i],P[i])
+			assert_array_equal(track[i-len(idx)],P[i])
+		
+		self.assertRaises(IndexError,track.__getitem__,len(idx))
+		self.assertRaises(IndexError,track.__getitem__,-len(idx)-1)
+	
+	def test_grow(self):
+		
+		self.check_track(make_recorder(0),[])
+		self.check_track(make_recorder(20),range(20))
+	
+	#Only last maxlen entries are kept, oldest first
+	def test_wraparound(self):
+		
+		for n in [4,5,10,11]:
+			track=make_recorder(n,maxlen=4)
+			self.check_track(track,range(n-4,n))
+			self.assertEqual(shape(track.parms),(4,3))
+	
+	def test_every(self):
+		
+		track=make_recorder(10,every=3)
+		self.check_track(track,[0,3,6,9])
+		self.assertEqual(track.nevals,10)
+		
+		track=make_recorder(20,maxlen=3,every=3)
+		self.check_track(track,[12,15,18])
+	
+	#Models with extra parameters record more than 3 parameters
+	def test_width(self):
+		
+		track=pyfdap_fit_module.track_recorder()
+		track.append([1.,2.,3.,4.,5.])
+		track.append([6.,7.,8.,9.,10.])
+		
+		assert_array_equal(track.get_parms(),[[1.,2.,3.,4.,5.],[6.,7.,8.,9.,10.]])
+	
+	#Only kept entries are pickled, in order, and recording continues after unpickling
+	def test_pickle(self):
+		
+		for n,maxlen in [[0,4],[10,1000],[10,4],[11,4]]:
+			
+			track=make_recorder(n,maxlen=maxlen)
+			loaded=pickle.loads(pickle.dumps(track,pickle.HIGHEST_PROTOCOL))
+			
+			idx=range(max(n-maxlen,0),n)
+			self.check_track(loaded,idx)
+			self.assertEqual(shape(loaded.parms)[0],len(idx))
+			
+			loaded.append([n,10*n,100*n])
+			self.check_track(loaded,range(max(n+1-maxlen,0),n+1))
+		
+	def test_clear(self):
+		
+		track=make_recorder(10,maxlen=4)
+		track.clear()
+		self.check_track(track,[])
+		self.assertEqual(track.nevals,0)
+
+class test_get_track_recorder(unittest.TestCase):
+	
+	def setUp(self):
+		
+		self.fit=make_embryo(0).fits[0]
+	
+	def test_new(self):
+		
+		self.fit.track_maxlen=5
+		self.fit.track_every=2
+		
+		track=pyfdap_fit_module.get_track_recorder(self.fit)
+		
+		self.assertTrue(self.fit.track_parms is track)
+		self.assertEqual([track.maxlen,track.every,len(track)],[5,2,0])
+		self.assertTrue(pyfdap_fit_module.get_track_recorder(self.fit) is track)
+	
+	#Tracks of older versions are lists of parameter sets
+	def test_convert_list(self):
+		
+		self.fit.track_parms=[list(P) for P in get_parms(range(10))]
+		
+		track=pyfdap_fit_module.get_track_recorder(self.fit)
+		
+		self.assertTrue(isinstance(track,pyfdap_fit_module.track_recorder))
+		assert_array_equal(track.get_parms(),get_parms(range(10)))
+	
+	#Changing maxlen or every creates new recorder with the last kept parameters
+	def test_settings_changed(self):
+		
+		self.fit.track_parms=make_recorder(10)
+		self.fit.track_maxlen=4
+		
+		track=pyfdap_fit_module.get_track_recorder(self.fit)
+		
+		self.assertEqual(track.maxlen,4)
+		assert_array_equal(track.get_parms(),get_parms(range(6,10)))
+
+class test_get_track_fit(unittest.TestCase):
+	
+	#Records copy of fit_av_d after every evaluation of calc_ssd/calc_residuals, as older versions did in fit.track_fit
+	def setUp(self):
+		
+		self.track_fit=[]
+		self.calc_ssd=pyfdap_fit_module.fit_context.calc_ssd
+		self.calc_residuals=pyfdap_fit_module.fit_context.calc_residuals
+		
+		calc_ssd=self.calc_ssd
+		calc_residuals=self.calc_residuals
+		track_fit=self.track_fit
+		
+		def record_ssd(ctx,x):
+			val=calc_ssd(ctx,x)
+			track_fit.append(array(ctx.fit.fit_av_d))
+			return val
+		def record_residuals(ctx,x):
+			val=calc_residuals(ctx,x)
+			track_fit.append(array(ctx.fit.fit_av_d))
+			return val
+		
+		pyfdap_fit_module.fit_context.calc_ssd=record_ssd
+		pyfdap_fit_module.fit_context.calc_residuals=record_residuals
+	
+	def tearDown(self):
+		
+		pyfdap_fit_module.fit_context.calc_ssd=self.calc_ssd
+		pyfdap_fit_module.fit_context.calc_residuals=self.calc_residuals
+	
+	def test_equal_curves(self):
+		
+		#Embryo 1 has an ignored time point
+		for i,opt_meth in [[0,'Constrained Nelder-Mead'],[1,'Constrained Nelder-Mead'],[1,'least_squares']]:
+			
+			del self.track_fit[:]
+			
+			emb=make_embryo(i)
+			fit=emb.fits[0]
+			fit.opt_meth=opt_meth
+			fit.save_track=1
+			fit.track_maxlen=100000
+			pyfdap_fit_module.fdap_fitting(emb,0)
+			
+			self.assertTrue(len(self.track_fit)>10)
+			self.assertEqual(len(fit.track_parms),len(self.track_fit))
+			assert_allclose(pyfdap_fit_module.get_track_fit(emb,fit),self.track_fit,rtol=1e-12)
+			
+			#Tracks of older versions give the same curves
+			fit.track_parms=[list(P) for P in fit.track_parms.get_parms()]
+			assert_allclose(pyfdap_fit_module.get_track_fit(emb,fit),self.track_fit,rtol=1e-12)
+	
+	#With a short ring buffer only the curves of the last evaluations are kept
+	def test_wraparound(self):
+		
+		emb=make_embryo(0)
+		fit=emb.fits[0]
+		fit.save_track=1
+		fit.track_maxlen=7
+		pyfdap_fit_module.fdap_fitting(emb,0)
+		
+		assert_allclose(pyfdap_fit_module.get_track_fit(emb,fit),self.track_fit[-7:],rtol=1e-12)
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,113 @@
+#=====================================================================================================================================
+#Copyright
+#=====================================================================================================================================
+
+#Copyright (C) 2014 Alexander Blaessle, Patrick Mueller, and the Friedrich Miescher Laboratory of the Max Planck Society
+#This software is distributed under the terms of the GNU General Public License.
+
+#This file is part of PyFDAP.
+
+#PyFDAP is free software: you can redistribute it and/or modify
+#it under the terms of the GNU General Public License as published by
+#the Free Software Foundation, either version 3 of the License, or
+#(at your option) any later version.
+
+#This program is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#GNU General Public License for more details.
+
+#You should have received a copy of the GNU General Public License
+#along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+#=====================================================================================================================================
+#Module Description
+#=====================================================================================================================================
+
+#Tests of the VarPro optimizer for the exponential model: fits of synthetic embryos have to find the optimum of the 
+#constrained Nelder-Mead of PyFDAP 1.1 (baseline_reference), also with c0 or y0 fixed, and the closed-form c0 and y0 of 
+#fit_context.linear_parms have to be the bounded linear least squares solution for each k. Run from the repository root with:
+#python -m unittest discover tests
+
+#=====================================================================================================================================
+#Importing necessary modules
+#=====================================================================================================================================
+
+import unittest
+
+from numpy import *
+from numpy.testing import assert_allclose
+import scipy.optimize as sopt
+
+import fit_checks
+import pyfdap_fit_module
+from synthetic_data import make_embryo
+
+#=====================================================================================================================================
+#Tests
+#=====================================================================================================================================
+
+class test_varpro(unittest.TestCase,fit_checks.same_optimum_checks):
+	
+	def test_same_optimum(self):
+		
+		self.check_same_optimum('VarPro')
+	
+	def test_fixed(self):
+		
+		self.check_nm_optimum('VarPro','exp',fit_cnaught=0)
+		self.check_nm_optimum('VarPro','exp',fit_ynaught=0)
+	
+	#c0 and y0 minimizing SSD for fixed k within bounds, by scipy's bounded linear least squares
+	def get_linear_parms(self,ctx,knew):
+		
+		fit=ctx.fit
+		E=exp(-knew*ctx.tvec)
+		d=asarray(ctx.data,dtype=float)
+		
+		cols=[]
+		LB=[]
+		UB=[]
+		for fitted,col,lb,ub,x0 in [[fit.fit_cnaught,E,fit.LB_cnaught,fit.UB_cnaught,fit.x0[1]],[fit.fit_ynaught,ones(shape(E)),fit.LB_ynaught,fit.UB_ynaught,fit.x0[2]]]:
+			if fitted==1:
+				cols.append(col)
+				LB.append(-inf if lb==None else lb)
+				UB.append(inf if ub==None else ub)
+			else:
+				d=d-x0*col
+		
+		P=list(sopt.lsq_linear(array(cols).T,d,bounds=(LB,UB),tol=1e-14).x)
+		
+		cnaught=P.pop(0) if fit.fit_cnaught==1 else fit.x0[1]
+		ynaught=P.pop(0) if fit.fit_ynaught==1 else fit.x0[2]
+		
+		return cnaught,ynaught
+	
+	#Bounds of c0 and y0 that are not active, active and missing
+	def test_linear_parms(self):
+		
+		#c0 and y0 are not unique for k=0
+		K=linspace(1e-5,1e-3,11)
+		
+		for i in range(3):
+			for bounds in [[0,500,0,200],[0,100,0,200],[0,500,50,200],[130,500,0,35],[None,None,None,None]]:
+				for fit_cnaught,fit_ynaught in [[1,1],[1,0],[0,1]]:
+					
+					emb=make_embryo(i)
+					fit=emb.fits[0]
+					fit.LB_cnaught,fit.UB_cnaught,fit.LB_ynaught,fit.UB_ynaught=bounds
+					fit.fit_cnaught=fit_cnaught
+					fit.fit_ynaught=fit_ynaught
+					ctx=pyfdap_fit_module.fit_context(emb,0)
+					
+					#Vectorized over k and for single k
+					C,Y=ctx.linear_parms(K)
+					for j,knew in enumerate(K):
+						
+						msg=str([i,bounds,fit_cnaught,fit_ynaught,knew])
+						assert_allclose(ctx.linear_parms(knew),[C[j],Y[j]],rtol=1e-12,err_msg=msg)
+						assert_allclose([C[j],Y[j]],self.get_linear_parms(ctx,knew),rtol=1e-6,atol=1e-6,err_msg=msg)
+
+if __name__ == '__main__':
+	unittest.main()